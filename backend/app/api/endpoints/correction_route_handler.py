@@ -19,7 +19,7 @@ from typing import List, Literal, Optional, Dict
 from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel, Field
  
-from ...database import get_db, get_db_pool
+from ...database import get_db_pool
 from ...utils.multimodal_framework.similarity_pipeline import run_similarity_pipeline
 from ...utils.metadata_embeddings.embedding_calculator import EmbeddingCalculator
  
@@ -200,10 +200,11 @@ async def predict_correction(
     request: CorrectionRequest,
     debug: bool = False,
     pool=Depends(get_db_pool),
-    conn=Depends(get_db),
 ):
     try:
-        robot_info = await _fetch_robot_info(conn, request.robot_model)
+        # Connections nur pro DB-Schritt — die Pipeline holt sich ihre eigenen aus dem Pool
+        async with pool.acquire() as conn:
+            robot_info = await _fetch_robot_info(conn, request.robot_model)
         if robot_info is None:
             logger.warning(f"robot_model '{request.robot_model}' not found — using fallback.")
  
@@ -224,7 +225,6 @@ async def predict_correction(
             },
             external_embedding_calculator=embedding_calculator,
             pool=pool,
-            conn=conn,
             modes=["position", "joint", "orientation", "velocity", "metadata"],
             limit=request.limit,
             stage2_active=request.stage2_active,
@@ -247,10 +247,11 @@ async def predict_correction(
                     all_ids.append(s["seg_id"])
  
         # ── Kalibrierungsfilter: alte Daten ausschließen ─────────────────
-        filtered_ids = await _filter_seg_ids_by_calibration(
-            conn, all_ids, request.calibration_date or "" if request.filter_by_calibration else ""
-        )
-        query_data = await _get_all_segment_data(conn, filtered_ids)
+        async with pool.acquire() as conn:
+            filtered_ids = await _filter_seg_ids_by_calibration(
+                conn, all_ids, request.calibration_date or "" if request.filter_by_calibration else ""
+            )
+            query_data = await _get_all_segment_data(conn, filtered_ids)
  
         # ── Korrektur pro Segment ────────────────────
         corrections = []
@@ -334,7 +335,8 @@ async def predict_correction(
  
         debug_data = None
         if debug:
-            neighbor_positions = await _fetch_neighbor_positions(conn, all_ids)
+            async with pool.acquire() as conn:
+                neighbor_positions = await _fetch_neighbor_positions(conn, all_ids)
             debug_data = []
             for group, corr in zip(seg_groups, corrections):
                 similar = group.get("similar_segments", {}).get("results", [])
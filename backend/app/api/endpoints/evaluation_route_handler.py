@@ -1,16 +1,32 @@
 import os
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
 from ...database import get_db
 import logging
 from fastapi_cache.decorator import cache
+from ...utils.pagination.keyset import (
+    decode_cursor, estimate_count, keyset_condition, keyset_order, page_rows, pagination_info
+)
+from ...utils.plotting.downsampling import downsample_rows
+from ...utils.serialization.wire_format import WireCoder, wire_response
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Optionales Downsampling der Abweichungs-Reihen; max_points/method sind Teil
+# des Cache-Keys → jede reduzierte Variante wird getrennt gecacht
+MAX_POINTS = Query(
+    None, ge=10, description="Serverseitig auf höchstens so viele Punkte reduzieren (Standard: alle)"
+)
+DOWNSAMPLE_METHOD = Query('lttb', description="lttb (Largest-Triangle-Three-Buckets) oder minmax pro Bucket")
+
+# Content Negotiation (Arrow IPC / msgpack / JSON); Accept ist Teil des
+# Cache-Keys, WireCoder legt binäre Antworten direkt als Bytes ab
+ACCEPT = Header(None, description="application/vnd.apache.arrow.stream, application/msgpack oder JSON (Standard)")
+
 @router.get("/evaluation_info/{traj_id}")
 async def get_evaluation_info_by_id(
         traj_id: str,
@@ -169,8 +185,14 @@ async def get_evaluation_info(
 
 
 @router.get("/ed_evaluation/{traj_id}")
-@cache(expire=2400)
-async def get_position_euclidean_by_id(traj_id: str, conn=Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_position_euclidean_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn=Depends(get_db),
+):
     try:
         query = """
         SELECT 
@@ -194,9 +216,9 @@ async def get_position_euclidean_by_id(traj_id: str, conn=Depends(get_db)):
         if not rows:
             raise HTTPException(status_code=404, detail=f"No euclidean deviation data found for traj_id {traj_id}")
 
-        return {
-            "position_euclidean": [dict(row) for row in rows]
-        }
+        return wire_response(
+            {"position_euclidean": downsample_rows(rows, max_points, method)}, accept
+        )
 
     except Exception as e:
         logger.error(f"Error fetching euclidean deviation data: {str(e)}")
@@ -239,8 +261,14 @@ async def get_position_dfd_by_id(traj_id: str, conn=Depends(get_db)):
 '''
 
 @router.get("/sidtw_evaluation/{traj_id}")
-@cache(expire=2400)
-async def get_position_sidtw_by_id(traj_id: str, conn=Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_position_sidtw_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn=Depends(get_db),
+):
     try:
         query = """
         SELECT 
@@ -264,9 +292,9 @@ async def get_position_sidtw_by_id(traj_id: str, conn=Depends(get_db)):
         if not rows:
             raise HTTPException(status_code=404, detail=f"No SIDTW deviation data found for traj_id {traj_id}")
 
-        return {
-            "position_sidtw": [dict(row) for row in rows]
-        }
+        return wire_response(
+            {"position_sidtw": downsample_rows(rows, max_points, method)}, accept
+        )
 
     except Exception as e:
         logger.error(f"Error fetching SIDTW deviation data: {str(e)}")
@@ -359,16 +387,24 @@ async def search_evaluation_traj_ids(
         velocity: int = Query(None, description="Geschwindigkeit"),
         page: int = Query(1, ge=1, description="Seitennummer"),
         page_size: int = Query(20, ge=1, le=100, description="Einträge pro Seite"),
+        cursor: Optional[str] = Query(None, description="next_cursor der vorigen Seite (Keyset statt OFFSET)"),
+        exact_count: bool = Query(False, description="Gesamtanzahl exakt zählen statt Planner-Schätzung"),
         conn=Depends(get_db)
 ):
     try:
-        # Der entscheidende Unterschied: Wir verbinden die traj_info mit evaluation_ed_info
-        # Wir selektieren nur die Bahnen, für die auch Auswertungsdaten existieren
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    try:
+        # Der entscheidende Unterschied: Wir selektieren nur die Bahnen, für die
+        # auch Auswertungsdaten (evaluation.ed_info) existieren. EXISTS statt
+        # JOIN + DISTINCT: gleiche Bahnen, aber der Keyset-Index auf traj_info
+        # liefert die Sortierung und LIMIT kann früh abbrechen
         base_query = """
-        SELECT DISTINCT bi.* 
+        SELECT bi.* 
         FROM motion.traj_info bi
-        JOIN evaluation.ed_info ie ON bi.traj_id = ie.traj_id
-        WHERE 1=1
+        WHERE EXISTS (SELECT 1 FROM evaluation.ed_info ie WHERE ie.traj_id = bi.traj_id)
         """
 
         params = []
@@ -412,42 +448,53 @@ async def search_evaluation_traj_ids(
             params.append(velocity)
             param_index += 1
 
-        # Zähle Gesamtanzahl für Pagination
-        count_query = f"SELECT COUNT(*) FROM ({base_query}) AS filtered_data"
-        total_count = await conn.fetchval(count_query, *params)
-
-        # Füge Sortierung und Pagination hinzu
-        query = base_query + f" ORDER BY bi.recording_date DESC LIMIT ${param_index} OFFSET ${param_index + 1}"
-        params.extend([page_size, (page - 1) * page_size])
+        # Gesamtanzahl: exakt oder Planner-Schätzung
+        if exact_count:
+            total_count = await conn.fetchval(f"SELECT COUNT(*) FROM ({base_query}) AS filtered_data", *params)
+        else:
+            total_count = await estimate_count(conn, base_query, *params)
+
+        # Mit Cursor per Keyset, sonst OFFSET (Sprung auf Seite n); eine Zeile mehr für has_next
+        query = base_query
+        if after is not None:
+            condition, keyset_params = keyset_condition('bi', after, param_index)
+            query += condition
+            params.extend(keyset_params)
+            param_index += len(keyset_params)
+        query += keyset_order('bi') + f" LIMIT ${param_index}"
+        params.append(page_size + 1)
+        if after is None:
+            query += f" OFFSET ${param_index + 1}"
+            params.append((page - 1) * page_size)
 
         rows = await conn.fetch(query, *params)
-        traj_info_list = [dict(row) for row in rows]
+        rows, has_next, next_cursor = page_rows(rows, page_size)
 
         # Keine Ergebnisse und Seite > 1
-        if not traj_info_list and page > 1:
+        if not rows and page > 1:
             raise HTTPException(status_code=404, detail="Page number exceeds available pages")
 
-        total_pages = (total_count + page_size - 1) // page_size
-
         return {
-            "traj_info": traj_info_list,
-            "pagination": {
-                "total": total_count,
-                "page": page,
-                "page_size": page_size,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_previous": page > 1
-            }
+            "traj_info": [dict(row) for row in rows],
+            "pagination": pagination_info(total_count, page, page_size, has_next, next_cursor, exact_count),
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching evaluation traj info: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
     
     
 @router.get("/gd_evaluation/{traj_id}")
-async def get_gd_evaluation_by_id(traj_id: str, conn=Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_gd_evaluation_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn=Depends(get_db),
+):
     try:
         query = """
                 SELECT 
@@ -473,17 +520,23 @@ async def get_gd_evaluation_by_id(traj_id: str, conn=Depends(get_db)):
         if not rows:
             raise HTTPException(status_code=404, detail=f"No GD orientation data found for traj_id {traj_id}")
 
-        return {
-            "gd_evaluation": [dict(row) for row in rows]
-        }
+        return wire_response(
+            {"gd_evaluation": downsample_rows(rows, max_points, method)}, accept
+        )
 
     except Exception as e:
         logger.error(f"Error fetching GD orientation data: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 @router.get("/qdtw_evaluation/{traj_id}")
-@cache(expire=2400)
-async def get_qdtw_evaluation_by_id(traj_id: str, conn=Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_qdtw_evaluation_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn=Depends(get_db),
+):
     try:
         query = """
                 SELECT 
@@ -509,9 +562,9 @@ async def get_qdtw_evaluation_by_id(traj_id: str, conn=Depends(get_db)):
         if not rows:
             raise HTTPException(status_code=404, detail=f"No QDTW deviation data found for traj_id {traj_id}")
 
-        return {
-            "qdtw_evaluation": [dict(row) for row in rows]
-        }
+        return wire_response(
+            {"qdtw_evaluation": downsample_rows(rows, max_points, method)}, accept
+        )
 
     except Exception as e:
         logger.error(f"Error fetching qdtw deviation data: {str(e)}")
@@ -6,12 +6,17 @@ from ...database import get_db_pool
 from ...utils.metadata_embeddings.metadata_calculator import MetadataCalculatorService
 from ...utils.metadata_embeddings.background_tasks import (
     process_metadata_background,
+    process_embedding_recompute_background,
     create_task_id,
     get_task_status,
     cleanup_old_tasks,
     get_all_tasks,
-    TaskStatus, find_running_task
+    update_task,
+    TaskStatus, find_running_task,
+    RECOMPUTE_TASK_TYPE
 )
+from ...utils.metadata_embeddings.binary_vector_writer import get_binary_writer
+from ...utils.metadata_embeddings.embedding_calculator import EMBEDDING_MODES
 import logging
 
 logger = logging.getLogger(__name__)
@@ -50,6 +55,11 @@ class MetadataCalculationResponse(BaseModel):
     message: str
     estimated_duration_minutes: Optional[float] = None
 
+class EmbeddingRecomputeRequest(BaseModel):
+    modes: List[str] = list(EMBEDDING_MODES)  # "joint", "position", "orientation", "velocity", "metadata"
+    shadow: bool = False   # in {mode}_embedding_next statt live schreiben
+    switch: bool = False   # nach shadow-Recompute atomar umschalten
+
 class SegmentSimilarityRequest(BaseModel):
     segment_limit: int = 5
     weight_duration: float = 1.0
@@ -74,10 +84,10 @@ async def calculate_metadata(
     """
     try:
         # Cleanup alte Tasks
-        cleanup_old_tasks()
+        await cleanup_old_tasks()
 
         # DUPLIKAT-PRÜFUNG für Metadata-Tasks
-        existing_task = find_running_task(
+        existing_task = await find_running_task(
             "metadata_calculation",
             mode=request.mode,
             traj_id=request.traj_id if request.mode == "single" else None
@@ -175,7 +185,7 @@ async def get_task_status_endpoint(task_id: str):
     """
     Holt den aktuellen Status einer Background Task
     """
-    task_data = get_task_status(task_id)
+    task_data = await get_task_status(task_id)
 
     if not task_data:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
@@ -189,7 +199,7 @@ async def get_task_status_endpoint(task_id: str):
     if task_data.get("total_trajs", 0) > 0:
         # Bahn-Task
         total_items = task_data.get("total_trajs", 0)
-        processed_items = task_data.get("processed_bahns", 0)
+        processed_items = task_data.get("processed_trajs") or task_data.get("processed_bahns", 0)
     elif task_data.get("total_segments", 0) > 0:
         # Segment-Task
         total_items = task_data.get("total_segments", 0)
@@ -206,9 +216,9 @@ async def get_task_status_endpoint(task_id: str):
         failed_at=task_data.get("failed_at"),
         total_trajs=total_items,
         processed_bahns=processed_items,
-        successful_bahns=task_data.get("successful_bahns") or task_data.get("successful_segments", 0),
-        failed_bahns=task_data.get("failed_bahns") or task_data.get("failed_segments", 0),
-        current_bahn=task_data.get("current_bahn") or task_data.get("current_segment"),
+        successful_bahns=task_data.get("successful_trajs") or task_data.get("successful_segments", 0),
+        failed_bahns=task_data.get("failed_trajs") or task_data.get("failed_segments", 0),
+        current_bahn=task_data.get("current_traj") or task_data.get("current_segment"),
         progress_percent=round(progress_percent, 1),
         errors=task_data.get("errors", []),
         details=task_data.get("details", {}),
@@ -220,22 +230,22 @@ async def get_task_status_endpoint(task_id: str):
 
 @router.get("/tasks")
 async def list_all_tasks():
-    tasks = get_all_tasks()
+    tasks = await get_all_tasks()
 
     # Formatiere für bessere Übersicht
     formatted_tasks = {}
     for task_id, task_data in tasks.items():
         progress_percent = 0.0
+        processed = task_data.get("processed_trajs", 0)
         if task_data.get("total_trajs", 0) > 0:
-            progress_percent = (task_data.get("processed_bahns", 0) / task_data["total_trajs"]) * 100
+            progress_percent = (processed / task_data["total_trajs"]) * 100
 
         formatted_tasks[task_id] = {
             "status": task_data.get("status"),
             "started_at": task_data.get("started_at"),
             "progress": f"{progress_percent:.1f}%",
-            "bahns": f"{task_data.get('processed_bahns', 0)}/{task_data.get('total_trajs', 0)}",
-            "success_rate": f"{task_data.get('successful_bahns', 0)}/{task_data.get('processed_bahns', 0)}" if task_data.get(
-                'processed_bahns', 0) > 0 else "0/0"
+            "bahns": f"{processed}/{task_data.get('total_trajs', 0)}",
+            "success_rate": f"{task_data.get('successful_trajs', 0)}/{processed}" if processed > 0 else "0/0"
         }
 
     return {
@@ -248,15 +258,14 @@ async def cancel_task(task_id: str):
     """
     Bricht eine laufende Task ab (falls möglich)
     """
-    task_data = get_task_status(task_id)
+    task_data = await get_task_status(task_id)
 
     if not task_data:
         raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
 
     if task_data.get("status") == TaskStatus.RUNNING:
-        # Task als cancelled markieren
-        task_data["status"] = "cancelled"
-        task_data["cancelled_at"] = datetime.now().isoformat()
+        # Task als cancelled markieren — laufende Worker leasen danach keine Items mehr
+        await update_task(task_id, status="cancelled", cancelled_at=datetime.now().isoformat())
 
         return {"message": f"Task {task_id} marked for cancellation"}
 
@@ -268,15 +277,73 @@ async def cleanup_tasks_endpoint(max_age_hours: int = 24):
     """
     Bereinigt alte Tasks
     """
-    initial_count = len(get_all_tasks())
-    cleanup_old_tasks(max_age_hours)
-    final_count = len(get_all_tasks())
+    initial_count = len(await get_all_tasks())
+    await cleanup_old_tasks(max_age_hours)
+    final_count = len(await get_all_tasks())
 
     return {
         "message": f"Cleaned up {initial_count - final_count} old tasks",
         "remaining_tasks": final_count
     }
 
+############################ EMBEDDINGS NEU BERECHNEN ##########################################################
+
+@router.post("/recompute-embeddings", response_model=MetadataCalculationResponse)
+async def recompute_embeddings(
+        request: EmbeddingRecomputeRequest,
+        background_tasks: BackgroundTasks,
+        db_pool=Depends(get_db_pool)
+):
+    """
+    Berechnet nur Embeddings neu, deren Versions-Hash veraltet ist —
+    modusweise, jeweils nur aus der benötigten Quelltabelle.
+    """
+    unknown = [m for m in request.modes if m not in EMBEDDING_MODES]
+    if unknown or not request.modes:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid modes {unknown}. Expected any of: {list(EMBEDDING_MODES)}"
+        )
+
+    existing_task = await find_running_task(RECOMPUTE_TASK_TYPE)
+    if existing_task:
+        return MetadataCalculationResponse(
+            task_id=existing_task,
+            status="already_running",
+            message="Embedding-Recompute läuft bereits"
+        )
+
+    task_id = create_task_id("recompute")
+    background_tasks.add_task(
+        process_embedding_recompute_background,
+        task_id=task_id,
+        service=MetadataCalculatorService(db_pool),
+        modes=request.modes,
+        shadow=request.shadow,
+        switch=request.switch,
+    )
+
+    logger.info(f"Started embedding recompute {task_id} for modes {request.modes}")
+
+    return MetadataCalculationResponse(
+        task_id=task_id,
+        status="started",
+        message=f"Started recomputing stale {', '.join(request.modes)} embeddings in background"
+    )
+
+
+@router.post("/switch-embeddings/{mode}")
+async def switch_shadow_embeddings(mode: str):
+    """
+    Schaltet eine im Shadow-Modus berechnete Modalität atomar live
+    ({mode}_embedding_next → {mode}_embedding).
+    """
+    if mode not in EMBEDDING_MODES:
+        raise HTTPException(status_code=400, detail=f"Invalid mode {mode}")
+
+    switched = await get_binary_writer().switch_shadow(mode)
+    return {"message": f"Switched {switched} {mode} embeddings", "switched_rows": switched}
+
 @router.get("/metadata-stats")
 async def get_metadata_stats(db_pool=Depends(get_db_pool)):
     """
@@ -7,24 +7,43 @@ Trajectory similarity search endpoints.
 GET  /search/{target_id}   — search against an existing DB trajectory
 POST /search/candidate     — search against an unsaved, simulated candidate
                              (from the recorder's RoboDK-based PointGenerator)
+GET  /search/{target_id}/stream
+                           — same search, results streamed as NDJSON/SSE events
+POST /search/batch         — search for many existing DB trajectories or unsaved
+                             candidates at once (set-based Stage 1, shared load,
+                             parallel DTW)
+POST /search/candidates    — score all AutoMode candidates of one round at once
+                             (per-candidate prognosis + acquisition score)
 
 Both endpoints share the same pipeline (run_similarity_pipeline) and the
 same modes/prognosis/calibration semantics. The only difference is the
 QUERY side: an existing traj_id vs. an in-memory payload.
 
 Previously the candidate endpoint lived in similarity_candidate_route_handler.py.
+
+Result endpoints honour Accept: application/vnd.apache.arrow.stream or
+application/msgpack for a compact binary encoding (utils/serialization).
 """
 
+import json
 import logging
 import math
 from typing import Dict, List, Literal, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 
-from ...database import get_db, get_db_pool
-from ...utils.multimodal_framework.similarity_pipeline import run_similarity_pipeline
+from ...database import get_db_pool
+from ...utils.multimodal_framework.similarity_pipeline import (
+    run_similarity_pipeline,
+    run_similarity_pipeline_batch,
+    stream_similarity_pipeline,
+)
 from ...utils.metadata_embeddings.embedding_calculator import EmbeddingCalculator
+from ...utils.feature_prediction.predictor import compute_acquisition_score
+from ...utils.serialization.wire_format import wire_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -87,9 +106,7 @@ def _sanitize_result(result: dict) -> dict:
 
 # ── GET /search/{target_id} ───────────────────────────────────────────────
 
-@router.get("/search/{target_id}")
-async def search_trajectory(
-        target_id: str,
+def _search_query_params(
         modes: Optional[str] = Query(
             None,
             description="Comma-separated modes: position, joint, orientation, velocity, metadata"
@@ -119,8 +136,76 @@ async def search_trajectory(
             )
         ),
         coverage: float = Query(0.90, ge=0.5, le=0.99),
+) -> Dict:
+    """Parses the shared GET query parameters into run_similarity_pipeline kwargs."""
+    mode_list = [m.strip() for m in modes.split(',')] if modes else None
+    weights = {
+        'joint':       joint_weight,
+        'position':    position_weight,
+        'orientation': orientation_weight,
+        'velocity':    velocity_weight,
+        'metadata':    metadata_weight,
+    }
+
+    prefilter_list: list = []
+    if prefilter_features:
+        prefilter_list = [f.strip() for f in prefilter_features.split(',') if f.strip()]
+        allowed = {'length', 'duration', 'movement_type', 'position_3d',
+                   'velocity_profile', 'acceleration_profile'}
+        invalid = [f for f in prefilter_list if f not in allowed]
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid prefilter features: {invalid}. Allowed: {list(allowed)}"
+            )
+
+    include_tags_list = (
+        [t for t in (t.strip() for t in include_tags.split(',')) if t and t != 'all']
+        if include_tags else None
+    ) or None
+    exclude_tags_list = (
+        [t.strip() for t in exclude_tags.split(',') if t.strip()]
+        if exclude_tags else None
+    )
+    exclude_ids_list = (
+        [i.strip() for i in exclude_ids.split(',') if i.strip()]
+        if exclude_ids else None
+    )
+    include_ids_list = (
+        [i.strip() for i in include_ids.split(',') if i.strip()]
+        if include_ids else None
+    )
+    calibration_tags = (
+        [t.strip() for t in calibration_tag.split(',') if t.strip()]
+        if calibration_tag else ['all']
+    )
+    calibration_tag_param = calibration_tags if len(calibration_tags) > 1 else calibration_tags[0]
+
+    return dict(
+        modes=mode_list,
+        weights=weights,
+        limit=limit,
+        buffer_factor=5,
+        prefilter_features=prefilter_list,
+        metric=metric,
+        include_tags=include_tags_list,
+        exclude_tags=exclude_tags_list,
+        exclude_ids=exclude_ids_list,
+        include_ids=include_ids_list,
+        stage2_active=stage2_active,
+        dtw_mode=dtw_mode,
+        prognosis_active=prognosis_active,
+        calibration_tag=calibration_tag_param,
+        coverage=coverage,
+    )
+
+
+@router.get("/search/{target_id}")
+async def search_trajectory(
+        target_id: str,
+        params: Dict = Depends(_search_query_params),
+        accept: Optional[str] = Header(None),
         pool=Depends(get_db_pool),
-        conn=Depends(get_db),
 ):
     """
     Two-Stage Trajectory Similarity Search against an existing DB trajectory.
@@ -139,74 +224,16 @@ async def search_trajectory(
         GET /search/1765989370?exclude_ids=1781022623,1763474797
     """
     try:
-        mode_list = [m.strip() for m in modes.split(',')] if modes else None
-        weights = {
-            'joint':       joint_weight,
-            'position':    position_weight,
-            'orientation': orientation_weight,
-            'velocity':    velocity_weight,
-            'metadata':    metadata_weight,
-        }
-
-        prefilter_list: list = []
-        if prefilter_features:
-            prefilter_list = [f.strip() for f in prefilter_features.split(',') if f.strip()]
-            allowed = {'length', 'duration', 'movement_type', 'position_3d',
-                       'velocity_profile', 'acceleration_profile'}
-            invalid = [f for f in prefilter_list if f not in allowed]
-            if invalid:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"Invalid prefilter features: {invalid}. Allowed: {list(allowed)}"
-                )
-
-        include_tags_list = (
-            [t for t in (t.strip() for t in include_tags.split(',')) if t and t != 'all']
-            if include_tags else None
-        ) or None
-        exclude_tags_list = (
-            [t.strip() for t in exclude_tags.split(',') if t.strip()]
-            if exclude_tags else None
-        )
-        exclude_ids_list = (
-            [i.strip() for i in exclude_ids.split(',') if i.strip()]
-            if exclude_ids else None
-        )
-        include_ids_list = (
-            [i.strip() for i in include_ids.split(',') if i.strip()]
-            if include_ids else None
-        )
-        calibration_tags = (
-            [t.strip() for t in calibration_tag.split(',') if t.strip()]
-            if calibration_tag else ['all']
-        )
-        calibration_tag_param = calibration_tags if len(calibration_tags) > 1 else calibration_tags[0]
-
         result = await run_similarity_pipeline(
             target_id=target_id,
             pool=pool,
-            conn=conn,
-            modes=mode_list,
-            weights=weights,
-            limit=limit,
-            buffer_factor=5,
-            prefilter_features=prefilter_list,
-            metric=metric,
-            include_tags=include_tags_list,
-            exclude_tags=exclude_tags_list,
-            exclude_ids=exclude_ids_list,
-            include_ids=include_ids_list,
-            stage2_active=stage2_active,
-            dtw_mode=dtw_mode,
-            prognosis_active=prognosis_active,
-            calibration_tag=calibration_tag_param,
-            coverage=coverage,
+            **params,
         )
 
         if result.get('error'):
             raise HTTPException(status_code=404, detail=result['error'])
 
-        return _sanitize_result(result)
+        return wire_response(_sanitize_result(result), accept)
 
     except HTTPException:
         raise
@@ -215,6 +242,44 @@ async def search_trajectory(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# ── GET /search/{target_id}/stream ────────────────────────────────────────
+
+def _encode_event(event: Dict, fmt: str) -> str:
+    payload = json.dumps(jsonable_encoder(_sanitize_non_finite(event)))
+    if fmt == 'sse':
+        return f"event: {event['event']}\ndata: {payload}\n\n"
+    return payload + "\n"
+
+
+@router.get("/search/{target_id}/stream")
+async def search_trajectory_stream(
+        target_id: str,
+        params: Dict = Depends(_search_query_params),
+        format: Literal['ndjson', 'sse'] = Query('ndjson'),
+        pool=Depends(get_db_pool),
+):
+    """
+    Streaming variant of GET /search/{target_id} — same query parameters.
+
+    Emits one event per line (NDJSON) or as Server-Sent Events:
+      stage1 → stage2_traj / stage2_segment (in completion order) → prognosis → done
+
+    Each event carries its own `timing` (stage duration + `elapsed_ms`), so the
+    UI can render the Stage 1 ranking long before DTW and prognosis are finished.
+    An unknown target yields a single `error` event.
+    """
+    async def _events():
+        try:
+            async for event in stream_similarity_pipeline(target_id=target_id, pool=pool, **params):
+                yield _encode_event(event, format)
+        except Exception as e:
+            logger.error(f"Error in streaming similarity search for {target_id}: {e}", exc_info=True)
+            yield _encode_event({'event': 'error', 'error': str(e)}, format)
+
+    media_type = 'text/event-stream' if format == 'sse' else 'application/x-ndjson'
+    return StreamingResponse(_events(), media_type=media_type)
+
+
 # ── POST /search/candidate ────────────────────────────────────────────────
 
 class CandidateTrajectory(BaseModel):
@@ -224,6 +289,27 @@ class CandidateTrajectory(BaseModel):
     joints:     List[List[float]]   # [[j1..j6], ...]
 
 
+class CandidateItem(BaseModel):
+    trajectory:      CandidateTrajectory
+    movement_type:   str
+    weight:          float               = Field(..., description="Payload weight in kg — required, no silent default")
+    segment_indices: Optional[List[int]] = None
+
+
+def _candidate_payload(c: CandidateItem) -> Dict:
+    return {
+        "trajectory": {
+            "timestamps": c.trajectory.timestamps,
+            "positions":  c.trajectory.positions,
+            "quats":      c.trajectory.quats,
+            "joints":     c.trajectory.joints,
+        },
+        "movement_type": c.movement_type,
+        "weight":        c.weight,
+        **({"segment_indices": c.segment_indices} if c.segment_indices else {}),
+    }
+
+
 class SearchCandidateRequest(BaseModel):
     trajectory:    CandidateTrajectory
     movement_type: str
@@ -249,8 +335,8 @@ class SearchCandidateRequest(BaseModel):
 @router.post("/search/candidate")
 async def search_candidate(
     request: SearchCandidateRequest,
+    accept: Optional[str] = Header(None),
     pool=Depends(get_db_pool),
-    conn=Depends(get_db),
 ):
     """
     Two-Stage Similarity Search against an unsaved, simulated candidate
@@ -262,7 +348,9 @@ async def search_candidate(
 
     """
     try:
-        robot_info = await _fetch_robot_info(conn, request.robot_model)
+        # Connection nur für den Lookup — die Pipeline holt sich ihre eigenen aus dem Pool
+        async with pool.acquire() as conn:
+            robot_info = await _fetch_robot_info(conn, request.robot_model)
         if robot_info is None:
             logger.warning(
                 f"robot_model '{request.robot_model}' not found in robot_info "
@@ -292,7 +380,6 @@ async def search_candidate(
             external_payload=candidate_payload,
             external_embedding_calculator=embedding_calculator,
             pool=pool,
-            conn=conn,
             modes=request.modes,
             weights=weights,
             limit=request.limit,
@@ -313,10 +400,238 @@ async def search_candidate(
         if result.get('error'):
             raise HTTPException(status_code=422, detail=result['error'])
 
-        return _sanitize_result(result)
+        return wire_response(_sanitize_result(result), accept)
 
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error in candidate similarity search: {e}", exc_info=True)
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ── POST /search/batch ────────────────────────────────────────────────────
+
+MAX_BATCH_TARGETS = 1000
+
+
+class SearchBatchRequest(BaseModel):
+    # Entweder gespeicherte Targets oder ungespeicherte Kandidaten (dann robot_model Pflicht)
+    target_ids:  Optional[List[str]]           = None
+    candidates:  Optional[List[CandidateItem]] = None
+    robot_model: Optional[str]                 = Field(None, description="Required with candidates, see POST /search/candidate")
+
+    modes:           List[str]                   = ["position", "joint", "orientation", "velocity", "metadata"]
+    weights:         Optional[Dict[str, float]]  = None
+    dtw_mode:        Literal["position", "joint"] = "position"
+    metric:          Literal["sidtw", "qdtw"]     = "sidtw"
+    calibration_tag: str                          = "all"
+    coverage:        float                        = Field(0.90, ge=0.5, le=0.99)
+    limit:           int                          = Field(10, ge=1, le=100)
+    stage2_active:   bool                         = False
+    prognosis_active: bool                        = False
+    include_tags:    Optional[List[str]]          = None
+    exclude_tags:    Optional[List[str]]          = None
+    exclude_ids:     Optional[List[str]]          = None
+    include_ids:     Optional[List[str]]          = None
+
+
+@router.post("/search/batch")
+async def search_batch(
+    request: SearchBatchRequest,
+    accept: Optional[str] = Header(None),
+    pool=Depends(get_db_pool),
+):
+    """
+    Similarity Search for many existing DB trajectories (`target_ids`) or
+    many unsaved candidates (`candidates` + `robot_model`) in one call
+    (e.g. validation runs or calibration sets).
+
+    Same modes/prognosis/calibration semantics as GET /search/{target_id},
+    but Stage 1 runs set-based over all targets, all trajectories for
+    Stage 2 are loaded once and the DTW reranking runs in parallel.
+    prefilter_features is NOT supported here (per-target feature windows).
+
+    Per-target errors (e.g. unknown target_id, no candidates after
+    pre-filter) are returned inline in `results` instead of failing the
+    whole batch.
+    """
+    try:
+        if (request.target_ids is None) == (request.candidates is None):
+            raise HTTPException(status_code=400, detail="Provide exactly one of target_ids or candidates")
+
+        if request.candidates is not None:
+            target_ids = None
+            n_targets  = len(request.candidates)
+            if not request.robot_model:
+                raise HTTPException(status_code=400, detail="robot_model is required with candidates")
+        else:
+            target_ids = list(dict.fromkeys(t.strip() for t in request.target_ids if t.strip()))
+            n_targets  = len(target_ids)
+        if not n_targets:
+            raise HTTPException(status_code=400, detail="target_ids/candidates must not be empty")
+        if n_targets > MAX_BATCH_TARGETS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Too many targets ({n_targets}), max {MAX_BATCH_TARGETS} per batch"
+            )
+
+        external_kwargs = {}
+        if request.candidates is not None:
+            # Connection nur für den Lookup — die Pipeline holt sich ihre eigenen aus dem Pool
+            async with pool.acquire() as conn:
+                robot_info = await _fetch_robot_info(conn, request.robot_model)
+            if robot_info is None:
+                logger.warning(
+                    f"robot_model '{request.robot_model}' not found in robot_info "
+                    f"— using fallback normalization values"
+                )
+            external_kwargs = dict(
+                external_payloads=[_candidate_payload(c) for c in request.candidates],
+                external_embedding_calculator=EmbeddingCalculator(n_samples=10, robot_info=robot_info),
+            )
+
+        calibration_tags = [t.strip() for t in request.calibration_tag.split(',') if t.strip()] or ['all']
+        calibration_tag_param = calibration_tags if len(calibration_tags) > 1 else calibration_tags[0]
+
+        include_tags = [t for t in (request.include_tags or []) if t and t != 'all'] or None
+
+        result = await run_similarity_pipeline_batch(
+            pool=pool,
+            target_ids=target_ids,
+            **external_kwargs,
+            modes=request.modes,
+            weights=request.weights,
+            limit=request.limit,
+            buffer_factor=5,
+            metric=request.metric,
+            include_tags=include_tags,
+            exclude_tags=request.exclude_tags,
+            exclude_ids=request.exclude_ids,
+            include_ids=request.include_ids,
+            stage2_active=request.stage2_active,
+            dtw_mode=request.dtw_mode,
+            prognosis_active=request.prognosis_active,
+            calibration_tag=calibration_tag_param,
+            coverage=request.coverage,
+        )
+
+        return wire_response(_sanitize_result(result), accept)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in batch similarity search: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# ── POST /search/candidates ───────────────────────────────────────────────
+
+MAX_CANDIDATES = 100
+
+
+class SearchCandidatesRequest(BaseModel):
+    candidates:  List[CandidateItem]
+    robot_model: str = Field(..., description="Must match motion.robot_info for embedding normalization")
+
+    modes:           List[str]                   = ["position", "joint", "orientation", "velocity", "metadata"]
+    weights:         Optional[Dict[str, float]]  = None
+    dtw_mode:        Literal["position", "joint"] = "position"
+    metric:          Literal["sidtw", "qdtw"]     = "sidtw"
+    calibration_tag: str                          = "all"
+    coverage:        float                        = 0.90
+    limit:           int                          = 10
+    stage2_active:   bool                         = True
+    conformal_active: bool                        = True
+    include_tags:    Optional[List[str]]          = None
+    exclude_tags:    Optional[List[str]]          = None
+    exclude_ids:     Optional[List[str]]          = None
+    include_ids:     Optional[List[str]]          = None
+
+
+@router.post("/search/candidates")
+async def search_candidates(
+    request: SearchCandidatesRequest,
+    accept: Optional[str] = Header(None),
+    pool=Depends(get_db_pool),
+):
+    """
+    Scores all ucb_k candidates of one AutoMode round in a single call
+    (see docs/automode_pipeline.md).
+
+    Embeddings for all candidates are built in one pass, Stage 1 runs
+    set-based over all candidate segments, neighbour trajectories for
+    Stage 2 are loaded once and the calibration quantile lookups are shared.
+
+    Each entry in `results` carries the usual segment_similarity + prognosis
+    plus `acquisition_score` = mean(σ_i · d_min,i). `best_index` points at the
+    candidate with the highest score (None on cold start → caller falls back
+    to the first candidate).
+    """
+    if not request.candidates:
+        raise HTTPException(status_code=400, detail="candidates must not be empty")
+    if len(request.candidates) > MAX_CANDIDATES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Too many candidates ({len(request.candidates)}), max {MAX_CANDIDATES} per call"
+        )
+
+    try:
+        # Connection nur für den Lookup — die Pipeline holt sich ihre eigenen aus dem Pool
+        async with pool.acquire() as conn:
+            robot_info = await _fetch_robot_info(conn, request.robot_model)
+        if robot_info is None:
+            logger.warning(
+                f"robot_model '{request.robot_model}' not found in robot_info "
+                f"— using fallback normalization values"
+            )
+
+        embedding_calculator = EmbeddingCalculator(n_samples=10, robot_info=robot_info)
+
+        payloads = [_candidate_payload(c) for c in request.candidates]
+
+        weights = request.weights or {
+            'joint': 1.0, 'position': 1.0, 'orientation': 1.0,
+            'velocity': 1.0, 'metadata': 1.0,
+        }
+
+        batch = await run_similarity_pipeline_batch(
+            pool=pool,
+            external_payloads=payloads,
+            external_embedding_calculator=embedding_calculator,
+            modes=request.modes,
+            weights=weights,
+            limit=request.limit,
+            buffer_factor=5,
+            metric=request.metric,
+            include_tags=request.include_tags,
+            exclude_tags=request.exclude_tags,
+            exclude_ids=request.exclude_ids,
+            include_ids=request.include_ids,
+            stage2_active=request.stage2_active,
+            dtw_mode=request.dtw_mode,
+            prognosis_active=True,
+            calibration_tag=request.calibration_tag,
+            coverage=request.coverage,
+            conformal_active=request.conformal_active,
+        )
+
+        scores = []
+        for index, result in enumerate(batch['results']):
+            result['index'] = index
+            result['acquisition_score'] = None if result.get('error') else compute_acquisition_score(result)
+            scores.append(result['acquisition_score'])
+
+        scored = [(s, i) for i, s in enumerate(scores) if s is not None]
+        batch['best_index'] = max(scored, key=lambda x: x[0])[1] if scored else None
+
+        return wire_response(_sanitize_result(batch), accept)
+
+    except HTTPException:
+        raise
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error in multi-candidate similarity search: {e}", exc_info=True)
+        raise HTTPException(status_code=500, detail=str(e))
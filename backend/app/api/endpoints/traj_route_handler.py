@@ -1,54 +1,83 @@
-from fastapi import APIRouter, Depends, HTTPException, Query
-from ...database import get_db
+import asyncio
+import os
+from itertools import groupby
+from typing import Dict, Literal, Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from ...database import get_db, get_db_pool
 import logging
 from fastapi_cache.decorator import cache
+from ...utils.pagination.keyset import (
+    decode_cursor, estimate_count, keyset_condition, keyset_order, page_rows, pagination_info
+)
+from ...utils.plotting.downsampling import downsample_rows
+from ...utils.serialization.wire_format import WireCoder, wire_response
+from ...utils.upload_data.traj_counts import get_traj_count
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
+# Optionales Downsampling der Zeitreihen-Endpunkte; max_points/method sind Teil
+# des Cache-Keys → jede reduzierte Variante wird getrennt gecacht
+MAX_POINTS = Query(
+    None, ge=10, description="Serverseitig auf höchstens so viele Punkte pro Kanal reduzieren (Standard: alle)"
+)
+DOWNSAMPLE_METHOD = Query('lttb', description="lttb (Largest-Triangle-Three-Buckets) oder minmax pro Bucket")
+
+# Content Negotiation (Arrow IPC / msgpack / JSON); Accept ist Teil des
+# Cache-Keys, WireCoder legt binäre Antworten direkt als Bytes ab
+ACCEPT = Header(None, description="application/vnd.apache.arrow.stream, application/msgpack oder JSON (Standard)")
+
 ########################## BEWEGUNGSDATEN #########################################
 
 @router.get("/traj_info")
 async def get_traj_info(
         page: int = Query(1, ge=1, description="Seitennummer"),
         page_size: int = Query(20, ge=1, le=100, description="Anzahl der Einträge pro Seite"),
+        cursor: Optional[str] = Query(None, description="next_cursor der vorigen Seite (Keyset statt OFFSET)"),
+        exact_count: bool = Query(False, description="Gesamtanzahl exakt zählen statt des gecachten Zählers"),
         conn=Depends(get_db)
 ):
     try:
-        # Berechne den Offset für die SQL-Abfrage
-        offset = (page - 1) * page_size
-
-        # Zähle die Gesamtanzahl der Einträge für die Metadaten
-        count_query = "SELECT COUNT(*) FROM motion.traj_info"
-        total_count = await conn.fetchval(count_query)
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
-        # Abfrage mit LIMIT und OFFSET für Pagination
-        query = "SELECT * FROM motion.traj_info ORDER BY recording_date DESC LIMIT $1 OFFSET $2"
-        rows = await conn.fetch(query, page_size, offset)
+    try:
+        # Gesamtanzahl: Zähler aus traj_counts (beim Upload gepflegt) oder exakt
+        if exact_count:
+            total_count = await conn.fetchval("SELECT COUNT(*) FROM motion.traj_info")
+        else:
+            total_count = await get_traj_count(conn)
+
+        # Mit Cursor per Keyset, sonst OFFSET (Sprung auf Seite n); eine Zeile mehr für has_next
+        query = "SELECT * FROM motion.traj_info b WHERE 1=1"
+        params = []
+        if after is not None:
+            condition, params = keyset_condition('b', after, 1)
+            query += condition
+        query += keyset_order('b') + f" LIMIT ${len(params) + 1}"
+        params.append(page_size + 1)
+        if after is None:
+            query += f" OFFSET ${len(params) + 1}"
+            params.append((page - 1) * page_size)
 
-        traj_info_list = [dict(row) for row in rows]
+        rows = await conn.fetch(query, *params)
+        rows, has_next, next_cursor = page_rows(rows, page_size)
 
-        if not traj_info_list and page > 1:
+        if not rows and page > 1:
             # Falls die angeforderte Seite keine Daten enthält, aber es gibt vorherige Seiten
             raise HTTPException(status_code=404, detail="Page number exceeds available pages")
 
-        # Berechne die Gesamtanzahl der Seiten
-        total_pages = (total_count + page_size - 1) // page_size
-
         # Pagination-Metadaten zum Ergebnis hinzufügen
         return {
-            "traj_info": traj_info_list,
-            "pagination": {
-                "total": total_count,
-                "page": page,
-                "page_size": page_size,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_previous": page > 1
-            }
+            "traj_info": [dict(row) for row in rows],
+            "pagination": pagination_info(total_count, page, page_size, has_next, next_cursor, exact_count),
         }
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error fetching Bahn info: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
@@ -65,8 +94,15 @@ async def search_traj_info(
         recording_date: str = Query(None, description="Datumsfilter"),
         sidtw_distance: float = Query(None, description="SIDTW Distance (±10% Toleranz)"),
         tag: str = Query(None, description="Tag-Filter"),
+        cursor: Optional[str] = Query(None, description="next_cursor der vorigen Seite (Keyset statt OFFSET)"),
+        exact_count: bool = Query(False, description="Gesamtanzahl exakt zählen statt Planner-Schätzung"),
         conn=Depends(get_db)
 ):
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
     try:
         # Basis-Query erstellen
         base_query = """
@@ -163,35 +199,41 @@ async def search_traj_info(
             params.extend([sidtw_distance - tolerance, sidtw_distance + tolerance])
             param_index += 2
 
-        # Zähle Gesamtanzahl für Pagination
-        count_query = f"SELECT COUNT(*) FROM ({base_query}) AS filtered_data"
-        total_count = await conn.fetchval(count_query, *params)
-
-        # Füge Sortierung und Pagination hinzu
-        query = base_query + f" ORDER BY b.recording_date DESC LIMIT ${param_index} OFFSET ${param_index + 1}"
-        params.extend([page_size, (page - 1) * page_size])
+        # Gesamtanzahl: exakt, ohne Filter aus traj_counts, sonst Planner-Schätzung
+        if exact_count:
+            total_count = await conn.fetchval(f"SELECT COUNT(*) FROM ({base_query}) AS filtered_data", *params)
+        elif not params:
+            total_count = await get_traj_count(conn)
+        else:
+            total_count = await estimate_count(conn, base_query, *params)
+
+        # Mit Cursor per Keyset, sonst OFFSET (Sprung auf Seite n); eine Zeile mehr für has_next
+        query = base_query
+        if after is not None:
+            condition, keyset_params = keyset_condition('b', after, param_index)
+            query += condition
+            params.extend(keyset_params)
+            param_index += len(keyset_params)
+        query += keyset_order('b') + f" LIMIT ${param_index}"
+        params.append(page_size + 1)
+        if after is None:
+            query += f" OFFSET ${param_index + 1}"
+            params.append((page - 1) * page_size)
 
         rows = await conn.fetch(query, *params)
-        traj_info_list = [dict(row) for row in rows]
+        rows, has_next, next_cursor = page_rows(rows, page_size)
 
         # Keine Ergebnisse und Seite > 1
-        if not traj_info_list and page > 1:
+        if not rows and page > 1:
             raise HTTPException(status_code=404, detail="Page number exceeds available pages")
 
-        total_pages = (total_count + page_size - 1) // page_size
-
         return {
-            "traj_info": traj_info_list,
-            "pagination": {
-                "total": total_count,
-                "page": page,
-                "page_size": page_size,
-                "total_pages": total_pages,
-                "has_next": page < total_pages,
-                "has_previous": page > 1
-            }
+            "traj_info": [dict(row) for row in rows],
+            "pagination": pagination_info(total_count, page, page_size, has_next, next_cursor, exact_count),
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error searching Bahn info: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
@@ -212,102 +254,261 @@ async def get_traj_info_by_id(traj_id: str, conn = Depends(get_db)):
         raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
 
 @router.get("/traj_pose_act/{traj_id}")
-@cache(expire=2400)
-async def get_traj_pose_ist_by_id(traj_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_pose_ist_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn = Depends(get_db),
+):
     rows = await conn.fetch(
         "SELECT * FROM motion.traj_pose_act WHERE traj_id = $1 ORDER BY timestamp ASC",
         traj_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(downsample_rows(rows, max_points, method), accept)
 
 @router.get("/traj_vel_act/{traj_id}")
-@cache(expire=2400)
-async def get_traj_twist_ist_by_id(traj_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_twist_ist_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn = Depends(get_db),
+):
     rows = await conn.fetch(
         "SELECT * FROM motion.traj_vel_act WHERE traj_id = $1 ORDER BY timestamp ASC",
         traj_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(downsample_rows(rows, max_points, method), accept)
 
 @router.get("/traj_accel_act/{traj_id}")
-@cache(expire=2400)
-async def get_traj_accel_ist_by_id(traj_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_accel_ist_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn = Depends(get_db),
+):
     rows = await conn.fetch(
         "SELECT * FROM motion.traj_accel_act WHERE traj_id = $1 ORDER BY timestamp ASC",
         traj_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(downsample_rows(rows, max_points, method), accept)
 
 @router.get("/traj_accel_cmd/{traj_id}")
-@cache(expire=2400)
-async def get_traj_accel_soll_by_id(traj_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_accel_soll_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn = Depends(get_db),
+):
     rows = await conn.fetch(
         "SELECT * FROM motion.traj_accel_cmd WHERE traj_id = $1 ORDER BY timestamp ASC",
         traj_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(downsample_rows(rows, max_points, method), accept)
 
 @router.get("/traj_position_cmd/{traj_id}")
-@cache(expire=2400)
-async def get_traj_position_soll_by_id(traj_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_position_soll_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn = Depends(get_db),
+):
     rows = await conn.fetch(
         "SELECT * FROM motion.traj_position_cmd WHERE traj_id = $1 ORDER BY timestamp ASC",
         traj_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(downsample_rows(rows, max_points, method), accept)
 
 @router.get("/seg_position_cmd/{segment_id}")
-@cache(expire=2400)
-async def get_segment_position_soll_by_id(segment_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_segment_position_soll_by_id(
+        segment_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn = Depends(get_db),
+):
     rows = await conn.fetch(
         "SELECT * FROM motion.traj_position_cmd WHERE seg_id = $1 ORDER BY timestamp ASC",
         segment_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(downsample_rows(rows, max_points, method), accept)
 
 
 @router.get("/traj_orientation_cmd/{traj_id}")
-@cache(expire=2400)
-async def get_traj_orientation_soll_by_id(traj_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_orientation_soll_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn = Depends(get_db),
+):
     rows = await conn.fetch(
         "SELECT * FROM motion.traj_orientation_cmd WHERE traj_id = $1 ORDER BY timestamp ASC",
         traj_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(downsample_rows(rows, max_points, method), accept)
 
 @router.get("/traj_vel_cmd/{traj_id}")
-@cache(expire=2400)
-async def get_traj_twist_soll_by_id(traj_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_twist_soll_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn = Depends(get_db),
+):
     rows = await conn.fetch(
         "SELECT timestamp, tcp_vel_cmd FROM motion.traj_vel_cmd WHERE traj_id = $1 ORDER BY timestamp ASC",
         traj_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(downsample_rows(rows, max_points, method), accept)
 
 @router.get("/traj_joint_states/{traj_id}")
-@cache(expire=2400)
-async def get_traj_joint_states_by_id(traj_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_joint_states_by_id(
+        traj_id: str,
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        conn = Depends(get_db),
+):
     rows = await conn.fetch(
         "SELECT * FROM motion.traj_joint_states WHERE traj_id = $1 ORDER BY timestamp ASC",
         traj_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(downsample_rows(rows, max_points, method), accept)
 
 @router.get("/traj_setpoints/{traj_id}")
-@cache(expire=2400)
-async def get_traj_events_by_id(traj_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_events_by_id(traj_id: str, accept: Optional[str] = ACCEPT, conn = Depends(get_db)):
     rows = await conn.fetch(
         "SELECT * FROM motion.traj_setpoints WHERE traj_id = $1 ORDER BY timestamp ASC",
         traj_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(rows, accept)
 
 @router.get("/traj_metadata/{traj_id}")
-@cache(expire=2400)
-async def get_traj_metadata_by_id(traj_id: str, conn = Depends(get_db)):
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_metadata_by_id(traj_id: str, accept: Optional[str] = ACCEPT, conn = Depends(get_db)):
     rows = await conn.fetch(
         "SELECT * FROM motion.traj_metadata WHERE traj_id = $1 ORDER BY seg_id ASC",
         traj_id
     )
-    return [dict(row) for row in rows]
+    return wire_response(rows, accept)
+
+
+########################## BUNDLE #########################################
+
+# Kanal (= Tabelle) → Sortierspalte
+BUNDLE_CHANNELS = {
+    'traj_pose_act':        'timestamp',
+    'traj_vel_act':         'timestamp',
+    'traj_accel_act':       'timestamp',
+    'traj_accel_cmd':       'timestamp',
+    'traj_position_cmd':    'timestamp',
+    'traj_orientation_cmd': 'timestamp',
+    'traj_vel_cmd':         'timestamp',
+    'traj_joint_states':    'timestamp',
+    'traj_setpoints':       'timestamp',
+    'traj_metadata':        'seg_id',
+}
+
+# Gleichzeitige Kanal-Abfragen pro Bundle-Request (je eine Pool-Connection)
+BUNDLE_FETCH_CONCURRENCY = int(os.getenv('BUNDLE_FETCH_CONCURRENCY', 3))
+
+
+def _to_columns(rows) -> Dict[str, list]:
+    """asyncpg-Records → eine Liste pro Spalte; traj_id entfällt (steht im Pfad)."""
+    if not rows:
+        return {}
+    return {
+        name: list(values)
+        for name, values in zip(rows[0].keys(), zip(*rows))
+        if name != 'traj_id'
+    }
+
+
+def _runs(values: list) -> Dict[str, list]:
+    """Lauflängen-Kodierung, z. B. für seg_id (zeitlich sortiert → zusammenhängend)."""
+    runs = [(value, sum(1 for _ in group)) for value, group in groupby(values)]
+    return {'values': [v for v, _ in runs], 'counts': [c for _, c in runs]}
+
+
+@router.get("/bundle/{traj_id}")
+@cache(expire=2400, coder=WireCoder)
+async def get_traj_bundle_by_id(
+        traj_id: str,
+        channels: Optional[str] = Query(
+            None, description="Kommagetrennte Kanäle, z. B. traj_pose_act,traj_setpoints (Standard: alle)"
+        ),
+        max_points: Optional[int] = MAX_POINTS,
+        method: Literal['lttb', 'minmax'] = DOWNSAMPLE_METHOD,
+        accept: Optional[str] = ACCEPT,
+        pool=Depends(get_db_pool),
+):
+    """
+    Mehrere Kanäle einer Bahn in einem Request, auf höchstens
+    BUNDLE_FETCH_CONCURRENCY Pool-Connections gleichzeitig abgefragt und
+    spaltenweise geliefert (eine Liste pro Spalte statt einer Liste von
+    Zeilen-Objekten).
+
+    Gleiche Zeitstempel-Folgen — typischerweise alle SOLL-Kanäle — stehen nur
+    einmal unter timestamps; der Kanal verweist per Schlüssel darauf. seg_id
+    kommt bei Zeitreihen lauflängenkodiert unter segments. Mit max_points
+    wird jeder Zeitreihen-Kanal für sich reduziert.
+    """
+    requested = (
+        list(BUNDLE_CHANNELS) if channels is None
+        else list(dict.fromkeys(c.strip() for c in channels.split(',') if c.strip()))
+    )
+    unknown = [c for c in requested if c not in BUNDLE_CHANNELS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown channels: {', '.join(unknown)}")
+
+    slots = asyncio.Semaphore(BUNDLE_FETCH_CONCURRENCY)
+
+    async def _fetch(channel):
+        async with slots, pool.acquire() as conn:
+            return await conn.fetch(
+                f"SELECT * FROM motion.{channel} WHERE traj_id = $1 ORDER BY {BUNDLE_CHANNELS[channel]} ASC",
+                traj_id
+            )
+
+    try:
+        results = await asyncio.gather(*(_fetch(channel) for channel in requested))
+    except Exception as e:
+        logger.error(f"Error fetching Bahn bundle: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {str(e)}")
+
+    timestamps = {}
+    timestamp_keys = {}   # Zeitstempel-Folge → Schlüssel in timestamps
+    bundle = {}
+    for channel, rows in zip(requested, results):
+        if BUNDLE_CHANNELS[channel] == 'timestamp' and channel != 'traj_setpoints':
+            rows = downsample_rows(rows, max_points, method)
+        columns = _to_columns(rows)
+        entry = {'length': len(rows), 'columns': columns}
+        if BUNDLE_CHANNELS[channel] == 'timestamp' and 'timestamp' in columns:
+            series = tuple(columns.pop('timestamp'))
+            key = timestamp_keys.get(series)
+            if key is None:
+                key = timestamp_keys[series] = f"t{len(timestamps)}"
+                timestamps[key] = list(series)
+            entry['timestamp'] = key
+            if 'seg_id' in columns:
+                entry['segments'] = _runs(columns.pop('seg_id'))
+        bundle[channel] = entry
+
+    return wire_response({'traj_id': traj_id, 'timestamps': timestamps, 'channels': bundle}, accept)
 
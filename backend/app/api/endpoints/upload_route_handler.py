@@ -1,24 +1,44 @@
+import asyncio
 import json
 import os
 from datetime import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from ...database import get_db
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form
+from ...database import get_db_pool
 import logging
 
 from tempfile import NamedTemporaryFile
-import shutil
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-from ...utils.upload_data.batch_processor import BatchProcessor
+from ...utils.metadata_embeddings.background_tasks import create_task_id, get_task_status, cleanup_old_tasks
+from ...utils.upload_data.upload_tasks import (
+    create_upload_task,
+    process_upload_background,
+    upload_progress_percent,
+)
 
 router = APIRouter()
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024  # Bytes pro Lese-/Schreibschritt beim Speichern der Uploads
+
+
+async def _save_upload(file: UploadFile) -> str:
+    """Schreibt eine hochgeladene Datei blockweise auf die Platte, ohne den Event-Loop zu blockieren."""
+    temp_file = await asyncio.to_thread(NamedTemporaryFile, delete=False, suffix='.csv')
+    try:
+        while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+            await asyncio.to_thread(temp_file.write, chunk)
+    finally:
+        await asyncio.to_thread(temp_file.close)
+    return temp_file.name
+
+
 @router.post("/process-csv-batch")
 async def process_csv_batch(
+        background_tasks: BackgroundTasks,
         files: list[UploadFile] = File(...),
         robot_model: str = Form(...),
         path_planning: str = Form(...),
@@ -29,9 +49,14 @@ async def process_csv_batch(
         num_segments: int = Form(default=3),  # Standardwert auf 3 erhöht
         reference_position: Optional[str] = Form(default=None),  # JSON-String für [x, y, z]
         tag: Optional[str] = Form(default=None),
-        conn=Depends(get_db)
+        db_pool=Depends(get_db_pool)
 ):
-    """Process multiple CSV files in a single batch upload"""
+    """
+    Startet den Batch-Upload als Background-Job und liefert sofort die task_id.
+    Fortschritt pro Stufe und file_results über GET /status/{task_id}.
+    Dateien: CSV, Parquet oder Arrow IPC (erkannt an den Magic Bytes).
+    """
+    files_and_paths = []
     try:
         start_time = datetime.now()
         logger.info(f"Starting batch processing of {len(files)} files at {start_time}")
@@ -60,51 +85,49 @@ async def process_csv_batch(
                 detail="Reference position coordinates as JSON array [x, y, z] are required for 'reference_position' segmentation method"
             )
 
-        # Create temporary files for each uploaded file
-        temp_files = []
-        files_and_paths = []
+        await cleanup_old_tasks()
 
+        # Uploads auf die Platte streamen; verarbeitet wird im Hintergrund
         for file in files:
-            temp_file = NamedTemporaryFile(delete=False)
-            shutil.copyfileobj(file.file, temp_file)
-            temp_file.close()
-
-            temp_files.append(temp_file.name)
             files_and_paths.append({
-                'path': temp_file.name,
+                'path': await _save_upload(file),
                 'filename': file.filename
             })
 
-        # Process all files in batch
-        processor = BatchProcessor()
-        file_results = await processor.process_csv_batch(
-            files_and_paths,
-            robot_model,
-            path_planning,
-            source_data_act,
-            source_data_cmd,
-            upload_database,
-            segmentation_method,
-            num_segments,
-            conn,
-            ref_pos_tuple,
-            tag=tag
+        task_id = create_task_id("upload")
+        await create_upload_task(task_id, files_and_paths, {
+            "robot_model": robot_model,
+            "segmentation_method": segmentation_method,
+            "upload_database": upload_database,
+            "files": len(files_and_paths),
+        })
+        background_tasks.add_task(
+            process_upload_background,
+            task_id=task_id,
+            files_and_paths=files_and_paths,
+            db_pool=db_pool,
+            robot_model=robot_model,
+            path_planning=path_planning,
+            source_data_act=source_data_act,
+            source_data_cmd=source_data_cmd,
+            upload_database=upload_database,
+            segmentation_method=segmentation_method,
+            num_segments=num_segments,
+            reference_position=ref_pos_tuple,
+            tag=tag,
         )
 
-        # Clean up temporary files
-        for temp_file in temp_files:
-            os.unlink(temp_file)
-
-        end_time = datetime.now()
-        processing_time = (end_time - start_time).total_seconds()
-        logger.info(f"Batch processing completed in {processing_time:.2f} seconds")
+        logger.info(f"Started upload task {task_id} for {len(files_and_paths)} files "
+                    f"({(datetime.now() - start_time).total_seconds():.2f}s to receive)")
 
         return {
-            "message": f"Batch processed {len(files)} files successfully",
-            "processing_time_seconds": processing_time,
-            "file_results": file_results
+            "task_id": task_id,
+            "status": "started",
+            "message": f"Started processing {len(files_and_paths)} files in background"
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in batch processing: {str(e)}")
         # Clean up any temporary files that might have been created
@@ -115,4 +138,32 @@ async def process_csv_batch(
             except Exception as cleanup_error:
                 logger.error(f"Error cleaning up temporary file {path}: {str(cleanup_error)}")
 
-        raise HTTPException(status_code=500, detail=f"Error in batch processing: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Error in batch processing: {str(e)}")
+
+
+@router.get("/status/{task_id}")
+async def get_upload_status(task_id: str):
+    """
+    Status eines Upload-Jobs: Stufe, Fortschritt pro Stufe und file_results
+    """
+    task_data = await get_task_status(task_id)
+
+    if not task_data:
+        raise HTTPException(status_code=404, detail=f"Task {task_id} not found")
+
+    return {
+        "task_id": task_id,
+        "status": task_data.get("status", "unknown"),
+        "created_at": task_data.get("created_at"),
+        "started_at": task_data.get("started_at"),
+        "completed_at": task_data.get("completed_at"),
+        "failed_at": task_data.get("failed_at"),
+        "current_stage": task_data.get("current_stage"),
+        "stages": task_data.get("stages", {}),
+        "progress_percent": upload_progress_percent(task_data),
+        "file_results": task_data.get("file_results", []),
+        "processing_time_seconds": task_data.get("processing_time_seconds"),
+        "details": task_data.get("details", {}),
+        "summary": task_data.get("summary"),
+        "error": task_data.get("error")
+    }
@@ -2,10 +2,15 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from .api.endpoints import traj_route_handler, dashboard_route_handler, evaluation_route_handler, metadata_route_handler, upload_route_handler, similarity_route_handler, correction_route_handler
-from .database import init_db
+from .database import init_db, get_db_pool
+from .utils.metadata_embeddings.background_tasks import init_job_store, resume_metadata_tasks
+from .utils.metadata_embeddings.binary_vector_writer import close_binary_writer
+from .utils.upload_data.upload_tasks import fail_interrupted_uploads
+from .utils.process_pool import shutdown_process_pool
 from fastapi_cache import FastAPICache
 from fastapi_cache.backends.redis import RedisBackend
 import aioredis
+import asyncio
 import os
 from dotenv import load_dotenv
 import logging
@@ -62,6 +67,15 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Failed to connect to Redis: {e}")
 
+    # Job-Store (SQLite) anlegen, bevor Tasks ihn benutzen
+    await init_job_store()
+
+    # Abgebrochene Uploads (Prozess weg) als failed markieren → Client-Polling endet
+    await fail_interrupted_uploads()
+
+    # Unterbrochene Metadata-Backfills fortsetzen (Leases teilen sich die Worker)
+    asyncio.create_task(resume_metadata_tasks(await get_db_pool()))
+
     # Matlab initialization nur wenn USE_MATLAB true ist
     #if USE_MATLAB:
     #    try:
@@ -72,6 +86,12 @@ async def startup_event():
     #else:
     #    logger.info("MATLAB engine initialization skipped (USE_MATLAB=false)")
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    await close_binary_writer()
+    # wartet auf die Worker-Prozesse → nicht im Event-Loop blockieren
+    await asyncio.to_thread(shutdown_process_pool)
+
 #@app.on_event("shutdown")
 #async def shutdown_event():
 #    # Clean up MATLAB engine only if it was used
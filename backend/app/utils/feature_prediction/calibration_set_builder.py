@@ -707,25 +707,23 @@ async def process_trajectory_bundle(
     exclude_ids = list(dict.fromkeys([traj_id, *own_segment_ids]))
 
     try:
-        async with pool.acquire() as conn:
-            result = await run_similarity_pipeline(
-                target_id=traj_id,
-                pool=pool,
-                conn=conn,
-                modes=list(cfg.search_modes),
-                weights={m: 1.0 for m in cfg.search_modes},
-                limit=cfg.k,
-                buffer_factor=5,
-                prefilter_features=[],
-                metric=cfg.metric,
-                include_tags=include_tags,
-                exclude_ids=exclude_ids,
-                stage2_active=not stage1_mode,
-                dtw_mode=cfg.dtw_mode if not stage1_mode else 'position',  # dtw_mode irrelevant for stage1
-                prognosis_active=True,
-                coverage=0.90,
-                conformal_active=False,
-            )
+        result = await run_similarity_pipeline(
+            target_id=traj_id,
+            pool=pool,
+            modes=list(cfg.search_modes),
+            weights={m: 1.0 for m in cfg.search_modes},
+            limit=cfg.k,
+            buffer_factor=5,
+            prefilter_features=[],
+            metric=cfg.metric,
+            include_tags=include_tags,
+            exclude_ids=exclude_ids,
+            stage2_active=not stage1_mode,
+            dtw_mode=cfg.dtw_mode if not stage1_mode else 'position',  # dtw_mode irrelevant for stage1
+            prognosis_active=True,
+            coverage=0.90,
+            conformal_active=False,
+        )
 
         if result.get('error'):
             return None
@@ -19,6 +19,7 @@ Each fallback attaches a CalibrationMismatch so the frontend can warn.
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import time
 from dataclasses import dataclass
@@ -48,6 +49,10 @@ DEFAULT_COV = 0.90
 _quantile_cache: Dict[str, Tuple[Optional[float], Optional['CalibrationMismatch'], float]] = {}
 QUANTILE_CACHE_TTL = 300  # seconds — mirrors quality_match.py TTL
 
+# Lookups currently running: key → task (dedupes concurrent cache misses).
+# A task runs on its own pool connection and is removed from the dict when done.
+_quantile_inflight: Dict[str, 'asyncio.Future'] = {}
+
 
 # ═══════════════════════════════════════════════════════════════════════════
 # Mismatch descriptor
@@ -183,12 +188,17 @@ def _cache_key(
 async def get_calibration_quantile(
     conn:         asyncpg.Connection,
     cfg:          CalibrationConfig,
-    coverage:     float = DEFAULT_COV,
-    level:        str   = 'trajectory',
+    coverage:     float                  = DEFAULT_COV,
+    level:        str                    = 'trajectory',
+    pool:         Optional[asyncpg.Pool] = None,
 ) -> Tuple[Optional[float], Optional[CalibrationMismatch]]:
     """
     Lookup conformal quantile with progressive fuzzy fallback.
     Returns (quantile_value, mismatch_or_None).
+
+    With pool, concurrent cache misses share one lookup that runs on its own
+    pool connection; a cancelled caller does not cancel it for the others.
+    Without pool (scripts) the lookup runs on conn and is not shared.
     """
     metric           = cfg.metric
     dtw_mode         = cfg.dtw_mode
@@ -204,6 +214,54 @@ async def get_calibration_quantile(
     if cached is not None and now < cached[2]:
         return cached[0], cached[1]
 
+    if pool is None:
+        return await _lookup_calibration_quantile(conn, cfg, coverage, level, ck, now)
+
+    # Parallel requests (batch / multi-candidate) share one DB lookup per key
+    task = _quantile_inflight.get(ck)
+    if task is None:
+        task = asyncio.ensure_future(_lookup_on_pool(pool, cfg, coverage, level, ck, now))
+        _quantile_inflight[ck] = task
+        task.add_done_callback(lambda done: _finish_inflight(ck, done))
+    return await asyncio.shield(task)
+
+
+async def _lookup_on_pool(
+    pool:     asyncpg.Pool,
+    cfg:      CalibrationConfig,
+    coverage: float,
+    level:    str,
+    ck:       str,
+    now:      float,
+) -> Tuple[Optional[float], Optional[CalibrationMismatch]]:
+    async with pool.acquire() as conn:
+        return await _lookup_calibration_quantile(conn, cfg, coverage, level, ck, now)
+
+
+def _finish_inflight(ck: str, task: 'asyncio.Future') -> None:
+    if _quantile_inflight.get(ck) is task:
+        del _quantile_inflight[ck]
+    if not task.cancelled() and task.exception() is not None:
+        # Mark as retrieved even if every waiter was cancelled
+        logger.warning(f"Quantile lookup failed for {ck}: {task.exception()}")
+
+
+async def _lookup_calibration_quantile(
+    conn:     asyncpg.Connection,
+    cfg:      CalibrationConfig,
+    coverage: float,
+    level:    str,
+    ck:       str,
+    now:      float,
+) -> Tuple[Optional[float], Optional[CalibrationMismatch]]:
+    metric           = cfg.metric
+    dtw_mode         = cfg.dtw_mode
+    strategy         = cfg.retrieval_strategy
+    k                = cfg.k
+    search_modes_str = cfg.search_modes_str()
+    tag              = cfg.calibration_tag
+    stage            = cfg.config_stage
+
     def _store(q: Optional[float], mm: Optional[CalibrationMismatch]) -> Tuple[Optional[float], Optional[CalibrationMismatch]]:
         _quantile_cache[ck] = (q, mm, now + QUANTILE_CACHE_TTL)
         return q, mm
@@ -270,8 +328,9 @@ async def get_calibration_quantile_for_tags(
     conn:         asyncpg.Connection,
     cfg:          CalibrationConfig,
     tags:         Sequence[str],
-    coverage:     float = DEFAULT_COV,
-    level:        str   = 'trajectory',
+    coverage:     float                  = DEFAULT_COV,
+    level:        str                    = 'trajectory',
+    pool:         Optional[asyncpg.Pool] = None,
 ) -> Tuple[Optional[float], Optional[CalibrationMismatch]]:
     """
     Weighted-average quantile over multiple tags.
@@ -281,7 +340,7 @@ async def get_calibration_quantile_for_tags(
     MIN_N_CALIBRATION = 150
 
     if not tags or len(tags) == 1:
-        return await get_calibration_quantile(conn, cfg, coverage, level)
+        return await get_calibration_quantile(conn, cfg, coverage, level, pool)
 
     metric           = cfg.metric
     dtw_mode         = cfg.dtw_mode
@@ -322,7 +381,7 @@ async def get_calibration_quantile_for_tags(
 
     # All tags skipped — fall back to 'all'
     cfg_all = cfg.with_tag('all')
-    q, mm   = await get_calibration_quantile(conn, cfg_all, coverage, level)
+    q, mm   = await get_calibration_quantile(conn, cfg_all, coverage, level, pool)
     if q is not None:
         mm2 = CalibrationMismatch(
             warning=f"All tags {tags} had insufficient calibration data. Using tag='all'.",
@@ -404,6 +463,7 @@ async def compute_conformal_intervals(
     search_modes:    Optional[Tuple[str, ...]]  = None,
     dtw_mode:        str                        = 'position',
     metric:          str                        = 'sidtw',
+    pool:            Optional[asyncpg.Pool]     = None,
 ) -> Dict[str, Any]:
     """
     Compute and attach Stage 2 conformal intervals to result.
@@ -422,8 +482,8 @@ async def compute_conformal_intervals(
     )
     tags = [calibration_tag] if isinstance(calibration_tag, str) else calibration_tag
 
-    q_seg,  mm_seg  = await get_calibration_quantile_for_tags(conn, cfg, tags, coverage, 'segment')
-    q_traj, mm_traj = await get_calibration_quantile_for_tags(conn, cfg, tags, coverage, 'trajectory')
+    q_seg,  mm_seg  = await get_calibration_quantile_for_tags(conn, cfg, tags, coverage, 'segment', pool)
+    q_traj, mm_traj = await get_calibration_quantile_for_tags(conn, cfg, tags, coverage, 'trajectory', pool)
 
     if q_seg is None and q_traj is None:
         if 'prognosis' in result:
@@ -486,7 +546,7 @@ async def compute_conformal_intervals(
     # ── Direct trajectory interval ───────────────────────────────────────
     direct_interval = await _compute_direct_conformal_interval(
         result=result, conn=conn, cfg=cfg, tags=tags,
-        coverage=coverage, sigma_floor=sigma_floor,
+        coverage=coverage, sigma_floor=sigma_floor, pool=pool,
     )
     if 'prognosis' in result:
         result['prognosis']['direct_conformal_interval'] = direct_interval
@@ -504,6 +564,7 @@ async def _compute_direct_conformal_interval(
     tags:        Sequence[str],
     coverage:    float,
     sigma_floor: float,
+    pool:        Optional[asyncpg.Pool] = None,
 ) -> Optional[Dict[str, Any]]:
     """Stage 2 direct trajectory interval."""
     direct_cfg = get_active_config(
@@ -511,7 +572,7 @@ async def _compute_direct_conformal_interval(
         k=cfg.k, search_modes=cfg.search_modes,
         dtw_mode=cfg.dtw_mode, metric=cfg.metric, config_stage=2,
     )
-    q, mismatch = await get_calibration_quantile_for_tags(conn, direct_cfg, tags, coverage, 'trajectory')
+    q, mismatch = await get_calibration_quantile_for_tags(conn, direct_cfg, tags, coverage, 'trajectory', pool)
     if q is None:
         return None
 
@@ -544,6 +605,7 @@ async def compute_stage1_conformal_interval(
     k:               Optional[int]             = None,
     search_modes:    Optional[Tuple[str, ...]] = None,
     metric:          str                       = 'sidtw',
+    pool:            Optional[asyncpg.Pool]    = None,
 ) -> None:
     """
     Compute Stage 1 conformal intervals matching the paper's two strategies:
@@ -559,7 +621,7 @@ async def compute_stage1_conformal_interval(
     cfg_direct = get_active_config('direct', tags[0], k=k, search_modes=search_modes,
                                    metric=metric, config_stage=1)
     q_direct, mm_direct = await get_calibration_quantile_for_tags(
-        conn, cfg_direct, tags, coverage, 'trajectory'
+        conn, cfg_direct, tags, coverage, 'trajectory', pool
     )
     direct_interval = None
     if q_direct is not None:
@@ -581,7 +643,7 @@ async def compute_stage1_conformal_interval(
     cfg_decomp = get_active_config('decomposed', tags[0], k=k, search_modes=search_modes,
                                    metric=metric, config_stage=1)
     q_seg, mm_seg = await get_calibration_quantile_for_tags(
-        conn, cfg_decomp, tags, coverage, 'segment'
+        conn, cfg_decomp, tags, coverage, 'segment', pool
     )
     if q_seg is None:
         if 'prognosis' in result:
@@ -612,7 +674,7 @@ async def compute_stage1_conformal_interval(
         seg_path_lengths.append(float(prediction.get('query_path_length') or 0.0))
 
     q_traj_decomp, mm_traj_decomp = await get_calibration_quantile_for_tags(
-        conn, cfg_decomp, tags, coverage, 'trajectory'
+        conn, cfg_decomp, tags, coverage, 'trajectory', pool
     )
     traj_interval = _aggregate_trajectory_interval(
         seg_intervals=seg_intervals,
@@ -256,6 +256,7 @@ async def predict_performance(
     search_modes:     Optional[Tuple[str, ...]] = None,
     dtw_mode:         str                       = 'position',
     metric:           str                       = 'sidtw',
+    pool:             Optional[asyncpg.Pool]    = None,
 ) -> Dict[str, Any]:
     sigma_floor     = 0.005
     stage2_active   = bool(result.get('stage2_active'))
@@ -414,7 +415,7 @@ async def predict_performance(
                 result=result, conn=conn, strategy='decomposed',
                 coverage=coverage, calibration_tag=calibration_tag,
                 path_length_map=path_length_map,
-                k=k, search_modes=search_modes, dtw_mode=dtw_mode, metric=metric,
+                k=k, search_modes=search_modes, dtw_mode=dtw_mode, metric=metric, pool=pool,
             )
         else:
             # Stage 1: writes stage1_conformal_interval and decomposed_conformal_interval
@@ -422,10 +423,45 @@ async def predict_performance(
             await compute_stage1_conformal_interval(
                 result=result, conn=conn,
                 coverage=coverage, calibration_tag=calibration_tag,
-                k=k, search_modes=search_modes, metric=metric,
+                k=k, search_modes=search_modes, metric=metric, pool=pool,
             )
 
         for group in segment_groups:
             group.pop('prediction', None)
 
-    return result
\ No newline at end of file
+    return result
+
+# ═══════════════════════════════════════════════════════════════════════════
+# AutoMode acquisition score
+# ═══════════════════════════════════════════════════════════════════════════
+
+def compute_acquisition_score(result: Dict[str, Any]) -> Optional[float]:
+    """
+    Akquisitionsfunktion aus docs/automode_pipeline.md:
+
+        score = mean_i( σ_i · d_min,i )
+
+    σ_i     aus prognosis.segments[i].sigma
+    d_min,i dtw_distance des besten Nachbarn von Segment i (Stage 2),
+            ohne Stage 2 der d_min der Segment-Prognose.
+
+    None, wenn kein Segment sowohl σ als auch d_min hat (Cold Start).
+    """
+    segments  = (result.get('prognosis') or {}).get('segments') or []
+    seg_preds = {s.get('seg_id'): s for s in segments}
+
+    terms = []
+    for group in result.get('segment_similarity', []):
+        pred  = seg_preds.get(group.get('target_segment')) or {}
+        sigma = pred.get('sigma')
+
+        seg_results = group.get('similar_segments', {}).get('results', [])
+        d_min = seg_results[0].get('dtw_distance') if seg_results else None
+        if d_min is None:
+            d_min = pred.get('d_min')
+
+        if sigma is None or d_min is None:
+            continue
+        terms.append(float(sigma) * float(d_min))
+
+    return float(np.mean(terms)) if terms else None
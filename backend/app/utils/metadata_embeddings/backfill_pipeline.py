@@ -0,0 +1,353 @@
+# backend/app/utils/metadata_embeddings/backfill_pipeline.py
+"""
+Producer/Consumer-Pipeline für Metadaten- & Embedding-Backfills.
+
+    traj_id-Batches ─▶ Fetcher (N × Pool-Connection) ─▶ [compute_queue]
+                    ─▶ Compute (ProcessPool)         ─▶ [write_queue]
+                    ─▶ Writer (COPY in großen Batches)
+
+Die traj_ids kommen als Leases aus dem JobStore (Checkpoint nach jedem
+Write), dadurch ist ein Backfill fortsetzbar und auf mehrere Prozesse
+verteilbar. Scheitert das Laden eines Batches (DB/Pool), wird mit Backoff
+wiederholt und danach die Lease zurückgegeben; endgültig fehlgeschlagen
+ist ein Item erst nach MAX_ATTEMPTS Leases.
+
+Die Queues sind begrenzt → Backpressure: ist der Writer langsam, warten die
+Compute-Stufe und danach die Fetcher, statt Daten im Speicher anzuhäufen.
+DB-I/O und NumPy/SciPy-Arbeit überlappen sich, die CPU-Arbeit skaliert mit
+der Anzahl Kerne.
+"""
+
+import asyncio
+import logging
+import os
+from typing import Dict, List, Optional, Set
+
+from .job_store import JobStore, LEASE_SECONDS
+from .metadata_calculator import MetadataCalculatorService
+from ..process_pool import PROCESS_POOL_WORKERS, get_process_pool
+
+logger = logging.getLogger(__name__)
+
+FETCH_BATCH_SIZE = 25
+FETCH_WORKERS    = int(os.getenv('BACKFILL_FETCH_WORKERS', 4))
+COMPUTE_WORKERS  = int(os.getenv('BACKFILL_COMPUTE_WORKERS', PROCESS_POOL_WORKERS))
+WRITE_BATCH_SIZE = 2000   # Embedding-/Metadaten-Zeilen pro COPY
+QUEUE_DEPTH      = 2      # Batches pro Consumer in der Queue
+FETCH_RETRIES    = int(os.getenv('BACKFILL_FETCH_RETRIES', 3))
+FETCH_BACKOFF    = 1.0    # Sekunden, verdoppelt pro Wiederholung
+MAX_ATTEMPTS     = int(os.getenv('BACKFILL_MAX_ATTEMPTS', 3))   # Leases pro Item bis "failed"
+
+_worker_service: Optional[MetadataCalculatorService] = None
+
+
+def _empty_result(traj_id: str, error: Optional[str] = None) -> Dict:
+    return {
+        'traj_id': traj_id,
+        'metadata': [],
+        'embeddings': [],
+        'segments_processed': 0,
+        'error': error
+    }
+
+
+def _to_plain(traj_data: Dict) -> Dict:
+    """asyncpg-Records → dicts (Records lassen sich nicht pickeln)."""
+    return {
+        'traj_info':        dict(traj_data['traj_info']),
+        'segments':         [dict(row) for row in traj_data['segments']],
+        'joints':           {k: dict(v) for k, v in traj_data['joints'].items()},
+        'orientations':     {k: dict(v) for k, v in traj_data['orientations'].items()},
+        'twists':           {k: list(v) for k, v in traj_data['twists'].items()},
+        'accels':           {k: list(v) for k, v in traj_data['accels'].items()},
+        'circular_seg_ids': set(traj_data['circular_seg_ids']),
+    }
+
+
+def _compute_worker(items: List[Dict], skip_embeddings: bool) -> List[Dict]:
+    """Läuft im Worker-Prozess: Metadaten + Embeddings für einen Batch."""
+    global _worker_service
+    if _worker_service is None:
+        _worker_service = MetadataCalculatorService(db_pool=None, skip_embeddings=skip_embeddings)
+    _worker_service.skip_embeddings = skip_embeddings
+
+    results = []
+    for item in items:
+        result = _empty_result(item['traj_id'])
+        try:
+            _worker_service.compute_traj(
+                item['traj_id'], item['traj_data'], result, item['embedding_calculator'],
+                compute_metadata=item['compute_metadata'],
+                compute_embeddings=item['compute_embeddings'],
+                existing_metadata=item['existing_metadata'],
+            )
+        except Exception as e:
+            logger.error(f"Error working on traj_id {item['traj_id']}: {e}")
+            result['error'] = str(e)
+        results.append(result)
+    return results
+
+
+async def run_backfill_pipeline(
+        service: MetadataCalculatorService,
+        job_store: JobStore,
+        task_id: str,
+        owner: str,
+) -> Dict:
+    """
+    Berechnet und schreibt Metadaten/Embeddings für die Items eines Jobs.
+
+    Die traj_ids werden batchweise aus dem JobStore geleast; nach jedem
+    erfolgreichen Write werden die geschriebenen Items als Checkpoint
+    committet. Mehrere Prozesse können denselben Job parallel abarbeiten.
+
+    Args:
+        service: MetadataCalculatorService mit db_pool
+        job_store / task_id: Quelle der Items + Fortschritt
+        owner: Lease-Owner dieses Prozesses
+
+    Returns:
+        {"successful": int, "failed": List[result]} — nur für diesen Prozess
+    """
+    loop     = asyncio.get_running_loop()
+    executor = get_process_pool()
+
+    compute_queue: asyncio.Queue = asyncio.Queue(maxsize=COMPUTE_WORKERS * QUEUE_DEPTH)
+    write_queue:   asyncio.Queue = asyncio.Queue(maxsize=COMPUTE_WORKERS * QUEUE_DEPTH)
+    abort = asyncio.Event()
+
+    needs_metadata:   Set[str] = set()
+    needs_embeddings: Set[str] = set()
+    # Bei einem Retry schon in der DB vorhanden (nicht neu berechnet)
+    has_metadata:     Set[str] = set()
+    has_embeddings:   Set[str] = set()
+
+    failed: List[Dict] = []
+    counts = {'successful': 0}
+    attempts: Dict[str, int] = {}
+
+    async def _lease() -> List[str]:
+        leased = await asyncio.to_thread(job_store.lease, task_id, owner, FETCH_BATCH_SIZE)
+        if not leased:
+            return []
+
+        for item in leased:
+            attempts[item['traj_id']] = item['attempts']
+            if item['needs_metadata']:
+                needs_metadata.add(item['traj_id'])
+            if item['needs_embeddings']:
+                needs_embeddings.add(item['traj_id'])
+
+        # Erneuter Versuch (Absturz zwischen Write und Checkpoint möglich):
+        # nur berechnen, was in der DB noch fehlt → keine Duplikate
+        retried = [item['traj_id'] for item in leased if item['attempts'] > 1]
+        if retried:
+            with_metadata = set(await service.check_existing_trajs(retried))
+            with_embeddings = set(await service.check_existing_embeddings(retried))
+            has_metadata.update(with_metadata)
+            has_embeddings.update(with_embeddings)
+            needs_metadata.difference_update(with_metadata)
+            needs_embeddings.difference_update(with_embeddings)
+
+        return [item['traj_id'] for item in leased]
+
+    # ── Stufe 1: Fetcher ─────────────────────────────────────────────────
+    async def _fetch(batch: List[str]):
+        """Bahndaten, vorhandene Metadaten und EmbeddingCalculator pro Roboter für batch."""
+        async with service.db_pool.acquire() as conn:
+            all_traj_data = await service._fetch_all_traj_data_batch(conn, batch)
+            existing_metadata = await service._load_existing_metadata_batch(
+                conn, [t for t in batch if t not in needs_metadata and t in all_traj_data]
+            )
+            calculators = {}
+            for traj_data in all_traj_data.values():
+                robot_model = traj_data['traj_info']['robot_model']
+                if robot_model not in calculators:
+                    calculators[robot_model] = await service._get_embedding_calculator(conn, robot_model)
+        return all_traj_data, existing_metadata, calculators
+
+    async def _fetch_with_retry(batch: List[str]):
+        for retry in range(FETCH_RETRIES + 1):
+            try:
+                return await _fetch(batch)
+            except Exception as e:
+                if retry == FETCH_RETRIES:
+                    raise
+                delay = FETCH_BACKOFF * 2 ** retry
+                logger.warning(f"Fetch error for batch starting at {batch[0]}, retrying in {delay:.0f}s: {e}")
+                await asyncio.sleep(delay)
+
+    async def _fetcher():
+        while not abort.is_set() and (batch := await _lease()):
+            todo = [t for t in batch if t in needs_metadata or t in needs_embeddings]
+            if len(todo) < len(batch):
+                # Bereits vollständig geschrieben (Retry) → direkt als erledigt melden
+                await write_queue.put([_empty_result(t) for t in batch if t not in todo])
+            if not todo:
+                continue
+            batch = todo
+
+            try:
+                all_traj_data, existing_metadata, calculators = await _fetch_with_retry(batch)
+            except Exception as e:
+                # Vorübergehend (DB/Pool) → Lease zurückgeben; erst nach MAX_ATTEMPTS endgültig failed
+                exhausted = [t for t in batch if attempts.get(t, 0) >= MAX_ATTEMPTS]
+                released = [t for t in batch if t not in exhausted]
+                logger.error(
+                    f"Fetch error for batch starting at {batch[0]}: {e} "
+                    f"({len(released)} released, {len(exhausted)} failed after {MAX_ATTEMPTS} attempts)"
+                )
+                if released:
+                    await asyncio.to_thread(job_store.release, task_id, owner, released)
+                if exhausted:
+                    await write_queue.put([_empty_result(t, str(e)) for t in exhausted])
+                continue
+
+            items, not_found = [], []
+            for traj_id in batch:
+                traj_data = all_traj_data.get(traj_id)
+                if not traj_data:
+                    not_found.append(_empty_result(traj_id, 'Data not found'))
+                    continue
+                items.append({
+                    'traj_id':              traj_id,
+                    'traj_data':            _to_plain(traj_data),
+                    'embedding_calculator': calculators[traj_data['traj_info']['robot_model']],
+                    'compute_metadata':     traj_id in needs_metadata,
+                    'compute_embeddings':   traj_id in needs_embeddings,
+                    'existing_metadata':    existing_metadata.get(traj_id, []),
+                })
+
+            if not_found:
+                await write_queue.put(not_found)
+            if items:
+                await compute_queue.put(items)
+
+    # ── Stufe 2: Compute (ProcessPool) ───────────────────────────────────
+    async def _computer():
+        while (items := await compute_queue.get()) is not None:
+            try:
+                results = await loop.run_in_executor(
+                    executor, _compute_worker, items, service.skip_embeddings
+                )
+            except Exception as e:
+                logger.error(f"Compute error: {e}")
+                results = [_empty_result(item['traj_id'], str(e)) for item in items]
+            await write_queue.put(results)
+
+    # ── Stufe 3: Writer ──────────────────────────────────────────────────
+    pending_metadata:   List[Dict] = []
+    pending_embeddings: List[Dict] = []
+    write_error: List[Exception] = []
+
+    pending_done:   List[str] = []
+    pending_failed: Dict[str, str] = {}
+    # Outbox: pro Bahn nur abhaken, was vorliegt (jetzt berechnet oder schon in der DB)
+    pending_metadata_done:   List[str] = []
+    pending_embeddings_done: List[str] = []
+
+    async def _flush():
+        # Puffer immer leeren — nach einem Write-Fehler wird nur noch verworfen
+        metadata, embeddings = list(pending_metadata), list(pending_embeddings)
+        done, failed_items = list(pending_done), dict(pending_failed)
+        metadata_done, embeddings_done = list(pending_metadata_done), list(pending_embeddings_done)
+        pending_metadata.clear()
+        pending_embeddings.clear()
+        pending_done.clear()
+        pending_failed.clear()
+        pending_metadata_done.clear()
+        pending_embeddings_done.clear()
+        if write_error:
+            return
+
+        written = {'metadata': 0, 'embeddings': 0}
+        try:
+            if metadata or embeddings or metadata_done or embeddings_done:
+                # Metadaten + Embeddings (+ Outbox-Einträge) in einer psycopg-Transaktion
+                await service.batch_write_everything(
+                    None, metadata, embeddings,
+                    metadata_done_ids=metadata_done, embeddings_done_ids=embeddings_done,
+                )
+                written['metadata'] = len(metadata)
+                written['embeddings'] = len(embeddings)
+
+            # Checkpoint erst nach erfolgreichem Write
+            await asyncio.to_thread(
+                job_store.complete, task_id, owner, done, failed_items,
+                written['metadata'], written['embeddings'],
+            )
+        except Exception as e:
+            # Kein weiterer Fetch; Queues werden trotzdem geleert (kein Deadlock).
+            # Nicht committete Items werden nach Ablauf der Lease erneut vergeben.
+            logger.error(f"Write error, aborting backfill: {e}")
+            write_error.append(e)
+            abort.set()
+
+    async def _writer():
+        while (results := await write_queue.get()) is not None:
+            for result in results:
+                traj_id = result['traj_id']
+
+                if result.get('error'):
+                    failed.append(result)
+                    pending_failed[traj_id] = result['error']
+                    continue
+
+                # Nur hinzufügen was auch berechnet wurde
+                if traj_id in needs_metadata and result.get('metadata'):
+                    pending_metadata.extend(result['metadata'])
+                if traj_id in needs_embeddings and result.get('embeddings'):
+                    pending_embeddings.extend(result['embeddings'])
+
+                # Ohne Ergebnis (z. B. skip_embeddings) bleibt der Teil in der Outbox offen
+                if traj_id in has_metadata or (traj_id in needs_metadata and result.get('metadata')):
+                    pending_metadata_done.append(traj_id)
+                if traj_id in has_embeddings or (traj_id in needs_embeddings and result.get('embeddings')):
+                    pending_embeddings_done.append(traj_id)
+
+                counts['successful'] += 1
+                pending_done.append(traj_id)
+
+            if (len(pending_metadata) >= WRITE_BATCH_SIZE
+                    or len(pending_embeddings) >= WRITE_BATCH_SIZE
+                    or len(pending_done) + len(pending_failed) >= WRITE_BATCH_SIZE):
+                await _flush()
+        await _flush()
+
+    async def _heartbeat():
+        # Ein Fehler beim Verlängern beendet den Heartbeat nicht; erst wenn er
+        # länger als LEASE_SECONDS anhält, können andere Prozesse Items übernehmen
+        while True:
+            await asyncio.sleep(LEASE_SECONDS / 3)
+            try:
+                await asyncio.to_thread(job_store.renew, task_id, owner)
+            except Exception as e:
+                logger.warning(f"Lease renewal failed for {task_id} ({owner}): {e}")
+
+    fetchers  = [asyncio.create_task(_fetcher()) for _ in range(FETCH_WORKERS)]
+    computers = [asyncio.create_task(_computer()) for _ in range(COMPUTE_WORKERS)]
+    writer    = asyncio.create_task(_writer())
+    heartbeat = asyncio.create_task(_heartbeat())
+
+    try:
+        await asyncio.gather(*fetchers)
+        for _ in computers:
+            await compute_queue.put(None)
+        await asyncio.gather(*computers)
+        await write_queue.put(None)
+        await writer
+    except BaseException:
+        for task in fetchers + computers + [writer]:
+            task.cancel()
+        raise
+    finally:
+        heartbeat.cancel()
+
+    if write_error:
+        raise write_error[0]
+
+    logger.info(
+        f"Backfill pipeline ({owner}) done for {task_id}: "
+        f"{counts['successful']} successful, {len(failed)} failed"
+    )
+    return {"successful": counts['successful'], "failed": failed}
@@ -1,12 +1,28 @@
+import asyncio
+import os
+import socket
 import uuid
 from datetime import datetime
 from typing import Dict, List, Optional
 import logging
 
+from .backfill_pipeline import run_backfill_pipeline
+from .embedding_recompute import EmbeddingRecomputer, RECOMPUTE_BATCH_SIZE
+from .job_store import JobStore, TASK_STORE_PATH
+from .metadata_calculator import MetadataCalculatorService
+
 logger = logging.getLogger(__name__)
 
-# In-Memory Task Store (für Production sollte Redis verwendet werden)
-task_store: Dict[str, Dict] = {}
+# Persistenter Task Store (SQLite) — überlebt Neustarts, für alle uvicorn-Worker sichtbar.
+# Wird beim Startup angelegt (init_job_store); alle Zugriffe laufen per
+# asyncio.to_thread, damit SQLite den Event-Loop nicht blockiert.
+_job_store: Optional[JobStore] = None
+
+METADATA_TASK_TYPE  = "metadata_calculation"
+RECOMPUTE_TASK_TYPE = "embedding_recompute"
+
+# Lease-Owner dieses Prozesses
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
 
 
 class TaskStatus:
@@ -16,6 +32,22 @@ class TaskStatus:
     FAILED = "failed"
 
 
+def get_job_store() -> JobStore:
+    """Store dieses Prozesses (legt ihn an, falls init_job_store() noch nicht lief)."""
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore(TASK_STORE_PATH)
+    return _job_store
+
+
+async def init_job_store(path: str = TASK_STORE_PATH) -> JobStore:
+    """Beim Startup: SQLite-Datei + Schema anlegen (im Thread)."""
+    global _job_store
+    _job_store = await asyncio.to_thread(JobStore, path)
+    logger.info(f"Job store at {path}")
+    return _job_store
+
+
 # In background_tasks.py - Korrektur für process_segment_similarity_background:
 
 async def process_metadata_background(
@@ -26,9 +58,7 @@ async def process_metadata_background(
         duplicate_handling: str
 ):
 
-    BATCH_SIZE = 100
-    
-    task_store[task_id] = {
+    await asyncio.to_thread(get_job_store().create, task_id, METADATA_TASK_TYPE, {
         "status": TaskStatus.RUNNING,
         "started_at": datetime.now().isoformat(),
         "total_trajs": len(traj_ids),
@@ -43,168 +73,226 @@ async def process_metadata_background(
             "metadata_written": 0,
             "embeddings_written": 0
         }
-    }
-
-    async with service.db_pool.acquire() as conn:
-        try:
-            logger.info(f"Starting task {task_id} for {len(traj_ids)} trajectories")
-
-            # ✅ SCHRITT 1: Prüfe welche Bahnen Metadata/Embeddings brauchen
-            trajs_needing_metadata = []
-            trajs_needing_embeddings = []
-
-            if duplicate_handling == "replace":
-                # Replace: Alles neu berechnen
-                existing_metadata = await service.check_existing_trajs(traj_ids)
-                existing_embeddings = existing_metadata  # Gleiche Liste
-                
-                if existing_metadata:
-                    await service.delete_existing_metadata(existing_metadata)
-                    await service.delete_existing_embeddings(existing_embeddings)
-                
-                trajs_needing_metadata = traj_ids
-                trajs_needing_embeddings = traj_ids
-                
-            elif duplicate_handling == "skip":
-                # ✅ Skip: Prüfe separat für Metadata und Embeddings
-                existing_metadata = await service.check_existing_trajs(traj_ids)
-                trajs_needing_metadata = [b for b in traj_ids if b not in existing_metadata]
-                
-                # Prüfe welche Bahnen Embeddings fehlen
-                existing_embeddings = await service.check_existing_embeddings(traj_ids)
-                trajs_needing_embeddings = [b for b in traj_ids if b not in existing_embeddings]
-                
-            else:  # append (default)
-                trajs_needing_metadata = traj_ids
-                trajs_needing_embeddings = traj_ids
-
-            # Kombiniere: Alle Bahnen die IRGENDWAS brauchen
-            all_trajs_to_process = list(set(trajs_needing_metadata + trajs_needing_embeddings))
+    })
+
+    try:
+        logger.info(f"Starting task {task_id} for {len(traj_ids)} trajectories")
+
+        # ✅ SCHRITT 1: Prüfe welche Bahnen Metadata/Embeddings brauchen
+        trajs_needing_metadata = []
+        trajs_needing_embeddings = []
+
+        if duplicate_handling == "replace":
+            # Replace: Alles neu berechnen
+            existing_metadata = await service.check_existing_trajs(traj_ids)
+            existing_embeddings = existing_metadata  # Gleiche Liste
+            
+            if existing_metadata:
+                await service.delete_existing_metadata(existing_metadata)
+                await service.delete_existing_embeddings(existing_embeddings)
             
-            task_store[task_id]["total_trajs"] = len(all_trajs_to_process)
-            task_store[task_id]["details"]["trajs_needing_metadata"] = len(trajs_needing_metadata)
-            task_store[task_id]["details"]["trajs_needing_embeddings"] = len(trajs_needing_embeddings)
+            trajs_needing_metadata = traj_ids
+            trajs_needing_embeddings = traj_ids
+            
+        elif duplicate_handling == "skip":
+            # ✅ Skip: Prüfe separat für Metadata und Embeddings
+            existing_metadata = await service.check_existing_trajs(traj_ids)
+            trajs_needing_metadata = [b for b in traj_ids if b not in existing_metadata]
+            
+            # Prüfe welche Bahnen Embeddings fehlen
+            existing_embeddings = await service.check_existing_embeddings(traj_ids)
+            trajs_needing_embeddings = [b for b in traj_ids if b not in existing_embeddings]
+            
+        else:  # append (default)
+            trajs_needing_metadata = traj_ids
+            trajs_needing_embeddings = traj_ids
+
+        # Kombiniere: Alle Bahnen die IRGENDWAS brauchen
+        all_trajs_to_process = list(set(trajs_needing_metadata + trajs_needing_embeddings))
+        needs_metadata = set(trajs_needing_metadata)
+        needs_embeddings = set(trajs_needing_embeddings)
+
+        # ✅ Checkpoint-Items anlegen — ab hier ist der Job fortsetzbar
+        await asyncio.to_thread(get_job_store().add_items, task_id, [
+            (t, t in needs_metadata, t in needs_embeddings) for t in all_trajs_to_process
+        ])
+        await asyncio.to_thread(get_job_store().update, task_id, details={
+            "trajs_needing_metadata": len(trajs_needing_metadata),
+            "trajs_needing_embeddings": len(trajs_needing_embeddings),
+        })
+
+        logger.info(
+            f"Task {task_id}: {len(trajs_needing_metadata)} need metadata, "
+            f"{len(trajs_needing_embeddings)} need embeddings"
+        )
+
+    except Exception as e:
+        logger.error(f"Task {task_id} failed: {e}")
+        await asyncio.to_thread(
+            get_job_store().update, task_id,
+            status=TaskStatus.FAILED,
+            failed_at=datetime.now().isoformat(),
+            error=str(e)
+        )
+        return
+
+    await _run_metadata_job(task_id, service)
+
+
+async def _run_metadata_job(task_id: str, service):
+    """
+    ✅ SCHRITT 2: Fetch → Compute (ProcessPool) → Write als Pipeline.
+    Kann von mehreren Prozessen gleichzeitig für denselben Job laufen;
+    abgeschlossen wird der Job von dem Prozess, der das letzte Item committet.
+    """
+    try:
+        await run_backfill_pipeline(service, get_job_store(), task_id, WORKER_ID)
 
-            logger.info(
-                f"Task {task_id}: {len(trajs_needing_metadata)} need metadata, "
-                f"{len(trajs_needing_embeddings)} need embeddings"
+        task_data = await asyncio.to_thread(get_job_store().get, task_id)
+        remaining = await asyncio.to_thread(get_job_store().remaining, task_id)
+        if task_data and task_data["status"] == TaskStatus.RUNNING and remaining == 0:
+            # Task abschließen
+            await asyncio.to_thread(
+                get_job_store().update, task_id,
+                status=TaskStatus.COMPLETED,
+                completed_at=datetime.now().isoformat(),
+                summary={
+                    "total_processed": task_data["total_trajs"],
+                    "successful": task_data["successful_trajs"],
+                    "failed": task_data["failed_trajs"],
+                    "metadata_rows": task_data["details"]["metadata_written"],
+                    "embedding_rows": task_data["details"]["embeddings_written"]
+                }
             )
 
-            successful_results = []
-            failed_results = []
-
-            # ✅ SCHRITT 2: Batch-Processing
-            for batch_idx in range(0, len(all_trajs_to_process), BATCH_SIZE):
-                batch = all_trajs_to_process[batch_idx:batch_idx + BATCH_SIZE]
-                batch_metadata = []
-                batch_embeddings = []
-                
-                for traj_id in batch:
-                    task_store[task_id]["current_traj"] = traj_id
-                    
-                    needs_metadata = traj_id in trajs_needing_metadata
-                    needs_embeddings = traj_id in trajs_needing_embeddings
-                    
-                    try:
-                        # Verarbeite mit Flag was benötigt wird
-                        result = await service.process_single_traj(
-                            conn, traj_id,
-                            compute_metadata=needs_metadata,
-                            compute_embeddings=needs_embeddings
-                        )
-                        
-                        if result.get('error'):
-                            failed_results.append(result)
-                            task_store[task_id]["failed_trajs"] += 1
-                        else:
-                            # Nur hinzufügen was auch berechnet wurde
-                            if needs_metadata and result.get('metadata'):
-                                batch_metadata.extend(result['metadata'])
-                            if needs_embeddings and result.get('embeddings'):
-                                batch_embeddings.extend(result['embeddings'])
-                            
-                            successful_results.append(result)
-                            task_store[task_id]["successful_trajs"] += 1
-                            
-                    except Exception as e:
-                        logger.error(f"Error {traj_id}: {e}")
-                        failed_results.append({"traj_id": traj_id, "error": str(e)})
-                        task_store[task_id]["failed_trajs"] += 1
-                    
-                    task_store[task_id]["processed_trajs"] += 1
-                
-                # ✅ Schreibe Batch (nur was vorhanden ist)
-                if batch_metadata:
-                    await service.batch_write_metadata(conn, batch_metadata)
-                    task_store[task_id]["details"]["metadata_written"] += len(batch_metadata)
-                
-                if batch_embeddings:
-                    await service.batch_write_embeddings(conn, batch_embeddings)
-                    task_store[task_id]["details"]["embeddings_written"] += len(batch_embeddings)
-                
-                logger.info(
-                    f"✓ Batch {batch_idx//BATCH_SIZE + 1}: "
-                    f"{len(batch_metadata)} metadata, {len(batch_embeddings)} embeddings"
+    except Exception as e:
+        logger.error(f"Task {task_id} failed: {e}")
+        await asyncio.to_thread(
+            get_job_store().update, task_id,
+            status=TaskStatus.FAILED,
+            failed_at=datetime.now().isoformat(),
+            error=str(e)
+        )
+
+
+async def resume_metadata_tasks(db_pool):
+    """
+    Nimmt laufende Metadata-Jobs wieder auf (nach Neustart oder von einem
+    anderen Worker-Prozess): pending- und abgelaufene Items werden geleast,
+    bereits committete Batches übersprungen.
+    """
+    for task_id in await asyncio.to_thread(get_job_store().resumable, METADATA_TASK_TYPE):
+        logger.info(f"Resuming task {task_id} ({WORKER_ID})")
+        await _run_metadata_job(task_id, MetadataCalculatorService(db_pool))
+
+async def process_embedding_recompute_background(
+        task_id: str,
+        service,
+        modes: List[str],
+        shadow: bool = False,
+        switch: bool = False,
+):
+    """
+    Berechnet veraltete Embeddings (embedding_versions != aktueller Hash)
+    modusweise neu. Mit shadow=True landet das Ergebnis in
+    {mode}_embedding_next; switch=True schaltet danach atomar um.
+    """
+    await asyncio.to_thread(get_job_store().create, task_id, RECOMPUTE_TASK_TYPE, {
+        "status": TaskStatus.RUNNING,
+        "started_at": datetime.now().isoformat(),
+        "total_trajs": 0,
+        "processed_trajs": 0,
+        "current_traj": None,
+        "errors": [],
+        "details": {
+            "modes": modes,
+            "shadow": shadow,
+            "switch": switch,
+            "embeddings_written": 0
+        }
+    })
+
+    recomputer = EmbeddingRecomputer(service)
+    try:
+        for mode in modes:
+            stale = await recomputer.find_stale_traj_ids(mode, shadow=shadow)
+            task_data = await asyncio.to_thread(get_job_store().get, task_id)
+            await asyncio.to_thread(
+                get_job_store().update, task_id,
+                current_mode=mode,
+                total_trajs=task_data["total_trajs"] + len(stale),
+                details={f"{mode}_stale_trajs": len(stale)}
+            )
+            logger.info(f"Task {task_id}: {len(stale)} trajectories with stale {mode} embeddings")
+
+            for start in range(0, len(stale), RECOMPUTE_BATCH_SIZE):
+                task_data = await asyncio.to_thread(get_job_store().get, task_id)
+                if task_data["status"] != TaskStatus.RUNNING:
+                    logger.info(f"Task {task_id} stopped ({task_data['status']})")
+                    return
+
+                batch = stale[start:start + RECOMPUTE_BATCH_SIZE]
+                written = await recomputer.recompute(mode, batch, shadow=shadow)
+                await asyncio.to_thread(
+                    get_job_store().update, task_id,
+                    processed_trajs=task_data["processed_trajs"] + len(batch),
+                    current_traj=batch[-1],
+                    details={"embeddings_written": task_data["details"]["embeddings_written"] + written}
                 )
 
-            # Task abschließen
-            task_store[task_id].update({
-                "status": TaskStatus.COMPLETED,
-                "completed_at": datetime.now().isoformat(),
-                "summary": {
-                    "total_processed": len(all_trajs_to_process),
-                    "successful": len(successful_results),
-                    "failed": len(failed_results),
-                    "metadata_rows": task_store[task_id]["details"]["metadata_written"],
-                    "embedding_rows": task_store[task_id]["details"]["embeddings_written"]
-                }
-            })
+            if shadow and switch:
+                switched = await recomputer.switch_shadow(mode)
+                await asyncio.to_thread(get_job_store().update, task_id, details={f"{mode}_switched_rows": switched})
+
+        task_data = await asyncio.to_thread(get_job_store().get, task_id)
+        await asyncio.to_thread(
+            get_job_store().update, task_id,
+            status=TaskStatus.COMPLETED,
+            completed_at=datetime.now().isoformat(),
+            summary={
+                "total_processed": task_data["processed_trajs"],
+                "embedding_rows": task_data["details"]["embeddings_written"]
+            }
+        )
+
+    except Exception as e:
+        logger.error(f"Task {task_id} failed: {e}")
+        await asyncio.to_thread(
+            get_job_store().update, task_id,
+            status=TaskStatus.FAILED,
+            failed_at=datetime.now().isoformat(),
+            error=str(e)
+        )
 
-        except Exception as e:
-            logger.error(f"Task {task_id} failed: {e}")
-            task_store[task_id].update({
-                "status": TaskStatus.FAILED,
-                "failed_at": datetime.now().isoformat(),
-                "error": str(e)
-            })
 
 def create_task_id(type) -> str:
     """Generiert eine eindeutige Task-ID"""
     return f"{type}_{uuid.uuid4().hex[:8]}_{int(datetime.now().timestamp())}"
 
 
-def get_task_status(task_id: str) -> Optional[Dict]:
+async def get_task_status(task_id: str) -> Optional[Dict]:
     """Holt den aktuellen Status einer Task"""
-    return task_store.get(task_id)
+    return await asyncio.to_thread(get_job_store().get, task_id)
 
 
-def cleanup_old_tasks(max_age_hours: int = 24):
-    """Entfernt alte Tasks aus dem Store"""
-    current_time = datetime.now()
-    to_remove = []
-
-    for task_id, task_data in task_store.items():
-        if "completed_at" in task_data or "failed_at" in task_data:
-            completion_time_str = task_data.get("completed_at") or task_data.get("failed_at")
-            completion_time = datetime.fromisoformat(completion_time_str)
+async def update_task(task_id: str, **fields):
+    """Aktualisiert den State einer Task"""
+    await asyncio.to_thread(get_job_store().update, task_id, **fields)
 
-            # Check if older than max_age_hours
-            age_hours = (current_time - completion_time).total_seconds() / 3600
-            if age_hours > max_age_hours:
-                to_remove.append(task_id)
 
-    for task_id in to_remove:
-        del task_store[task_id]
+async def cleanup_old_tasks(max_age_hours: int = 24):
+    """Entfernt alte Tasks aus dem Store"""
+    removed = await asyncio.to_thread(get_job_store().delete_finished_older_than, max_age_hours)
 
-    if to_remove:
-        logger.info(f"Cleaned up {len(to_remove)} old tasks")
+    if removed:
+        logger.info(f"Cleaned up {removed} old tasks")
 
 
-def get_all_tasks() -> Dict[str, Dict]:
-    return dict(task_store)
+async def get_all_tasks() -> Dict[str, Dict]:
+    return await asyncio.to_thread(get_job_store().all)
 
 
-def find_running_task(task_type: str, target_traj_id: str = None, **kwargs) -> Optional[str]:
+async def find_running_task(task_type: str, target_traj_id: str = None, **kwargs) -> Optional[str]:
     """
     Sucht nach bereits laufenden Tasks für gleiche Parameter
 
@@ -216,7 +304,7 @@ def find_running_task(task_type: str, target_traj_id: str = None, **kwargs) -> O
     Returns:
         task_id falls laufender Task gefunden, sonst None
     """
-    for task_id, task_data in task_store.items():
+    for task_id, task_data in (await asyncio.to_thread(get_job_store().all)).items():
         if task_data["status"] in [TaskStatus.PENDING, TaskStatus.RUNNING]:
 
             # Segment Similarity Tasks
@@ -248,4 +336,9 @@ def find_running_task(task_type: str, target_traj_id: str = None, **kwargs) -> O
                   task_data.get("total_rows") is not None):  # Hat meta_values structure
                 return task_id
 
+            # Embedding Recompute Tasks (global, nur ein Task zur Zeit)
+            elif (task_type == RECOMPUTE_TASK_TYPE and
+                  task_data.get("details", {}).get("modes") is not None):  # Hat recompute structure
+                return task_id
+
     return None
\ No newline at end of file
@@ -1,11 +1,50 @@
 # backend/scripts/calculators/embedding_calculator.py
 
+import hashlib
+import json
 import numpy as np
-from typing import List, Dict, Optional, Any
+from typing import List, Dict, Optional, Any, Tuple
 import logging
 
 logger = logging.getLogger(__name__)
 
+EMBEDDING_MODES = ('joint', 'position', 'orientation', 'velocity', 'metadata')
+
+# Bei jeder Änderung am Algorithmus eines Modus hochzählen → alle Zeilen
+# dieses Modus gelten als veraltet (siehe embedding_recompute.py)
+EMBEDDING_ALGO_VERSIONS = {
+    'joint':       1,
+    'position':    1,
+    'orientation': 1,
+    'velocity':    1,   # Savitzky-Golay: Fenster ≤ 33, polyorder 3 (Position) / 2 (Velocity)
+    'metadata':    1,
+}
+
+# Modi, deren Version nicht von robot_info abhängt
+ROBOT_INDEPENDENT_MODES = ('joint', 'position', 'orientation', 'velocity')
+
+
+def stack_segments(arrays: List[np.ndarray], dims: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Stapelt Segment-Arrays (n_i, dims) zu (sum n_i, dims) + offsets (N+1,)
+    für die Batch-API von EmbeddingCalculator. Leere/None-Segmente sind erlaubt.
+    """
+    parts   = [np.asarray(a, dtype=np.float32).reshape(-1, dims) if a is not None and len(a)
+               else np.zeros((0, dims), dtype=np.float32) for a in arrays]
+    offsets = np.zeros(len(parts) + 1, dtype=np.int64)
+    np.cumsum([len(p) for p in parts], out=offsets[1:])
+    stacked = np.concatenate(parts) if parts else np.zeros((0, dims), dtype=np.float32)
+    return stacked, offsets
+
+
+def stack_selected(stacked: np.ndarray, offsets: np.ndarray, mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Nur die Segmente mit mask=True, wieder als (stacked, offsets)."""
+    lengths = np.diff(offsets)
+    rows    = np.repeat(mask, lengths)
+    new_offsets = np.zeros(int(mask.sum()) + 1, dtype=np.int64)
+    np.cumsum(lengths[mask], out=new_offsets[1:])
+    return stacked[rows], new_offsets
+
 
 class EmbeddingCalculator:
     """
@@ -28,6 +67,30 @@ class EmbeddingCalculator:
         self.reach_z_min = info.get('reach_z_min', -290.0)
         self.max_payload = info.get('max_payload', 60.0)
 
+    def version_hashes(self) -> Dict[str, str]:
+        """
+        Parameter-Hash pro Modus (wird pro Zeile in traj_embeddings.embedding_versions
+        gespeichert). Ändert sich n_samples, der Algorithmus oder — für metadata —
+        eine robot_info-Normierungskonstante, ändert sich der Hash.
+        """
+        params = {
+            mode: {'algo': EMBEDDING_ALGO_VERSIONS[mode], 'n_samples': self.n_samples}
+            for mode in ROBOT_INDEPENDENT_MODES
+        }
+        params['metadata'] = {
+            'algo':        EMBEDDING_ALGO_VERSIONS['metadata'],
+            'vel_max':     self.vel_max,
+            'accel_max':   self.accel_max,
+            'reach_xy':    self.reach_xy,
+            'reach_z_max': self.reach_z_max,
+            'reach_z_min': self.reach_z_min,
+            'max_payload': self.max_payload,
+        }
+        return {
+            mode: hashlib.sha1(json.dumps({'mode': mode, **p}, sort_keys=True).encode()).hexdigest()[:12]
+            for mode, p in params.items()
+        }
+
     def compute_joint_embedding(self, data: List[Dict]) -> Optional[np.ndarray]:
         if len(data) < 10:
             return None
@@ -217,6 +280,276 @@ class EmbeddingCalculator:
         return self._l2_normalize(features)
 
 
+    # ── Batch API (array-native) ─────────────────────────────────────────
+    #
+    # Alle Segmente einer Modalität liegen gestapelt in einem (M, d) Array,
+    # offsets (N+1,) markieren die Segmentgrenzen: Segment i = stacked[offsets[i]:offsets[i+1]].
+    # Rückgabe jeweils (embeddings (N, D) float32, valid (N,) bool) — Zeilen mit
+    # valid=False entsprechen einem None der Einzel-Methoden (< 10 Punkte).
+
+    def compute_embeddings_batch(
+            self,
+            segments: Dict[str, Tuple[np.ndarray, np.ndarray]],
+            metadata_rows: Optional[List[Dict]] = None,
+    ) -> Dict[str, Tuple[np.ndarray, np.ndarray]]:
+        """
+        Berechnet alle Modi für viele Segmente auf einmal.
+
+        Args:
+            segments: {mode: (stacked, offsets)} für 'joint', 'position',
+                      'orientation' (Quaternions xyzw), 'velocity' (Positionen)
+            metadata_rows: optional, eine Metadaten-Zeile pro Segment
+
+        Returns:
+            {mode: (embeddings, valid)}
+        """
+        compute = {
+            'joint':       self.compute_joint_embeddings_batch,
+            'position':    self.compute_position_embeddings_batch,
+            'orientation': self.compute_orientation_embeddings_batch,
+            'velocity':    self.compute_velocity_embeddings_batch,
+        }
+        out = {
+            mode: compute[mode](stacked, offsets)
+            for mode, (stacked, offsets) in segments.items()
+        }
+        if metadata_rows is not None:
+            out['metadata'] = self.compute_metadata_embeddings_batch(metadata_rows)
+        return out
+
+    def compute_joint_embeddings_batch(
+            self, joints: np.ndarray, offsets: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        return self._shape_embeddings_batch(joints, offsets, lambda x, off: x)
+
+    def compute_position_embeddings_batch(
+            self, positions: np.ndarray, offsets: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Wie compute_position_embedding: resampled wird die rohe Trajektorie
+        # (nicht die start-/extent-normalisierte) — bestehende DB-Embeddings
+        # wurden so berechnet und müssen vergleichbar bleiben.
+        return self._shape_embeddings_batch(positions, offsets, lambda x, off: x)
+
+    def compute_orientation_embeddings_batch(
+            self, quats_xyzw: np.ndarray, offsets: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        from scipy.spatial.transform import Rotation
+
+        def _to_relative_rotvec(quats, off):
+            rot_vectors = Rotation.from_quat(quats).as_rotvec()
+            starts = np.repeat(rot_vectors[off[:-1]], np.diff(off), axis=0)
+            return rot_vectors - starts
+
+        quats_xyzw = np.asarray(quats_xyzw, dtype=np.float32)
+        offsets    = np.asarray(offsets, dtype=np.int64)
+
+        # Null-Quaternions würden Rotation.from_quat für den ganzen Batch
+        # abbrechen → betroffene Segmente als ungültig markieren
+        zero = np.linalg.norm(quats_xyzw, axis=1) == 0 if len(quats_xyzw) else np.zeros(0, bool)
+        bad_segments = np.zeros(len(offsets) - 1, dtype=bool)
+        if zero.any():
+            seg_of_row = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+            bad_segments[np.unique(seg_of_row[zero])] = True
+
+        return self._shape_embeddings_batch(
+            quats_xyzw, offsets, _to_relative_rotvec, exclude=bad_segments, out_dims=3
+        )
+
+    def compute_velocity_embeddings_batch(
+            self, positions: np.ndarray, offsets: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+
+        def _velocity(pos, off):
+            lengths = np.diff(off)
+
+            # Künstliche Zeitstempel je Segment (wie np.linspace(0, 1, n))
+            local = np.arange(len(pos)) - np.repeat(off[:-1], lengths)
+            n_rep = np.repeat(lengths, lengths)
+            t     = local * (1.0 / (n_rep - 1))
+            t[off[1:] - 1] = 1.0
+
+            smooth = self._savgol_batch(pos, off, polyorder=3)
+
+            same_segment = np.ones(len(pos) - 1, dtype=bool)
+            same_segment[off[1:-1] - 1] = False
+
+            delta_pos  = np.diff(smooth, axis=0)[same_segment]
+            delta_time = np.diff(t)[same_segment]
+            delta_time = np.where(delta_time == 0, 1e-9, delta_time)
+            velocity   = delta_pos / delta_time[:, np.newaxis]
+
+            vel_offsets = off - np.arange(len(off))
+            return self._savgol_batch(velocity, vel_offsets, polyorder=2)
+
+        # Velocity hat pro Segment einen Punkt weniger
+        return self._shape_embeddings_batch(
+            positions, offsets, _velocity, resample_offsets=lambda off: off - np.arange(len(off))
+        )
+
+    def compute_metadata_embeddings_batch(
+            self, metadata_rows: List[Dict]
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        n = len(metadata_rows)
+        if n == 0:
+            return np.zeros((0, 15), dtype=np.float32), np.zeros(0, dtype=bool)
+
+        def _col(key):
+            return np.array([m.get(key, 0.0) for m in metadata_rows], dtype=np.float64)
+
+        ratios = np.array([
+            self._movement_ratios(m.get('movement_type', '')) for m in metadata_rows
+        ], dtype=np.float64)
+
+        features = np.column_stack([
+            ratios[:, 0],
+            ratios[:, 1],
+            np.clip(_col('weight') / self.max_payload, 0, 1),
+            np.clip(_col('position_x') / self.reach_xy, -1, 1),
+            np.clip(_col('position_y') / self.reach_xy, -1, 1),
+            np.clip((_col('position_z') - self.reach_z_min) / (self.reach_z_max - self.reach_z_min), 0, 1),
+            np.clip(_col('max_vel')    / self.vel_max, 0, 1),
+            np.clip(_col('mean_vel')   / self.vel_max, 0, 1),
+            np.clip(_col('median_vel') / self.vel_max, 0, 1),
+            np.clip(_col('std_vel')    / self.vel_max, 0, 1),
+            np.clip(np.abs(_col('min_accel'))    / self.accel_max, 0, 1),
+            np.clip(np.abs(_col('max_accel'))    / self.accel_max, 0, 1),
+            np.clip(np.abs(_col('mean_accel'))   / self.accel_max, 0, 1),
+            np.clip(np.abs(_col('median_accel')) / self.accel_max, 0, 1),
+            np.clip(_col('std_accel') / self.accel_max, 0, 1),
+        ]).astype(np.float32)
+
+        return self._l2_normalize_rows(features), np.ones(n, dtype=bool)
+
+    @staticmethod
+    def _movement_ratios(movement_type: str) -> Tuple[float, float]:
+        movement_str = (movement_type or '').lower().strip()
+        if movement_str in ('linear', 'l'):
+            return 1.0, 0.0
+        if movement_str in ('circular', 'c'):
+            return 0.0, 1.0
+        linear_count   = movement_str.count('l')
+        circular_count = movement_str.count('c')
+        total = linear_count + circular_count
+        if total > 0:
+            return linear_count / total, circular_count / total
+        return 0.0, 0.0
+
+    def _shape_embeddings_batch(
+            self,
+            stacked: np.ndarray,
+            offsets: np.ndarray,
+            transform,
+            exclude: Optional[np.ndarray] = None,
+            resample_offsets=None,
+            out_dims: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Gemeinsamer Ablauf für die Zeitreihen-Modi:
+        gültige Segmente (>= 10 Punkte) auswählen → transform → resample → flatten → L2.
+        """
+        stacked = np.asarray(stacked, dtype=np.float32)
+        offsets = np.asarray(offsets, dtype=np.int64)
+        n_seg   = len(offsets) - 1
+        dims    = out_dims or (stacked.shape[1] if stacked.ndim == 2 else 3)
+
+        valid = np.diff(offsets) >= 10
+        if exclude is not None:
+            valid &= ~exclude
+
+        out = np.zeros((n_seg, self.n_samples * dims), dtype=np.float32)
+        if not valid.any():
+            return out, valid
+
+        sel_stacked, sel_offsets = stack_selected(stacked, offsets, valid)
+        values = transform(sel_stacked, sel_offsets)
+        if resample_offsets is not None:
+            sel_offsets = resample_offsets(sel_offsets)
+
+        resampled = self._resample_batch(values, sel_offsets, self.n_samples)
+        flat      = resampled.reshape(len(resampled), -1)
+        out[valid] = self._l2_normalize_rows(flat)
+        return out, valid
+
+    @staticmethod
+    def _resample_batch(stacked: np.ndarray, offsets: np.ndarray, n_samples: int) -> np.ndarray:
+        """
+        Vektorisierte Variante von _resample für alle Segmente auf einmal:
+        lineare Interpolation auf n_samples, Edge-Padding bei <= n_samples Punkten.
+        Returns (N, n_samples, d)
+        """
+        starts  = offsets[:-1]
+        lengths = np.diff(offsets)
+        last    = (lengths - 1)[:, None]
+
+        x_new = np.linspace(0, 1, n_samples)[None, :]
+        pos   = x_new * last
+        short = (lengths <= n_samples)[:, None]
+        pos   = np.where(short, np.minimum(np.arange(n_samples)[None, :], last), pos)
+
+        i0 = np.minimum(np.floor(pos).astype(np.int64), last)
+        i1 = np.minimum(i0 + 1, last)
+        w  = (pos - i0)[..., None]
+
+        base = starts[:, None]
+        lo   = stacked[base + i0]
+        hi   = stacked[base + i1]
+        return lo + (hi - lo) * w
+
+    @staticmethod
+    def _savgol_batch(
+            stacked: np.ndarray,
+            offsets: np.ndarray,
+            polyorder: int,
+            max_window: int = 33,
+    ) -> np.ndarray:
+        """
+        savgol_filter (mode='interp') segmentweise, aber für alle Segmente
+        mit voller Fensterbreite in einem einzigen Filterlauf über das
+        gestapelte Array. Die Ränder jedes Segments — wo das Fenster über die
+        Segmentgrenze ragen würde — werden wie bei mode='interp' über den
+        Polynom-Fit des ersten/letzten Fensters ersetzt (savgol_coeffs mit pos).
+        """
+        from scipy.signal import savgol_coeffs, savgol_filter
+
+        out     = np.empty_like(stacked)
+        lengths = np.diff(offsets)
+        windows = np.maximum(np.minimum(max_window, np.where(lengths % 2 == 1, lengths, lengths - 1)), 3)
+
+        full = windows == max_window
+        if full.any():
+            half = max_window // 2
+            sel_stacked, sel_offsets = stack_selected(stacked, offsets, full)
+            smooth = savgol_filter(sel_stacked, max_window, polyorder, axis=0).astype(stacked.dtype)
+
+            starts = sel_offsets[:-1]
+            ends   = sel_offsets[1:]
+            win    = np.arange(max_window)
+
+            left  = np.stack([savgol_coeffs(max_window, polyorder, pos=p, use='dot') for p in range(half)])
+            right = np.stack([savgol_coeffs(max_window, polyorder, pos=p, use='dot')
+                              for p in range(max_window - half, max_window)])
+
+            left_windows  = sel_stacked[starts[:, None] + win].astype(np.float64)
+            right_windows = sel_stacked[(ends - max_window)[:, None] + win].astype(np.float64)
+
+            smooth[starts[:, None] + np.arange(half)] = np.einsum('pw,nwd->npd', left, left_windows)
+            smooth[(ends - half)[:, None] + np.arange(half)] = np.einsum('pw,nwd->npd', right, right_windows)
+
+            rows = np.repeat(full, lengths)
+            out[rows] = smooth
+
+        # Kurze Segmente (Fenster < max_window): einzeln — selten und klein
+        for i in np.flatnonzero(~full):
+            start, end = offsets[i], offsets[i + 1]
+            out[start:end] = savgol_filter(stacked[start:end], int(windows[i]), polyorder, axis=0)
+
+        return out
+
+    @staticmethod
+    def _l2_normalize_rows(matrix: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        return np.divide(matrix, norms, out=np.array(matrix, copy=True), where=norms > 0)
+
     # Helper methods
     @staticmethod
     def _resample(trajectory: np.ndarray, n_samples: int) -> np.ndarray:
@@ -244,8 +577,9 @@ class EmbeddingCalculator:
         Args:
             vec: input vector
         Returns:
-            normalized vector
+            normalized vector (float32 — geht so direkt in den Binary COPY)
         """
+        vec  = np.asarray(vec, dtype=np.float32)
         norm = np.linalg.norm(vec)
         return vec / norm if norm > 0 else vec
     
@@ -363,6 +697,27 @@ def build_candidate_embeddings(
     }
 
 
+def _split_candidate_payload(payload: Dict[str, Any], segment_indices: list[int]) -> list[Dict[str, Any]]:
+    """Ein Payload pro Segment; Segment i endet inklusive segment_indices[i]."""
+    traj       = payload['trajectory']
+    boundaries = [0] + segment_indices
+    out = []
+    for i in range(len(segment_indices)):
+        start = boundaries[i]
+        end   = boundaries[i + 1] + 1
+        out.append({
+            "trajectory": {
+                "timestamps": traj['timestamps'][start:end],
+                "positions":  traj['positions'][start:end],
+                "quats":      traj.get('quats', [])[start:end],
+                "joints":     traj.get('joints', [])[start:end],
+            },
+            "movement_type": payload['movement_type'],
+            "weight":        payload['weight'],
+        })
+    return out
+
+
 def build_candidate_embeddings_segmented(
     payload:              Dict[str, Any],
     embedding_calculator: 'EmbeddingCalculator',
@@ -378,12 +733,6 @@ def build_candidate_embeddings_segmented(
       rows[0]    = Gesamttrajektorie  (seg_id == traj_id == CANDIDATE_SEG_ID)
       rows[1..n] = ein Row pro Segment (seg_id = CANDIDATE_SEG_ID_0, _1, ...)
     """
-    traj       = payload['trajectory']
-    positions  = traj['positions']
-    timestamps = traj['timestamps']
-    quats      = traj.get('quats', [])
-    joints     = traj.get('joints', [])
-
     # ── Gesamttrajektorie ─────────────────────────────────────────────────
     full_row = build_candidate_embeddings(payload, embedding_calculator, seg_id=CANDIDATE_SEG_ID)
     if full_row is None:
@@ -393,23 +742,9 @@ def build_candidate_embeddings_segmented(
     rows = [full_row]
 
     # ── Pro Segment ───────────────────────────────────────────────────────
-    boundaries = [0] + segment_indices
-    for i in range(len(segment_indices)):
-        start  = boundaries[i]
-        end    = boundaries[i + 1] + 1
+    for i, seg_payload in enumerate(_split_candidate_payload(payload, segment_indices)):
         seg_id = f"{CANDIDATE_SEG_ID}_{i}"
 
-        seg_payload = {
-            "trajectory": {
-                "timestamps": timestamps[start:end],
-                "positions":  positions[start:end],
-                "quats":      quats[start:end],
-                "joints":     joints[start:end],
-            },
-            "movement_type": payload['movement_type'],
-            "weight":        payload['weight'],
-        }
-
         row = build_candidate_embeddings(seg_payload, embedding_calculator, seg_id=seg_id)
         if row is None:
             logger.warning(
@@ -426,4 +761,82 @@ def build_candidate_embeddings_segmented(
 
     logger.info("[segmented] total rows built: %d (1 full + %d segments)", len(rows), len(rows) - 1)
 
-    return rows
\ No newline at end of file
+    return rows
+
+def build_candidate_embeddings_batch(
+    payloads:             List[Dict[str, Any]],
+    embedding_calculator: 'EmbeddingCalculator',
+) -> List[Optional[list[Dict[str, Any]]]]:
+    """
+    Builds the embedding rows for several candidates in one call
+    (AutoMode: ucb_k candidates per round).
+
+    All candidates and their segments are stacked and pushed through
+    EmbeddingCalculator.compute_embeddings_batch in a single vectorized pass.
+
+    Gibt pro Payload zurück:
+      - segmentiert (segment_indices gesetzt): wie build_candidate_embeddings_segmented
+      - sonst: [row] wie build_candidate_embeddings
+      - None, wenn keine Embeddings berechnet werden konnten
+    """
+    # (payload_idx, seg_id, seg_payload) — Gesamttrajektorie immer zuerst
+    entries = []
+    for idx, payload in enumerate(payloads):
+        entries.append((idx, CANDIDATE_SEG_ID, payload))
+        segment_indices = payload.get('segment_indices')
+        if segment_indices:
+            for i, seg_payload in enumerate(_split_candidate_payload(payload, segment_indices)):
+                entries.append((idx, f"{CANDIDATE_SEG_ID}_{i}", seg_payload))
+
+    def _arr(entry, key, dims):
+        values = entry[2]['trajectory'].get(key) or []
+        return np.asarray(values, dtype=np.float32).reshape(-1, dims) if len(values) else None
+
+    positions = [_arr(e, 'positions', 3) for e in entries]
+    joints    = [_arr(e, 'joints', 6) for e in entries]
+    quats     = [_arr(e, 'quats', 4) for e in entries]
+    quats     = [q[:, [1, 2, 3, 0]] if q is not None else None for q in quats]  # wxyz → xyzw
+
+    metadata_rows = [_build_candidate_metadata(e[2], seg_id=e[1]) for e in entries]
+
+    pos_stacked = stack_segments(positions, 3)
+    embeddings  = embedding_calculator.compute_embeddings_batch(
+        {
+            'joint':       stack_segments(joints, 6),
+            'position':    pos_stacked,
+            'orientation': stack_segments(quats, 4),
+            'velocity':    pos_stacked,
+        },
+        metadata_rows=metadata_rows,
+    )
+
+    def _emb(mode, i):
+        matrix, valid = embeddings[mode]
+        return matrix[i] if valid[i] else None
+
+    per_payload: List[list] = [[] for _ in payloads]
+    for i, (idx, seg_id, _) in enumerate(entries):
+        row = {
+            'seg_id':                seg_id,
+            'traj_id':               CANDIDATE_SEG_ID,
+            'joint_embedding':       _emb('joint', i),
+            'position_embedding':    _emb('position', i),
+            'orientation_embedding': _emb('orientation', i),
+            'velocity_embedding':    _emb('velocity', i),
+            'metadata_embedding':    _emb('metadata', i),
+            'metadata_row':          metadata_rows[i],
+        }
+        if all(row[f'{k}_embedding'] is None for k in ('joint', 'position', 'orientation', 'velocity', 'metadata')):
+            row = None
+        per_payload[idx].append(row)
+
+    out: List[Optional[list[Dict[str, Any]]]] = []
+    for payload, rows in zip(payloads, per_payload):
+        full_row, seg_rows = rows[0], [r for r in rows[1:] if r is not None]
+        if full_row is None:
+            out.append(None)
+        elif payload.get('segment_indices'):
+            out.append([full_row] + seg_rows if seg_rows else None)
+        else:
+            out.append([full_row])
+    return out
@@ -0,0 +1,200 @@
+# backend/app/utils/metadata_embeddings/embedding_recompute.py
+"""
+Selektives Neuberechnen einzelner Embedding-Modalitäten.
+
+Jede Zeile in traj_embeddings trägt in embedding_versions den Parameter-Hash
+pro Modus (EmbeddingCalculator.version_hashes). Veraltet ist eine Zeile, wenn
+der gespeicherte Hash vom aktuellen abweicht (für metadata pro robot_model).
+
+Pro Modus wird nur die Quelltabelle gelesen, die dieser Modus braucht
+(velocity/position → traj_position_cmd, joint → traj_joint_states, …) und
+nur die eine Spalte überschrieben — oder, mit shadow=True, in
+{mode}_embedding_next geschrieben und später atomar umgeschaltet.
+"""
+
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import asyncpg
+import numpy as np
+
+from .embedding_calculator import EMBEDDING_MODES, EmbeddingCalculator, stack_segments
+from .metadata_calculator import MetadataCalculatorService
+
+logger = logging.getLogger(__name__)
+
+RECOMPUTE_BATCH_SIZE = 200
+
+# Quelle pro Zeitreihen-Modus: (Tabelle, Spalten in Embedding-Reihenfolge)
+_MODE_SOURCES = {
+    'position':    ('traj_position_cmd',    ['x_cmd', 'y_cmd', 'z_cmd']),
+    'velocity':    ('traj_position_cmd',    ['x_cmd', 'y_cmd', 'z_cmd']),
+    'joint':       ('traj_joint_states',    ['joint_1', 'joint_2', 'joint_3', 'joint_4', 'joint_5', 'joint_6']),
+    'orientation': ('traj_orientation_cmd', ['qx_cmd', 'qy_cmd', 'qz_cmd', 'qw_cmd']),  # xyzw
+}
+
+
+class EmbeddingRecomputer:
+    def __init__(self, service: MetadataCalculatorService):
+        self.service = service
+
+    async def _current_hashes(self, conn: asyncpg.Connection, mode: str) -> Tuple[List[Optional[str]], List[str]]:
+        """
+        (robot_models, hashes) — der aktuelle Hash von mode pro Robotermodell.
+        robot_model NULL ist ein eigener Eintrag: recompute() rechnet diese
+        Bahnen mit dem Calculator ohne robot_info und stempelt dessen Hash.
+        """
+        robot_models = [
+            r['robot_model'] for r in await conn.fetch(
+                "SELECT DISTINCT robot_model FROM rmpd.motion.traj_info"
+            )
+        ]
+        hashes = [
+            (await self.service._get_embedding_calculator(conn, m)).version_hashes()[mode]
+            for m in robot_models
+        ]
+        return robot_models, hashes
+
+    async def find_stale_traj_ids(self, mode: str, shadow: bool = False) -> List[str]:
+        """
+        traj_ids mit mindestens einer Zeile, deren mode-Version nicht aktuell ist.
+
+        Mit shadow=True zählt eine Zeile nur als veraltet, wenn weder die live-
+        noch die Shadow-Version ({mode}_next) aktuell ist — sonst würde ein
+        Shadow-Lauf alle bereits aktuellen Zeilen neu schreiben.
+        """
+        if mode not in EMBEDDING_MODES:
+            raise ValueError(f"Unknown embedding mode: {mode}")
+
+        stale_condition = "te.embedding_versions ->> $3 IS DISTINCT FROM c.hash"
+        if shadow:
+            stale_condition += " AND te.embedding_versions ->> $4 IS DISTINCT FROM c.hash"
+
+        async with self.service.db_pool.acquire() as conn:
+            robot_models, hashes = await self._current_hashes(conn, mode)
+            rows = await conn.fetch(f"""
+                WITH current AS (
+                    SELECT * FROM unnest($1::text[], $2::text[]) AS c(robot_model, hash)
+                )
+                SELECT DISTINCT te.traj_id
+                FROM rmpd.motion.traj_embeddings te
+                JOIN rmpd.motion.traj_info ti ON ti.traj_id = te.traj_id
+                LEFT JOIN current c ON c.robot_model IS NOT DISTINCT FROM ti.robot_model
+                WHERE {stale_condition}
+                ORDER BY te.traj_id
+            """, robot_models, hashes, mode, *([f'{mode}_next'] if shadow else []))
+            return [r['traj_id'] for r in rows]
+
+    async def recompute(self, mode: str, traj_ids: List[str], shadow: bool = False) -> int:
+        """Berechnet mode für traj_ids neu und schreibt nur diese Spalte."""
+        if mode not in EMBEDDING_MODES:
+            raise ValueError(f"Unknown embedding mode: {mode}")
+        if not traj_ids:
+            return 0
+
+        async with self.service.db_pool.acquire() as conn:
+            robot_by_traj = {
+                r['traj_id']: r['robot_model'] for r in await conn.fetch(
+                    "SELECT traj_id, robot_model FROM rmpd.motion.traj_info WHERE traj_id = ANY($1::text[])",
+                    traj_ids
+                )
+            }
+            calculators = {
+                m: await self.service._get_embedding_calculator(conn, m)
+                for m in set(robot_by_traj.values())
+            }
+
+            if mode == 'metadata':
+                rows = await self._recompute_metadata(conn, robot_by_traj, calculators)
+            else:
+                rows = await self._recompute_time_series(conn, mode, list(robot_by_traj), calculators)
+
+        return await self.service.binary_writer.update_modality(mode, rows, shadow=shadow)
+
+    async def _recompute_time_series(
+            self,
+            conn: asyncpg.Connection,
+            mode: str,
+            traj_ids: List[str],
+            calculators: Dict[str, EmbeddingCalculator],
+    ) -> List[Dict]:
+        table, columns = _MODE_SOURCES[mode]
+        aggs = ",\n".join(f"array_agg({c} ORDER BY timestamp) AS {c}" for c in columns)
+        source_rows = await conn.fetch(f"""
+            SELECT traj_id, seg_id,
+                   {aggs}
+            FROM rmpd.motion.{table}
+            WHERE traj_id = ANY($1::text[])
+            GROUP BY traj_id, seg_id
+            ORDER BY traj_id, seg_id
+        """, traj_ids)
+
+        # Segmente + Gesamtbahn (seg_id = traj_id) wie in _calculate_all_embeddings_in_memory
+        keys, arrays = [], []
+        by_traj: Dict[str, List[np.ndarray]] = {}
+        for row in source_rows:
+            arr = np.column_stack([row[c] for c in columns]).astype(np.float32)
+            keys.append((row['seg_id'], row['traj_id']))
+            arrays.append(arr)
+            if mode != 'velocity' or len(arr) > 2:
+                by_traj.setdefault(row['traj_id'], []).append(arr)
+        for traj_id, parts in by_traj.items():
+            keys.append((traj_id, traj_id))
+            arrays.append(np.concatenate(parts))
+
+        # Zeitreihen-Modi hängen nicht von robot_info ab → ein Calculator genügt
+        calculator = next(iter(calculators.values()), None) or EmbeddingCalculator()
+        compute = {
+            'joint':       calculator.compute_joint_embeddings_batch,
+            'position':    calculator.compute_position_embeddings_batch,
+            'orientation': calculator.compute_orientation_embeddings_batch,
+            'velocity':    calculator.compute_velocity_embeddings_batch,
+        }[mode]
+        matrix, valid = compute(*stack_segments(arrays, len(columns)))
+        version = calculator.version_hashes()[mode]
+
+        return [
+            {
+                'seg_id':    seg_id,
+                'traj_id':   traj_id,
+                'embedding': matrix[i] if valid[i] else None,
+                'version':   version,
+            }
+            for i, (seg_id, traj_id) in enumerate(keys)
+        ]
+
+    async def _recompute_metadata(
+            self,
+            conn: asyncpg.Connection,
+            robot_by_traj: Dict[str, str],
+            calculators: Dict[str, EmbeddingCalculator],
+    ) -> List[Dict]:
+        metadata_rows = await conn.fetch("""
+            SELECT *
+            FROM rmpd.motion.traj_metadata
+            WHERE traj_id = ANY($1::text[])
+            ORDER BY traj_id, seg_id
+        """, list(robot_by_traj))
+
+        out = []
+        by_robot: Dict[str, List[Dict]] = {}
+        for row in metadata_rows:
+            by_robot.setdefault(robot_by_traj[row['traj_id']], []).append(dict(row))
+
+        for robot_model, rows in by_robot.items():
+            calculator = calculators[robot_model]
+            matrix, valid = calculator.compute_metadata_embeddings_batch(rows)
+            version = calculator.version_hashes()['metadata']
+            out.extend(
+                {
+                    'seg_id':    row['seg_id'],
+                    'traj_id':   row['traj_id'],
+                    'embedding': matrix[i] if valid[i] else None,
+                    'version':   version,
+                }
+                for i, row in enumerate(rows)
+            )
+        return out
+
+    async def switch_shadow(self, mode: str) -> int:
+        return await self.service.binary_writer.switch_shadow(mode)
@@ -0,0 +1,282 @@
+# backend/app/utils/metadata_embeddings/job_store.py
+"""
+Persistenter Job-Store für Background-Tasks (SQLite, eine Datei pro Host).
+
+- jobs:      Status + frei strukturierter State (JSON) pro task_id
+- job_items: eine Zeile pro traj_id mit Lease (owner, expires) und Checkpoint
+             (pending → leased → done/failed)
+
+Mehrere Prozesse (uvicorn-Worker) können sich einen Job teilen: jeder least
+Batches von pending- oder abgelaufenen Items. Ein abgestürzter Worker gibt
+seine Items durch Ablauf der Lease automatisch wieder frei; fortgesetzt wird
+ab dem letzten committeten Batch.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Fester Ort neben dem Backend statt relativ zum Arbeitsverzeichnis (TASK_STORE_PATH überschreibt)
+_DEFAULT_STORE_PATH = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'task_store.sqlite3')
+TASK_STORE_PATH     = os.path.abspath(os.getenv('TASK_STORE_PATH', _DEFAULT_STORE_PATH))
+LEASE_SECONDS   = 120
+MAX_ERRORS      = 50   # Fehlermeldungen pro Job in get()
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    task_id    TEXT PRIMARY KEY,
+    task_type  TEXT NOT NULL,
+    status     TEXT NOT NULL,
+    state      TEXT NOT NULL,
+    updated_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS job_items (
+    task_id          TEXT NOT NULL,
+    traj_id          TEXT NOT NULL,
+    needs_metadata   INTEGER NOT NULL,
+    needs_embeddings INTEGER NOT NULL,
+    status           TEXT NOT NULL DEFAULT 'pending',
+    attempts         INTEGER NOT NULL DEFAULT 0,
+    lease_owner      TEXT,
+    lease_expires    REAL,
+    error            TEXT,
+    PRIMARY KEY (task_id, traj_id)
+);
+CREATE INDEX IF NOT EXISTS job_items_status ON job_items (task_id, status);
+"""
+
+
+class JobStore:
+    def __init__(self, path: str = TASK_STORE_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._connect() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.executescript(_SCHEMA)
+
+    @contextmanager
+    def _connect(self):
+        db = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        db.row_factory = sqlite3.Row
+        try:
+            yield db
+        finally:
+            db.close()
+
+    @contextmanager
+    def _transaction(self):
+        """Schreib-Transaktion (BEGIN IMMEDIATE → kein Lease-Race zwischen Prozessen)."""
+        with self._connect() as db:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                yield db
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    # ── Jobs ─────────────────────────────────────────────────────────────
+
+    def create(self, task_id: str, task_type: str, state: Dict):
+        with self._transaction() as db:
+            db.execute(
+                "INSERT OR REPLACE INTO jobs (task_id, task_type, status, state, updated_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (task_id, task_type, state.get('status', 'pending'), json.dumps(state), time.time())
+            )
+
+    def update(self, task_id: str, **fields):
+        """Merged fields in den State; 'details' wird eine Ebene tief gemerged."""
+        with self._transaction() as db:
+            row = db.execute("SELECT state FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                return
+            state = json.loads(row['state'])
+            details = fields.pop('details', None)
+            state.update(fields)
+            if details:
+                state.setdefault('details', {}).update(details)
+            db.execute(
+                "UPDATE jobs SET status = ?, state = ?, updated_at = ? WHERE task_id = ?",
+                (state.get('status', 'pending'), json.dumps(state), time.time(), task_id)
+            )
+
+    def get(self, task_id: str) -> Optional[Dict]:
+        """State inkl. Fortschritt aus den Item-Checkpoints."""
+        with self._connect() as db:
+            row = db.execute("SELECT state FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+            if row is None:
+                return None
+            state = json.loads(row['state'])
+            self._merge_progress(db, task_id, state)
+            return state
+
+    def all(self) -> Dict[str, Dict]:
+        with self._connect() as db:
+            rows = db.execute("SELECT task_id, state FROM jobs").fetchall()
+            out = {}
+            for row in rows:
+                state = json.loads(row['state'])
+                self._merge_progress(db, row['task_id'], state)
+                out[row['task_id']] = state
+            return out
+
+    def delete_finished_older_than(self, max_age_hours: float) -> int:
+        cutoff = time.time() - max_age_hours * 3600
+        with self._transaction() as db:
+            ids = [r['task_id'] for r in db.execute(
+                "SELECT task_id FROM jobs WHERE status NOT IN ('pending', 'running') AND updated_at < ?",
+                (cutoff,)
+            )]
+            db.executemany("DELETE FROM job_items WHERE task_id = ?", [(i,) for i in ids])
+            db.executemany("DELETE FROM jobs WHERE task_id = ?", [(i,) for i in ids])
+            return len(ids)
+
+    def unfinished(self, task_type: str) -> Dict[str, Dict]:
+        """pending-/running-Jobs eines Typs (ohne Item-Fortschritt)."""
+        with self._connect() as db:
+            rows = db.execute(
+                "SELECT task_id, state FROM jobs WHERE task_type = ? AND status IN ('pending', 'running')",
+                (task_type,)
+            ).fetchall()
+            return {row['task_id']: json.loads(row['state']) for row in rows}
+
+    def resumable(self, task_type: str) -> List[str]:
+        """Laufende Jobs mit pending- oder abgelaufenen Items."""
+        with self._connect() as db:
+            rows = db.execute(
+                """
+                SELECT DISTINCT j.task_id
+                FROM jobs j JOIN job_items i ON i.task_id = j.task_id
+                WHERE j.task_type = ? AND j.status = 'running'
+                  AND (i.status = 'pending' OR (i.status = 'leased' AND i.lease_expires < ?))
+                """,
+                (task_type, time.time())
+            ).fetchall()
+            return [r['task_id'] for r in rows]
+
+    @staticmethod
+    def _merge_progress(db: sqlite3.Connection, task_id: str, state: Dict):
+        counts = dict(db.execute(
+            "SELECT status, COUNT(*) FROM job_items WHERE task_id = ? GROUP BY status", (task_id,)
+        ).fetchall())
+        if not counts:
+            return
+        done, failed = counts.get('done', 0), counts.get('failed', 0)
+        state['total_trajs']      = sum(counts.values())
+        state['processed_trajs']  = done + failed
+        state['successful_trajs'] = done
+        state['failed_trajs']     = failed
+        state['errors'] = [
+            f"{r['traj_id']}: {r['error']}" for r in db.execute(
+                "SELECT traj_id, error FROM job_items WHERE task_id = ? AND status = 'failed' LIMIT ?",
+                (task_id, MAX_ERRORS)
+            )
+        ]
+
+    # ── Items (Leases + Checkpoints) ─────────────────────────────────────
+
+    def add_items(self, task_id: str, items: Iterable[Tuple[str, bool, bool]]):
+        """items: (traj_id, needs_metadata, needs_embeddings)"""
+        with self._transaction() as db:
+            db.executemany(
+                "INSERT OR IGNORE INTO job_items (task_id, traj_id, needs_metadata, needs_embeddings) "
+                "VALUES (?, ?, ?, ?)",
+                [(task_id, t, int(m), int(e)) for t, m, e in items]
+            )
+
+    def lease(self, task_id: str, owner: str, n: int, lease_seconds: float = LEASE_SECONDS) -> List[Dict]:
+        """
+        Least bis zu n Items (pending oder mit abgelaufener Lease).
+        Liefert nichts, wenn der Job nicht (mehr) läuft — z. B. nach Cancel.
+        """
+        now = time.time()
+        with self._transaction() as db:
+            job = db.execute("SELECT status FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+            if job is None or job['status'] != 'running':
+                return []
+            rows = db.execute(
+                """
+                SELECT traj_id, needs_metadata, needs_embeddings, attempts
+                FROM job_items
+                WHERE task_id = ?
+                  AND (status = 'pending' OR (status = 'leased' AND lease_expires < ?))
+                LIMIT ?
+                """,
+                (task_id, now, n)
+            ).fetchall()
+            db.executemany(
+                "UPDATE job_items SET status = 'leased', attempts = attempts + 1, "
+                "lease_owner = ?, lease_expires = ? WHERE task_id = ? AND traj_id = ?",
+                [(owner, now + lease_seconds, task_id, r['traj_id']) for r in rows]
+            )
+            return [
+                {
+                    'traj_id':          r['traj_id'],
+                    'needs_metadata':   bool(r['needs_metadata']),
+                    'needs_embeddings': bool(r['needs_embeddings']),
+                    'attempts':         r['attempts'] + 1,
+                }
+                for r in rows
+            ]
+
+    def renew(self, task_id: str, owner: str, lease_seconds: float = LEASE_SECONDS):
+        with self._transaction() as db:
+            db.execute(
+                "UPDATE job_items SET lease_expires = ? "
+                "WHERE task_id = ? AND lease_owner = ? AND status = 'leased'",
+                (time.time() + lease_seconds, task_id, owner)
+            )
+
+    def release(self, task_id: str, owner: str, traj_ids: List[str]):
+        """Lease vorzeitig zurückgeben (z. B. nach einem vorübergehenden Fehler) → wieder pending."""
+        with self._transaction() as db:
+            db.executemany(
+                "UPDATE job_items SET status = 'pending', lease_owner = NULL, lease_expires = NULL "
+                "WHERE task_id = ? AND traj_id = ? AND lease_owner = ? AND status = 'leased'",
+                [(task_id, t, owner) for t in traj_ids]
+            )
+
+    def complete(
+            self,
+            task_id: str,
+            owner: str,
+            done: List[str],
+            failed: Dict[str, str],
+            metadata_written: int = 0,
+            embeddings_written: int = 0,
+    ):
+        """Checkpoint nach erfolgreichem Write: Items done/failed + Zähler in einer Transaktion."""
+        with self._transaction() as db:
+            db.executemany(
+                "UPDATE job_items SET status = 'done', lease_owner = NULL, lease_expires = NULL "
+                "WHERE task_id = ? AND traj_id = ? AND lease_owner = ?",
+                [(task_id, t, owner) for t in done]
+            )
+            db.executemany(
+                "UPDATE job_items SET status = 'failed', error = ?, lease_owner = NULL, lease_expires = NULL "
+                "WHERE task_id = ? AND traj_id = ? AND lease_owner = ?",
+                [(err, task_id, t, owner) for t, err in failed.items()]
+            )
+            row = db.execute("SELECT state FROM jobs WHERE task_id = ?", (task_id,)).fetchone()
+            if row is not None:
+                state = json.loads(row['state'])
+                details = state.setdefault('details', {})
+                details['metadata_written'] = details.get('metadata_written', 0) + metadata_written
+                details['embeddings_written'] = details.get('embeddings_written', 0) + embeddings_written
+                if done or failed:
+                    state['current_traj'] = (done or list(failed))[-1]
+                db.execute(
+                    "UPDATE jobs SET state = ?, updated_at = ? WHERE task_id = ?",
+                    (json.dumps(state), time.time(), task_id)
+                )
+
+    def remaining(self, task_id: str) -> int:
+        with self._connect() as db:
+            return db.execute(
+                "SELECT COUNT(*) FROM job_items WHERE task_id = ? AND status IN ('pending', 'leased')",
+                (task_id,)
+            ).fetchone()[0]
@@ -0,0 +1,66 @@
+# backend/app/utils/metadata_embeddings/pending_work.py
+"""
+Outbox für fehlende Metadaten/Embeddings.
+
+Der Upload trägt neue traj_ids (in derselben Transaktion wie traj_info) in
+motion.traj_pending_work ein. Nach erfolgreichem Write (in derselben
+Transaktion wie der COPY) wird pro Bahn nur der Teil abgehakt, der
+tatsächlich geschrieben wurde; die Zeile verschwindet erst, wenn weder
+Metadaten noch Embeddings mehr fehlen. "all_missing" liest nur noch
+diese kleine Tabelle statt traj_info gegen traj_metadata/traj_embeddings
+per Anti-Join zu scannen.
+
+Tabelle und einmaliges Seeding per Anti-Join: scripts/migrate_schema.py
+(Schritt pending_work) — hier nur noch INSERT/SELECT, keine DDL.
+"""
+
+import logging
+from typing import List, Tuple
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# psycopg-Varianten für den Writer (gleiche Transaktion wie der COPY), Parameter
+# metadata / embeddings = traj_ids, deren Metadaten bzw. Embeddings jetzt vorliegen.
+# Erst vollständig erledigte Zeilen löschen, dann bei den übrigen die Teile abhaken.
+CONSUME_PENDING_WORK_SQL = """
+    DELETE FROM motion.traj_pending_work
+    WHERE (traj_id = ANY(%(metadata)s) OR traj_id = ANY(%(embeddings)s))
+      AND (NOT needs_metadata   OR traj_id = ANY(%(metadata)s))
+      AND (NOT needs_embeddings OR traj_id = ANY(%(embeddings)s))
+"""
+RESOLVE_PENDING_WORK_SQL = """
+    UPDATE motion.traj_pending_work
+    SET needs_metadata   = needs_metadata   AND NOT traj_id = ANY(%(metadata)s),
+        needs_embeddings = needs_embeddings AND NOT traj_id = ANY(%(embeddings)s)
+    WHERE traj_id = ANY(%(metadata)s) OR traj_id = ANY(%(embeddings)s)
+"""
+
+
+async def enqueue_pending_work(conn: asyncpg.Connection, traj_ids: List[str]) -> None:
+    """Neue Bahnen vormerken (im Upload in derselben Transaktion wie traj_info)."""
+    if not traj_ids:
+        return
+    await conn.execute("""
+        INSERT INTO motion.traj_pending_work (traj_id)
+        SELECT unnest($1::text[])
+        ON CONFLICT (traj_id) DO UPDATE
+            SET needs_metadata = TRUE, needs_embeddings = TRUE, enqueued_at = NOW()
+    """, traj_ids)
+
+
+async def fetch_pending_work(conn: asyncpg.Connection) -> Tuple[List[str], List[str]]:
+    """
+    Returns:
+        (missing_metadata_ids, missing_embedding_ids)
+    """
+    rows = await conn.fetch("""
+        SELECT traj_id, needs_metadata, needs_embeddings
+        FROM motion.traj_pending_work
+        ORDER BY traj_id
+    """)
+    return (
+        [row['traj_id'] for row in rows if row['needs_metadata']],
+        [row['traj_id'] for row in rows if row['needs_embeddings']],
+    )
@@ -0,0 +1,552 @@
+# backend/app/utils/multimodal_framework/batch_searcher.py
+"""
+Set-basierte Stage-1 Suche für viele Targets auf einmal.
+
+Statt pro Target (und pro Segment) eigene Lookups + eine HNSW-Query pro
+Modus abzusetzen, werden alle Query-IDs in einem Rutsch aufgelöst und die
+kNN-Suche pro Modus als eine einzige LATERAL-Query über alle Targets
+ausgeführt. Jede LATERAL-Iteration nutzt weiterhin den HNSW-Index.
+
+Das Ergebnis pro Target hat exakt dieselbe Struktur wie
+MultiModalSearcher.search_similar(), damit Stage 2 und die Prognose
+unverändert weiterarbeiten können.
+"""
+
+import asyncio
+import asyncpg
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+import logging
+
+from .multi_modal_searcher import _SingleConnContext
+from .rrf_ranker import RRFRanker
+from .filter_searcher import FilterSearcher
+from .shape_searcher import _array_to_vector_str
+from ..metadata_embeddings.embedding_calculator import CANDIDATE_SEG_ID
+
+logger = logging.getLogger(__name__)
+
+ALL_MODES = ['joint', 'position', 'orientation', 'velocity', 'metadata']
+
+
+class MultiModalBatchSearcher:
+
+    def __init__(self, conn_or_pool):
+        if isinstance(conn_or_pool, asyncpg.Pool):
+            self._pool: Optional[asyncpg.Pool] = conn_or_pool
+            self._conn: Optional[asyncpg.Connection] = None
+        else:
+            self._pool = None
+            self._conn = conn_or_pool
+
+        self.ranker = RRFRanker(k=60)
+
+    def _acquire(self):
+        if self._pool:
+            return self._pool.acquire()
+        return _SingleConnContext(self._conn)
+
+    # =========================================================================
+    # PUBLIC
+    # =========================================================================
+
+    async def search_similar_batch(
+            self,
+            target_ids: List[str],
+            modes: Optional[List[str]] = None,
+            weights: Optional[Dict[str, float]] = None,
+            limit: int = 10,
+            metric: str = 'sidtw',
+            buffer_factor: int = 5,
+            include_tags: Optional[List[str]] = None,
+            exclude_tags: Optional[List[str]] = None,
+            exclude_ids: Optional[List[str]] = None,
+            include_ids: Optional[List[str]] = None,
+    ) -> Dict[str, Dict]:
+        """
+        Stage 1 für gespeicherte Trajektorien.
+
+        Returns:
+            Dict[target_id, result] — result wie MultiModalSearcher.search_similar()
+        """
+        modes   = modes or list(ALL_MODES)
+        weights = weights or {mode: 1.0 / len(modes) for mode in modes}
+        search_limit = max(limit, limit * buffer_factor)
+
+        # ── Targets + Segmente + Features + Embedding-Status in 3 Queries ─
+        async with self._acquire() as conn:
+            target_rows = await conn.fetch(
+                "SELECT seg_id, traj_id FROM motion.traj_metadata WHERE seg_id = ANY($1)",
+                list(target_ids),
+            )
+            target_traj = {r['seg_id']: r['traj_id'] for r in target_rows}
+            traj_ids    = sorted(set(target_traj.values()))
+
+            seg_rows = await conn.fetch(
+                """
+                SELECT traj_id, seg_id FROM motion.traj_metadata
+                WHERE traj_id = ANY($1) AND seg_id != traj_id
+                ORDER BY traj_id, seg_id
+                """,
+                traj_ids,
+            )
+            segments_by_traj: Dict[str, List[str]] = defaultdict(list)
+            for r in seg_rows:
+                segments_by_traj[r['traj_id']].append(r['seg_id'])
+
+            query_ids = traj_ids + [r['seg_id'] for r in seg_rows]
+            features  = await self._get_features_batch(
+                conn, sorted(set(query_ids) | set(target_traj)), metric
+            )
+            status    = await self._check_embeddings_exist_batch(conn, query_ids)
+
+        candidate_trajs, candidate_segs, filter_error = await self._shared_candidates(
+            include_tags, exclude_tags, exclude_ids, include_ids
+        )
+
+        # ── kNN pro Modus — eine LATERAL-Query je Ebene ───────────────────
+        traj_queries = [(tid, tid) for tid in traj_ids]
+        seg_queries  = [(r['seg_id'], r['traj_id']) for r in seg_rows]
+
+        traj_rankings, seg_rankings = {}, {}
+        if not filter_error:
+            traj_rankings, seg_rankings = await asyncio.gather(
+                self._rank_all_modes(traj_queries, modes, search_limit, candidate_trajs, only_traj=True),
+                self._rank_all_modes(seg_queries,  modes, search_limit, candidate_segs,  only_traj=False),
+            )
+
+        fused_traj = self._fuse(traj_rankings, status, modes, weights, limit)
+        fused_seg  = self._fuse(seg_rankings,  status, modes, weights, limit)
+
+        all_hits = {r['seg_id'] for res in (*fused_traj.values(), *fused_seg.values()) for r in res}
+        async with self._acquire() as conn:
+            hit_features = await self._get_features_batch(conn, list(all_hits), metric)
+
+        # ── Ergebnisse pro Target zusammensetzen ──────────────────────────
+        out: Dict[str, Dict] = {}
+        for target_id in target_ids:
+            traj_id = target_traj.get(target_id)
+            if not traj_id:
+                out[target_id] = {
+                    'error': f"Target {target_id} not found",
+                    'traj_similarity': {},
+                    'segment_similarity': []
+                }
+                continue
+            if filter_error:
+                # wie die Einzelsuche: leerer Pre-Filter ist ein Fehler, kein leeres Ergebnis
+                out[target_id] = {
+                    'error': filter_error,
+                    'traj_similarity': {},
+                    'segment_similarity': []
+                }
+                continue
+
+            result = {
+                'target_id': target_id,
+                'target_traj_id': traj_id,
+                'target_traj_features': features.get(target_id),
+                'modes': modes,
+                'weights': weights,
+                'metric': metric,
+                'traj_similarity': self._level_result(
+                    traj_id, fused_traj, status, modes, weights, hit_features,
+                    f"No embeddings available for traj {traj_id}",
+                ),
+                'segment_similarity': [],
+                'metadata': {}
+            }
+
+            target_segments = segments_by_traj.get(traj_id, [])
+            result['metadata']['target_segments_count'] = len(target_segments)
+            if target_segments:
+                result['segment_similarity'] = [
+                    {
+                        'target_segment': seg_id,
+                        'target_segment_features': features.get(seg_id),
+                        'similar_segments': self._level_result(
+                            seg_id, fused_seg, status, modes, weights, hit_features,
+                            f"No embeddings for segment {seg_id}",
+                        ),
+                    }
+                    for seg_id in target_segments
+                ]
+                result['metadata']['segments_processed'] = len(target_segments)
+
+            out[target_id] = result
+
+        logger.info(
+            f"[Batch Stage 1] {len(target_ids)} targets, "
+            f"{len(traj_queries)} traj + {len(seg_queries)} segment queries"
+        )
+        return out
+
+    async def search_candidates_batch(
+            self,
+            candidates: List[Dict[str, Dict[str, list]]],
+            modes: Optional[List[str]] = None,
+            weights: Optional[Dict[str, float]] = None,
+            limit: int = 10,
+            metric: str = 'sidtw',
+            buffer_factor: int = 5,
+            include_tags: Optional[List[str]] = None,
+            exclude_tags: Optional[List[str]] = None,
+            exclude_ids: Optional[List[str]] = None,
+            include_ids: Optional[List[str]] = None,
+    ) -> List[Dict]:
+        """
+        Stage 1 für mehrere externe (ungespeicherte) Kandidaten.
+
+        Args:
+            candidates: pro Kandidat ein Dict[seg_id, Dict[mode, embedding]] —
+                        ein Eintrag pro Query-Segment (wie segment_embeddings_map
+                        bei MultiModalSearcherCandidate bzw. {CANDIDATE_SEG_ID: ...})
+
+        Returns:
+            Liste von Results (gleiche Reihenfolge), Struktur wie
+            MultiModalSearcherCandidate.search_similar()
+        """
+        modes   = modes or list(ALL_MODES)
+        weights = weights or {m: 1.0 for m in modes}
+        search_limit = max(limit, limit * buffer_factor)
+
+        # Interne Keys müssen über alle Kandidaten eindeutig sein — die
+        # seg_ids (externalcandidate_0, …) wiederholen sich pro Kandidat.
+        queries: List[Tuple[str, Dict[str, list]]] = []
+        for i, seg_map in enumerate(candidates):
+            for seg_id, emb in seg_map.items():
+                queries.append((f"{i}:{seg_id}", emb))
+
+        status = {
+            key: {mode: emb.get(mode) is not None for mode in ALL_MODES}
+            for key, emb in queries
+        }
+
+        _, candidate_segs, filter_error = await self._shared_candidates(
+            include_tags, exclude_tags, exclude_ids, include_ids
+        )
+
+        seg_rankings = {}
+        if not filter_error:
+            async def _one_mode(mode: str):
+                vectors = [
+                    (key, CANDIDATE_SEG_ID, _array_to_vector_str(emb[mode]))
+                    for key, emb in queries if emb.get(mode) is not None
+                ]
+                async with self._acquire() as conn:
+                    return mode, await self._knn_external(conn, mode, vectors, search_limit, candidate_segs)
+
+            seg_rankings = dict(await asyncio.gather(*[_one_mode(m) for m in modes]))
+
+        fused_seg = self._fuse(seg_rankings, status, modes, weights, limit)
+
+        all_hits = {r['seg_id'] for res in fused_seg.values() for r in res}
+        async with self._acquire() as conn:
+            hit_features = await self._get_features_batch(conn, list(all_hits), metric)
+
+        out = []
+        for i, seg_map in enumerate(candidates):
+            if filter_error:
+                out.append({'error': filter_error, 'traj_similarity': {}, 'segment_similarity': []})
+                continue
+            groups = [
+                {
+                    'target_segment':          seg_id,
+                    'target_segment_features': None,
+                    'similar_segments':        self._level_result(
+                        f"{i}:{seg_id}", fused_seg, status, modes, weights, hit_features,
+                        f"No embeddings for segment {seg_id}", target=seg_id,
+                    ),
+                }
+                for seg_id in seg_map
+            ]
+            out.append({
+                'target_id':            CANDIDATE_SEG_ID,
+                'target_traj_id':       CANDIDATE_SEG_ID,
+                'target_traj_features': None,
+                'modes':                modes,
+                'weights':              weights,
+                'metric':               metric,
+                'traj_similarity':      {'results': []},
+                'segment_similarity':   groups,
+                'metadata':             {'target_segments_count': len(groups)},
+            })
+        return out
+
+    # =========================================================================
+    # PRIVATE — SUCHE
+    # =========================================================================
+
+    async def _shared_candidates(
+            self,
+            include_tags: Optional[List[str]],
+            exclude_tags: Optional[List[str]],
+            exclude_ids: Optional[List[str]],
+            include_ids: Optional[List[str]],
+    ) -> Tuple[Optional[List[str]], Optional[List[str]], Optional[str]]:
+        """
+        Tag/ID-Filter hängen nicht vom Target ab → einmal für den ganzen Batch.
+        Das Target selbst wird in der kNN-Query über traj_id ausgeschlossen.
+        """
+        if not (include_tags or exclude_tags or exclude_ids or include_ids):
+            return None, None, None
+
+        async with self._acquire() as conn:
+            prefilter = FilterSearcher(conn)
+            candidate_ids = await prefilter.get_filtered_candidates(
+                CANDIDATE_SEG_ID,
+                include_tags=include_tags,
+                exclude_tags=exclude_tags,
+                exclude_ids=exclude_ids,
+                include_ids=include_ids,
+            )
+            traj_candidates = await prefilter._filter_only_trajs(candidate_ids)
+            seg_candidates  = await prefilter._filter_only_segments(candidate_ids)
+
+        logger.info(
+            f"[Pre-Filter Batch] {len(traj_candidates)} traj / "
+            f"{len(seg_candidates)} segment candidates"
+        )
+        if not traj_candidates and not seg_candidates:
+            return [], [], 'No candidates after pre-filter'
+        return traj_candidates, seg_candidates, None
+
+    async def _rank_all_modes(
+            self,
+            queries: List[Tuple[str, str]],
+            modes: List[str],
+            limit: int,
+            candidate_ids: Optional[List[str]],
+            only_traj: bool,
+    ) -> Dict[str, Dict[str, List[Dict]]]:
+        if not queries:
+            return {}
+        if candidate_ids is not None and not candidate_ids:
+            return {}
+
+        async def _one_mode(mode: str):
+            async with self._acquire() as conn:
+                return mode, await self._knn_stored(conn, mode, queries, limit, candidate_ids, only_traj)
+
+        return dict(await asyncio.gather(*[_one_mode(m) for m in modes]))
+
+    async def _knn_stored(
+            self,
+            conn: asyncpg.Connection,
+            mode: str,
+            queries: List[Tuple[str, str]],
+            limit: int,
+            candidate_ids: Optional[List[str]],
+            only_traj: bool,
+    ) -> Dict[str, List[Dict]]:
+        embedding_col = f"{mode}_embedding"
+        params = [[q[0] for q in queries], limit]
+        if candidate_ids is not None:
+            params.append(candidate_ids)
+
+        sql = f"""
+            WITH targets AS (
+                SELECT te.seg_id AS target_id, te.traj_id AS target_traj_id,
+                       te.{embedding_col} AS q
+                FROM motion.traj_embeddings te
+                WHERE te.seg_id = ANY($1::text[]) AND te.{embedding_col} IS NOT NULL
+            )
+            {self._lateral_knn(embedding_col, only_traj, limit_param=2,
+                               candidate_param=3 if candidate_ids is not None else None)}
+        """
+        return await self._fetch_knn(conn, mode, sql, params)
+
+    async def _knn_external(
+            self,
+            conn: asyncpg.Connection,
+            mode: str,
+            vectors: List[Tuple[str, str, str]],
+            limit: int,
+            candidate_ids: Optional[List[str]],
+    ) -> Dict[str, List[Dict]]:
+        if not vectors:
+            return {}
+        if candidate_ids is not None and not candidate_ids:
+            return {}
+
+        params = [[v[0] for v in vectors], [v[1] for v in vectors], [v[2] for v in vectors], limit]
+        if candidate_ids is not None:
+            params.append(candidate_ids)
+
+        sql = f"""
+            WITH targets AS (
+                SELECT t.target_id, t.target_traj_id, t.emb::vector AS q
+                FROM unnest($1::text[], $2::text[], $3::text[]) AS t(target_id, target_traj_id, emb)
+            )
+            {self._lateral_knn(f"{mode}_embedding", False, limit_param=4,
+                               candidate_param=5 if candidate_ids is not None else None)}
+        """
+        return await self._fetch_knn(conn, mode, sql, params)
+
+    @staticmethod
+    def _lateral_knn(
+            embedding_col: str,
+            only_traj: bool,
+            limit_param: int,
+            candidate_param: Optional[int] = None,
+    ) -> str:
+        where_conditions = [
+            "e.seg_id != t.target_id",
+            "e.traj_id != t.target_traj_id",
+            f"e.{embedding_col} IS NOT NULL",
+            "e.seg_id = e.traj_id" if only_traj else "e.seg_id != e.traj_id",
+        ]
+        if candidate_param is not None:
+            where_conditions.append(f"e.seg_id = ANY(${candidate_param}::text[])")
+
+        return f"""
+            SELECT t.target_id, c.seg_id, c.traj_id, c.distance
+            FROM targets t
+            CROSS JOIN LATERAL (
+                SELECT e.seg_id, e.traj_id, e.{embedding_col} <=> t.q AS distance
+                FROM motion.traj_embeddings e
+                WHERE {" AND ".join(where_conditions)}
+                ORDER BY distance, e.seg_id
+                LIMIT ${limit_param}
+            ) c
+            ORDER BY t.target_id, c.distance, c.seg_id
+        """
+
+    @staticmethod
+    async def _fetch_knn(
+            conn: asyncpg.Connection,
+            mode: str,
+            sql: str,
+            params: list,
+    ) -> Dict[str, List[Dict]]:
+        await conn.execute("SET hnsw.ef_search = 500;")
+        rows = await conn.fetch(sql, *params)
+
+        ranked: Dict[str, List[Dict]] = defaultdict(list)
+        for row in rows:
+            bucket = ranked[row['target_id']]
+            bucket.append({
+                'seg_id':   row['seg_id'],
+                'traj_id':  row['traj_id'],
+                'distance': float(row['distance']),
+                'rank':     len(bucket) + 1,
+                'mode':     mode,
+            })
+        logger.info(f"{mode.upper()} batch search: {len(ranked)} targets, {len(rows)} rows")
+        return ranked
+
+    # =========================================================================
+    # PRIVATE — FUSION + ERGEBNIS
+    # =========================================================================
+
+    def _fuse(
+            self,
+            rankings: Dict[str, Dict[str, List[Dict]]],
+            status: Dict[str, Dict[str, bool]],
+            modes: List[str],
+            weights: Dict[str, float],
+            limit: int,
+    ) -> Dict[str, List[Dict]]:
+        # rankings: Dict[mode, Dict[target, results]] → Dict[target, Dict[mode, results]]
+        batch_rankings: Dict[str, Dict[str, List[Dict]]] = defaultdict(dict)
+        for mode, per_target in rankings.items():
+            for key, results in per_target.items():
+                if status.get(key, {}).get(mode):
+                    batch_rankings[key][mode] = results
+
+        fused = {}
+        for key, per_mode in batch_rankings.items():
+            for mode in modes:
+                if status.get(key, {}).get(mode):
+                    per_mode.setdefault(mode, [])
+            fused[key] = self.ranker.fuse_rankings(per_mode, weights)[:limit]
+        return fused
+
+    @staticmethod
+    def _level_result(
+            key: str,
+            fused: Dict[str, List[Dict]],
+            status: Dict[str, Dict[str, bool]],
+            modes: List[str],
+            weights: Dict[str, float],
+            hit_features: Dict[str, Dict],
+            no_embedding_error: str,
+            target: Optional[str] = None,
+    ) -> Dict:
+        available_modes = [m for m in modes if status.get(key, {}).get(m, False)]
+        if not available_modes:
+            return {'error': no_embedding_error, 'results': []}
+
+        results = []
+        for r in fused.get(key, []):
+            r = dict(r)
+            if r['seg_id'] in hit_features:
+                r['features'] = dict(hit_features[r['seg_id']])
+            results.append(r)
+
+        return {
+            'target': target or key,
+            'results': results,
+            'metadata': {'modes': available_modes, 'weights': weights},
+        }
+
+    # =========================================================================
+    # PRIVATE — HELPERS
+    # =========================================================================
+
+    @staticmethod
+    async def _get_features_batch(
+            conn: asyncpg.Connection,
+            seg_ids: List[str],
+            metric: str = 'sidtw',
+    ) -> Dict[str, Dict]:
+        if not seg_ids:
+            return {}
+
+        allowed_metrics = {'sidtw', 'qdtw'}
+        if metric not in allowed_metrics:
+            metric = 'sidtw'
+
+        metric_table = f"evaluation.{metric}_info"
+        rows = await conn.fetch(
+            f"""
+            SELECT
+                bm.seg_id, bm.traj_id, bm.duration, bm.weight, bm.length,
+                bm.movement_type, bm.mean_vel, bm.max_vel, bm.std_vel,
+                bm.min_accel, bm.mean_accel, bm.max_accel, bm.std_accel,
+                bm.position_x, bm.position_y, bm.position_z,
+                mi.{metric}_min_distance     AS min_distance,
+                mi.{metric}_average_distance AS mean_distance,
+                mi.{metric}_max_distance     AS max_distance
+            FROM motion.traj_metadata bm
+            LEFT JOIN {metric_table} mi ON bm.seg_id = mi.seg_id
+            WHERE bm.seg_id = ANY($1)
+            """,
+            seg_ids,
+        )
+        return {row['seg_id']: dict(row) for row in rows}
+
+    @staticmethod
+    async def _check_embeddings_exist_batch(
+            conn: asyncpg.Connection,
+            seg_ids: List[str],
+    ) -> Dict[str, Dict[str, bool]]:
+        if not seg_ids:
+            return {}
+        rows = await conn.fetch(
+            """
+            SELECT seg_id,
+                   joint_embedding       IS NOT NULL AS has_joint,
+                   position_embedding    IS NOT NULL AS has_position,
+                   orientation_embedding IS NOT NULL AS has_orientation,
+                   velocity_embedding    IS NOT NULL AS has_velocity,
+                   metadata_embedding    IS NOT NULL AS has_metadata
+            FROM motion.traj_embeddings
+            WHERE seg_id = ANY($1)
+            """,
+            seg_ids,
+        )
+        return {
+            row['seg_id']: {mode: row[f'has_{mode}'] for mode in ALL_MODES}
+            for row in rows
+        }
@@ -5,26 +5,47 @@ Two-stage trajectory similarity search with optional prognosis.
 
 Used by:
   - FastAPI search endpoint  (similarity_route_handler.py)
+  - FastAPI batch endpoint   (similarity_route_handler.py) — run_similarity_pipeline_batch
+  - FastAPI stream endpoint  (similarity_route_handler.py) — stream_similarity_pipeline
   - FastAPI candidate endpoint (similarity_candidate_route_handler.py) — external/unsaved candidates
   - Offline calibration builder (calibration_set_builder.py)
+
+All three variants (DAG, batch, stream) share the same stage building blocks:
+_stage2_traj_ids / _load_trajectories (data loading), _stage2_jobs /
+_run_stage2_job / _apply_stage2 (DTW reranking) and _prognosis.
 """
 
 from __future__ import annotations
 
+import asyncio
 import logging
+import os
 import time
-from typing import Any, Dict, List, Literal, Optional
+from contextlib import AsyncExitStack, contextmanager
+from typing import Any, AsyncIterator, Callable, Dict, List, Literal, Optional, Tuple
 
 import asyncpg
 
 from .multi_modal_searcher import MultiModalSearcher, MultiModalSearcherCandidate
+from .batch_searcher import MultiModalBatchSearcher
 from ..metadata_embeddings.trajectory_loader import TrajectoryLoader, TrajectoryLoaderCandidate
-from ..metadata_embeddings.embedding_calculator import build_candidate_embeddings, build_candidate_embeddings_segmented, CANDIDATE_SEG_ID
+from ..metadata_embeddings.embedding_calculator import (
+    build_candidate_embeddings,
+    build_candidate_embeddings_batch,
+    build_candidate_embeddings_segmented,
+    CANDIDATE_SEG_ID,
+)
 from ..feature_prediction.predictor import predict_performance
 from .dtw_reranker import rerank
+from ..process_pool import get_process_pool
 
 logger = logging.getLogger(__name__)
 
+# DTW ist CPU-bound → große Rerankings laufen im gemeinsamen Prozess-Pool (utils/process_pool.py),
+# kleine (bis DTW_INLINE_MAX_CANDIDATES Kandidaten) in einem Thread ohne Pickling/IPC
+DTW_INLINE_MAX_CANDIDATES = int(os.getenv('DTW_INLINE_MAX_CANDIDATES', 25))
+PROGNOSIS_CONCURRENCY     = 8
+
 
 def _seg_id_to_traj_id(seg_id: str) -> str:
     return seg_id.rsplit('_', 1)[0]
@@ -40,11 +61,369 @@ def _normalize_stage1_ranks(result: Dict[str, Any]) -> None:
                 r['rank_stage1'] = r.pop('rank')
 
 
+def _segment_traj_ids(result: Dict[str, Any]) -> set:
+    """Eltern-traj_ids aller Segment-Kandidaten eines Stage-1 Ergebnisses."""
+    traj_ids = set()
+    for group in result.get('segment_similarity', []):
+        for r in group.get('similar_segments', {}).get('results', []):
+            cid = r.get('seg_id')
+            if cid:
+                traj_ids.add(_seg_id_to_traj_id(cid))
+    return traj_ids
+
+
+def _apply_dtw(results: List[Dict], dtw_results: List[Dict]) -> List[Dict]:
+    dtw_lookup = {r['id']: r for r in dtw_results}
+    enriched   = []
+    for r in results:
+        sid = r.get('seg_id')
+        if sid in dtw_lookup:
+            r['dtw_distance']     = dtw_lookup[sid]['dtw_distance']
+            r['similarity_score'] = dtw_lookup[sid]['similarity_score']
+            r['rank_stage2']      = dtw_lookup[sid]['rank']
+        enriched.append(r)
+    enriched.sort(key=lambda x: x.get('dtw_distance', float('inf')))
+    return enriched
+
+
+def _rerank_traj_level(
+    result:          Dict[str, Any],
+    query_arr:       Any,
+    candidates_traj: Dict[str, Any],
+    limit:           int,
+    dtw_mode:        str,
+) -> None:
+    traj_results = result.get('traj_similarity', {}).get('results', [])
+    candidates_flat = {
+        r['seg_id']: candidates_traj[r['seg_id']]['trajectory']
+        for r in traj_results
+        if candidates_traj.get(r.get('seg_id')) is not None
+        and candidates_traj[r['seg_id']].get('trajectory') is not None
+    }
+    if query_arr is None or not candidates_flat:
+        return
+    dtw_traj = rerank(query_seq=query_arr, candidates=candidates_flat, limit=limit, mode=dtw_mode)
+    result['traj_similarity']['results'] = _apply_dtw(traj_results, dtw_traj)
+
+
+def _rerank_segment_group(
+    group:       Dict[str, Any],
+    seg_batch:   Dict[str, Any],
+    limit:       int,
+    dtw_mode:    str,
+    is_external: bool,
+) -> bool:
+    query_seg_id = group.get('target_segment')
+    if not query_seg_id:
+        return False
+    seg_results = group.get('similar_segments', {}).get('results', [])
+    if not seg_results:
+        return False
+    query_traj_data = seg_batch.get(_seg_id_to_traj_id(query_seg_id))
+    if query_traj_data is None and is_external:
+        query_traj_data = seg_batch.get(query_seg_id)
+    if query_traj_data is None:
+        return False
+    query_arr = (query_traj_data.get('segments') or {}).get(query_seg_id)
+    if query_arr is None:
+        return False
+
+    candidates_seg_flat = {}
+    for r in seg_results:
+        cand_seg_id = r.get('seg_id')
+        if not cand_seg_id:
+            continue
+        cand_data = seg_batch.get(_seg_id_to_traj_id(cand_seg_id))
+        if cand_data is None:
+            continue
+        cand_arr = (cand_data.get('segments') or {}).get(cand_seg_id)
+        if cand_arr is not None:
+            candidates_seg_flat[cand_seg_id] = cand_arr
+
+    if not candidates_seg_flat:
+        return False
+
+    dtw_seg = rerank(query_seq=query_arr, candidates=candidates_seg_flat,
+                     limit=limit, mode=dtw_mode)
+    group['similar_segments']['results'] = _apply_dtw(seg_results, dtw_seg)
+    return True
+
+
+async def _load_external_segments(
+    external_payload: Dict[str, Any],
+    segment_groups:   List[Dict[str, Any]],
+    dtw_mode:         str,
+) -> Dict[str, Any]:
+    """Query-Arrays eines externen Kandidaten, gekeyt wie in seg_batch."""
+    out: Dict[str, Any] = {}
+    segment_indices = external_payload.get('segment_indices')
+
+    if segment_indices:
+        boundaries = [0] + segment_indices
+        traj = external_payload['trajectory']
+
+        for i, group in enumerate(segment_groups):
+            seg_id = group.get('target_segment')
+            if seg_id is None:
+                continue
+
+            start = boundaries[i]
+            end   = boundaries[i + 1] + 1
+
+            seg_payload = {
+                "trajectory": {
+                    "timestamps": traj['timestamps'][start:end],
+                    "positions":  traj['positions'][start:end],
+                    "quats":      traj.get('quats', [])[start:end],
+                    "joints":     traj.get('joints', [])[start:end],
+                },
+                "movement_type": external_payload['movement_type'],
+                "weight":        external_payload['weight'],
+            }
+
+            ext_loader = TrajectoryLoaderCandidate(seg_payload, candidate_seg_id=seg_id)
+            ext_data   = await ext_loader.load_trajectory_data(seg_id, dtw_mode)
+            if ext_data is not None:
+                out[seg_id] = ext_data
+
+    else:
+        ext_loader = TrajectoryLoaderCandidate(external_payload)
+        ext_data   = await ext_loader.load_trajectory_data(CANDIDATE_SEG_ID, dtw_mode)
+        if ext_data is not None:
+            out[CANDIDATE_SEG_ID] = ext_data
+
+    return out
+
+
+def _rerank_traj_worker(
+    result:          Dict[str, Any],
+    query_arr:       Any,
+    candidates_traj: Dict[str, Any],
+    limit:           int,
+    dtw_mode:        str,
+) -> Dict[str, Any]:
+    _rerank_traj_level(result, query_arr, candidates_traj, limit, dtw_mode)
+    return result['traj_similarity']
+
+
+def _rerank_group_worker(
+    group:       Dict[str, Any],
+    seg_batch:   Dict[str, Any],
+    limit:       int,
+    dtw_mode:    str,
+    is_external: bool,
+) -> Dict[str, Any]:
+    _rerank_segment_group(group, seg_batch, limit, dtw_mode, is_external)
+    return group
+
+
+def _group_seg_batch(group: Dict[str, Any], seg_batch: Dict[str, Any]) -> Dict[str, Any]:
+    """Nur die Trajektorien, die eine Segment-Gruppe braucht (klein halten fürs Pickling)."""
+    ids = {_seg_id_to_traj_id(r['seg_id'])
+           for r in group.get('similar_segments', {}).get('results', []) if r.get('seg_id')}
+    if group.get('target_segment'):
+        ids.add(_seg_id_to_traj_id(group['target_segment']))
+        ids.add(group['target_segment'])   # externe Query-Arrays sind per seg_id gekeyt
+    return {tid: seg_batch[tid] for tid in ids if tid in seg_batch}
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Gemeinsame Stages — DAG, Batch und Stream bauen darauf auf
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _stage2_traj_ids(result: Dict[str, Any], is_external: bool) -> set:
+    """Alle traj_ids, die Stage 2 für ein Stage-1 Ergebnis laden muss."""
+    ids = _segment_traj_ids(result)
+    if not is_external:
+        ids.add(result['target_traj_id'])
+        ids.update(r['seg_id'] for r in result.get('traj_similarity', {}).get('results', []) if r.get('seg_id'))
+    return ids
+
+
+async def _load_trajectories(pool: asyncpg.Pool, traj_ids, dtw_mode: str) -> Dict[str, Any]:
+    if not traj_ids:
+        return {}
+    async with pool.acquire() as conn:
+        return await TrajectoryLoader(conn).load_trajectories_batch(sorted(traj_ids), dtw_mode)
+
+
+# Ein DTW-Job: (index, n_candidates, fn, args) — index None = Bahn-Ebene, sonst Segment-Gruppe
+Stage2Job = Tuple[Optional[int], int, Callable, tuple]
+
+
+def _traj_job(
+    traj_similarity: Dict[str, Any],
+    seg_batch:       Dict[str, Any],
+    target_traj_id:  str,
+    limit:           int,
+    dtw_mode:        str,
+) -> Optional[Stage2Job]:
+    query_data = seg_batch.get(target_traj_id)
+    candidates = {r['seg_id']: seg_batch[r['seg_id']] for r in traj_similarity.get('results', [])
+                  if r.get('seg_id') in seg_batch and r['seg_id'] != target_traj_id}
+    if query_data is None or not candidates:
+        return None
+    return (None, len(candidates), _rerank_traj_worker,
+            ({'traj_similarity': traj_similarity}, query_data.get('trajectory'), candidates, limit, dtw_mode))
+
+
+def _group_job(
+    index:       int,
+    group:       Dict[str, Any],
+    seg_batch:   Dict[str, Any],
+    limit:       int,
+    dtw_mode:    str,
+    is_external: bool,
+) -> Optional[Stage2Job]:
+    n_candidates = len(group.get('similar_segments', {}).get('results', []))
+    if not n_candidates:
+        return None
+    return (index, n_candidates, _rerank_group_worker,
+            (group, _group_seg_batch(group, seg_batch), limit, dtw_mode, is_external))
+
+
+def _stage2_jobs(
+    result:      Dict[str, Any],
+    seg_batch:   Dict[str, Any],
+    limit:       int,
+    dtw_mode:    str,
+    is_external: bool,
+) -> List[Stage2Job]:
+    """DTW-Jobs eines Targets: Bahn-Ebene (nur gespeicherte Targets) + je Segment-Gruppe."""
+    jobs = []
+    if not is_external:
+        jobs.append(_traj_job(result.get('traj_similarity', {}), seg_batch,
+                              result.get('target_traj_id'), limit, dtw_mode))
+    for i, group in enumerate(result.get('segment_similarity', [])):
+        jobs.append(_group_job(i, group, seg_batch, limit, dtw_mode, is_external))
+    return [job for job in jobs if job is not None]
+
+
+async def _run_stage2_job(job: Stage2Job) -> Tuple[Optional[int], Dict[str, Any], float]:
+    """
+    DTW-Job ausführen: klein (bis DTW_INLINE_MAX_CANDIDATES Kandidaten) im
+    Thread, groß im Prozess-Pool. Gibt (index, Ergebnis, dtw_ms) zurück.
+    """
+    index, n_candidates, fn, args = job
+    t = time.time()
+    if n_candidates <= DTW_INLINE_MAX_CANDIDATES:
+        out = await asyncio.to_thread(fn, *args)
+    else:
+        out = await asyncio.get_running_loop().run_in_executor(get_process_pool(), fn, *args)
+    return index, out, round((time.time() - t) * 1000, 1)
+
+
+def _apply_stage2(result: Dict[str, Any], index: Optional[int], out: Dict[str, Any]) -> None:
+    if index is None:
+        result['traj_similarity'] = out
+    else:
+        result['segment_similarity'][index] = out
+
+
+async def _prognosis(
+    result:    Dict[str, Any],
+    seg_batch: Dict[str, Any],
+    conn:      asyncpg.Connection,
+    *,
+    limit:            int,
+    modes:            Optional[List[str]],
+    dtw_mode:         str,
+    metric:           str,
+    calibration_tag:  str,
+    coverage:         float,
+    conformal_active: bool,
+    pool:             Optional[asyncpg.Pool] = None,
+) -> Dict[str, Any]:
+    return await predict_performance(
+        result=result,
+        seg_batch=seg_batch,
+        conn=conn,
+        feature='mean_distance',
+        coverage=coverage,
+        calibration_tag=calibration_tag,
+        conformal_active=conformal_active,
+        k=limit,
+        search_modes=tuple(sorted(modes or [])),
+        dtw_mode=dtw_mode,
+        metric=metric,
+        pool=pool,
+    )
+
+
+class _TrajectoryCache:
+    """
+    Lädt jede traj_id genau einmal pro Pipeline-Lauf. Parallele Branches, die
+    dieselbe Trajektorie brauchen, warten auf denselben laufenden Load.
+    """
+
+    def __init__(self, pool: asyncpg.Pool, dtw_mode: str):
+        self._pool     = pool
+        self._dtw_mode = dtw_mode
+        self._tasks: Dict[str, asyncio.Future] = {}
+
+    async def _load(self, traj_ids: List[str]) -> Dict[str, Any]:
+        async with self._pool.acquire() as conn:
+            return await TrajectoryLoader(conn).load_trajectories_batch(traj_ids, self._dtw_mode)
+
+    async def get_many(self, traj_ids) -> Dict[str, Any]:
+        wanted  = list(dict.fromkeys(traj_ids))
+        missing = [tid for tid in wanted if tid not in self._tasks]
+        if missing:
+            task = asyncio.ensure_future(self._load(missing))
+            for tid in missing:
+                self._tasks[tid] = task
+
+        out = {}
+        for tid in wanted:
+            data = (await self._tasks[tid]).get(tid)
+            if data is not None:
+                out[tid] = data
+        return out
+
+    def snapshot(self) -> Dict[str, Any]:
+        out = {}
+        for tid, task in self._tasks.items():
+            if task.done() and not task.cancelled() and task.exception() is None:
+                data = task.result().get(tid)
+                if data is not None:
+                    out[tid] = data
+        return out
+
+
+class _StageClock:
+    """Sammelt (start, end)-Intervalle pro Stage — Stages überlappen sich im DAG."""
+
+    def __init__(self):
+        self._spans: Dict[str, List[tuple]] = {}
+
+    @contextmanager
+    def track(self, stage: str):
+        t = time.time()
+        try:
+            yield
+        finally:
+            self._spans.setdefault(stage, []).append((t, time.time()))
+
+    def wall_ms(self, stage: str) -> float:
+        """Vereinigung der Intervalle — wie lange die Stage insgesamt aktiv war."""
+        total, cur_start, cur_end = 0.0, None, None
+        for start, end in sorted(self._spans.get(stage, [])):
+            if cur_end is None or start > cur_end:
+                if cur_end is not None:
+                    total += cur_end - cur_start
+                cur_start, cur_end = start, end
+            else:
+                cur_end = max(cur_end, end)
+        if cur_end is not None:
+            total += cur_end - cur_start
+        return total * 1000
+
+
 async def run_similarity_pipeline(
     *,
     target_id: Optional[str] = None,
     pool: asyncpg.Pool,
-    conn: asyncpg.Connection,
+    conn: Optional[asyncpg.Connection] = None,
 
     # External candidate (unsaved, simulated) — mutually exclusive with target_id
     external_payload:              Optional[Dict[str, Any]] = None,
@@ -72,6 +451,25 @@ async def run_similarity_pipeline(
     coverage:         float = 0.90,
     conformal_active: bool  = True,
 ) -> Dict[str, Any]:
+    """
+    Läuft als nebenläufiger DAG statt strikt Stage für Stage:
+
+        Bahn-Suche      ──► Load Kandidaten ──► DTW Bahn
+        Segment-Suche i ──► Load Kandidaten ──► DTW Segment i     (je Segment)
+        Load Query-Trajektorie (startet sofort)
+
+    Jeder Branch lädt seine Trajektorien, sobald seine Kandidatenliste steht,
+    und startet DTW, sobald die Daten da sind. Loads werden über
+    _TrajectoryCache dedupliziert. Die Prognose wartet auf alle Branches.
+
+    Alle Branches holen ihre Connections selbst aus dem Pool; conn wird nur
+    für die Prognose genutzt (ohne conn ebenfalls aus dem Pool). Aufrufer
+    sollten vor dem Aufruf keine eigene Connection mehr halten.
+
+    timing: stage1_ms / data_loading_ms / stage2_ms sind die Wall-Clock-Zeiten,
+    in denen die jeweilige Stage aktiv war; overlap_ms ist die Zeit, die durch
+    Überlappung gegenüber der sequentiellen Summe eingespart wurde.
+    """
     t_start = time.time()
 
     is_external = external_payload is not None
@@ -85,262 +483,524 @@ async def run_similarity_pipeline(
     if prefilter_features is None:
         prefilter_features = []
 
-    # ── Stage 1 ──────────────────────────────────────────────────────────
-    t1 = time.time()
+    search_kwargs = dict(
+        limit=limit,
+        prefilter_features=prefilter_features,
+        metric=metric,
+        buffer_factor=buffer_factor,
+        include_tags=include_tags,
+        exclude_tags=exclude_tags,
+        exclude_ids=exclude_ids,
+        include_ids=include_ids,
+    )
+
+    clock = _StageClock()
+    cache = _TrajectoryCache(pool, dtw_mode)
+
+    # ── Query-Seite vorbereiten ──────────────────────────────────────────
+    segment_metadata_map: Dict[str, Any] = {}
 
     if is_external:
+        modes   = modes or ['joint', 'position', 'orientation', 'velocity', 'metadata']
+        weights = weights or {m: 1.0 for m in modes}
         segment_indices = external_payload.get('segment_indices')
 
-        if segment_indices:
-            # ── Multi-Segment Kandidat ────────────────────────────────────
-            rows = build_candidate_embeddings_segmented(
-                external_payload, external_embedding_calculator, segment_indices
+        def _emb(row):
+            return {k: row[f'{k}_embedding'] for k in ('joint', 'position', 'orientation', 'velocity', 'metadata')}
+
+        with clock.track('stage1'):
+            if segment_indices:
+                # ── Multi-Segment Kandidat ────────────────────────────────
+                rows = build_candidate_embeddings_segmented(
+                    external_payload, external_embedding_calculator, segment_indices
+                )
+                if rows is None:
+                    return {
+                        'error': 'Could not compute segment embeddings for external candidate.',
+                        'traj_similarity': {}, 'segment_similarity': [],
+                    }
+                segment_embeddings_map = {row['seg_id']: _emb(row) for row in rows[1:]}
+                segment_metadata_map   = {row['seg_id']: row['metadata_row'] for row in rows[1:]}
+            else:
+                embedding_row = build_candidate_embeddings(external_payload, external_embedding_calculator)
+                if embedding_row is None:
+                    return {
+                        'error': 'Could not compute embeddings for external candidate (too few points?)',
+                        'traj_similarity': {}, 'segment_similarity': [],
+                    }
+                segment_embeddings_map = {CANDIDATE_SEG_ID: _emb(embedding_row)}
+
+        target_segments = list(segment_embeddings_map)
+        result = {
+            'target_id':            target_id,
+            'target_traj_id':       CANDIDATE_SEG_ID,
+            'target_traj_features': None,
+            'modes':                modes,
+            'weights':              weights,
+            'metric':               metric,
+            'traj_similarity':      {'results': []},
+            'segment_similarity':   [],
+            'metadata':             {'target_segments_count': len(target_segments)},
+        }
+        external_query = (
+            await _load_external_segments(
+                external_payload, [{'target_segment': s} for s in target_segments], dtw_mode
             )
-            if rows is None:
-                return {
-                    'error': 'Could not compute segment embeddings for external candidate.',
-                    'traj_similarity': {}, 'segment_similarity': [],
-                }
+            if stage2_active else {}
+        )
 
-            full_row = rows[0]
-            seg_rows = rows[1:]
+    else:
+        modes   = modes or ['joint', 'position', 'orientation', 'velocity', 'metadata']
+        weights = weights or {mode: 1.0 / len(modes) for mode in modes}
+        searcher = MultiModalSearcher(pool)
 
-            def _emb(row):
-                return {k: row[f'{k}_embedding'] for k in ('joint', 'position', 'orientation', 'velocity', 'metadata')}
+        with clock.track('stage1'):
+            target_traj_id, target_traj_features = await asyncio.gather(
+                searcher._get_traj_id(target_id),
+                searcher._get_features(target_id, metric),
+            )
 
-            full_embeddings        = _emb(full_row)
-            segment_embeddings_map = {row['seg_id']: _emb(row) for row in seg_rows}
-            segment_metadata_map   = {row['seg_id']: row['metadata_row'] for row in seg_rows}
+        if not target_traj_id:
+            return {
+                'error': f"Target {target_id} not found",
+                'traj_similarity': {},
+                'segment_similarity': [],
+                'timing': {'stage1_ms': round(clock.wall_ms('stage1'), 1),
+                           'total_ms':  round((time.time() - t_start) * 1000, 1)},
+                'stage2_active': False,
+            }
 
-            searcher = MultiModalSearcherCandidate(
-                pool,
-                full_embeddings,
-                CANDIDATE_SEG_ID,
-                segment_embeddings_map=segment_embeddings_map,
+        target_segments: List[str] = []
+
+        result = {
+            'target_id': target_id,
+            'target_traj_id': target_traj_id,
+            'target_traj_features': target_traj_features,
+            'modes': modes,
+            'weights': weights,
+            'metric': metric,
+            'traj_similarity': {},
+            'segment_similarity': [],
+            'metadata': {}
+        }
+
+    # ── Branches ─────────────────────────────────────────────────────────
+    async def _traj_branch() -> None:
+        with clock.track('stage1'):
+            traj_result = await searcher._search_trajs(
+                target_traj_id=target_traj_id, modes=modes, weights=weights, **search_kwargs,
             )
+        result['traj_similarity'] = traj_result
+
+        candidate_ids = [r['seg_id'] for r in traj_result.get('results', []) if r.get('seg_id')]
+        if not stage2_active or not candidate_ids:
+            return
+
+        with clock.track('loading'):
+            data = await cache.get_many([target_traj_id] + candidate_ids)
+        job = _traj_job(traj_result, data, target_traj_id, limit, dtw_mode)
+        if job is None:
+            return
+
+        with clock.track('dtw'):
+            _, result['traj_similarity'], _ = await _run_stage2_job(job)
+
+    async def _segment_branch(index: int, seg_id: str) -> Dict[str, Any]:
+        with clock.track('stage1'):
+            if is_external:
+                seg_searcher = MultiModalSearcherCandidate(pool, segment_embeddings_map[seg_id], seg_id)
+                features     = segment_metadata_map.get(seg_id)
+                seg_result   = await seg_searcher._search_segments(
+                    target_seg_id=seg_id, modes=modes, weights=weights, **search_kwargs,
+                )
+            else:
+                features, seg_result = await asyncio.gather(
+                    searcher._get_features(seg_id, metric),
+                    searcher._search_segments(
+                        target_seg_id=seg_id, modes=modes, weights=weights, **search_kwargs,
+                    ),
+                )
+        group = {
+            'target_segment':          seg_id,
+            'target_segment_features': features,
+            'similar_segments':        seg_result,
+        }
+        if not stage2_active or not seg_result.get('results'):
+            return group
+
+        with clock.track('loading'):
+            traj_ids = {_seg_id_to_traj_id(r['seg_id']) for r in seg_result['results'] if r.get('seg_id')}
+            if not is_external:
+                traj_ids.add(target_traj_id)
+            data = await cache.get_many(traj_ids)
+        if is_external and seg_id in external_query:
+            data[seg_id] = external_query[seg_id]
+
+        with clock.track('dtw'):
+            _, group, _ = await _run_stage2_job(_group_job(index, group, data, limit, dtw_mode, is_external))
+        return group
+
+    async def _segments() -> None:
+        nonlocal target_segments
+        if not is_external:
+            target_segments = await searcher._get_traj_segments(target_traj_id)
+            result['metadata']['target_segments_count'] = len(target_segments)
+            if not target_segments:
+                return
+        groups = await asyncio.gather(*[_segment_branch(i, seg_id) for i, seg_id in enumerate(target_segments)])
+        result['segment_similarity'] = list(groups)
+        if not is_external:
+            result['metadata']['segments_processed'] = len(groups)
+
+    if not is_external:
+        # Query-Trajektorie lädt parallel zur gesamten Stage 1 (die Branches warten auf denselben Load)
+        prefetch = [cache.get_many([target_traj_id])] if stage2_active else []
+        await asyncio.gather(_traj_branch(), _segments(), *prefetch)
+    else:
+        await _segments()
+
+    pipeline_ms = (time.time() - t_start) * 1000
+    stage1_ms   = clock.wall_ms('stage1')
+    load_ms     = clock.wall_ms('loading')
+    stage2_ms   = clock.wall_ms('dtw')
+
+    _normalize_stage1_ranks(result)
+    result['timing'] = {'stage1_ms': round(stage1_ms, 1)}
+    result['stage2_active'] = bool(stage2_active)
+    if stage2_active:
+        result['stage2_dtw_mode'] = dtw_mode
+
+    seg_batch = cache.snapshot() if stage2_active else {}
+    if is_external:
+        seg_batch.update(external_query)
+
+    # ── Prognosis ────────────────────────────────────────────────────────
+    if prognosis_active:
+        prognosis_kwargs = dict(
+            limit=limit, modes=modes, dtw_mode=dtw_mode, metric=metric,
+            calibration_tag=calibration_tag, coverage=coverage, conformal_active=conformal_active,
+            pool=pool,
+        )
+        async with AsyncExitStack() as stack:
+            if conn is None:
+                conn = await stack.enter_async_context(pool.acquire())
+            result = await _prognosis(result, seg_batch, conn, **prognosis_kwargs)
+
+    if stage2_active:
+        result['timing']['data_loading_ms'] = round(load_ms, 1)
+        result['timing']['stage2_ms']       = round(stage2_ms, 1)
+        result['timing']['overlap_ms']      = round(max(0.0, stage1_ms + load_ms + stage2_ms - pipeline_ms), 1)
+    result['timing']['total_ms'] = round((time.time() - t_start) * 1000, 1)
+
+    return result
+
+
+async def run_similarity_pipeline_batch(
+    *,
+    pool: asyncpg.Pool,
+
+    # Entweder gespeicherte Targets oder externe Kandidaten
+    target_ids:                    Optional[List[str]]            = None,
+    external_payloads:             Optional[List[Dict[str, Any]]] = None,
+    external_embedding_calculator: Optional[Any]                  = None,
+
+    # Stage 1
+    modes:         Optional[List[str]]        = None,
+    weights:       Optional[Dict[str, float]] = None,
+    limit:         int                        = 10,
+    buffer_factor: int                        = 5,
+    metric:        Literal['sidtw', 'qdtw']   = 'sidtw',
+    include_tags:  Optional[List[str]]        = None,
+    exclude_tags:  Optional[List[str]]        = None,
+    exclude_ids:   Optional[List[str]]        = None,
+    include_ids:   Optional[List[str]]        = None,
 
-        else:
-            def _emb(row):
-                return {k: row[f'{k}_embedding'] for k in ('joint', 'position', 'orientation', 'velocity', 'metadata')}
+    # Stage 2
+    stage2_active: bool                         = False,
+    dtw_mode:      Literal['position', 'joint'] = 'position',
 
-            embedding_row = build_candidate_embeddings(external_payload, external_embedding_calculator)
-            if embedding_row is None:
-                return {
-                    'error': 'Could not compute embeddings for external candidate (too few points?)',
+    # Prognosis
+    prognosis_active: bool  = False,
+    calibration_tag:  str   = 'all',
+    coverage:         float = 0.90,
+    conformal_active: bool  = True,
+) -> Dict[str, Any]:
+    """
+    Wie run_similarity_pipeline, aber für viele Targets in einem Aufruf:
+      - Stage 1 set-basiert (eine LATERAL-kNN-Query pro Modus und Ebene)
+      - alle benötigten Trajektorien mit einem einzigen Batch-Load
+      - DTW-Reranking der Targets parallel im Prozesspool
+
+    Returns:
+        {'results': [result pro Target, Reihenfolge wie Input], 'timing': {...}}
+    """
+    t_start = time.time()
+
+    is_external = external_payloads is not None
+    if is_external == (target_ids is not None):
+        raise ValueError("Exactly one of target_ids or external_payloads must be provided")
+
+    n_targets = len(external_payloads) if is_external else len(target_ids)
+    searcher  = MultiModalBatchSearcher(pool)
+
+    search_kwargs = dict(
+        modes=modes, weights=weights, limit=limit, metric=metric,
+        buffer_factor=buffer_factor, include_tags=include_tags,
+        exclude_tags=exclude_tags, exclude_ids=exclude_ids, include_ids=include_ids,
+    )
+
+    # ── Stage 1 ──────────────────────────────────────────────────────────
+    t1 = time.time()
+
+    if is_external:
+        results: List[Optional[Dict[str, Any]]] = [None] * n_targets
+        seg_maps, seg_meta, valid_idx = [], [], []
+
+        def _emb(row):
+            return {k: row[f'{k}_embedding'] for k in ('joint', 'position', 'orientation', 'velocity', 'metadata')}
+
+        all_rows = build_candidate_embeddings_batch(external_payloads, external_embedding_calculator)
+        for i, (payload, rows) in enumerate(zip(external_payloads, all_rows)):
+            if rows is None:
+                results[i] = {
+                    'error': (
+                        'Could not compute segment embeddings for external candidate.'
+                        if payload.get('segment_indices') else
+                        'Could not compute embeddings for external candidate (too few points?)'
+                    ),
                     'traj_similarity': {}, 'segment_similarity': [],
                 }
+                continue
+            seg_rows = rows[1:] if payload.get('segment_indices') else rows
+            seg_maps.append({row['seg_id']: _emb(row) for row in seg_rows})
+            seg_meta.append(
+                {row['seg_id']: row['metadata_row'] for row in seg_rows}
+                if payload.get('segment_indices') else {}
+            )
+            valid_idx.append(i)
+
+        found = await searcher.search_candidates_batch(seg_maps, **search_kwargs)
+        for i, res, meta in zip(valid_idx, found, seg_meta):
+            for group in res.get('segment_similarity', []):
+                if group.get('target_segment_features') is None:
+                    group['target_segment_features'] = meta.get(group.get('target_segment'))
+            results[i] = res
+    else:
+        found   = await searcher.search_similar_batch(list(target_ids), **search_kwargs)
+        results = [found[t] for t in target_ids]
+
+    stage1_ms = (time.time() - t1) * 1000
 
-            searcher = MultiModalSearcherCandidate(pool, _emb(embedding_row), CANDIDATE_SEG_ID)
+    active = [r for r in results if not r.get('error')]
+    for r in active:
+        _normalize_stage1_ranks(r)
+        r['stage2_active'] = False
+    for r in results:
+        if r.get('error'):
+            r['stage2_active'] = False
 
-    else:
-        searcher = MultiModalSearcher(pool)
+    # ── Stage 2: ein Batch-Load, DTW-Jobs aller Targets parallel ──────────
+    data_load_ms = 0.0
+    stage2_ms    = 0.0
+    seg_batches: Dict[int, Dict[str, Any]] = {}
+
+    if stage2_active and active:
+        t2 = time.time()
+
+        needed = {i: _stage2_traj_ids(r, is_external) for i, r in enumerate(results) if not r.get('error')}
+        t_load = time.time()
+        shared = await _load_trajectories(pool, set().union(*needed.values()), dtw_mode)
+        for i, ids in needed.items():
+            seg_batches[i] = {tid: shared[tid] for tid in ids if tid in shared}
+            if is_external:
+                seg_batches[i].update(await _load_external_segments(
+                    external_payloads[i], results[i].get('segment_similarity', []), dtw_mode
+                ))
+        data_load_ms = (time.time() - t_load) * 1000
+
+        async def _rerank(i: int) -> None:
+            jobs = _stage2_jobs(results[i], seg_batches[i], limit, dtw_mode, is_external)
+            for index, out, _ in await asyncio.gather(*[_run_stage2_job(job) for job in jobs]):
+                _apply_stage2(results[i], index, out)
+            results[i]['stage2_active']   = True
+            results[i]['stage2_dtw_mode'] = dtw_mode
+
+        await asyncio.gather(*[_rerank(i) for i in needed])
+        stage2_ms = (time.time() - t2) * 1000
+
+    # ── Prognosis ────────────────────────────────────────────────────────
+    prognosis_ms = 0.0
+    if prognosis_active:
+        t_prog    = time.time()
+        semaphore = asyncio.Semaphore(PROGNOSIS_CONCURRENCY)
+        prognosis_kwargs = dict(
+            limit=limit, modes=modes, dtw_mode=dtw_mode, metric=metric,
+            calibration_tag=calibration_tag, coverage=coverage, conformal_active=conformal_active,
+            pool=pool,
+        )
+
+        async def _predict(i: int) -> None:
+            async with semaphore, pool.acquire() as conn:
+                results[i] = await _prognosis(results[i], seg_batches.get(i, {}), conn, **prognosis_kwargs)
+
+        await asyncio.gather(*[
+            _predict(i) for i, r in enumerate(results) if not r.get('error')
+        ])
+        prognosis_ms = (time.time() - t_prog) * 1000
+
+    total_ms = (time.time() - t_start) * 1000
+    n_errors = sum(1 for r in results if r.get('error'))
+
+    logger.info(
+        f"[Batch Pipeline] {n_targets} targets ({n_errors} errors) in {total_ms:.0f} ms"
+    )
+
+    return {
+        'n_targets':     n_targets,
+        'n_errors':      n_errors,
+        'stage2_active': bool(stage2_active and active),
+        'results':       results,
+        'timing': {
+            'stage1_ms':          round(stage1_ms, 1),
+            'data_loading_ms':    round(data_load_ms, 1),
+            'stage2_ms':          round(stage2_ms, 1),
+            'prognosis_ms':       round(prognosis_ms, 1),
+            'total_ms':           round(total_ms, 1),
+            'targets_per_second': round(n_targets / (total_ms / 1000), 2) if total_ms > 0 else None,
+        },
+    }
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# Streaming variant
+# ═══════════════════════════════════════════════════════════════════════════
+
+async def stream_similarity_pipeline(
+    *,
+    target_id: str,
+    pool:      asyncpg.Pool,
+
+    # Stage 1
+    modes:              Optional[List[str]]        = None,
+    weights:            Optional[Dict[str, float]] = None,
+    limit:              int                        = 10,
+    buffer_factor:      int                        = 5,
+    prefilter_features: Optional[List[str]]        = None,
+    metric:             Literal['sidtw', 'qdtw']   = 'sidtw',
+    include_tags:       Optional[List[str]]        = None,
+    exclude_tags:       Optional[List[str]]        = None,
+    exclude_ids:        Optional[List[str]]        = None,
+    include_ids:        Optional[List[str]]        = None,
 
-    result = await searcher.search_similar(
+    # Stage 2
+    stage2_active: bool                         = False,
+    dtw_mode:      Literal['position', 'joint'] = 'position',
+
+    # Prognosis
+    prognosis_active: bool  = False,
+    calibration_tag:  str   = 'all',
+    coverage:         float = 0.90,
+    conformal_active: bool  = True,
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Wie run_similarity_pipeline, liefert die Ergebnisse aber progressiv als Events:
+
+      stage1          — fusioniertes Stage-1 Ranking (komplettes result)
+      stage2_traj     — DTW-Rerank der Bahn-Ebene
+      stage2_segment  — DTW-Rerank einer Segment-Gruppe, sobald sie fertig ist
+      prognosis       — Prognose-Block + Segment-Predictions
+      done            — Gesamt-Timing
+      error           — Abbruch (z.B. Target nicht gefunden)
+
+    Jedes Event trägt 'timing' mit eigener Dauer und 'elapsed_ms' seit Start.
+    Holt sich Connections selbst aus dem Pool — der Generator lebt länger als
+    der Request-Scope einer Depends(get_db)-Connection.
+    """
+    t_start = time.time()
+
+    def _elapsed() -> float:
+        return round((time.time() - t_start) * 1000, 1)
+
+    # ── Stage 1 ──────────────────────────────────────────────────────────
+    t1 = time.time()
+    result = await MultiModalSearcher(pool).search_similar(
         target_id=target_id,
         modes=modes,
         weights=weights,
         limit=limit,
         buffer_factor=buffer_factor,
-        prefilter_features=prefilter_features,
+        prefilter_features=prefilter_features or [],
         metric=metric,
         include_tags=include_tags,
         exclude_tags=exclude_tags,
         exclude_ids=exclude_ids,
         include_ids=include_ids,
     )
-    stage1_ms = (time.time() - t1) * 1000
-
-    # Populate target_segment_features from pre-computed metadata for candidate segments
-    if is_external and segment_indices:
-        for group in result.get('segment_similarity', []):
-            if group.get('target_segment_features') is None:
-                seg_id = group.get('target_segment')
-                if seg_id and seg_id in segment_metadata_map:
-                    group['target_segment_features'] = segment_metadata_map[seg_id]
+    stage1_ms = round((time.time() - t1) * 1000, 1)
 
     if result.get('error'):
-        result['timing']       = {'stage1_ms': round(stage1_ms, 1), 'total_ms': round((time.time() - t_start) * 1000, 1)}
-        result['stage2_active'] = False
-        return result
+        yield {'event': 'error', 'error': result['error'],
+               'timing': {'stage1_ms': stage1_ms, 'elapsed_ms': _elapsed()}}
+        return
 
     _normalize_stage1_ranks(result)
-    result['timing'] = {'stage1_ms': round(stage1_ms, 1)}
+    result['stage2_active'] = bool(stage2_active)
+    if stage2_active:
+        result['stage2_dtw_mode'] = dtw_mode
+    result['timing'] = {'stage1_ms': stage1_ms}
 
-    # ── Stage 1 only ─────────────────────────────────────────────────────
-    if not stage2_active:
-        result['stage2_active'] = False
-        if prognosis_active:
-            result = await predict_performance(
-            result=result, seg_batch={}, conn=conn,
-            feature='mean_distance', coverage=coverage,
-            calibration_tag=calibration_tag,
-            conformal_active=conformal_active,
-            k=limit,
-            search_modes=tuple(sorted(modes or [])),
-            dtw_mode=dtw_mode,
-            metric=metric,
-        )
-        result['timing']['total_ms'] = round((time.time() - t_start) * 1000, 1)
-        return result
+    yield {'event': 'stage1', 'result': result,
+           'timing': {'stage1_ms': stage1_ms, 'elapsed_ms': _elapsed()}}
 
-    # ── Stage 2: DTW reranking ───────────────────────────────────────────
-    t2 = time.time()
-    loader       = TrajectoryLoader(conn)   # immer der echte Loader — lädt DB-Kandidaten
+    # ── Stage 2: DTW pro Gruppe, Events in Fertigstellungs-Reihenfolge ───
+    seg_batch:    Dict[str, Any] = {}
     data_load_ms = 0.0
-    candidates_traj: Dict[str, Any] = {}
-    seg_batch:       Dict[str, Any] = {}
-
-    traj_results = result.get('traj_similarity', {}).get('results', [])
-    if traj_results:
-        traj_candidate_ids = [r['seg_id'] for r in traj_results if r.get('seg_id')]
-        t_load = time.time()
-        query_traj_data = await loader.load_trajectory_data(target_id, dtw_mode)
-
-        if query_traj_data is not None and traj_candidate_ids:
-            candidates_traj = await loader.load_trajectories_batch(traj_candidate_ids, dtw_mode)
-            data_load_ms   += (time.time() - t_load) * 1000
-
-            candidates_flat = {
-                tid: data['trajectory']
-                for tid, data in candidates_traj.items()
-                if data is not None and data.get('trajectory') is not None
-            }
-            if candidates_flat:
-                dtw_traj   = rerank(query_seq=query_traj_data['trajectory'],
-                                    candidates=candidates_flat, limit=limit, mode=dtw_mode)
-                dtw_lookup = {r['id']: r for r in dtw_traj}
-                enriched   = []
-                for r in traj_results:
-                    sid = r.get('seg_id')
-                    if sid in dtw_lookup:
-                        r['dtw_distance']     = dtw_lookup[sid]['dtw_distance']
-                        r['similarity_score'] = dtw_lookup[sid]['similarity_score']
-                        r['rank_stage2']      = dtw_lookup[sid]['rank']
-                    enriched.append(r)
-                enriched.sort(key=lambda x: x.get('dtw_distance', float('inf')))
-                result['traj_similarity']['results'] = enriched
-
-    segment_groups = result.get('segment_similarity', [])
-    all_seg_traj_ids: set = set() if is_external else {target_id}
-    for group in segment_groups:
-        for r in group.get('similar_segments', {}).get('results', []):
-            cid = r.get('seg_id')
-            if cid:
-                all_seg_traj_ids.add(_seg_id_to_traj_id(cid))
-
-    if all_seg_traj_ids:
-        t_load    = time.time()
-        seg_batch = await loader.load_trajectories_batch(list(all_seg_traj_ids), dtw_mode)
-        data_load_ms += (time.time() - t_load) * 1000
-
-    # Query-Segment des externen Kandidaten separat laden und in seg_batch
-    # einspeisen — unter demselben Key, den _seg_id_to_traj_id() für das
-    # Query-Segment liefern würde (bei uns: EXTERNAL_SEG_ID selbst, da
-    # seg_id == traj_id für einen einzelnen externen Kandidaten).
-    if is_external:
-        segment_indices = external_payload.get('segment_indices')
-
-        if segment_indices:
-            boundaries = [0] + segment_indices
-            traj = external_payload['trajectory']
-
-            for i, group in enumerate(segment_groups):
-                seg_id = group.get('target_segment')
-                if seg_id is None:
-                    continue
-
-                start = boundaries[i]
-                end   = boundaries[i + 1] + 1
-
-                seg_payload = {
-                    "trajectory": {
-                        "timestamps": traj['timestamps'][start:end],
-                        "positions":  traj['positions'][start:end],
-                        "quats":      traj.get('quats', [])[start:end],
-                        "joints":     traj.get('joints', [])[start:end],
-                    },
-                    "movement_type": external_payload['movement_type'],
-                    "weight":        external_payload['weight'],
-                }
-
-                ext_loader = TrajectoryLoaderCandidate(seg_payload, candidate_seg_id=seg_id)
-                ext_data   = await ext_loader.load_trajectory_data(seg_id, dtw_mode)
-                if ext_data is not None:
-                    seg_batch[seg_id] = ext_data
-
-        else:
-            ext_loader = TrajectoryLoaderCandidate(external_payload)
-            ext_data   = await ext_loader.load_trajectory_data(target_id, dtw_mode)
-            if ext_data is not None:
-                seg_batch[target_id] = ext_data
-    
-    for group in segment_groups:
-        query_seg_id = group.get('target_segment')
-        if not query_seg_id:
-            continue
-        seg_results = group.get('similar_segments', {}).get('results', [])
-        if not seg_results:
-            continue
-        query_traj_data = seg_batch.get(_seg_id_to_traj_id(query_seg_id))
-        if query_traj_data is None and is_external:
-            query_traj_data = seg_batch.get(query_seg_id)
-        if query_traj_data is None:
-            continue
-        query_arr = (query_traj_data.get('segments') or {}).get(query_seg_id)
-        if query_arr is None:
-            continue
-
-        candidates_seg_flat = {}
-        for r in seg_results:
-            cand_seg_id = r.get('seg_id')
-            if not cand_seg_id:
-                continue
-            cand_data = seg_batch.get(_seg_id_to_traj_id(cand_seg_id))
-            if cand_data is None:
-                continue
-            cand_arr = (cand_data.get('segments') or {}).get(cand_seg_id)
-            if cand_arr is not None:
-                candidates_seg_flat[cand_seg_id] = cand_arr
+    stage2_ms    = 0.0
 
-        if not candidates_seg_flat:
-            continue
+    if stage2_active:
+        t2 = time.time()
+        result['target_traj_id'] = result.get('target_traj_id') or target_id
 
-        dtw_seg     = rerank(query_seq=query_arr, candidates=candidates_seg_flat,
-                             limit=limit, mode=dtw_mode)
-        dtw_seg_lup = {r['id']: r for r in dtw_seg}
-        enriched    = []
-        for r in seg_results:
-            sid = r.get('seg_id')
-            if sid in dtw_seg_lup:
-                r['dtw_distance']     = dtw_seg_lup[sid]['dtw_distance']
-                r['similarity_score'] = dtw_seg_lup[sid]['similarity_score']
-                r['rank_stage2']      = dtw_seg_lup[sid]['rank']
-            enriched.append(r)
-        enriched.sort(key=lambda x: x.get('dtw_distance', float('inf')))
-        group['similar_segments']['results'] = enriched
-
-    stage2_ms = (time.time() - t2) * 1000
-    result['stage2_active']   = True
-    result['stage2_dtw_mode'] = dtw_mode
+        t_load = time.time()
+        seg_batch = await _load_trajectories(pool, _stage2_traj_ids(result, False), dtw_mode)
+        data_load_ms = round((time.time() - t_load) * 1000, 1)
+
+        jobs = _stage2_jobs(result, seg_batch, limit, dtw_mode, False)
+        for fut in asyncio.as_completed([_run_stage2_job(job) for job in jobs]):
+            index, out, dtw_ms = await fut
+            _apply_stage2(result, index, out)
+            timing = {'dtw_ms': dtw_ms, 'data_loading_ms': data_load_ms, 'elapsed_ms': _elapsed()}
+            if index is None:
+                yield {'event': 'stage2_traj', 'traj_similarity': out, 'timing': timing}
+            else:
+                yield {'event': 'stage2_segment', 'index': index, 'group': out, 'timing': timing}
+
+        stage2_ms = round((time.time() - t2) * 1000, 1)
+        result['timing']['data_loading_ms'] = data_load_ms
+        result['timing']['stage2_ms']       = stage2_ms
 
     # ── Prognosis ────────────────────────────────────────────────────────
     if prognosis_active:
-        result = await predict_performance(
-            result=result,
-            seg_batch=seg_batch,
-            conn=conn,
-            feature='mean_distance',
-            coverage=coverage,
-            calibration_tag=calibration_tag,
-            conformal_active=conformal_active,
-            k=limit,
-            search_modes=tuple(sorted(modes or [])),
-            dtw_mode=dtw_mode,
-            metric=metric,
+        t_prog = time.time()
+        prognosis_kwargs = dict(
+            limit=limit, modes=modes, dtw_mode=dtw_mode, metric=metric,
+            calibration_tag=calibration_tag, coverage=coverage, conformal_active=conformal_active,
+            pool=pool,
         )
-
-    result['timing']['data_loading_ms'] = round(data_load_ms, 1)
-    result['timing']['stage2_ms']       = round(stage2_ms, 1)
-    result['timing']['total_ms']        = round((time.time() - t_start) * 1000, 1)
-
-    return result
\ No newline at end of file
+        async with pool.acquire() as conn:
+            result = await _prognosis(result, seg_batch, conn, **prognosis_kwargs)
+        prognosis_ms = round((time.time() - t_prog) * 1000, 1)
+        result['timing']['prognosis_ms'] = prognosis_ms
+
+        yield {
+            'event':     'prognosis',
+            'prognosis': result.get('prognosis'),
+            'segment_predictions': [
+                {'target_segment': g.get('target_segment'), 'prediction': g.get('prediction')}
+                for g in result.get('segment_similarity', [])
+            ],
+            'timing': {'prognosis_ms': prognosis_ms, 'elapsed_ms': _elapsed()},
+        }
+
+    result['timing']['total_ms'] = _elapsed()
+    yield {'event': 'done', 'timing': result['timing']}
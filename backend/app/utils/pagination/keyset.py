@@ -0,0 +1,94 @@
+# backend/app/utils/pagination/keyset.py
+"""
+Keyset-Pagination für die Bahn-Listen (traj_info, traj_search,
+evaluation/search).
+
+Sortierung: recording_date DESC NULLS LAST, traj_id DESC. Die nächste
+Seite setzt per Cursor (letzte Zeile der Seite, base64-kodiert) an, statt
+per OFFSET alle vorherigen Zeilen erneut zu lesen. Ohne Cursor bleibt
+page/OFFSET als Rückfall für Clients, die direkt auf Seite n springen.
+
+Gesamtzahlen sind standardmäßig geschätzt (Planner-Statistik bzw. der
+Zähler aus traj_counts); exact_count=true zählt wie bisher exakt.
+
+Der passende Index traj_info_keyset_idx kommt aus scripts/migrate_schema.py
+(Schritt keyset_index); die Endpunkte lesen nur.
+"""
+
+import base64
+import json
+from typing import Any, List, Optional, Tuple
+
+import asyncpg
+
+def keyset_order(alias: str) -> str:
+    return f" ORDER BY {alias}.recording_date DESC NULLS LAST, {alias}.traj_id DESC"
+
+
+def encode_cursor(row) -> str:
+    raw = json.dumps([row['recording_date'], row['traj_id']], default=str)
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[Optional[str], str]:
+    """Cursor → (recording_date, traj_id); ValueError bei ungültigem Cursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        recording_date, traj_id = json.loads(raw)
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if recording_date is not None and not isinstance(recording_date, str):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return recording_date, str(traj_id)
+
+
+def keyset_condition(alias: str, after: Tuple[Optional[str], str], param_index: int) -> Tuple[str, List[Any]]:
+    """WHERE-Zusatz für alle Zeilen nach after (= decode_cursor, passend zu keyset_order)."""
+    recording_date, traj_id = after
+    if recording_date is None:
+        # Cursor steht bereits im NULL-Block am Ende
+        return f" AND {alias}.recording_date IS NULL AND {alias}.traj_id < ${param_index}", [traj_id]
+    return (
+        f" AND (({alias}.recording_date, {alias}.traj_id) < (${param_index}, ${param_index + 1})"
+        f" OR {alias}.recording_date IS NULL)",
+        [recording_date, traj_id],
+    )
+
+
+def page_rows(rows: list, page_size: int) -> Tuple[list, bool, Optional[str]]:
+    """Abfrage mit LIMIT page_size + 1 → (Seite, has_next, next_cursor)."""
+    has_next = len(rows) > page_size
+    rows = rows[:page_size]
+    return rows, has_next, encode_cursor(rows[-1]) if has_next else None
+
+
+async def estimate_count(conn: asyncpg.Connection, query: str, *params) -> int:
+    """Zeilenschätzung des Planners für query (ohne die Abfrage auszuführen)."""
+    plan = await conn.fetchval(f"EXPLAIN (FORMAT JSON) {query}", *params)
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def pagination_info(
+        total: int,
+        page: int,
+        page_size: int,
+        has_next: bool,
+        next_cursor: Optional[str],
+        exact: bool,
+) -> dict:
+    total_pages = (total + page_size - 1) // page_size
+    if not exact:
+        # Schätzung kann unter der tatsächlichen Seitenzahl liegen → mindestens bis zur aktuellen Seite
+        total_pages = max(total_pages, page + 1 if has_next else page)
+    return {
+        "total": total,
+        "total_is_estimate": not exact,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": total_pages,
+        "has_next": has_next,
+        "has_previous": page > 1,
+        "next_cursor": next_cursor,
+    }
@@ -0,0 +1,214 @@
+# backend/app/utils/plotting/downsampling.py
+"""
+Downsampling von Zeitreihen für die Plot-Endpunkte.
+
+LTTB (Largest-Triangle-Three-Buckets) oder Min/Max pro Bucket, vektorisiert
+mit NumPy. max_points ist eine harte Obergrenze. Segmentgrenzen bleiben
+erhalten, solange das Budget reicht: jedes Segment (zusammenhängender Lauf
+gleicher seg_id) wird für sich reduziert, Anfang und Ende bleiben immer
+drin, Minimum und Maximum jeder Spalte, wenn daneben noch Platz ist. Gibt
+es mehr Segmente als max_points / 2, werden benachbarte Segmente
+zusammengefasst.
+"""
+
+from decimal import Decimal
+from typing import List, Optional, Sequence
+
+import numpy as np
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+# Spalten, die nie als Werte-Spalte zählen
+_NON_VALUE_COLUMNS = {'traj_id', 'seg_id', 'timestamp', 'points_order'}
+
+
+def _scaled(values: np.ndarray) -> np.ndarray:
+    """Spaltenweise auf [0, 1] — Flächen und Extrema über Spalten vergleichbar."""
+    lo = np.nanmin(values, axis=0) if np.isfinite(values).any() else 0.0
+    span = np.nanmax(values, axis=0) - lo if np.isfinite(values).any() else 1.0
+    span = np.where(np.isfinite(span) & (span > 0), span, 1.0)
+    return (values - np.nan_to_num(lo)) / span
+
+
+def _first_per_bucket(hit: np.ndarray, bucket: np.ndarray) -> np.ndarray:
+    """Index des ersten True pro Bucket (bucket aufsteigend sortiert)."""
+    idx = np.flatnonzero(hit)
+    first = np.r_[True, bucket[idx][1:] != bucket[idx][:-1]]
+    return idx[first]
+
+
+def _lttb(values: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    LTTB-Indizes für values (m, k), inklusive erstem und letztem Punkt.
+
+    Ankerpunkt des vorigen Buckets ist dessen Mittelwert statt des dort
+    gewählten Punkts — damit hängen die Buckets nicht voneinander ab und
+    alles läuft ohne Schleife. Die Dreiecksfläche wird über alle Spalten
+    summiert.
+    """
+    m = len(values)
+    if n_out >= m:
+        return np.arange(m)
+    if n_out < 3:
+        return np.array([0, m - 1])[:max(n_out, 0)]
+
+    x = np.arange(m) / (m - 1)
+    y = np.nan_to_num(values)
+    n_buckets = n_out - 2
+
+    edges = np.linspace(1, m - 1, n_buckets + 1).astype(np.int64)   # Bucket b: [edges[b], edges[b+1])
+    counts = np.diff(edges)
+    bucket = np.repeat(np.arange(n_buckets), counts)
+
+    inner_x, inner_y = x[1:m - 1], y[1:m - 1]
+    mean_x = np.add.reduceat(inner_x, edges[:-1] - 1) / counts
+    mean_y = np.add.reduceat(inner_y, edges[:-1] - 1, axis=0) / counts[:, None]
+
+    prev_x = np.r_[x[0], mean_x[:-1]][bucket]
+    prev_y = np.vstack([y[:1], mean_y[:-1]])[bucket]
+    next_x = np.r_[mean_x[1:], x[-1]][bucket]
+    next_y = np.vstack([mean_y[1:], y[-1:]])[bucket]
+
+    area = np.abs(
+        (prev_x - next_x)[:, None] * (inner_y - prev_y)
+        - (prev_x - inner_x)[:, None] * (next_y - prev_y)
+    ).sum(axis=1)
+
+    best = np.maximum.reduceat(area, edges[:-1] - 1)
+    chosen = _first_per_bucket(area == best[bucket], bucket) + 1
+    return np.r_[0, chosen, m - 1]
+
+
+def _minmax(values: np.ndarray, n_out: int) -> np.ndarray:
+    """Minimum und Maximum jeder Spalte pro Bucket (höchstens n_out Punkte)."""
+    m, k = values.shape
+    if n_out >= m:
+        return np.arange(m)
+
+    n_buckets = (n_out - 2) // (2 * k)
+    if n_buckets < 1:
+        # Zu wenig Platz für Min/Max aller Spalten → gleichmäßig ausdünnen
+        return np.unique(np.linspace(0, m - 1, max(n_out, 2)).round().astype(np.int64))
+    edges = np.linspace(0, m, n_buckets + 1).astype(np.int64)
+    bucket = np.repeat(np.arange(n_buckets), np.diff(edges))
+
+    keep = [np.array([0, m - 1])]
+    for column in values.T:
+        low = np.where(np.isnan(column), np.inf, column)
+        high = np.where(np.isnan(column), -np.inf, column)
+        keep.append(_first_per_bucket(low == np.minimum.reduceat(low, edges[:-1])[bucket], bucket))
+        keep.append(_first_per_bucket(high == np.maximum.reduceat(high, edges[:-1])[bucket], bucket))
+    return np.unique(np.concatenate(keep))
+
+
+def downsample_indices(
+        values: np.ndarray,
+        max_points: int,
+        segment_ids: Optional[Sequence] = None,
+        method: str = 'lttb',
+) -> np.ndarray:
+    """
+    Indizes der Punkte, die beim Reduzieren auf höchstens max_points erhalten bleiben.
+
+    Args:
+        values:      (n,) oder (n, k) Werte in Zeitreihenfolge
+        max_points:  Obergrenze der Punktzahl (mindestens 2)
+        segment_ids: seg_id pro Punkt; jeder zusammenhängende Lauf wird
+                     getrennt reduziert (bei mehr als max_points / 2 Läufen
+                     werden benachbarte zusammengefasst)
+        method:      'lttb' oder 'minmax'
+
+    Returns:
+        aufsteigende Indizes (int64)
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+
+    values = np.asarray(values, dtype=np.float64)
+    if values.ndim == 1:
+        values = values[:, None]
+    n, k = values.shape
+    max_points = max(2, max_points)
+    if n <= max_points:
+        return np.arange(n)
+
+    if segment_ids is None or len(segment_ids) == 0:
+        starts = np.array([0])
+    else:
+        segment_ids = np.asarray(segment_ids)
+        starts = np.flatnonzero(np.r_[True, segment_ids[1:] != segment_ids[:-1]])
+
+    # Jedes Segment braucht mindestens Anfang und Ende → höchstens max_points // 2 Segmente
+    max_segments = max_points // 2
+    if len(starts) > max_segments:
+        starts = starts[np.linspace(0, len(starts), max_segments + 1).astype(np.int64)[:-1]]
+    ends = np.r_[starts[1:], n]
+
+    # 2 Punkte pro Segment fest, der Rest anteilig zur Länge → Summe ≤ max_points
+    spare = max_points - 2 * len(starts)
+    budgets = 2 + spare * (ends - starts) // n
+
+    scaled = _scaled(values)
+    reduce = _lttb if method == 'lttb' else _minmax
+    keep = [starts, ends - 1]
+
+    for start, end, budget in zip(starts.tolist(), ends.tolist(), budgets.tolist()):
+        if end - start <= budget:
+            keep.append(np.arange(start, end))
+            continue
+
+        part = scaled[start:end]
+        # Extrema pro Spalte (NaN-Spalten ausgenommen), wenn daneben noch Platz ist
+        finite = np.isfinite(part).any(axis=0)
+        n_extrema = 2 * int(finite.sum())
+        if finite.any() and budget - n_extrema >= 3:
+            keep.append(start + np.nanargmin(part[:, finite], axis=0))
+            keep.append(start + np.nanargmax(part[:, finite], axis=0))
+            budget -= n_extrema
+        keep.append(start + reduce(part, budget))
+
+    return np.unique(np.concatenate(keep))
+
+
+def _first_value(rows: List, name: str):
+    """Erster Wert ungleich NULL der Spalte name (None, wenn alle NULL)."""
+    return next((row[name] for row in rows if row[name] is not None), None)
+
+
+def _is_numeric(value) -> bool:
+    return isinstance(value, (int, float, Decimal)) and not isinstance(value, bool)
+
+
+def downsample_rows(
+        rows: List,
+        max_points: Optional[int],
+        method: str = 'lttb',
+        value_columns: Optional[List[str]] = None,
+) -> List:
+    """
+    asyncpg-Records (bzw. dicts) in Zeitreihenfolge → reduzierte Teilliste.
+
+    Werte-Spalten sind ohne Angabe alle numerischen Spalten außer traj_id,
+    seg_id, timestamp und points_order (Typ nach dem ersten Wert ungleich
+    NULL der Spalte). Ohne max_points oder bei wenigen Zeilen kommt rows
+    unverändert zurück.
+    """
+    if not max_points or len(rows) <= max_points:
+        return rows
+
+    first = rows[0]
+    if value_columns is None:
+        value_columns = [
+            name for name in first.keys()
+            if name not in _NON_VALUE_COLUMNS and _is_numeric(_first_value(rows, name))
+        ]
+    if not value_columns:
+        step = -(-len(rows) // max_points)
+        return rows[::step]
+
+    values = np.array(
+        [[row[name] if row[name] is not None else np.nan for name in value_columns] for row in rows],
+        dtype=np.float64,
+    )
+    segment_ids = [row['seg_id'] for row in rows] if 'seg_id' in first.keys() else None
+    return [rows[i] for i in downsample_indices(values, max_points, segment_ids, method).tolist()]
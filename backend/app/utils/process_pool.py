@@ -0,0 +1,40 @@
+# backend/app/utils/process_pool.py
+"""
+Gemeinsamer Prozess-Pool für CPU-lastige Arbeit (CSV-Parsing, Evaluation,
+Metadaten-/Embedding-Backfill, DTW-Reranking).
+
+Ein Pool pro API-Prozess statt je einem pro Modul: gleichzeitige Uploads,
+Backfills und Suchen teilen sich höchstens PROCESS_POOL_WORKERS Worker-
+Prozesse. Die *_WORKERS-Einstellungen der Module begrenzen nur noch, wie
+viele Aufgaben sie gleichzeitig einreichen. Geschlossen wird der Pool im
+Shutdown-Hook (main.py).
+"""
+
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PROCESS_POOL_WORKERS = max(1, int(os.getenv('PROCESS_POOL_WORKERS', os.cpu_count() or 1)))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def get_process_pool() -> ProcessPoolExecutor:
+    """Prozessweiten Pool liefern (beim ersten Aufruf angelegt)."""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS)
+        logger.info(f"Process pool started with {PROCESS_POOL_WORKERS} workers")
+    return _executor
+
+
+def shutdown_process_pool() -> None:
+    """Offene Aufgaben verwerfen und die Worker-Prozesse beenden."""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True, cancel_futures=True)
+        _executor = None
+        logger.info("Process pool shut down")
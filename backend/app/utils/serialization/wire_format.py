@@ -0,0 +1,267 @@
+# backend/app/utils/serialization/wire_format.py
+"""
+Content Negotiation für große Antworten (Bahn-, Evaluations- und
+Similarity-Endpunkte).
+
+Accept: application/vnd.apache.arrow.stream → Arrow IPC Stream
+Accept: application/msgpack (x-msgpack)      → MessagePack
+sonst                                         → JSON wie bisher
+
+Binäre Formate sind spaltenweise: eine Tabelle (Liste von Zeilen, z. B.
+asyncpg-Records) wird direkt aus den abgefragten Spalten gebaut.
+
+  - msgpack: gleiche Struktur wie das JSON, aber jede Tabelle ist ein
+    Dict Spalte → Werteliste
+  - Arrow: eine Tabelle (auch {"key": [rows]}) wird ein RecordBatch, der
+    Schlüssel steht im Schema-Metadatum 'key'. Verschachtelte Antworten
+    (Bundle, Similarity) werden ein RecordBatch mit genau einer Zeile
+    (Struct/List-Spalten, Metadatum 'layout' = 'nested')
+
+Lässt sich eine Antwort nicht als Arrow darstellen, wird das nächste
+akzeptierte Format genommen. WireCoder legt die binäre Form direkt im
+fastapi-cache ab.
+"""
+
+import logging
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+from uuid import UUID
+
+import numpy as np
+from fastapi_cache.coder import JsonCoder
+from starlette.responses import Response
+
+try:
+    import pyarrow as pa
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+ARROW_STREAM = 'application/vnd.apache.arrow.stream'
+MSGPACK      = 'application/msgpack'
+
+MEDIA_TYPES = {
+    'arrow':   ARROW_STREAM,
+    'msgpack': MSGPACK,
+}
+
+# Accept-Eintrag → Format
+_ACCEPT_FORMATS = {
+    ARROW_STREAM:               'arrow',
+    MSGPACK:                    'msgpack',
+    'application/x-msgpack':    'msgpack',
+    'application/vnd.msgpack':  'msgpack',
+    'application/json':         'json',
+    'application/*':            'json',
+    '*/*':                      'json',
+}
+
+# Präfix der binären Cache-Einträge (JSON beginnt nie mit NUL)
+_CACHE_MARKER = b'\x00wire:'
+
+
+def accepted_formats(accept: Optional[str]) -> List[str]:
+    """
+    Formate aus dem Accept-Header nach q-Wert (bei Gleichstand Reihenfolge
+    im Header); nicht installierte Formate fallen weg, 'json' steht immer
+    zuletzt als Rückfall.
+    """
+    ranked = []
+    for position, entry in enumerate((accept or '').split(',')):
+        media_type, *params = [part.strip() for part in entry.split(';')]
+        fmt = _ACCEPT_FORMATS.get(media_type.lower())
+        if fmt is None:
+            continue
+        q = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip() == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            ranked.append((-q, position, fmt))
+
+    available = {'json', *(['arrow'] if ARROW_AVAILABLE else []), *(['msgpack'] if MSGPACK_AVAILABLE else [])}
+    formats = [fmt for _, _, fmt in sorted(ranked) if fmt in available]
+    formats = list(dict.fromkeys(formats))
+    if 'json' in formats:
+        return formats[:formats.index('json') + 1]
+    return formats + ['json']
+
+
+# ---------------------------------------------------------------------------
+# Tabellen → Spalten
+# ---------------------------------------------------------------------------
+
+def _is_row(value: Any) -> bool:
+    """Dict oder asyncpg-Record (Record ist kein Mapping, hat aber keys/get)."""
+    return isinstance(value, dict) or (hasattr(value, 'keys') and hasattr(value, 'get') and not isinstance(value, type))
+
+
+def _is_table(value: Any) -> bool:
+    return isinstance(value, list) and len(value) > 0 and all(_is_row(row) for row in value)
+
+
+def _plain(value: Any) -> Any:
+    """Einzelwert/Struktur → nur noch Typen, die msgpack/Arrow kennen."""
+    if value is None or isinstance(value, (str, bool, int, float, bytes)):
+        return value
+    if isinstance(value, Decimal):
+        return float(value)
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, UUID):
+        return str(value)
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if _is_row(value):
+        return {key: _plain(value[key]) for key in value.keys()}
+    return value
+
+
+def _column(values: list) -> list:
+    """Spalte nur dann Wert für Wert umwandeln, wenn sie es braucht."""
+    sample = next((v for v in values if v is not None), None)
+    if sample is None or isinstance(sample, (str, bool, int, float, datetime, date)):
+        return values
+    return [_plain(v) for v in values]
+
+
+def table_columns(rows: list) -> Dict[str, list]:
+    """Zeilen → Spalte → Werteliste (Vereinigung der Schlüssel, fehlend = None)."""
+    names = list(rows[0].keys())
+    # Records einer Abfrage haben dieselben Spalten; dicts können abweichen
+    if any(isinstance(row, dict) and list(row.keys()) != names for row in rows):
+        names = list(dict.fromkeys(name for row in rows for name in row.keys()))
+        return {name: _column([row.get(name) for row in rows]) for name in names}
+    return {name: _column(list(values)) for name, values in zip(names, zip(*(row.values() for row in rows)))}
+
+
+def _columnar(value: Any) -> Any:
+    """Struktur für msgpack: jede Tabelle wird zu Spalten."""
+    if _is_table(value):
+        columns = table_columns(value)
+        for name, column in columns.items():
+            if isinstance(next((v for v in column if v is not None), None), (list, dict)):
+                columns[name] = [_columnar(v) for v in column]   # verschachtelte Tabellen
+        return columns
+    if _is_row(value):
+        return {key: _columnar(value[key]) for key in value.keys()}
+    if isinstance(value, (list, tuple)):
+        return [_columnar(v) for v in value]
+    return _plain(value)
+
+
+# ---------------------------------------------------------------------------
+# Encoder
+# ---------------------------------------------------------------------------
+
+def _msgpack_default(value: Any) -> Any:
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    plain = _plain(value)
+    if plain is value:
+        raise TypeError(f"Cannot serialize {type(value).__name__}")
+    return plain
+
+
+def encode_msgpack(payload: Any) -> bytes:
+    return msgpack.packb(_columnar(payload), default=_msgpack_default, use_bin_type=True)
+
+
+def _arrow_stream(batch: 'pa.RecordBatch') -> bytes:
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, batch.schema) as writer:
+        writer.write_batch(batch)
+    return sink.getvalue().to_pybytes()
+
+
+def encode_arrow(payload: Any) -> bytes:
+    """Arrow IPC Stream; TypeError/ArrowInvalid, wenn nicht darstellbar."""
+    key = None
+    if isinstance(payload, dict) and len(payload) == 1 and _is_table(next(iter(payload.values()))):
+        key, payload = next(iter(payload.items()))
+
+    if _is_table(payload):
+        columns = table_columns(payload)
+        batch = pa.RecordBatch.from_arrays(
+            [pa.array(values) for values in columns.values()], names=list(columns)
+        )
+        metadata = {b'layout': b'table', **({b'key': key.encode()} if key else {})}
+    elif isinstance(payload, list) and not payload:
+        batch = pa.RecordBatch.from_pylist([])
+        metadata = {b'layout': b'table'}
+    elif isinstance(payload, dict):
+        batch = pa.RecordBatch.from_pylist([_plain(payload)])
+        metadata = {b'layout': b'nested'}
+    else:
+        raise TypeError(f"No Arrow layout for {type(payload).__name__}")
+
+    return _arrow_stream(batch.replace_schema_metadata(metadata))
+
+
+_ENCODERS = {
+    'arrow':   encode_arrow,
+    'msgpack': encode_msgpack,
+}
+
+
+def _json_ready(payload: Any) -> Any:
+    """Records → dicts (oberste Ebene und eine Ebene tiefer), wie bisher [dict(row) for row in rows]."""
+    if _is_table(payload):
+        return [dict(row) for row in payload]
+    if isinstance(payload, dict):
+        return {key: [dict(row) for row in value] if _is_table(value) else value for key, value in payload.items()}
+    return payload
+
+
+def wire_response(payload: Any, accept: Optional[str]) -> Any:
+    """
+    Antwort im bevorzugten Format des Clients. JSON bleibt das rohe
+    Payload (FastAPI/JsonCoder serialisieren wie bisher), binär kommt ein
+    Response mit fertigem Body zurück.
+    """
+    for fmt in accepted_formats(accept):
+        if fmt == 'json':
+            break
+        try:
+            body = _ENCODERS[fmt](payload)
+        except (TypeError, ValueError, OverflowError) as e:   # pa.ArrowInvalid ist ein ValueError
+            logger.debug(f"{fmt} encoding not possible, trying next format: {e}")
+            continue
+        return Response(content=body, media_type=MEDIA_TYPES[fmt], headers={'Vary': 'Accept'})
+    return _json_ready(payload)
+
+
+class WireCoder(JsonCoder):
+    """
+    fastapi-cache Coder: binäre Antworten werden als Bytes (mit Media-Type)
+    gespeichert und beim Treffer unverändert ausgeliefert, alles andere
+    wie JsonCoder.
+    """
+
+    @classmethod
+    def encode(cls, value: Any) -> bytes:
+        if isinstance(value, Response) and value.media_type in MEDIA_TYPES.values():
+            return _CACHE_MARKER + value.media_type.encode() + b'\n' + value.body
+        return super().encode(value)
+
+    @classmethod
+    def decode(cls, value: bytes) -> Any:
+        if isinstance(value, bytes) and value.startswith(_CACHE_MARKER):
+            media_type, _, body = value[len(_CACHE_MARKER):].partition(b'\n')
+            return Response(content=body, media_type=media_type.decode(), headers={'Vary': 'Accept'})
+        return super().decode(value)
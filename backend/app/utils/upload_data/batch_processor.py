@@ -1,15 +1,102 @@
 import asyncio
+import os
+import time
+from contextlib import AsyncExitStack, asynccontextmanager
 from datetime import datetime
+from itertools import chain
+from typing import Callable, Dict, List, Optional
 
 import logging
 
 logger = logging.getLogger(__name__)
 
-from .csv_processor import CSVProcessor
+from .csv_processor import ARROW_AVAILABLE, CSVProcessor, PackedRows, pack_processed_data
 from .db_operations import DatabaseOperations
 from .db_config import DB_PARAMS
 from ..metadata_embeddings.metadata_calculator import MetadataCalculatorService
-from .evaluation_processor import evaluate_and_upload
+from ..metadata_embeddings.pending_work import enqueue_pending_work
+from .evaluation_processor import evaluate_and_upload_batch
+from .traj_counts import add_traj_count
+from ..process_pool import PROCESS_POOL_WORKERS, get_process_pool
+
+# Parallele CSV-Verarbeitung: eine Datei pro Worker-Prozess
+CSV_PARSE_WORKERS = int(os.getenv('CSV_PARSE_WORKERS', PROCESS_POOL_WORKERS))
+
+# Parallele COPY-Ingest: Anzahl Pool-Connections für die Bewegungsdaten-Tabellen
+# (1 = alles seriell in einer Transaktion)
+COPY_PARALLELISM = int(os.getenv('UPLOAD_COPY_PARALLELISM', 4))
+
+# Metadaten/Evaluation nach dem Insert: gleichzeitig laufende Bahnen (nur mit db_pool)
+POSTPROCESS_CONCURRENCY = int(os.getenv('UPLOAD_POSTPROCESS_CONCURRENCY', 4))
+
+TRAJ_INFO_COLUMNS = [
+    'traj_id', 'robot_model', 'path_planning', 'recording_date', 'start_time',
+    'end_time', 'source_data_act', 'source_data_cmd', 'record_filename',
+    'number_setpoints', 'freq_pose_act', 'freq_position_cmd',
+    'freq_orientation_cmd', 'freq_vel_act', 'freq_vel_cmd',
+    'freq_accel_act', 'freq_joint_states',
+    'number_pose_act', 'number_vel_act', 'number_accel_act', 'number_position_cmd', 'number_orientation_cmd',
+    'number_vel_cmd', 'number_joint_states', 'weight',
+    'transformation_matrix',
+    'number_accel_cmd', 'freq_accel_cmd', 'setted_velocity', 'stop_point', 'tag'
+]
+
+# (Mapping aus process_csv, Zieltabelle, COPY-Spalten) in Einfüge-Reihenfolge
+TABLE_MAPPINGS = [
+    ('POSE_MAPPING', 'traj_pose_act_raw',
+     ['traj_id', 'seg_id', 'timestamp', 'x_act_raw', 'y_act_raw', 'z_act_raw', 'qx_act_raw', 'qy_act_raw',
+      'qz_act_raw', 'qw_act_raw']),
+    ('TRANSFORM_MAPPING', 'traj_pose_act',
+     ['traj_id', 'seg_id', 'timestamp', 'x_act', 'y_act', 'z_act', 'qx_act', 'qy_act',
+      'qz_act', 'qw_act']),
+    ('POSITION_CMD_MAPPING', 'traj_position_cmd',
+     ['traj_id', 'seg_id', 'timestamp', 'x_cmd', 'y_cmd', 'z_cmd']),
+    ('ORIENTATION_CMD_MAPPING', 'traj_orientation_cmd',
+     ['traj_id', 'seg_id', 'timestamp', 'qx_cmd', 'qy_cmd', 'qz_cmd', 'qw_cmd']),
+    ('VEL_ACT_MAPPING', 'traj_vel_act',
+     ['traj_id', 'seg_id', 'timestamp', 'tcp_vel_act']),
+    ('VEL_CMD_MAPPING', 'traj_vel_cmd',
+     ['traj_id', 'seg_id', 'timestamp', 'tcp_vel_cmd']),
+    ('ACCEL_ACT_MAPPING', 'traj_accel_act',
+     ['traj_id', 'seg_id', 'timestamp', 'tcp_accel_act']),
+    ('ACCEL_CMD_MAPPING', 'traj_accel_cmd',
+     ['traj_id', 'seg_id', 'timestamp', 'tcp_accel_cmd']),
+    ('RAPID_SETPOINTS_MAPPING', 'traj_setpoints',
+     ['traj_id', 'seg_id', 'timestamp',
+      'x_reached', 'y_reached', 'z_reached',
+      'qx_reached', 'qy_reached', 'qz_reached', 'qw_reached',
+      'x_support', 'y_support', 'z_support',
+      'qx_support', 'qy_support', 'qz_support', 'qw_support',
+      'vel_set', 'stop_point', 'timestamp_support']),
+    ('JOINT_MAPPING', 'traj_joint_states',
+     ['traj_id', 'seg_id', 'timestamp', 'joint_1', 'joint_2', 'joint_3', 'joint_4',
+      'joint_5', 'joint_6']),
+]
+
+
+def _parse_csv_file(path: str, filename: str, robot_model, path_planning, source_data_act,
+                    source_data_cmd, segmentation_method, num_segments, reference_position) -> List[Dict]:
+    """Läuft im Worker-Prozess: eine Datei parsen, Ergebnis als Spalten-Arrays zurück."""
+    processed_data_list = CSVProcessor(path).process_csv(
+        robot_model, path_planning, source_data_act, source_data_cmd,
+        filename, segmentation_method, num_segments, reference_position
+    )
+    return pack_processed_data(processed_data_list) if processed_data_list else processed_data_list
+
+
+def _no_progress(stage: str, processed: int, total: int, file_results: Optional[List[Dict]] = None, **extra):
+    pass
+
+
+def _split_into_lanes(copy_jobs: List[Dict], n_lanes: int) -> List[List[Dict]]:
+    """Tabellen nach Zeilenzahl auf n_lanes Connections verteilen (größte zuerst)."""
+    lanes = [[] for _ in range(min(n_lanes, len(copy_jobs)))]
+    load = [0] * len(lanes)
+    for job in sorted(copy_jobs, key=lambda j: j['row_count'], reverse=True):
+        lane = load.index(min(load))
+        lanes[lane].append(job)
+        load[lane] += job['row_count']
+    return lanes
 
 
 class BatchProcessor:
@@ -18,6 +105,184 @@ class BatchProcessor:
     def __init__(self):
         pass
 
+    @asynccontextmanager
+    async def _connection(self, conn, db_pool):
+        """Übergebene Connection, sonst eine aus dem Pool, sonst eine eigene."""
+        if conn is not None:
+            yield conn
+        elif db_pool is not None:
+            async with db_pool.acquire() as pooled_conn:
+                yield pooled_conn
+        else:
+            own_conn = await DatabaseOperations(DB_PARAMS).connect_to_db()
+            try:
+                yield own_conn
+            finally:
+                await own_conn.close()
+
+    @asynccontextmanager
+    async def _traj_locks(self, conn, traj_ids):
+        """
+        Advisory-Locks pro traj_id (Session-Ebene auf conn) für Duplikatprüfung
+        und Insert: ein paralleler Upload derselben Bahn wartet, bis dieser
+        fertig ist, und sieht dann deren Zeilen als vorhanden. Damit löscht die
+        Kompensation in _delete_copied nur Zeilen dieses Laufs. Sortiert
+        gesperrt → keine Deadlocks zwischen Uploads mit überlappenden Bahnen.
+        """
+        await conn.execute("""
+            SELECT pg_advisory_lock(hashtext('traj_upload'), hashtext(t))
+            FROM (SELECT t FROM unnest($1::text[]) AS t ORDER BY t) locked
+        """, traj_ids)
+        try:
+            yield
+        finally:
+            # Pool-Connections geben beim Zurückgeben ohnehin alle Advisory-Locks frei
+            await conn.execute("""
+                SELECT pg_advisory_unlock(hashtext('traj_upload'), hashtext(t))
+                FROM unnest($1::text[]) AS t
+            """, traj_ids)
+
+    async def _insert_traj_info(self, conn, db_ops, filtered_traj_info, tag):
+        """traj_info + Outbox-Einträge + Zähler (in der Transaktion des Aufrufers)."""
+        if not filtered_traj_info:
+            logger.info("No new traj_info records to insert")
+            return
+
+        padded_records = []
+        for record in filtered_traj_info:
+            padded_record = list(record)
+            # record hat 30 Felder aus CSVProcessor
+            # auf 30 auffüllen falls weniger
+            if len(padded_record) < 30:
+                padded_record.extend([None] * (30 - len(padded_record)))
+            # tag anhängen als 31. Feld
+            padded_record.append(tag or None)
+            padded_records.append(tuple(padded_record))
+
+        await db_ops.copy_data_to_table(conn, 'traj_info', padded_records, TRAJ_INFO_COLUMNS)
+        logger.info(f"Inserted {len(padded_records)} new traj_info records in batch")
+
+        # Outbox für Metadata/Embedding-Backfill (gleiche Transaktion)
+        await enqueue_pending_work(conn, [r[0] for r in padded_records])
+
+        # Zähler für die Listen-Endpunkte (gleiche Transaktion)
+        await add_traj_count(conn, len(padded_records))
+
+    async def _copy_table(self, conn, db_ops, job) -> Dict:
+        """COPY einer Tabelle; liefert rows, seconds, rows_per_second."""
+        if not job['row_count']:
+            logger.info(f"No new records to insert into {job['table']}")
+            return {'rows': 0, 'seconds': 0.0, 'rows_per_second': 0.0}
+
+        started = time.perf_counter()
+        blocks = [block for block in job['blocks'] if len(block)]
+        if ARROW_AVAILABLE and all(isinstance(block, PackedRows) for block in blocks):
+            await db_ops.copy_arrow_to_table(
+                conn, job['table'], (block.to_arrow(job['columns']) for block in blocks), job['columns']
+            )
+        else:
+            await db_ops.copy_data_to_table(conn, job['table'], chain.from_iterable(blocks), job['columns'])
+        seconds = time.perf_counter() - started
+
+        rows_per_second = job['row_count'] / seconds if seconds > 0 else 0.0
+        logger.info(
+            f"Inserted {job['row_count']} new records into {job['table']} "
+            f"in {seconds:.2f}s ({rows_per_second:,.0f} rows/s)"
+        )
+        return {'rows': job['row_count'], 'seconds': round(seconds, 3), 'rows_per_second': round(rows_per_second)}
+
+    async def _copy_tables_parallel(self, db_pool, db_ops, copy_jobs, progress, insert_steps) -> Dict[str, Dict]:
+        """
+        COPY der Tabellen auf COPY_PARALLELISM Pool-Connections, je eine
+        Transaktion pro Connection. Commit erst, wenn alle COPYs durch sind;
+        schlägt einer fehl, werden alle zurückgerollt. Scheitert ein Commit
+        nach bereits committeten Connections, werden deren Zeilen wieder
+        gelöscht (traj_info ist zu diesem Zeitpunkt noch nicht geschrieben).
+        """
+        lanes = _split_into_lanes([job for job in copy_jobs if job['row_count']], COPY_PARALLELISM)
+        copy_stats = {}
+        done_steps = 0   # traj_info wird erst danach geschrieben
+
+        async with AsyncExitStack() as stack:
+            connections = [await stack.enter_async_context(db_pool.acquire()) for _ in lanes]
+            transactions = [conn.transaction() for conn in connections]
+
+            async def _run_lane(lane_conn, transaction, lane):
+                nonlocal done_steps
+                await transaction.start()
+                for job in lane:
+                    copy_stats[job['table']] = await self._copy_table(lane_conn, db_ops, job)
+                    done_steps += 1
+                    progress('insert', done_steps, insert_steps)
+
+            started = time.perf_counter()
+            results = await asyncio.gather(
+                *(_run_lane(c, t, lane) for c, t, lane in zip(connections, transactions, lanes)),
+                return_exceptions=True
+            )
+            errors = [r for r in results if isinstance(r, BaseException)]
+            if errors:
+                for transaction in transactions:
+                    try:
+                        await transaction.rollback()
+                    except Exception:
+                        pass  # nie gestartet oder Connection bereits abgebrochen
+                raise errors[0]
+
+            committed_lanes = 0
+            try:
+                for transaction in transactions:
+                    await transaction.commit()
+                    committed_lanes += 1
+            except Exception:
+                for transaction in transactions[committed_lanes:]:
+                    try:
+                        await transaction.rollback()
+                    except Exception:
+                        pass
+                await self._delete_copied(db_pool, [job for lane in lanes[:committed_lanes] for job in lane])
+                raise
+
+        for job in copy_jobs:
+            if not job['row_count']:
+                copy_stats[job['table']] = await self._copy_table(None, db_ops, job)
+
+        seconds = time.perf_counter() - started
+        total_rows = sum(job['row_count'] for job in copy_jobs)
+        logger.info(
+            f"Parallel COPY of {total_rows} rows on {len(lanes)} connections in {seconds:.2f}s "
+            f"({total_rows / seconds if seconds > 0 else 0:,.0f} rows/s)"
+        )
+        return copy_stats
+
+    async def _delete_copied(self, db_pool, copy_jobs):
+        """
+        Kompensation: bereits committete Zeilen der neuen Bahnen wieder entfernen.
+        Die traj_ids sind per _traj_locks gesperrt → es trifft nur Zeilen dieses Laufs.
+
+        Schlägt auch das DELETE fehl (z.B. DB nicht erreichbar), bleiben die
+        Zeilen ohne traj_info-Eintrag stehen — sie sind in keiner Liste
+        sichtbar, werden aber als Waisen mit Tabelle und traj_ids geloggt,
+        damit sie von Hand entfernt werden können. Der ursprüngliche Fehler
+        wird vom Aufrufer weitergereicht.
+        """
+        copied = [job for job in copy_jobs if job['row_count']]
+        try:
+            async with db_pool.acquire() as conn, conn.transaction():
+                for job in copied:
+                    await conn.execute(
+                        f"DELETE FROM motion.{job['table']} WHERE traj_id = ANY($1::text[])",
+                        job['traj_ids']
+                    )
+        except Exception as e:
+            for job in copied:
+                logger.error(
+                    f"Orphaned rows in motion.{job['table']} (no traj_info) for traj_ids "
+                    f"{list(job['traj_ids'])}: compensating DELETE failed: {e}"
+                )
+            return
+        logger.warning(f"Removed partially committed rows from {len(copied)} tables")
+
     async def process_csv_batch(
             self,
             files_and_paths,
@@ -31,8 +296,17 @@ class BatchProcessor:
             conn,
             reference_position=None,  # Tuple mit (x, y, z)
             tag=None,
+            db_pool=None,
+            progress: Callable = _no_progress,
     ):
-        """Process multiple CSV files in a batch and upload them at once"""
+        """
+        Process multiple CSV files in a batch and upload them at once
+
+        Stufen: parse → insert → metadata → evaluation. progress(stage,
+        processed, total[, file_results]) wird nach jedem Schritt aufgerufen.
+        Ohne conn wird pro Stufe bzw. pro Bahn eine Connection aus db_pool
+        geholt, statt eine für die gesamte Laufzeit zu belegen.
+        """
 
         start_time = datetime.now()
         logger.info(f"Starting batch processing of {len(files_and_paths)} files at {start_time}")
@@ -48,298 +322,196 @@ class BatchProcessor:
         file_results = []
         filtered_traj_info = []
 
-        for file_info in files_and_paths:
+        # ── Parsen: bis zu CSV_PARSE_WORKERS Dateien gleichzeitig im Prozess-Pool ──
+        loop = asyncio.get_running_loop()
+        executor = get_process_pool()
+        slots = asyncio.Semaphore(CSV_PARSE_WORKERS)   # gemeinsamer Pool → nicht alle Dateien auf einmal einreihen
+        parsed_files = 0
+        progress('parse', 0, len(files_and_paths))
+
+        async def _parse(file_info):
+            nonlocal parsed_files
             try:
-                csv_processor = CSVProcessor(file_info['path'])
-                loop = asyncio.get_event_loop()
-                processed_data_list = await loop.run_in_executor(
-                    None,
-                    lambda p=file_info['path'], fn=file_info['filename']: CSVProcessor(p).process_csv(
+                async with slots:
+                    result = await loop.run_in_executor(
+                        executor, _parse_csv_file, file_info['path'], file_info['filename'],
                         robot_model, path_planning, source_data_act, source_data_cmd,
-                        fn, segmentation_method, num_segments, reference_position
+                        segmentation_method, num_segments, reference_position
                     )
-                )
+            except Exception as e:
+                # Fehler bleiben pro Datei
+                result = e
+            parsed_files += 1
+            progress('parse', parsed_files, len(files_and_paths))
+            return result
 
+        parse_results = await asyncio.gather(*(_parse(file_info) for file_info in files_and_paths))
 
-                if processed_data_list:
-                    all_processed_data.extend(processed_data_list)
-                    file_results.append({
-                        "filename": file_info['filename'],
-                        "segmentsFound": len(processed_data_list),
-                        "success": True
-                    })
-                    logger.info(
-                        f"Processed {file_info['filename']} successfully, found {len(processed_data_list)} trajectories")
-                else:
-                    file_results.append({
-                        "filename": file_info['filename'],
-                        "segmentsFound": 0,
-                        "success": False,
-                        "error": "No segments found"
-                    })
-                    logger.warning(f"No data processed from {file_info['filename']}")
-            except Exception as e:
+        for file_info, processed_data_list in zip(files_and_paths, parse_results):
+            if isinstance(processed_data_list, Exception):
+                file_results.append({
+                    "filename": file_info['filename'],
+                    "segmentsFound": 0,
+                    "success": False,
+                    "error": str(processed_data_list)
+                })
+                logger.error(f"Error processing {file_info['filename']}: {str(processed_data_list)}")
+            elif processed_data_list:
+                all_processed_data.extend(processed_data_list)
+                file_results.append({
+                    "filename": file_info['filename'],
+                    "segmentsFound": len(processed_data_list),
+                    "success": True
+                })
+                logger.info(
+                    f"Processed {file_info['filename']} successfully, found {len(processed_data_list)} trajectories")
+            else:
                 file_results.append({
                     "filename": file_info['filename'],
                     "segmentsFound": 0,
                     "success": False,
-                    "error": str(e)
+                    "error": "No segments found"
                 })
-                logger.error(f"Error processing {file_info['filename']}: {str(e)}")
+                logger.warning(f"No data processed from {file_info['filename']}")
+
+        progress('parse', len(files_and_paths), len(files_and_paths), file_results)
+
+        # Einmal pro Batch: traj_id → processed_data (bei Duplikaten gewinnt die erste Datei)
+        processed_by_traj = {}
+        for data_set in all_processed_data:
+            processed_by_traj.setdefault(data_set['traj_info_data'][0], data_set)
+        logger.info(
+            f"Parsed {len(files_and_paths)} files with {CSV_PARSE_WORKERS} workers "
+            f"in {(datetime.now() - start_time).total_seconds():.2f} seconds")
 
         # If not uploading to database, return early
         if not upload_database:
             return file_results
 
-        # Group data by type for batch insertion
+        # ── Insert: traj_info + Bewegungsdaten ────────────────────────────
         if all_processed_data:
             db_ops = DatabaseOperations(DB_PARAMS)
-
-            # If no connection was passed, create a new one
-            close_conn = False
-            if conn is None:
-                conn = await db_ops.connect_to_db()
-                close_conn = True
+            insert_steps = len(TABLE_MAPPINGS) + 1
+            progress('insert', 0, insert_steps)
+            copy_stats = {}
 
             try:
-                # Collect data by type and extract all traj_ids
-                traj_info_data = []
-                pose_data = []
-                position_cmd_data = []
-                orientation_cmd_data = []
-                vel_act_data = []
-                vel_cmd_data = []
-                accel_act_data = []
-                accel_cmd_data = []
-                rapid_setpoints_data = []
-                joint_data = []
-                transf_data = []
-
-                all_traj_ids = []
-
-                # Group all data by type and collect traj_ids
-                for data_set in all_processed_data:
-                    traj_id = data_set['traj_info_data'][0]
-                    all_traj_ids.append(traj_id)
-
-                    traj_info_data.append(data_set['traj_info_data'])
-                    pose_data.extend(data_set.get('POSE_MAPPING', []))
-                    position_cmd_data.extend(data_set.get('POSITION_CMD_MAPPING', []))
-                    orientation_cmd_data.extend(data_set.get('ORIENTATION_CMD_MAPPING', []))
-                    vel_act_data.extend(data_set.get('VEL_ACT_MAPPING', []))
-                    vel_cmd_data.extend(data_set.get('VEL_CMD_MAPPING', []))
-                    accel_act_data.extend(data_set.get('ACCEL_ACT_MAPPING', []))
-                    accel_cmd_data.extend(data_set.get('ACCEL_CMD_MAPPING', []))
-                    rapid_setpoints_data.extend(data_set.get('RAPID_SETPOINTS_MAPPING', []))
-                    joint_data.extend(data_set.get('JOINT_MAPPING', []))
-                    transf_data.extend(data_set.get('TRANSFORM_MAPPING', []))
-
-                # First check which traj_ids already exist in each table
-                # This avoids checking each record individually
-                tables = [
-                    'traj_info',
-                    'traj_pose_act_raw',
-                    'traj_position_cmd',
-                    'traj_orientation_cmd',
-                    'traj_vel_act',
-                    'traj_vel_cmd',
-                    'traj_accel_act',
-                    'traj_accel_cmd',
-                    'traj_setpoints',
-                    'traj_joint_states',
-                    'traj_pose_act',
-                ]
-
-                existing_traj_ids = {}
-                for table in tables:
-                    # Query for all traj_ids in this table in one go
-                    query = f"""
-                    SELECT DISTINCT traj_id FROM motion.{table} 
-                    WHERE traj_id = ANY($1::text[])
-                    """
-                    rows = await conn.fetch(query, all_traj_ids)
-                    existing_traj_ids[table] = {row['traj_id'] for row in rows}
-
-                    existing_count = len(existing_traj_ids[table])
-                    if existing_count > 0:
-                        logger.info(f"Found {existing_count} existing traj_ids in {table}")
-
-                # Filter out records that already exist in each table
-                filtered_traj_info = [
-                    record for record in traj_info_data
-                    if record[0] not in existing_traj_ids['traj_info']
-                ]
-
-                filtered_pose = [
-                    record for record in pose_data
-                    if record[0] not in existing_traj_ids['traj_pose_act_raw']
-                ]
-
-                filtered_transf = [
-                    record for record in transf_data
-                    if record[0] not in existing_traj_ids['traj_pose_act']
-                ]
-
-                filtered_position_cmd = [
-                    record for record in position_cmd_data
-                    if record[0] not in existing_traj_ids['traj_position_cmd']
-                ]
-
-                filtered_orientation_cmd = [
-                    record for record in orientation_cmd_data
-                    if record[0] not in existing_traj_ids['traj_orientation_cmd']
-                ]
-
-                filtered_vel_act = [
-                    record for record in vel_act_data
-                    if record[0] not in existing_traj_ids['traj_vel_act']
-                ]
-
-                filtered_vel_cmd = [
-                    record for record in vel_cmd_data
-                    if record[0] not in existing_traj_ids['traj_vel_cmd']
-                ]
-
-                filtered_accel_act = [
-                    record for record in accel_act_data
-                    if record[0] not in existing_traj_ids['traj_accel_act']
-                ]
-
-                filtered_accel_cmd = [
-                    record for record in accel_cmd_data
-                    if record[0] not in existing_traj_ids['traj_accel_cmd']
-                ]
-
-                filtered_setpoints = [
-                    record for record in rapid_setpoints_data
-                    if record[0] not in existing_traj_ids['traj_setpoints']
-                ]
-
-                filtered_joint = [
-                    record for record in joint_data
-                    if record[0] not in existing_traj_ids['traj_joint_states']
-                ]
-
-
-                # Now insert all filtered data in a single transaction
-                try:
-                    async with conn.transaction():
-                        # First insert traj_info (metadata)
-                        if filtered_traj_info:
-                            columns = [
-                                'traj_id', 'robot_model', 'path_planning', 'recording_date', 'start_time',
-                                'end_time', 'source_data_act', 'source_data_cmd', 'record_filename',
-                                'number_setpoints', 'freq_pose_act', 'freq_position_cmd',
-                                'freq_orientation_cmd', 'freq_vel_act', 'freq_vel_cmd',
-                                'freq_accel_act', 'freq_joint_states',
-                                'number_pose_act', 'number_vel_act', 'number_accel_act', 'number_position_cmd', 'number_orientation_cmd',
-                                'number_vel_cmd', 'number_joint_states', 'weight',
-                                'transformation_matrix',
-                                'number_accel_cmd', 'freq_accel_cmd', 'setted_velocity', 'stop_point', 'tag'
-                            ]
-
-                            padded_records = []
-                            for record in filtered_traj_info:
-                                padded_record = list(record)
-                                # record hat 30 Felder aus CSVProcessor
-                                # auf 30 auffüllen falls weniger
-                                if len(padded_record) < 30:
-                                    padded_record.extend([None] * (30 - len(padded_record)))
-                                # tag anhängen als 31. Feld
-                                padded_record.append(tag or None)
-                                padded_records.append(tuple(padded_record))
-
-                            await db_ops.copy_data_to_table(conn, 'traj_info', padded_records, columns)
-                            logger.info(f"Inserted {len(padded_records)} new traj_info records in batch")
+                all_traj_ids = list(processed_by_traj)
+                async with self._connection(conn, db_pool) as insert_conn, \
+                        self._traj_locks(insert_conn, all_traj_ids):
+                    # Ein Eintrag pro Bahn; die Bewegungsdaten bleiben pro Bahn als
+                    # Block (PackedRows) und werden erst im COPY zu Zeilen
+
+                    # Which traj_ids already exist in each table — one round trip for all tables
+                    tables = ['traj_info'] + [table for _, table, _ in TABLE_MAPPINGS]
+                    query = "\nUNION ALL\n".join(
+                        f"SELECT DISTINCT '{table}' AS table_name, traj_id FROM motion.{table} "
+                        f"WHERE traj_id = ANY($1::text[])"
+                        for table in tables
+                    )
+                    existing_traj_ids = {table: set() for table in tables}
+                    for row in await insert_conn.fetch(query, all_traj_ids):
+                        existing_traj_ids[row['table_name']].add(row['traj_id'])
+
+                    for table in tables:
+                        existing_count = len(existing_traj_ids[table])
+                        if existing_count > 0:
+                            logger.info(f"Found {existing_count} existing traj_ids in {table}")
+
+                    # Filter out trajectories that already exist in each table
+                    filtered_traj_info = [
+                        processed_by_traj[traj_id]['traj_info_data'] for traj_id in all_traj_ids
+                        if traj_id not in existing_traj_ids['traj_info']
+                    ]
+
+                    copy_jobs = []
+                    for mapping_name, table_name, columns in TABLE_MAPPINGS:
+                        traj_ids = [t for t in all_traj_ids if t not in existing_traj_ids[table_name]]
+                        blocks = [processed_by_traj[t].get(mapping_name, []) for t in traj_ids]
+                        copy_jobs.append({
+                            'table':     table_name,
+                            'columns':   columns,
+                            'blocks':    blocks,
+                            'row_count': sum(len(block) for block in blocks),
+                            'traj_ids':  traj_ids,
+                        })
+
+                    try:
+                        if conn is None and db_pool is not None and COPY_PARALLELISM > 1:
+                            # Bewegungsdaten parallel auf mehreren Connections; traj_info
+                            # erst danach → Bahnen werden erst mit vollständigen Daten sichtbar
+                            copy_stats = await self._copy_tables_parallel(
+                                db_pool, db_ops, copy_jobs, progress, insert_steps
+                            )
+                            try:
+                                async with insert_conn.transaction():
+                                    await self._insert_traj_info(insert_conn, db_ops, filtered_traj_info, tag)
+                            except Exception:
+                                await self._delete_copied(db_pool, copy_jobs)
+                                raise
                         else:
-                            logger.info("No new traj_info records to insert")
-
-                        # Define data mappings for other tables
-                        data_mappings = [
-                            (filtered_pose, 'traj_pose_act_raw',
-                             ['traj_id', 'seg_id', 'timestamp', 'x_act_raw', 'y_act_raw', 'z_act_raw', 'qx_act_raw', 'qy_act_raw',
-                              'qz_act_raw', 'qw_act_raw']),
-                            (filtered_transf, 'traj_pose_act',
-                             ['traj_id', 'seg_id', 'timestamp', 'x_act', 'y_act', 'z_act', 'qx_act', 'qy_act',
-                              'qz_act', 'qw_act']),
-                            (filtered_position_cmd, 'traj_position_cmd',
-                             ['traj_id', 'seg_id', 'timestamp', 'x_cmd', 'y_cmd', 'z_cmd']),
-                            (filtered_orientation_cmd, 'traj_orientation_cmd',
-                             ['traj_id', 'seg_id', 'timestamp', 'qx_cmd', 'qy_cmd', 'qz_cmd', 'qw_cmd']),
-                            (filtered_vel_act, 'traj_vel_act',
-                             ['traj_id', 'seg_id', 'timestamp', 'tcp_vel_act']),
-                            (filtered_vel_cmd, 'traj_vel_cmd',
-                             ['traj_id', 'seg_id', 'timestamp', 'tcp_vel_cmd']),
-                            (filtered_accel_act, 'traj_accel_act',
-                             ['traj_id', 'seg_id', 'timestamp', 'tcp_accel_act']),
-                            (filtered_accel_cmd, 'traj_accel_cmd',
-                             ['traj_id', 'seg_id', 'timestamp', 'tcp_accel_cmd']),
-                            (filtered_setpoints, 'traj_setpoints',
-                             ['traj_id', 'seg_id', 'timestamp',
-                             'x_reached', 'y_reached', 'z_reached',
-                             'qx_reached', 'qy_reached', 'qz_reached', 'qw_reached',
-                             'x_support', 'y_support', 'z_support',
-                             'qx_support', 'qy_support', 'qz_support', 'qw_support',
-                             'vel_set', 'stop_point', 'timestamp_support']),
-                            (filtered_joint, 'traj_joint_states',
-                             ['traj_id', 'seg_id', 'timestamp', 'joint_1', 'joint_2', 'joint_3', 'joint_4',
-                              'joint_5', 'joint_6']),
-                        ]
-
-                        # Insert each type of data
-                        for data_array, table_name, columns in data_mappings:
-                            if data_array:
-                                await db_ops.copy_data_to_table(conn, table_name, data_array, columns)
-                                logger.info(f"Inserted {len(data_array)} new records into {table_name}")
-                            else:
-                                logger.info(f"No new records to insert into {table_name}")
-
-                    logger.info(f"Successfully inserted all batch data")
-                except Exception as e:
-                    logger.error(f"Error during batch database insertion: {str(e)}")
-                    # Mark files as unsuccessful
-                    for result in file_results:
-                        if result['success']:
-                            result['success'] = False
-                            result['error'] = f"Database error: {str(e)}"
+                            # Now insert all filtered data in a single transaction
+                            async with insert_conn.transaction():
+                                await self._insert_traj_info(insert_conn, db_ops, filtered_traj_info, tag)
+                                progress('insert', 1, insert_steps)
+
+                                # Insert each type of data
+                                for step, job in enumerate(copy_jobs, start=2):
+                                    copy_stats[job['table']] = await self._copy_table(insert_conn, db_ops, job)
+                                    progress('insert', step, insert_steps)
+
+                        logger.info(f"Successfully inserted all batch data")
+                    except Exception as e:
+                        logger.error(f"Error during batch database insertion: {str(e)}")
+                        filtered_traj_info = []
+                        # Mark files as unsuccessful
+                        for result in file_results:
+                            if result['success']:
+                                result['success'] = False
+                                result['error'] = f"Database error: {str(e)}"
             except Exception as e:
                 logger.error(f"Error in batch processing: {str(e)}")
+                filtered_traj_info = []
                 for result in file_results:
                     if result['success']:
                         result['success'] = False
                         result['error'] = f"Processing error: {str(e)}"
-            finally:
-                if close_conn and conn:
-                    await conn.close()
+
+            progress('insert', insert_steps, insert_steps, file_results, copy_stats=copy_stats)
 
         end_time = datetime.now()
         processing_time = (end_time - start_time).total_seconds()
         logger.info(f"Batch processing completed in {processing_time:.2f} seconds")
 
-        # ── Metadata berechnen und hochladen ──────────────────────
+        # ── Metadata + Evaluation für neue Bahnen ─────────────────
         new_traj_ids = [r[0] for r in filtered_traj_info]
         if new_traj_ids:
-            logger.info(f'Computing metadata for {len(new_traj_ids)} new trajectories...')
+            logger.info(f'Computing metadata and evaluation for {len(new_traj_ids)} new trajectories...')
 
             metadata_service = MetadataCalculatorService(
                 db_pool=None,
                 skip_embeddings=False
             )
 
-            for traj_id in new_traj_ids:
+            # Eine asyncpg-Connection verarbeitet nur eine Query zur Zeit → mit
+            # fester conn seriell, mit Pool begrenzt parallel
+            concurrency = POSTPROCESS_CONCURRENCY if conn is None and db_pool is not None else 1
+            semaphore = asyncio.Semaphore(concurrency)
+            done = {'metadata': 0, 'evaluation': 0}
+            progress('metadata', 0, len(new_traj_ids))
+            progress('evaluation', 0, len(new_traj_ids))
+
+            async def _metadata(traj_id):
                 try:
-                    async with conn.transaction():
-                        # Hole waypoints für diese traj_id aus processed_data
-                        traj_comments = next(
-                            (d.get('traj_comments', {})
-                                for d in all_processed_data
-                                if d['traj_info_data'][0] == traj_id),
-                            {}
-                        )
+                    # Keine asyncpg-Transaktion: geschrieben wird über den psycopg-Pool
+                    # des BinaryVectorWriter (eine eigene Transaktion pro Bahn)
+                    async with self._connection(conn, db_pool) as traj_conn:
+                        # Waypoints für diese traj_id aus processed_data
+                        traj_comments = processed_by_traj[traj_id].get('traj_comments', {})
                         waypoints = traj_comments.get('waypoints', [])
 
                         result = await metadata_service.process_single_traj(
-                            conn=conn,
+                            conn=traj_conn,
                             traj_id=traj_id,
                             compute_metadata=True,
                             compute_embeddings=True,
@@ -348,9 +520,11 @@ class BatchProcessor:
 
                         if result.get('metadata') or result.get('embeddings'):
                             await metadata_service.batch_write_everything(
-                                conn,
+                                traj_conn,
                                 result.get('metadata', []),
                                 result.get('embeddings', []),
+                                metadata_done_ids=[traj_id] if result.get('metadata') else [],
+                                embeddings_done_ids=[traj_id] if result.get('embeddings') else [],
                             )
                             logger.info(
                                 f'✓ Metadata + Embeddings written for {traj_id} '
@@ -361,15 +535,32 @@ class BatchProcessor:
                 except Exception as e:
                     logger.error(f'Metadata error for {traj_id}: {e}')
 
-        # ── Evaluation berechnen und hochladen ────────────────────
-        if new_traj_ids:
-            logger.info(f'Starte Trajectory Evaluation für {len(new_traj_ids)} neue Bahnen...')
-            for traj_id in new_traj_ids:
-                traj_data = next(
-                    (d for d in all_processed_data if d['traj_info_data'][0] == traj_id),
-                    None
+            async def _bounded_metadata(traj_id):
+                async with semaphore:
+                    await _metadata(traj_id)
+                done['metadata'] += 1
+                progress('metadata', done['metadata'], len(new_traj_ids))
+
+            async def _metadata_all():
+                await asyncio.gather(*(_bounded_metadata(traj_id) for traj_id in new_traj_ids))
+
+            def _evaluated(traj_id):
+                done['evaluation'] += 1
+                progress('evaluation', done['evaluation'], len(new_traj_ids))
+
+            async def _evaluation_all():
+                # evaluate() im Prozess-Pool, ein Writer-Task schreibt die Ergebnisse
+                method_seconds = await evaluate_and_upload_batch(
+                    lambda: self._connection(conn, db_pool),
+                    {traj_id: processed_by_traj[traj_id] for traj_id in new_traj_ids},
+                    on_done=_evaluated,
                 )
-                if traj_data:
-                    await evaluate_and_upload(conn, traj_id, traj_data)
+                progress('evaluation', done['evaluation'], len(new_traj_ids), eval_method_seconds=method_seconds)
+
+            if concurrency > 1:
+                await asyncio.gather(_metadata_all(), _evaluation_all())
+            else:
+                await _metadata_all()
+                await _evaluation_all()
 
-        return file_results
\ No newline at end of file
+        return file_results
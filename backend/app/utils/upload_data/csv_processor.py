@@ -1,10 +1,198 @@
 import csv
+import logging
+import os
 import re
 from datetime import datetime
+from itertools import compress, islice
+from typing import Dict, List, Tuple
+
+import numpy as np
 
-from fastapi import logger
 from .db_config import MAPPINGS
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    ARROW_AVAILABLE = True
+except ImportError:
+    ARROW_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+# Zeilen pro Chunk beim Einlesen — begrenzt den Speicher für Rohtext
+CSV_CHUNK_ROWS = int(os.getenv('CSV_CHUNK_ROWS', 50_000))
+
+# Schema-Metadatum mit den Kommentarzeilen (# weight: …, # waypoints: …) in Parquet/Arrow-Dateien
+ARROW_COMMENTS_KEY = b'comments'
+
+ACT_MAPPINGS = ['POSE_MAPPING', 'VEL_ACT_MAPPING', 'ACCEL_ACT_MAPPING', 'TRANSFORM_MAPPING']
+CMD_MAPPINGS = ['POSITION_CMD_MAPPING', 'ORIENTATION_CMD_MAPPING', 'VEL_CMD_MAPPING', 'ACCEL_CMD_MAPPING',
+                'JOINT_MAPPING', 'RAPID_SETPOINTS_MAPPING']
+
+
+def _unique_in_order(values: np.ndarray) -> List[str]:
+    """Eindeutige Werte in Reihenfolge des ersten Auftretens."""
+    if len(values) == 0:
+        return []
+    uniq, first_idx = np.unique(values, return_index=True)
+    return uniq[np.argsort(first_idx)].tolist()
+
+
+def detect_file_format(path: str) -> str:
+    """'csv', 'parquet', 'arrow' (IPC-Datei) oder 'arrow_stream' — anhand der Magic Bytes,
+    Upload-Tempfiles heißen unabhängig vom Format *.csv."""
+    with open(path, 'rb') as f:
+        head = f.read(8)
+    if head[:4] == b'PAR1':
+        return 'parquet'
+    if head[:6] == b'ARROW1':
+        return 'arrow'
+    if head[:4] == b'\xff\xff\xff\xff':
+        return 'arrow_stream'
+    return 'csv'
+
+
+def _parse_numeric(raw: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Text-Zellen → (float64-Werte, present-Maske).
+    present = nicht leer (wie bisher zählt auch 'NaN' als vorhanden, Wert NaN).
+    """
+    stripped = [s.strip() for s in raw]
+    present  = np.array([s != '' for s in stripped], dtype=bool)
+    try:
+        values = np.array([float(s) if s else np.nan for s in stripped], dtype=np.float64)
+    except ValueError:
+        def _to_float(s):
+            try:
+                return float(s) if s else np.nan
+            except ValueError:
+                return np.nan
+        values = np.array([_to_float(s) for s in stripped], dtype=np.float64)
+    return values, present
+
+
+class PackedRows:
+    """
+    Zeilen eines Mappings ([traj_id, seg_id, timestamp, *werte]) als Spalten-Arrays.
+
+    Kompakte Form für die Übergabe aus dem Parse-Worker: pickelt ohne ein
+    Python-Objekt pro Wert. Zeilen-Tupel entstehen erst beim Iterieren
+    (direkt im COPY), die Evaluation liest die Arrays.
+    """
+
+    def __init__(self, labels: List[Tuple[str, str]], codes: np.ndarray,
+                 timestamps: np.ndarray, values: np.ndarray):
+        self.labels = labels           # [(traj_id, seg_id), ...]
+        self.codes = codes             # int32 (n,) → Index in labels
+        self.timestamps = timestamps   # bytes (n,), unverändert aus der CSV
+        self.values = values           # float64 (n, k)
+
+    @classmethod
+    def from_rows(cls, rows: list) -> 'PackedRows':
+        keys   = [(row[0], row[1]) for row in rows]
+        labels = list(dict.fromkeys(keys))
+        index  = {key: i for i, key in enumerate(labels)}
+        return cls(
+            labels,
+            np.array([index[key] for key in keys], dtype=np.int32),
+            np.array([row[2] for row in rows], dtype='S'),
+            np.array([row[3:] for row in rows], dtype=np.float64),
+        )
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __iter__(self):
+        labels = self.labels
+        for code, timestamp, values in zip(
+                self.codes.tolist(), self.timestamps.astype(str).tolist(), self.values.tolist()):
+            yield (*labels[code], timestamp, *values)
+
+    def segment_ids(self) -> List[str]:
+        return [self.labels[code][1] for code in self.codes.tolist()]
+
+    def to_arrow(self, columns: List[str]) -> 'pa.RecordBatch':
+        """
+        Als RecordBatch mit den COPY-Spalten — traj_id/seg_id als Dictionary
+        über labels, Werte-Spalten ohne Kopie aus values.
+        """
+        traj_ids, seg_ids = zip(*self.labels) if self.labels else ((), ())
+        codes = pa.array(self.codes)
+        arrays = [
+            pa.DictionaryArray.from_arrays(codes, pa.array(traj_ids, type=pa.string())),
+            pa.DictionaryArray.from_arrays(codes, pa.array(seg_ids, type=pa.string())),
+            pa.array(self.timestamps, type=pa.binary()).cast(pa.string()),
+            *(pa.array(np.ascontiguousarray(self.values[:, i])) for i in range(self.values.shape[1])),
+        ]
+        return pa.RecordBatch.from_arrays(arrays, names=columns)
+
+
+def pack_processed_data(processed_data: List[Dict]) -> List[Dict]:
+    """
+    process_csv()-Ergebnis → numerische Mappings als PackedRows.
+    RAPID_SETPOINTS (gemischte Typen, wenige Zeilen), traj_info_data und
+    traj_comments bleiben unverändert.
+    """
+    return [
+        {
+            key: PackedRows.from_rows(value)
+            if key in MAPPINGS and key != 'RAPID_SETPOINTS_MAPPING' and value else value
+            for key, value in traj_data.items()
+        }
+        for traj_data in processed_data
+    ]
+
+
+class ColumnTable:
+    """
+    Spaltenweise IST- bzw. SOLL-Zeilen einer CSV.
+
+    text:    timestamp + Segment-ID als String-Arrays (unverändert aus der CSV)
+    values:  numerische Spalten als float64 (leer → NaN)
+    present: pro numerischer Spalte, ob die Zelle nicht leer war
+    """
+
+    def __init__(self, text: Dict[str, np.ndarray], values: Dict[str, np.ndarray],
+                 present: Dict[str, np.ndarray]):
+        self.text = text
+        self.values = values
+        self.present = present
+
+    def __len__(self):
+        return len(self.text['timestamp'])
+
+    def filter(self, mask: np.ndarray) -> 'ColumnTable':
+        return ColumnTable(
+            {k: v[mask] for k, v in self.text.items()},
+            {k: v[mask] for k, v in self.values.items()},
+            {k: v[mask] for k, v in self.present.items()},
+        )
+
+
+class _ColumnBuffer:
+    """Sammelt Chunks einer Seite (IST/SOLL) und fügt sie am Ende zusammen."""
+
+    def __init__(self, text_columns: List[str], numeric_columns: List[str]):
+        self.text_columns = text_columns
+        self.numeric_columns = numeric_columns
+        self.chunks = []
+
+    def append(self, text: Dict[str, np.ndarray], values: Dict[str, np.ndarray],
+               present: Dict[str, np.ndarray]):
+        self.chunks.append((text, values, present))
+
+    def finish(self) -> ColumnTable:
+        def _cat(part, col, dtype):
+            arrays = [chunk[part][col] for chunk in self.chunks]
+            return np.concatenate(arrays) if arrays else np.zeros(0, dtype=dtype)
+
+        return ColumnTable(
+            {c: _cat(0, c, str) for c in self.text_columns},
+            {c: _cat(1, c, np.float64) for c in self.numeric_columns},
+            {c: _cat(2, c, bool) for c in self.numeric_columns},
+        )
+
+
 class CSVProcessor:
     def __init__(self, file_path):
         self.file_path = file_path
@@ -17,314 +205,28 @@ class CSVProcessor:
 
         print(f'Verarbeite CSV-Datei: {record_filename}')
         try:
-            matrix_info = None
-            traj_comments = self._parse_trajectory_comments()
+            # Ein Durchlauf: Kommentare + IST-/SOLL-Spalten (Split per Segment-ID-Maske)
+            act_table, cmd_table, comment_lines, first_timestamp, last_timestamp = self._read_columns()
 
-            with open(self.file_path, 'r') as matrixfile:
-                for line in matrixfile:
-                    if line.strip().startswith('# transformation_matrix:'):
-                        matrix_info = line.strip().split(':', 1)[1].strip()
-                        break
+            traj_comments = self._parse_trajectory_comments(comment_lines)
 
-            with open(self.file_path, 'r') as csvfile:
-                reader = csv.DictReader(csvfile)
-                rows = list(reader)
+            matrix_info = None
+            for line in comment_lines:
+                if line.startswith('# transformation_matrix:'):
+                    matrix_info = line.split(':', 1)[1].strip()
+                    break
 
             self.record_filename = record_filename
 
-            act_spalten = ['timestamp', 'pv_x', 'pv_y', 'pv_z', 'ov_x', 'ov_y', 'ov_z', 'ov_w',
-                           'pt_x', 'pt_y', 'pt_z', 'ot_x', 'ot_y', 'ot_z', 'ot_w', 'tcp_speedv',
-                           'tcp_angularv', 'tcp_accelv', 'tcp_accel_pi',
-                           'tcp_angular_vel_pi', 'segment_id_ist']
-
-            cmd_spalten = ['ps_x', 'ps_y', 'ps_z', 'os_x', 'os_y', 'os_z', 'os_w', 'tcp_speedbs', 'tcp_accelbs',
-                            'joint_1', 'joint_2', 'joint_3', 'joint_4', 'joint_5', 'joint_6',
-                            'ap_x', 'ap_y', 'ap_z', 'aq_x', 'aq_y', 'aq_z', 'aq_w', 'DO_Signal',
-                            'Movement Type', 'Weight', 'Velocity Picking', 'Velocity Handling',
-                            'segment_id_soll']
-
-            # Filtere Zeilen für IST-Daten anhand der IST-Spalten
-            rows_act = []
-            for row in rows:
-                # Prüfe, ob die Zeile gültige IST-Daten enthält
-                if row.get('segment_id_ist') is not None and row.get('segment_id_ist') != '' and row.get(
-                        'segment_id_ist') != 'NaN':
-                    # Prüfe, ob die erforderlichen IST-Spalten Werte enthalten
-                    if any(row.get(spalte) not in [None, '', 'NaN'] for spalte in act_spalten if spalte in row):
-                        rows_act.append(row)
-
-            # Filtere Zeilen für SOLL-Daten anhand der SOLL-Spalten
-            rows_cmd = []
-            for row in rows:
-                # Prüfe, ob die Zeile gültige SOLL-Daten enthält
-                if row.get('segment_id_soll') is not None and row.get('segment_id_soll') != '' and row.get(
-                        'segment_id_soll') != 'NaN':
-                    # Prüfe, ob die erforderlichen SOLL-Spalten Werte enthalten
-                    if any(row.get(spalte) not in [None, '', 'NaN'] for spalte in cmd_spalten if
-                           spalte in row):
-                        rows_cmd.append(row)
-
             # Wenn reference_position definiert ist, führe die positionsbasierte Segmentierung durch
             if segmentation_method == "reference_position":
-                ref_x = float(reference_position[0])
-                ref_y = float(reference_position[1])
-                ref_z = float(reference_position[2])
-                threshold = 0.3
-
-                # print(f"Suche nach AP-Positionen nahe der Referenzposition: x={ref_x}, y={ref_y}, z={ref_z} mit Schwellenwert {threshold}mm")
-
-                # Finde alle Zeilen mit AP-Positionen nahe der Referenzposition
-                matching_rows = []
-
-                for row in rows_cmd:
-                    # Überprüfe, ob die AP-Werte vorhanden und gültig sind
-                    ap_x = row.get('ap_x', '')
-                    ap_y = row.get('ap_y', '')
-                    ap_z = row.get('ap_z', '')
-
-                    if ap_x and ap_y and ap_z and ap_x != 'NaN' and ap_y != 'NaN' and ap_z != 'NaN':
-                        try:
-                            ap_x = float(ap_x)
-                            ap_y = float(ap_y)
-                            ap_z = float(ap_z)
-
-                            # Berechne den Abstand zur Referenzposition
-                            distance = self.calculate_distance(ap_x, ap_y, ap_z, ref_x, ref_y, ref_z)
-
-                            # Wenn der Abstand unter dem Schwellenwert liegt, speichere diese Zeile
-                            if distance <= threshold:
-                                matching_rows.append({
-                                    'segment_id': row.get('segment_id_soll'),
-                                    'timestamp': row.get('timestamp'),
-                                    'distance': distance,
-                                    'ap_x': ap_x,
-                                    'ap_y': ap_y,
-                                    'ap_z': ap_z
-                                })
-                        except ValueError:
-                            # Ignoriere Zeilen mit ungültigen AP-Werten
-                            continue
-
-                # Gruppiere die Treffer nach Segment-ID
-                segments_with_matches = {}
-                for match in matching_rows:
-                    segment_id = match['segment_id']
-                    if segment_id not in segments_with_matches:
-                        segments_with_matches[segment_id] = []
-                    segments_with_matches[segment_id].append(match)
-
-                print(f"Gefunden: {len(matching_rows)} Zeilen mit AP-Positionen nahe der Referenzposition")
-                print(f"Verteilt auf {len(segments_with_matches)} Segmente:")
-
-                robot_starts_at_ref = False
-                start_segment = None
-
-                for i, row in enumerate(rows_cmd[:200]):
-                    ps_x = row.get('ps_x', '')
-                    ps_y = row.get('ps_y', '')
-                    ps_z = row.get('ps_z', '')
-                    segment_id = row.get('segment_id_soll', '')  # Hole segment_id hier
-                    
-                    if ps_x and ps_y and ps_z and ps_x != 'NaN' and ps_y != 'NaN' and ps_z != 'NaN':
-                        try:
-                            ps_x = float(ps_x)
-                            ps_y = float(ps_y)
-                            ps_z = float(ps_z)
-                            
-                            distance = self.calculate_distance(ps_x, ps_y, ps_z, ref_x, ref_y, ref_z)
-                            
-                            if distance <= threshold and segment_id and segment_id != 'NaN':  # Prüfe auch segment_id
-                                robot_starts_at_ref = True
-                                start_segment = segment_id  # Verwende die bereits geholte segment_id
-                                print(f"Roboter startet an Referenzposition in Segment {start_segment}")
-                                break
-                        except ValueError:
-                            continue
-
-                #for segment_id, matches in segments_with_matches.items():
-                #    print(f"  Segment {segment_id}: {len(matches)} Referenzpunkte gefunden")
-                #    # Zeige den ersten und letzten gefundenen Punkt für dieses Segment
-                #    if matches:
-                #        first = matches[0]
-                #        last = matches[-1]
-                #        print(f"    Erster Punkt: AP=({first['ap_x']:.3f}, {first['ap_y']:.3f}, {first['ap_z']:.3f}), Abstand={first['distance']:.3f}mm")
-                #        print(f"    Letzter Punkt: AP=({last['ap_x']:.3f}, {last['ap_y']:.3f}, {last['ap_z']:.3f}), Abstand={last['distance']:.3f}mm")
-
-                # Sammle alle eindeutigen Segment-IDs (alle, nicht nur die mit Matches)
-                all_segment_ids = []
-                for row in rows_cmd:
-                    segment_id = row.get('segment_id_soll')
-                    if segment_id and segment_id not in all_segment_ids:
-                        all_segment_ids.append(segment_id)
-
-                # Sortiere alle Segment-IDs numerisch
-                all_segment_ids.sort(key=lambda x: int(x) if x.isdigit() else float('inf'))
-
-                # Entferne das erste und letzte Segment, wie bei der ursprünglichen Methode
-                if len(all_segment_ids) >= 2:
-                    all_segment_ids = all_segment_ids[1:-1]
-
-                # Sortiere die Segmente mit Matches (Referenzpunkte)
-                ref_segment_ids = sorted([s for s in segments_with_matches.keys() if s in all_segment_ids],
-                                         key=lambda x: int(x) if x.isdigit() else float('inf'))
-
-                # Definiere Bahnen als Bereiche zwischen Referenzpunkten
-                if robot_starts_at_ref and start_segment == '0':
-                    # Segment 0 wurde entfernt, also beginnt die erste Bahn bei Segment 1
-                    # Aber wir wollen Segment 1 auch überspringen (Bewegung zum nächsten Punkt)
-                    # Also beginnen wir bei Segment 2
-                    
-                    bahnen = []
-                    
-                    # Erste Bahn: Von Segment 2 bis zum ersten AP-Referenzpunkt
-                    if '1' in all_segment_ids and ref_segment_ids:
-                        start_idx = all_segment_ids.index('1')  # Beginne bei Segment 2
-                        first_ap_ref = ref_segment_ids[0]  # Das ist '5'
-                        if first_ap_ref in all_segment_ids:
-                            end_idx = all_segment_ids.index(first_ap_ref)
-                            if start_idx < end_idx:
-                                bahnen.append(all_segment_ids[start_idx:end_idx])
-                                print(f"Erste Bahn (Start an Ref): Segmente {all_segment_ids[start_idx]} bis {all_segment_ids[end_idx-1]}")
-                else:
-                    bahnen = []
+                valid_segments, reference_segment_to_bahn = self.segment_by_reference_position(
+                    cmd_table, reference_position
+                )
 
-                if robot_starts_at_ref and start_segment and start_segment in all_segment_ids:
-                    # Spezialbehandlung für Start an Referenzposition
-                    start_idx = all_segment_ids.index(start_segment) + 2  # +2 um Start und Bewegung zu überspringen
-                    
-                    # Finde das Ende dieser ersten Bahn
-                    if ref_segment_ids:  # ref_segment_ids enthält NUR AP-Referenzpunkte
-                        first_ap_ref = ref_segment_ids[0]
-                        if first_ap_ref in all_segment_ids:
-                            end_idx = all_segment_ids.index(first_ap_ref)
-                            if start_idx < end_idx:
-                                bahnen.append(all_segment_ids[start_idx:end_idx])
-                                print(f"Erste Bahn (Start an Ref): Segmente {all_segment_ids[start_idx]} bis {all_segment_ids[end_idx-1]}")
-
-                # Für jedes Referenzsegment (außer dem letzten) finden wir alle Segmente bis zum nächsten Referenzsegment
-                for i in range(len(ref_segment_ids)):
-                    home_segment_idx = all_segment_ids.index(ref_segment_ids[i])
-                    start_idx = home_segment_idx + 2  # Starte nach dem Home-Segment (2 Segmente weiter)
-
-                    # Für das letzte Referenzsegment nehmen wir alle verbleibenden Segmente
-                    if i == len(ref_segment_ids) - 1:
-                        end_idx = len(all_segment_ids)
-                    else:
-                        # Für alle anderen nehmen wir bis zum nächsten Home-Segment (exklusiv)
-                        # aber schließen das Segment VOR dem nächsten Home-Punkt mit ein
-                        next_home_idx = all_segment_ids.index(ref_segment_ids[i + 1])
-                        end_idx = next_home_idx  # Stoppe VOR dem nächsten Home-Segment
-
-                    # Sammle alle Segmente für diese Bahn (nur wenn start_idx < end_idx)
-                    if start_idx < end_idx:
-                        traj_segs = all_segment_ids[start_idx:end_idx]
-                        bahnen.append(traj_segs)
-
-                # Filtere Bahnen, die zu wenige Segmente haben (≤ 2)
-                min_segments_per_bahn = 1
-                valid_bahnen = []
-                removed_bahnen = []
-
-                for i, traj_segs in enumerate(bahnen):
-                    if len(traj_segs) > min_segments_per_bahn:
-                        valid_bahnen.append(traj_segs)
-                    else:
-                        removed_bahnen.append((i, traj_segs))
-
-                # print(f"\nDefiniere {len(bahnen)} Bahnen basierend auf Referenzpunkten:")
-                # for i, traj_segs in enumerate(bahnen):
-                #     start_segment = traj_segs[0]
-                #     end_segment = traj_segs[-1]
-                #
-                #     print(f"  Bahn {i}: Segment {start_segment} bis {end_segment} ({len(traj_segs)} Segmente)")
-                #     if start_segment in segments_with_matches:
-                #         ref_matches = segments_with_matches[start_segment]
-                #         ref_count = len(ref_matches)
-                #         avg_distance = sum(match['distance'] for match in ref_matches) / ref_count if ref_count > 0 else 0
-                #         print(f"    Beginnt mit Referenzpunkt: {ref_count} Punkte, Ø Abstand: {avg_distance:.3f}mm")
-                #     print(f"    Enthaltene Segmente: {', '.join(traj_segs)}")
-
-                # print(f"\nNach Filterung: {len(valid_bahnen)} gültige Bahnen (mehr als {min_segments_per_bahn} Segmente):")
-
-                # Entfernte Bahnen ausgeben
-                # if removed_bahnen:
-                #     print(f"Entfernte Bahnen (≤ {min_segments_per_bahn} Segmente):")
-                #     for traj_idx, segments in removed_bahnen:
-                #         print(f"  Bahn {traj_idx}: {', '.join(segments)}")
-
-                # Neue Bahn-Indizes zuweisen
-                new_trajs = {}
-                for new_idx, traj_segs in enumerate(valid_bahnen):
-                    original_idx = bahnen.index(traj_segs)
-                    new_trajs[new_idx] = {"segments": traj_segs, "original_idx": original_idx}
-
-                    # start_segment = traj_segs[0]
-                    # end_segment = traj_segs[-1]
-                    #
-                    # print(f"  Bahn {new_idx} (ursprünglich Bahn {original_idx}): Segment {start_segment} bis {end_segment} ({len(traj_segs)} Segmente)")
-                    # print(f"    Enthaltene Segmente: {', '.join(traj_segs)}")
-
-                # Segment zu Bahn Mapping mit neuen Indizes
-                segment_to_bahn = {}
-
-                # Initialisiere alle Segmente mit "?"
-                for segment_id in all_segment_ids:
-                    segment_to_bahn[segment_id] = "?"
-
-                # Weise Bahn-IDs zu
-                for new_traj_idx, traj_info in new_trajs.items():
-                    for segment_id in traj_info["segments"]:
-                        segment_to_bahn[segment_id] = str(new_traj_idx)
-
-                #print("\nSegment zu Bahn Mapping (nach Filterung):")
-                #for segment_id in all_segment_ids:
-                #    traj_id = segment_to_bahn.get(segment_id, "?")
-                #    print(f"  Segment {segment_id} → Bahn {traj_id}")
-
-                # print("\nZusammenfassung der finalen Bahnen:")
-                # for traj_idx, traj_info in new_trajs.items():
-                #     segments = traj_info["segments"]
-                #     print(f"  Bahn {traj_idx}: {len(segments)} Segmente - {', '.join(segments)}")
-
-                # Sammle alle Segmente aus den validen Bahnen
-                valid_segments = []
-                for traj_info in new_trajs.values():
-                    valid_segments.extend(traj_info["segments"])
-
-                #print(f"\nVerwende {len(valid_segments)} Segmente für die weitere Verarbeitung:")
-                #print(f"  {', '.join(valid_segments)}")
-
-                # Filtere Zeilen für IST-Daten basierend auf den gültigen Segmenten
-                rows_act_filtered = []
-                for row in rows_act:
-                    segment_id = row.get('segment_id_ist')
-                    if segment_id in valid_segments:
-                        rows_act_filtered.append(row)
-
-                # Filtere Zeilen für SOLL-Daten basierend auf den gültigen Segmenten
-                rows_cmd_filtered = []
-                for row in rows_cmd:
-                    segment_id = row.get('segment_id_soll')
-                    if segment_id in valid_segments:
-                        rows_cmd_filtered.append(row)
-
-                # print(f"IST: Originale Anzahl Zeilen: {len(rows_act)}, Nach Segment-Filterung: {len(rows_act_filtered)}")
-                # print(f"SOLL: Originale Anzahl Zeilen: {len(rows_cmd)}, Nach Segment-Filterung: {len(rows_cmd_filtered)}")
-
-                # Bereite ein Mapping von Segment zu Bahn vor, das an process_data übergeben wird
-                reference_segment_to_bahn = {}
-                for segment_id in all_segment_ids:
-                    traj_id = segment_to_bahn.get(segment_id, None)
-                    if traj_id != "?" and traj_id is not None:
-                        reference_segment_to_bahn[segment_id] = traj_id
-
-                if robot_starts_at_ref:
-                    print(f"DEBUG: Start-Segment: {start_segment}")
-                    print(f"DEBUG: all_segment_ids: {all_segment_ids}")
-                    print(f"DEBUG: ref_segment_ids VOR Änderung: {ref_segment_ids}")
-
-                    print(f"DEBUG: ref_segment_ids NACH Änderung: {ref_segment_ids}")
-                    print(f"DEBUG: Erste Bahn sollte beginnen bei Index: {all_segment_ids.index(start_segment) + 2 if start_segment in all_segment_ids else 'NICHT GEFUNDEN'}")
+                # Filtere IST-/SOLL-Zeilen basierend auf den gültigen Segmenten
+                rows_act_filtered = act_table.filter(np.isin(act_table.text['segment_id_ist'], valid_segments))
+                rows_cmd_filtered = cmd_table.filter(np.isin(cmd_table.text['segment_id_soll'], valid_segments))
 
                 # Verarbeite die Daten mit der reference_position Methode
                 act_rows_processed, act_processed_data, act_point_counts, act_max_bahn, act_traj_ids = self.process_data(
@@ -338,19 +240,9 @@ class CSVProcessor:
                 )
 
             else:  # Bei allen anderen Methoden (z.B. fixed_segments) den ursprünglichen Code verwenden
-                # Sammle alle eindeutigen IST-Segmente
-                act_segments = []
-                for row in rows_act:
-                    segment_id = row.get('segment_id_ist')
-                    if segment_id not in act_segments:
-                        act_segments.append(segment_id)
-
-                # Sammle alle eindeutigen SOLL-Segmente
-                cmd_segments = []
-                for row in rows_cmd:
-                    segment_id = row.get('segment_id_soll')
-                    if segment_id not in cmd_segments:
-                        cmd_segments.append(segment_id)
+                # Sammle alle eindeutigen IST-/SOLL-Segmente
+                act_segments = _unique_in_order(act_table.text['segment_id_ist'])
+                cmd_segments = _unique_in_order(cmd_table.text['segment_id_soll'])
 
                 # Bestimme, welche IST-Segmente zu entfernen sind
                 act_segments_to_remove = []
@@ -368,22 +260,14 @@ class CSVProcessor:
                 else:
                     print(f"Warnung: Nur {len(cmd_segments)} SOLL-Segmente gefunden, entferne keine")
 
-                # Filtere IST-Zeilen
-                rows_act_filtered = []
-                for row in rows_act:
-                    segment_id = row.get('segment_id_ist')
-                    if segment_id not in act_segments_to_remove:
-                        rows_act_filtered.append(row)
+                # Filtere IST-/SOLL-Zeilen
+                rows_act_filtered = act_table.filter(
+                    ~np.isin(act_table.text['segment_id_ist'], act_segments_to_remove))
+                rows_cmd_filtered = cmd_table.filter(
+                    ~np.isin(cmd_table.text['segment_id_soll'], cmd_segments_to_remove))
 
-                # Filtere SOLL-Zeilen
-                rows_cmd_filtered = []
-                for row in rows_cmd:
-                    segment_id = row.get('segment_id_soll')
-                    if segment_id not in cmd_segments_to_remove:
-                        rows_cmd_filtered.append(row)
-
-                # print(f"IST: Originale Anzahl Zeilen: {len(rows_act)}, Nach Filterung: {len(rows_act_filtered)}")
-                # print(f"SOLL: Originale Anzahl Zeilen: {len(rows_cmd)}, Nach Filterung: {len(rows_cmd_filtered)}")
+                # print(f"IST: Originale Anzahl Zeilen: {len(act_table)}, Nach Filterung: {len(rows_act_filtered)}")
+                # print(f"SOLL: Originale Anzahl Zeilen: {len(cmd_table)}, Nach Filterung: {len(rows_cmd_filtered)}")
 
                 # Verwende:
                 act_rows_processed, act_processed_data, act_point_counts, act_max_bahn, act_traj_ids = self.process_data(
@@ -482,8 +366,8 @@ class CSVProcessor:
                     end_time = str(self.convert_timestamp(all_timestamps[-1]))
                     recording_date = start_time
                 else:
-                    start_time = str(self.convert_timestamp(rows[0]['timestamp']))
-                    end_time = str(self.convert_timestamp(rows[-1]['timestamp']))
+                    start_time = str(self.convert_timestamp(first_timestamp))
+                    end_time = str(self.convert_timestamp(last_timestamp))
                     recording_date = start_time
 
                 traj_id = None
@@ -573,17 +457,118 @@ class CSVProcessor:
             print(traceback.format_exc())
             return None
 
-    def process_data(self, rows, source_data, data_type, segmentation_method="fixed_segments", num_segments=3,
-                     segment_to_traj_mapping=None):
+    def segment_by_reference_position(self, cmd_table: ColumnTable, reference_position, threshold=0.3):
+        """
+        Bahnerkennung über eine Referenzposition (Home-Punkt), vektorisiert auf den SOLL-Spalten.
+
+        Eine Bahn beginnt zwei Segmente nach einem Segment, dessen AP-Punkt
+        (ap_x/ap_y/ap_z) höchstens threshold mm von der Referenz entfernt liegt,
+        und endet vor dem nächsten solchen Segment. Startet der Roboter an der
+        Referenz (ps_* in den ersten 200 SOLL-Zeilen), beginnt die erste Bahn
+        entsprechend früher. Bahnen mit ≤ 1 Segment werden verworfen.
+
+        Returns:
+            (valid_segments, segment_to_traj_mapping)
+        """
+        ref = np.array([float(v) for v in reference_position[:3]])
+        segment_ids = cmd_table.text['segment_id_soll']
+
+        # Abstands-Maske (leere/ungültige Werte sind NaN → kein Treffer)
+        ap = np.column_stack([cmd_table.values[c] for c in ('ap_x', 'ap_y', 'ap_z')])
+        with np.errstate(invalid='ignore'):
+            ap_match = np.sqrt(((ap - ref) ** 2).sum(axis=1)) <= threshold
+
+        # Run-Length-Gruppierung nach segment_id_soll: Grenzen dort, wo die ID wechselt
+        if len(segment_ids):
+            uniq, codes = np.unique(segment_ids, return_inverse=True)
+            run_starts = np.concatenate(([0], np.flatnonzero(np.diff(codes) != 0) + 1))
+            run_segments = codes[run_starts]
+            run_has_match = np.logical_or.reduceat(ap_match, run_starts)
+        else:
+            uniq = np.zeros(0, dtype=str)
+            run_segments = np.zeros(0, dtype=np.int64)
+            run_has_match = np.zeros(0, dtype=bool)
+
+        def _first_seen(run_mask):
+            """Segment-IDs der markierten Runs in Reihenfolge des ersten Auftretens."""
+            segs = run_segments[run_mask]
+            _, first = np.unique(segs, return_index=True)
+            return uniq[segs[np.sort(first)]].tolist()
+
+        matched_segments = _first_seen(run_has_match)
+
+        print(f"Gefunden: {int(ap_match.sum())} Zeilen mit AP-Positionen nahe der Referenzposition")
+        print(f"Verteilt auf {len(matched_segments)} Segmente:")
+
+        # Startet der Roboter an der Referenzposition?
+        ps = np.column_stack([cmd_table.values[c][:200] for c in ('ps_x', 'ps_y', 'ps_z')])
+        with np.errstate(invalid='ignore'):
+            ps_match = (np.sqrt(((ps - ref) ** 2).sum(axis=1)) <= threshold) & (segment_ids[:200] != 'NaN')
+        robot_starts_at_ref = bool(ps_match.any())
+        start_segment = segment_ids[int(np.argmax(ps_match))].item() if robot_starts_at_ref else None
+        if robot_starts_at_ref:
+            print(f"Roboter startet an Referenzposition in Segment {start_segment}")
+
+        # Alle Segment-IDs numerisch sortiert, erstes und letztes entfernt
+        all_segment_ids = sorted(_first_seen(np.ones(len(run_segments), dtype=bool)),
+                                 key=lambda x: int(x) if x.isdigit() else float('inf'))
+        if len(all_segment_ids) >= 2:
+            all_segment_ids = all_segment_ids[1:-1]
+        position = {segment_id: i for i, segment_id in enumerate(all_segment_ids)}
+
+        ref_segment_ids = sorted([s for s in matched_segments if s in position],
+                                 key=lambda x: int(x) if x.isdigit() else float('inf'))
+
+        # Bahngrenzen als (start, end)-Indizes in all_segment_ids
+        bounds = []
+        if robot_starts_at_ref and ref_segment_ids:
+            end_idx = position[ref_segment_ids[0]]
+            if start_segment == '0' and '1' in position:
+                # Segment 0 wurde entfernt → erste Bahn beginnt bei Segment 1
+                bounds.append((position['1'], end_idx))
+            if start_segment in position:
+                # +2 um Start und Bewegung zu überspringen
+                bounds.append((position[start_segment] + 2, end_idx))
+
+        # Von Home-Segment + 2 bis vor das nächste Home-Segment (letzte Bahn bis zum Ende)
+        home = np.array([position[s] for s in ref_segment_ids], dtype=np.int64)
+        starts = home + 2
+        ends = np.append(home[1:], len(all_segment_ids))
+        bounds.extend(zip(starts.tolist(), ends.tolist()))
+
+        # Leere Bahnen entfallen, Bahnen mit ≤ 1 Segment werden verworfen
+        valid_bahnen = [all_segment_ids[a:b] for a, b in bounds if b - a > 1]
+
+        # Segment → Bahn (bei Überlappung gewinnt die spätere Bahn)
+        segment_to_bahn = {}
+        for traj_idx, traj_segs in enumerate(valid_bahnen):
+            for segment_id in traj_segs:
+                segment_to_bahn[segment_id] = str(traj_idx)
+
+        valid_segments = [segment_id for traj_segs in valid_bahnen for segment_id in traj_segs]
+        reference_segment_to_bahn = {
+            segment_id: segment_to_bahn[segment_id]
+            for segment_id in all_segment_ids if segment_id in segment_to_bahn
+        }
+
+        if robot_starts_at_ref:
+            print(f"DEBUG: Start-Segment: {start_segment}")
+            print(f"DEBUG: all_segment_ids: {all_segment_ids}")
+            print(f"DEBUG: ref_segment_ids: {ref_segment_ids}")
+
+        return valid_segments, reference_segment_to_bahn
+
+    def process_data(self, table: ColumnTable, source_data, data_type, segmentation_method="fixed_segments",
+                     num_segments=3, segment_to_traj_mapping=None):
         """
-        Verarbeitet IST- oder SOLL-Daten aus den CSV-Zeilen.
+        Verarbeitet IST- oder SOLL-Daten aus den CSV-Spalten.
         Die ersten und letzten Segmente wurden bereits entfernt.
         Bei reference_position werden die Bahnen anhand des übergebenen segment_to_traj_mapping zugeordnet.
         Bei fixed_segments enthält jede Bahn genau num_segments Segmente,
         außer die letzte, die auch mehr enthalten kann, wenn Restsegmente vorhanden sind.
 
         Args:
-            rows: Die CSV-Zeilen
+            table: Die CSV-Zeilen als ColumnTable
             source_data: Die Datenquelle (z.B. "ros" oder "rapid")
             data_type: "ist" oder "soll"
             segmentation_method: Die Segmentierungsmethode
@@ -595,11 +580,10 @@ class CSVProcessor:
         """
         if data_type.lower() == "ist":
             segment_id_field = 'segment_id_ist'
-            mappings_to_use = ['POSE_MAPPING', 'VEL_ACT_MAPPING', 'ACCEL_ACT_MAPPING', 'TRANSFORM_MAPPING']
+            mappings_to_use = ACT_MAPPINGS
         elif data_type.lower() == "soll":
             segment_id_field = 'segment_id_soll'
-            mappings_to_use = ['POSITION_CMD_MAPPING', 'ORIENTATION_CMD_MAPPING', 'VEL_CMD_MAPPING', 'ACCEL_CMD_MAPPING',
-                               'JOINT_MAPPING', 'RAPID_SETPOINTS_MAPPING']
+            mappings_to_use = CMD_MAPPINGS
         else:
             raise ValueError(f"Ungültiger Datentyp: {data_type}. Muss 'ist' oder 'soll' sein.")
 
@@ -621,12 +605,22 @@ class CSVProcessor:
             'number_vel_cmd': 0,
             'number_joint_states': 0,
         }
+        point_count_keys = {
+            'RAPID_SETPOINTS_MAPPING': 'number_setpoints',
+            'POSE_MAPPING':            'number_pose_act',
+            'VEL_ACT_MAPPING':         'number_vel_act',
+            'ACCEL_ACT_MAPPING':       'number_accel_act',
+            'ACCEL_CMD_MAPPING':       'number_accel_cmd',
+            'POSITION_CMD_MAPPING':    'number_position_cmd',
+            'ORIENTATION_CMD_MAPPING': 'number_orientation_cmd',
+            'VEL_CMD_MAPPING':         'number_vel_cmd',
+            'JOINT_MAPPING':           'number_joint_states',
+        }
 
-        all_segments = []
-        for row in rows:
-            segment_id = row.get(segment_id_field)
-            if segment_id is not None and segment_id != '' and segment_id not in all_segments:
-                all_segments.append(segment_id)
+        segment_ids = table.text[segment_id_field]
+        timestamps = table.text['timestamp']
+
+        all_segments = [s for s in _unique_in_order(segment_ids) if s != '']
 
         if segmentation_method == "reference_position" and segment_to_traj_mapping:
             segment_to_bahn = segment_to_traj_mapping
@@ -666,11 +660,6 @@ class CSVProcessor:
 
                 max_bahn = complete_bahnen - 1 if complete_bahnen > 0 else -1
 
-            # Debug-Ausgabe
-            # print(f"{data_type.upper()}-Segmente pro Bahn:")
-            # for bahn, segments in sorted(traj_to_segments.items(), key=lambda x: int(x[0])):
-            #     print(f"  Bahn {bahn}: {', '.join(segments)}")
-
             segment_to_bahn = {}
             for traj_key, segments in traj_to_segments.items():
                 for segment_id in segments:
@@ -681,66 +670,69 @@ class CSVProcessor:
             for i, segment_id in enumerate(segments):
                 segment_id_mapping[(traj_key, segment_id)] = i + 1  # Segment-IDs beginnen bei 1
 
-        traj_timestamps = {}
-
-        for i, row in enumerate(rows):
-            timestamp = row['timestamp']
-            segment_id = row.get(segment_id_field)
-
-            if segment_id is None or segment_id == '':
-                continue
-
-            traj_key = segment_to_bahn.get(segment_id)
-            if traj_key is None:
-                continue  # Dieses Segment wurde keiner Bahn zugeordnet
-
-            if traj_key not in traj_timestamps:
-                traj_timestamps[traj_key] = []
-            traj_timestamps[traj_key].append(timestamp)
-
-            for mapping_name in mappings_to_use:
-                if mapping_name not in self.mappings:
-                    continue
-
-                mapping = self.mappings[mapping_name]
-
-                traj_segment_id = str(segment_id_mapping.get((traj_key, segment_id), 0))
-                if traj_segment_id == '0':
-                    continue  # Keine gültige Zuordnung gefunden
-
-                if traj_key not in processed_data[mapping_name]:
-                    processed_data[mapping_name][traj_key] = []
-
-                result = self.process_mapping_row(
-                    row, mapping, traj_key, traj_segment_id, timestamp,
-                    source_data, point_counts, mapping_name
-                )
-
-                if result:
-                    processed_data[mapping_name][traj_key].append(result)
-                    rows_processed[mapping_name] += 1
-
+        # Bahn-Zuordnung pro eindeutigem Segment, per inverse-Index auf die Zeilen verteilt
+        uniq_segments, row_segment = np.unique(segment_ids, return_inverse=True)
+        uniq_segments = uniq_segments.tolist()
+
+        traj_keys = []  # in Reihenfolge des ersten Auftretens
+        key_codes = np.full(len(uniq_segments), -1, dtype=np.int64)
+        for code, segment_id in enumerate(uniq_segments):
+            traj_key = segment_to_bahn.get(segment_id) if segment_id != '' else None
+            if traj_key is not None and segment_id_mapping.get((traj_key, segment_id), 0):
+                if traj_key not in traj_keys:
+                    traj_keys.append(traj_key)
+                key_codes[code] = traj_keys.index(traj_key)
+        row_key = key_codes[row_segment] if len(segment_ids) else np.zeros(0, dtype=np.int64)
+        assigned = row_key >= 0
+
+        # Bahnreihenfolge wie beim zeilenweisen Durchlauf (erste Zeile je Bahn)
+        first_rows = {}
+        for i in np.flatnonzero(assigned):
+            first_rows.setdefault(int(row_key[i]), int(i))
+            if len(first_rows) == len(traj_keys):
+                break
+        key_order = sorted(first_rows, key=first_rows.get)
+
+        # Bahn-ID = frühester Zeitstempel (erste 10 Zeichen)
         traj_ids = {}
-        for traj_key, timestamps in traj_timestamps.items():
-            if timestamps:
-                # Verwende den frühesten Zeitstempel
-                earliest_timestamp = min(timestamps)
-                traj_ids[traj_key] = str(earliest_timestamp[:10])
-
-        # Aktualisiere alle verarbeiteten Daten mit der richtigen Bahn-ID
-        for mapping_name in processed_data.keys():
-            for traj_key in processed_data[mapping_name]:
-                if traj_key in traj_ids:
-                    traj_id = traj_ids[traj_key]
-                    for i in range(len(processed_data[mapping_name][traj_key])):
-                        # Ersetze die Bahn-ID und aktualisiere das segment_id Format
-                        if processed_data[mapping_name][traj_key][i]:
-                            row_data = processed_data[mapping_name][traj_key][i]
-                            processed_data[mapping_name][traj_key][i] = [
-                                traj_id,  # Bahn-ID an Position 0
-                                f"{traj_id}_{row_data[1]}",  # Neue segment_id im Format [traj_id]_[segmentzahl]
-                                *row_data[2:]  # Rest der Daten unverändert
-                            ]
+        for code in key_order:
+            earliest_timestamp = min(timestamps[row_key == code].tolist())
+            traj_ids[traj_keys[code]] = str(earliest_timestamp[:10])
+
+        # Neue segment_id im Format [traj_id]_[segmentzahl] pro eindeutigem Segment
+        segment_labels = np.array([
+            f"{traj_ids[segment_to_bahn[s]]}_{segment_id_mapping[(segment_to_bahn[s], s)]}"
+            if key_codes[code] >= 0 else ''
+            for code, s in enumerate(uniq_segments)
+        ], dtype=object)
+
+        for mapping_name in mappings_to_use:
+            columns = list(self.mappings[mapping_name])
+
+            # Nur Zeilen, in denen alle Werte des Mappings vorhanden sind
+            mask = assigned.copy()
+            for csv_col in columns:
+                mask &= table.present[csv_col]
+
+            selected = np.flatnonzero(mask)
+            rows_processed[mapping_name] = len(selected)
+            if mapping_name in point_count_keys:
+                point_counts[point_count_keys[mapping_name]] += len(selected)
+
+            selected_keys = row_key[selected]
+            values = np.column_stack([table.values[c] for c in columns])
+
+            for code in key_order:
+                idx = selected[selected_keys == code]
+                traj_id = traj_ids[traj_keys[code]]
+                processed_data[mapping_name][traj_keys[code]] = [
+                    [traj_id, label, timestamp, *row_values]
+                    for label, timestamp, row_values in zip(
+                        segment_labels[row_segment[idx]].tolist(),
+                        timestamps[idx].tolist(),
+                        values[idx].tolist(),
+                    )
+                ]
 
         # Gib am Ende die gefundenen Bahn-IDs und die zugehörigen Segment-IDs aus
         # print(f"\n{data_type.upper()}-Bahnen und zugehörige Segmente:")
@@ -765,88 +757,6 @@ class CSVProcessor:
 
         return rows_processed, processed_data, point_counts, max_bahn, traj_ids
 
-    def process_mapping_row(self, row, mapping, traj_id, segment_id, timestamp,
-                            point_counts, mapping_name, movement_types=None):
-        """
-        Verarbeitet eine Zeile gemäß einem bestimmten Mapping und gibt die Datenzeile zurück.
-        """
-
-        # Hilfsfunktion zur Wertkonvertierung
-        def convert_value(value):
-            if value is None:
-                return None
-
-            if isinstance(value, str):
-                value = value.strip()
-
-            if value == '0' or value == '0.0':
-                return 0.0
-            elif value:
-                try:
-                    return float(value)
-                except (ValueError, TypeError):
-                    return None
-            return None
-
-        # Für RAPID_SETPOINTS (AP-Punkte) - spezielle Behandlung
-        if mapping_name == 'RAPID_SETPOINTS_MAPPING':
-            # Nur verarbeiten, wenn mindestens ein Wert vorhanden ist
-            if any(row.get(csv_col, '').strip() for csv_col in mapping):
-                # Erstelle Datenzeile
-                data_row = [traj_id, segment_id, timestamp]
-                values = []
-
-                # Werte aus dem Mapping extrahieren
-                for csv_col in mapping:
-                    value = row.get(csv_col, '')
-                    if any(x in csv_col for x in ['x_reached', 'y_reached', 'z_reached',
-                                                  'qx_reached', 'qy_reached', 'qz_reached', 'qw_reached']):
-                        values.append(convert_value(value))
-                    else:
-                        values.append(value.strip() if value.strip() else None)
-
-                data_row.extend(values)
-
-                return data_row
-
-        # Für alle anderen Mappings
-        else:
-            # Nur verarbeiten, wenn alle erforderlichen Werte vorhanden sind
-            if all(row.get(csv_col, '').strip() for csv_col in mapping):
-                data_row = [traj_id, segment_id, timestamp]
-                values = []
-
-                # Werte aus dem Mapping extrahieren
-                for csv_col in mapping:
-                    value = row.get(csv_col, '')
-                    values.append(convert_value(value))
-
-                data_row.extend(values)
-
-                # Punktzähler aktualisieren
-                if mapping_name == 'POSE_MAPPING':
-                    point_counts['number_pose_act'] += 1
-                elif mapping_name == 'VEL_ACT_MAPPING':
-                    point_counts['number_vel_act'] += 1
-                elif mapping_name == 'ACCEL_ACT_MAPPING':
-                    point_counts['number_accel_act'] += 1
-                elif mapping_name == 'POSITION_CMD_MAPPING':
-                    point_counts['number_position_cmd'] += 1
-                elif mapping_name == 'ORIENTATION_CMD_MAPPING':
-                    point_counts['number_orientation_cmd'] += 1
-                elif mapping_name == 'VEL_CMD_MAPPING':
-                    point_counts['number_vel_cmd'] += 1
-                elif mapping_name == 'JOINT_MAPPING':
-                    point_counts['number_joint_states'] += 1
-                elif mapping_name == 'ACCEL_CMD_MAPPING':
-                    point_counts['number_accel_cmd'] += 1
-                elif mapping_name == 'IMU_MAPPING':
-                    point_counts['number_imu'] += 1
-
-                return data_row
-
-        return None
-
     def calculate_freq_from_data(self, data_rows):
         """Berechnet die Frequenz basierend auf Zeitstempeln in den Datenzeilen."""
         if not data_rows or len(data_rows) < 2:
@@ -863,10 +773,196 @@ class CSVProcessor:
         avg_diff = sum(diffs) / len(diffs) if diffs else 0
         return 1 / avg_diff if avg_diff > 0 else 0.0
 
-    def _parse_trajectory_comments(self) -> dict:
+    def _read_columns(self, chunk_rows: int = CSV_CHUNK_ROWS):
+        """
+        Liest die CSV in einem Durchlauf.
+
+        Kommentarzeilen werden gesammelt, Datenzeilen chunkweise in typisierte
+        Spalten zerlegt und per Maske auf segment_id_ist / segment_id_soll in
+        IST- und SOLL-Seite getrennt. Es werden nur die Spalten aus MAPPINGS
+        behalten; Rohtext liegt höchstens für einen Chunk im Speicher.
+        Parquet- und Arrow-Dateien gehen an _read_columns_arrow.
+
+        Returns:
+            (act_table, cmd_table, comment_lines, first_timestamp, last_timestamp)
+        """
+        file_format = detect_file_format(self.file_path)
+        if file_format != 'csv':
+            return self._read_columns_arrow(file_format, chunk_rows)
+
+        comment_lines = []
+
+        def _data_lines(f):
+            for line in f:
+                if line.lstrip().startswith('#'):
+                    comment_lines.append(line.strip())
+                else:
+                    yield line
+
+        buffers = self._column_buffers()
+        first_timestamp = last_timestamp = None
+
+        with open(self.file_path, 'r', newline='') as csvfile:
+            reader = csv.reader(_data_lines(csvfile))
+            header = next(reader, [])
+            index = {name: i for i, name in enumerate(header)}
+            width = len(header)
+
+            while chunk := list(islice(reader, chunk_rows)):
+                # Leerzeilen überspringen, kurze Zeilen auffüllen (wie csv.DictReader)
+                chunk = [row if len(row) == width else (row + [''] * width)[:width] for row in chunk if row]
+                if not chunk:
+                    continue
+                columns = list(zip(*chunk))
+
+                def _text(name):
+                    i = index.get(name)
+                    return np.array(columns[i]) if i is not None else np.full(len(chunk), '', dtype='U1')
+
+                timestamps = _text('timestamp')
+                if first_timestamp is None:
+                    first_timestamp = timestamps[0].item()
+                last_timestamp = timestamps[-1].item()
+
+                for segment_id_field, buffer in buffers.items():
+                    segment_ids = _text(segment_id_field)
+                    mask = (segment_ids != '') & (segment_ids != 'NaN')
+                    if not mask.any():
+                        continue
+
+                    row_mask = mask.tolist()
+                    values, present = {}, {}
+                    for csv_col in buffer.numeric_columns:
+                        if csv_col in index:
+                            values[csv_col], present[csv_col] = _parse_numeric(
+                                list(compress(columns[index[csv_col]], row_mask))
+                            )
+                        else:
+                            values[csv_col] = np.full(int(mask.sum()), np.nan)
+                            present[csv_col] = np.zeros(int(mask.sum()), dtype=bool)
+
+                    buffer.append(
+                        {'timestamp': timestamps[mask], segment_id_field: segment_ids[mask]},
+                        values, present
+                    )
+
+        return (
+            buffers['segment_id_ist'].finish(),
+            buffers['segment_id_soll'].finish(),
+            comment_lines,
+            first_timestamp,
+            last_timestamp,
+        )
+
+    def _column_buffers(self) -> Dict[str, _ColumnBuffer]:
+        return {
+            segment_id_field: _ColumnBuffer(
+                ['timestamp', segment_id_field],
+                [csv_col for mapping_name in mappings for csv_col in self.mappings[mapping_name]],
+            )
+            for segment_id_field, mappings in (('segment_id_ist', ACT_MAPPINGS),
+                                               ('segment_id_soll', CMD_MAPPINGS))
+        }
+
+    def _read_columns_arrow(self, file_format: str, chunk_rows: int = CSV_CHUNK_ROWS):
+        """
+        Wie _read_columns, aber für Parquet- bzw. Arrow-IPC-Dateien mit
+        denselben logischen Spalten wie die CSV (Namen aus MAPPINGS).
+
+        Gelesen werden nur die benötigten Spalten, batchweise; numerische
+        Spalten kommen ohne Text-Umweg als float64 an (null → nicht vorhanden,
+        NaN zählt wie in der CSV als vorhanden). Die Kommentarzeilen stehen im
+        Schema-Metadatum ARROW_COMMENTS_KEY (zeilenweise wie in der CSV).
+
+        Returns:
+            (act_table, cmd_table, comment_lines, first_timestamp, last_timestamp)
+        """
+        if not ARROW_AVAILABLE:
+            raise RuntimeError('pyarrow ist nicht installiert — Parquet/Arrow-Dateien können nicht gelesen werden')
+
+        buffers = self._column_buffers()
+        wanted = {'timestamp', *buffers} | {
+            csv_col for buffer in buffers.values() for csv_col in buffer.numeric_columns
+        }
+
+        if file_format == 'parquet':
+            parquet_file = pq.ParquetFile(self.file_path)
+            schema = parquet_file.schema_arrow
+            batches = parquet_file.iter_batches(
+                batch_size=chunk_rows, columns=[name for name in schema.names if name in wanted]
+            )
+        elif file_format == 'arrow':
+            reader = pa.ipc.open_file(pa.memory_map(self.file_path))
+            schema = reader.schema
+            batches = (reader.get_batch(i) for i in range(reader.num_record_batches))
+        else:
+            reader = pa.ipc.open_stream(pa.memory_map(self.file_path))
+            schema = reader.schema
+            batches = reader
+
+        comments = (schema.metadata or {}).get(ARROW_COMMENTS_KEY, b'').decode('utf-8')
+        comment_lines = [line.strip() for line in comments.splitlines() if line.strip()]
+        first_timestamp = last_timestamp = None
+
+        for batch in batches:
+            n_rows = batch.num_rows
+            if not n_rows:
+                continue
+            names = set(batch.schema.names)
+
+            def _text(name):
+                if name not in names:
+                    return np.full(n_rows, '', dtype='U1')
+                column = batch.column(name)
+                if not pa.types.is_string(column.type):
+                    column = column.cast(pa.string())
+                return np.array(column.fill_null('').to_numpy(zero_copy_only=False), dtype=str)
+
+            def _numeric(name):
+                column = batch.column(name)
+                if pa.types.is_string(column.type) or pa.types.is_large_string(column.type):
+                    return _parse_numeric(column.fill_null('').to_pylist())
+                present = column.is_valid().to_numpy(zero_copy_only=False)
+                return column.cast(pa.float64()).to_numpy(zero_copy_only=False), present
+
+            timestamps = _text('timestamp')
+            if first_timestamp is None:
+                first_timestamp = timestamps[0].item()
+            last_timestamp = timestamps[-1].item()
+
+            for segment_id_field, buffer in buffers.items():
+                segment_ids = _text(segment_id_field)
+                mask = (segment_ids != '') & (segment_ids != 'NaN')
+                if not mask.any():
+                    continue
+
+                values, present = {}, {}
+                for csv_col in buffer.numeric_columns:
+                    if csv_col in names:
+                        column_values, column_present = _numeric(csv_col)
+                        values[csv_col], present[csv_col] = column_values[mask], column_present[mask]
+                    else:
+                        values[csv_col] = np.full(int(mask.sum()), np.nan)
+                        present[csv_col] = np.zeros(int(mask.sum()), dtype=bool)
+
+                buffer.append(
+                    {'timestamp': timestamps[mask], segment_id_field: segment_ids[mask]},
+                    values, present
+                )
+
+        return (
+            buffers['segment_id_ist'].finish(),
+            buffers['segment_id_soll'].finish(),
+            comment_lines,
+            first_timestamp,
+            last_timestamp,
+        )
+
+    def _parse_trajectory_comments(self, lines=None) -> dict:
         """
         Parse comment lines at the end of CSV file.
         Extracts velocity, load_data, and waypoint list.
+        lines: bereits gesammelte Kommentarzeilen (sonst wird die Datei gelesen).
         """
         result = {
             'velocity': None,
@@ -887,76 +983,79 @@ class CSVProcessor:
             s = s.strip().strip('[]')
             return [float(x) for x in s.split()]
 
-        with open(self.file_path, 'r') as f:
-            for line in f:
-                line = line.strip()
-                if not line.startswith('#'):
-                    continue
+        if lines is None:
+            with open(self.file_path, 'r') as f:
+                lines = [line for line in f if line.lstrip().startswith('#')]
 
-                content = line[1:].strip()
-
-                # velocity
-                if content.startswith('velocity:'):
-                    try:
-                        result['velocity'] = float(content.split(':', 1)[1].strip())
-                    except ValueError:
-                        pass
-
-                # load_data → weight
-                elif content.startswith('load_data:'):
-                    tool = content.split(':', 1)[1].strip()
-                    result['load_data'] = tool
-                    # longest match first
-                    for name in sorted(tool_weights, key=len, reverse=True):
-                        if name in tool:
-                            result['weight'] = tool_weights[name]
-                            break
-                
-                # stop_point
-                elif content.startswith('stop_point:'):
-                    try:
-                        result['stop_point'] = float(content.split(':', 1)[1].strip())
-                    except ValueError:
-                        pass
-
-                # seg_N: move_type; pos=[...]; quat=[...]; support_pos=[...]; support_quat=[...]
-                elif content.startswith('seg_'):
-                    try:
-                        if ';' in content:
-                            parts = [p.strip() for p in content.split(';') if p.strip()]
-                        else:
-                            parts = [p.strip() for p in content.split('\t') if p.strip()]
-                        
-                        print(f"[parse SEG] separator={'semicolon' if ';' in content else 'tab'} n_parts={len(parts)}")
-                        print(f"[parse SEG] all parts: {parts}")
-                        # parts[0] = 'seg_1: linear'
-                        move_type = parts[0].split(':', 1)[1].strip()
-
-                        wp = {'move_type': move_type}
-
-                        for part in parts[1:]:
-                            if part.startswith('pos='):
-                                wp['pos'] = parse_vec(part[4:])
-                            elif part.startswith('quat='):
-                                wp['quat'] = parse_vec(part[5:])
-                            elif part.startswith('support_pos='):
-                                wp['support_pos'] = parse_vec(part[12:])
-                            elif part.startswith('support_quat='):
-                                wp['support_quat'] = parse_vec(part[13:])
-                            elif part.startswith('velocity='):
-                                try:
-                                    wp['velocity'] = float(part.split('=', 1)[1])
-                                except ValueError:
-                                    pass
-                            elif part.startswith('stop_point='):
-                                try:
-                                    wp['stop_point'] = float(part.split('=', 1)[1])
-                                except ValueError:
-                                    pass
-
-                        result['waypoints'].append(wp)
-                    except Exception as e:
-                        logger.warning(f'Could not parse waypoint line: {line} — {e}')
+        for line in lines:
+            line = line.strip()
+            if not line.startswith('#'):
+                continue
+
+            content = line[1:].strip()
+
+            # velocity
+            if content.startswith('velocity:'):
+                try:
+                    result['velocity'] = float(content.split(':', 1)[1].strip())
+                except ValueError:
+                    pass
+
+            # load_data → weight
+            elif content.startswith('load_data:'):
+                tool = content.split(':', 1)[1].strip()
+                result['load_data'] = tool
+                # longest match first
+                for name in sorted(tool_weights, key=len, reverse=True):
+                    if name in tool:
+                        result['weight'] = tool_weights[name]
+                        break
+            
+            # stop_point
+            elif content.startswith('stop_point:'):
+                try:
+                    result['stop_point'] = float(content.split(':', 1)[1].strip())
+                except ValueError:
+                    pass
+
+            # seg_N: move_type; pos=[...]; quat=[...]; support_pos=[...]; support_quat=[...]
+            elif content.startswith('seg_'):
+                try:
+                    if ';' in content:
+                        parts = [p.strip() for p in content.split(';') if p.strip()]
+                    else:
+                        parts = [p.strip() for p in content.split('\t') if p.strip()]
+                    
+                    print(f"[parse SEG] separator={'semicolon' if ';' in content else 'tab'} n_parts={len(parts)}")
+                    print(f"[parse SEG] all parts: {parts}")
+                    # parts[0] = 'seg_1: linear'
+                    move_type = parts[0].split(':', 1)[1].strip()
+
+                    wp = {'move_type': move_type}
+
+                    for part in parts[1:]:
+                        if part.startswith('pos='):
+                            wp['pos'] = parse_vec(part[4:])
+                        elif part.startswith('quat='):
+                            wp['quat'] = parse_vec(part[5:])
+                        elif part.startswith('support_pos='):
+                            wp['support_pos'] = parse_vec(part[12:])
+                        elif part.startswith('support_quat='):
+                            wp['support_quat'] = parse_vec(part[13:])
+                        elif part.startswith('velocity='):
+                            try:
+                                wp['velocity'] = float(part.split('=', 1)[1])
+                            except ValueError:
+                                pass
+                        elif part.startswith('stop_point='):
+                            try:
+                                wp['stop_point'] = float(part.split('=', 1)[1])
+                            except ValueError:
+                                pass
+
+                    result['waypoints'].append(wp)
+                except Exception as e:
+                    logger.warning(f'Could not parse waypoint line: {line} — {e}')
 
         return result
 
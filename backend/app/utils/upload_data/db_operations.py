@@ -46,4 +46,35 @@ class DatabaseOperations:
         except Exception as error:
             logger.error(f"Error copying data into {table_name}: {error}")
             logger.error(f"Data that caused error: {data}")
-            raise
\ No newline at end of file
+            raise
+
+    async def copy_arrow_to_table(self, conn, table_name, batches, columns):
+        """
+        COPY aus Arrow-RecordBatches: pyarrow schreibt CSV direkt aus den
+        Spaltenpuffern, ohne ein Python-Objekt pro Wert. Textformat statt
+        binär → Postgres wandelt in den jeweiligen Spaltentyp.
+        """
+        import pyarrow as pa
+        import pyarrow.csv as pa_csv
+
+        write_options = pa_csv.WriteOptions(include_header=False)
+
+        async def _chunks():
+            for batch in batches:
+                sink = pa.BufferOutputStream()
+                pa_csv.write_csv(batch, sink, write_options=write_options)
+                yield sink.getvalue().to_pybytes()
+
+        try:
+            await conn.copy_to_table(
+                table_name,
+                source=_chunks(),
+                schema_name='motion',
+                columns=columns,
+                format='csv'
+            )
+
+            logger.info(f"Data copied successfully into {table_name}")
+        except Exception as error:
+            logger.error(f"Error copying data into {table_name}: {error}")
+            raise
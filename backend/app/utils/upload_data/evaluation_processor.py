@@ -2,13 +2,25 @@
 und schreibt die Ergebnisse in die evaluation.*-Tabellen.
 
 Wird direkt aus batch_processor.py aufgerufen nachdem die Bewegungsdaten
-erfolgreich in die DB geschrieben wurden.
+erfolgreich in die DB geschrieben wurden. evaluate() läuft dabei in einem
+Prozess-Pool, geschrieben wird von einem Writer-Task.
 """
+import asyncio
 import sys
 import os
 import logging
+import pickle
+import time
+from decimal import Decimal
+from itertools import repeat
+from multiprocessing import shared_memory
+from typing import Callable, Dict, List, Optional, Tuple
+
 import numpy as np
 
+from .csv_processor import PackedRows
+from ..process_pool import PROCESS_POOL_WORKERS, get_process_pool
+
 logger = logging.getLogger(__name__)
 
 # trajectory_evaluation Package aus dem Recorder laden
@@ -30,6 +42,13 @@ except ImportError as e:
 # Hilfsfunktionen: processed_data → numpy arrays
 # ---------------------------------------------------------------------------
 
+def _values_and_seg_ids(rows):
+    """Werte-Spalten (ab Index 3) + seg_ids — aus PackedRows ohne Umweg über Zeilen."""
+    if isinstance(rows, PackedRows):
+        return rows.values, rows.segment_ids()
+    return np.array([r[3:] for r in rows], dtype=float), [r[1] for r in rows]
+
+
 def _extract_arrays(traj_data: dict):
     """Extrahiert Soll/Ist-Arrays aus dem geparsten CSV-Daten-Dict.
 
@@ -49,17 +68,17 @@ def _extract_arrays(traj_data: dict):
         return None
 
     # POSITION_CMD: [traj_id, seg_id, timestamp, x_cmd, y_cmd, z_cmd]
-    soll_pos    = np.array([[r[3], r[4], r[5]] for r in pos_cmd], dtype=float)
-    seg_ids_pos = [r[1] for r in pos_cmd]
+    pos_values, seg_ids_pos = _values_and_seg_ids(pos_cmd)
+    soll_pos = np.ascontiguousarray(pos_values[:, 0:3])
 
     # TRANSFORM_MAPPING: [traj_id, seg_id, timestamp, x_act, y_act, z_act, qx_act, qy_act, qz_act, qw_act]
-    ist_pos     = np.array([[r[3], r[4], r[5]]         for r in transf], dtype=float)
-    ist_ori     = np.array([[r[6], r[7], r[8], r[9]]   for r in transf], dtype=float)
-    seg_ids_ori = [r[1] for r in transf]
+    transf_values, seg_ids_ori = _values_and_seg_ids(transf)
+    ist_pos = np.ascontiguousarray(transf_values[:, 0:3])
+    ist_ori = np.ascontiguousarray(transf_values[:, 3:7])
 
     # ORIENTATION_CMD: [traj_id, seg_id, timestamp, qx_cmd, qy_cmd, qz_cmd, qw_cmd]
     if ori_cmd:
-        soll_ori = np.array([[r[3], r[4], r[5], r[6]] for r in ori_cmd], dtype=float)
+        soll_ori = np.ascontiguousarray(_values_and_seg_ids(ori_cmd)[0][:, 0:4])
     else:
         soll_ori = None
 
@@ -70,163 +89,175 @@ def _extract_arrays(traj_data: dict):
 # DB-Upload Hilfsfunktionen
 # ---------------------------------------------------------------------------
 
-async def _insert_info(conn, schema_method: str, traj_id: str, seg_id: str,
-                       min_d: float, max_d: float, avg_d: float, std_d: float):
-    """Schreibt einen Info-Eintrag (Gesamtbahn oder Segment)."""
-    col_prefix = schema_method
-    await conn.execute(f"""
-        INSERT INTO evaluation.{col_prefix}_info
-            (traj_id, seg_id,
-             {col_prefix}_min_distance, {col_prefix}_max_distance,
-             {col_prefix}_average_distance, {col_prefix}_standard_deviation)
-        VALUES ($1,$2,
-                ROUND($3::numeric,7), ROUND($4::numeric,7),
-                ROUND($5::numeric,7), ROUND($6::numeric,7))
-    """, traj_id, seg_id, min_d, max_d, avg_d, std_d)
-
-
-async def _insert_pos_deviations(conn, method: str, traj_id: str,
-                                 distances, soll_aligned, ist_aligned, seg_ids):
-    """Schreibt Positions-Abweichungen (ED, SIDTW)."""
-    table = f'{method}_evaluation'
-    dev_col   = f'{method}_deviation'
-    cmd_cols  = f'{method}_cmd_x, {method}_cmd_y, {method}_cmd_z'
-    act_cols  = f'{method}_act_x, {method}_act_y, {method}_act_z'
-
-    records = []
-    for k in range(len(distances)):
-        seg_id = seg_ids[k] if seg_ids and k < len(seg_ids) else traj_id
-        records.append((
-            traj_id, seg_id,
-            float(distances[k]),
-            float(soll_aligned[k, 0]), float(soll_aligned[k, 1]), float(soll_aligned[k, 2]),
-            float(ist_aligned[k, 0]),  float(ist_aligned[k, 1]),  float(ist_aligned[k, 2]),
-            k + 1,
-        ))
+# Komponenten der ausgerichteten Soll/Ist-Punkte pro Methode
+_DEVIATION_AXES = {
+    'ed':    ('x', 'y', 'z'),
+    'sidtw': ('x', 'y', 'z'),
+    'gd':    ('x', 'y', 'z', 'w'),
+    'qdtw':  ('x', 'y', 'z', 'w'),
+}
+
+
+def _round7(values) -> List[Decimal]:
+    """Wie ROUND(x::numeric, 7) in SQL — Decimal passt für numeric- und float-Spalten."""
+    return [Decimal(f'{v:.7f}') for v in np.asarray(values, dtype=float).tolist()]
+
+
+def _segment_stats(distances: np.ndarray, seg_ids) -> Tuple[List[str], np.ndarray]:
+    """
+    min/max/mean/std pro Segment in einem Durchlauf.
+
+    Returns:
+        (seg_ids in Reihenfolge des ersten Auftretens, [4 x k] min/max/mean/std)
+    """
+    labels = np.asarray(seg_ids).astype(str)
+    unique, first, inverse = np.unique(labels, return_index=True, return_inverse=True)
+
+    counts = np.bincount(inverse)
+    mean   = np.bincount(inverse, weights=distances) / counts
+    std    = np.sqrt(np.bincount(inverse, weights=(distances - mean[inverse]) ** 2) / counts)
+
+    order  = np.argsort(inverse, kind='stable')
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    d_min  = np.minimum.reduceat(distances[order], starts)
+    d_max  = np.maximum.reduceat(distances[order], starts)
+
+    appearance = np.argsort(first)
+    return unique[appearance].tolist(), np.vstack([d_min, d_max, mean, std])[:, appearance]
+
+
+async def _insert_info_rows(conn, method: str, traj_id: str, distances: np.ndarray, seg_ids):
+    """Info-Zeilen einer Methode (pro Segment + Gesamtbahn) mit einem COPY."""
+    if seg_ids and len(seg_ids) == len(distances):
+        seg_labels, stats = _segment_stats(distances, seg_ids)
+    else:
+        seg_labels, stats = [], np.empty((4, 0))
+
+    # Gesamtbahn-Zeile (seg_id == traj_id)
+    seg_labels = seg_labels + [traj_id]
+    stats = np.column_stack([stats, [distances.min(), distances.max(), distances.mean(), distances.std()]])
 
     await conn.copy_records_to_table(
-        table,
-        records=records,
+        f'{method}_info',
+        records=zip(repeat(traj_id), seg_labels, *(_round7(row) for row in stats)),
         schema_name='evaluation',
-        columns=['traj_id', 'seg_id', dev_col,
-                 f'{method}_cmd_x', f'{method}_cmd_y', f'{method}_cmd_z',
-                 f'{method}_act_x', f'{method}_act_y', f'{method}_act_z',
-                 'points_order'],
+        columns=['traj_id', 'seg_id',
+                 f'{method}_min_distance', f'{method}_max_distance',
+                 f'{method}_average_distance', f'{method}_standard_deviation'],
     )
 
 
-async def _insert_ori_deviations(conn, method: str, traj_id: str,
-                                 distances, soll_aligned, ist_aligned, seg_ids):
-    """Schreibt Orientierungs-Abweichungen (GD, QDTW)."""
-    table = f'{method}_evaluation'
-    dev_col = f'{method}_deviation'
-
-    records = []
-    for k in range(len(distances)):
-        seg_id = seg_ids[k] if seg_ids and k < len(seg_ids) else traj_id
-        records.append((
-            traj_id, seg_id,
-            float(distances[k]),
-            float(soll_aligned[k, 0]), float(soll_aligned[k, 1]),
-            float(soll_aligned[k, 2]), float(soll_aligned[k, 3]),
-            float(ist_aligned[k, 0]),  float(ist_aligned[k, 1]),
-            float(ist_aligned[k, 2]),  float(ist_aligned[k, 3]),
-            k + 1,
-        ))
+async def _insert_deviations(conn, method: str, traj_id: str,
+                             distances, soll_aligned, ist_aligned, seg_ids):
+    """Schreibt Abweichungen pro Punkt (Position: ED, SIDTW / Orientierung: GD, QDTW)."""
+    axes = _DEVIATION_AXES[method]
+    n = len(distances)
+
+    # seg_id pro Punkt; fehlende Einträge → traj_id
+    seg_col = list(seg_ids[:n]) if seg_ids else []
+    seg_col += [traj_id] * (n - len(seg_col))
+
+    soll_cols = np.asarray(soll_aligned, dtype=float)[:n, :len(axes)].T.tolist()
+    ist_cols  = np.asarray(ist_aligned, dtype=float)[:n, :len(axes)].T.tolist()
 
     await conn.copy_records_to_table(
-        table,
-        records=records,
+        f'{method}_evaluation',
+        records=zip(
+            repeat(traj_id, n), seg_col,
+            np.asarray(distances, dtype=float).tolist(),
+            *soll_cols, *ist_cols,
+            range(1, n + 1),
+        ),
         schema_name='evaluation',
-        columns=['traj_id', 'seg_id', dev_col,
-                 f'{method}_cmd_x', f'{method}_cmd_y', f'{method}_cmd_z', f'{method}_cmd_w',
-                 f'{method}_act_x', f'{method}_act_y', f'{method}_act_z', f'{method}_act_w',
+        columns=['traj_id', 'seg_id', f'{method}_deviation',
+                 *(f'{method}_cmd_{a}' for a in axes),
+                 *(f'{method}_act_{a}' for a in axes),
                  'points_order'],
     )
 
 
 # ---------------------------------------------------------------------------
-# Haupt-Einstiegspunkt
+# Evaluation im Prozess-Pool
 # ---------------------------------------------------------------------------
 
-async def evaluate_and_upload(conn, traj_id: str, traj_data: dict):
-    """Berechnet alle Metriken für eine Bahn und schreibt sie in die DB.
+EVAL_WORKERS = int(os.getenv('EVAL_WORKERS', PROCESS_POOL_WORKERS))
+EVAL_METHODS = ('ed', 'sidtw', 'gd', 'qdtw')
 
-    Wird aus batch_processor.py aufgerufen.
-    """
-    if not _EVAL_AVAILABLE:
-        logger.warning(f'Evaluation für {traj_id} übersprungen (trajectory_evaluation nicht verfügbar)')
-        return
+class _SharedArrays:
+    """Eingangs-Arrays einer Bahn in einem SharedMemory-Block — der Worker liest sie ohne Kopie."""
 
-    extracted = _extract_arrays(traj_data)
-    if extracted is None:
-        logger.warning(f'Keine Positions-/Ist-Daten für {traj_id} — Evaluation übersprungen')
-        return
+    def __init__(self, arrays: Dict[str, np.ndarray]):
+        arrays = {key: np.ascontiguousarray(value) for key, value in arrays.items()}
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, sum(a.nbytes for a in arrays.values())))
+        self.spec = {'name': self.shm.name, 'arrays': {}}
+        offset = 0
+        for key, array in arrays.items():
+            np.ndarray(array.shape, array.dtype, buffer=self.shm.buf, offset=offset)[...] = array
+            self.spec['arrays'][key] = (array.shape, array.dtype.str, offset)
+            offset += array.nbytes
 
-    soll_pos, ist_pos, soll_ori, ist_ori, seg_ids_pos, seg_ids_ori = extracted
+    def release(self):
+        self.shm.close()
+        self.shm.unlink()
 
-    use_ori = soll_ori is not None and len(soll_ori) > 0 and len(ist_ori) > 0
 
-    logger.info(f'Starte Evaluation für {traj_id}: soll={soll_pos.shape}, ist={ist_pos.shape}')
+def _encode_seg_ids(seg_ids) -> Tuple[List[str], np.ndarray]:
+    labels, codes = np.unique(np.asarray(seg_ids, dtype=str), return_inverse=True)
+    return labels.tolist(), codes.astype(np.int32)
 
-    try:
-        results = evaluate(
-            soll_pos=soll_pos,
-            ist_pos=ist_pos,
-            soll_ori=soll_ori if use_ori else np.zeros((1, 4)),
-            ist_ori=ist_ori if use_ori else np.zeros((1, 4)),
-            segment_ids_pos=seg_ids_pos,
-            segment_ids_ori=seg_ids_ori,
-            use_ed=True,
-            use_sidtw=True,
-            use_gd=use_ori,
-            use_qdtw=use_ori,
-        )
-    except Exception as e:
-        logger.error(f'Evaluation fehlgeschlagen für {traj_id}: {e}')
-        return
 
+def _evaluate_worker(spec: Dict, labels_pos: List[str], labels_ori: List[str], use_ori: bool) -> bytes:
+    """Läuft im Worker-Prozess: evaluate() einzeln pro Methode, mit Laufzeit pro Methode.
+
+    Gibt (results, timings) gepickelt zurück — serialisiert wird, solange der
+    Block noch gemappt ist, denn die Ergebnisse können Views auf die Eingaben sein.
+    """
+    # Pool-Worker teilen den resource_tracker des Hauptprozesses → unlink() dort räumt ab
+    shm = shared_memory.SharedMemory(name=spec['name'])
+    try:
+        arrays = {
+            key: np.ndarray(shape, dtype, buffer=shm.buf, offset=offset)
+            for key, (shape, dtype, offset) in spec['arrays'].items()
+        }
+        seg_ids_pos = [labels_pos[c] for c in arrays['seg_codes_pos'].tolist()]
+        seg_ids_ori = [labels_ori[c] for c in arrays['seg_codes_ori'].tolist()]
+
+        results, timings = {}, {}
+        for method in EVAL_METHODS:
+            if method in ('gd', 'qdtw') and not use_ori:
+                continue
+            started = time.perf_counter()
+            results.update(evaluate(
+                soll_pos=arrays['soll_pos'],
+                ist_pos=arrays['ist_pos'],
+                soll_ori=arrays['soll_ori'],
+                ist_ori=arrays['ist_ori'],
+                segment_ids_pos=seg_ids_pos,
+                segment_ids_ori=seg_ids_ori,
+                use_ed=method == 'ed',
+                use_sidtw=method == 'sidtw',
+                use_gd=method == 'gd',
+                use_qdtw=method == 'qdtw',
+            ))
+            timings[method] = time.perf_counter() - started
+
+        return pickle.dumps((results, timings), protocol=pickle.HIGHEST_PROTOCOL)
+    finally:
+        shm.close()
+
+
+async def _upload_results(conn, traj_id: str, results: Dict, use_ori: bool):
+    """Schreibt die Ergebnisse einer Bahn (Info-Zeilen + Abweichungen) in einer Transaktion."""
     try:
         async with conn.transaction():
             for method, result in results.items():
-                d = result.distances
-                seg_ids = result.segment_ids  # one entry per distance point
-
-                # Eine Zeile pro Segment
-                if seg_ids and len(seg_ids) == len(d):
-                    seen = []
-                    for sid in seg_ids:
-                        if sid not in seen:
-                            seen.append(sid)
-                    for sid in seen:
-                        mask = [i for i, s in enumerate(seg_ids) if s == sid]
-                        seg_d = d[mask]
-                        await _insert_info(conn, method, traj_id, str(sid),
-                                           round(float(np.min(seg_d)), 7),
-                                           round(float(np.max(seg_d)), 7),
-                                           round(float(np.mean(seg_d)), 7),
-                                           round(float(np.std(seg_d)), 7))
-
-                # Gesamtbahn-Zeile (seg_id == traj_id)
-                await _insert_info(conn, method, traj_id, traj_id,
-                                   round(float(np.min(d)), 7),
-                                   round(float(np.max(d)), 7),
-                                   round(float(np.mean(d)), 7),
-                                   round(float(np.std(d)), 7))
-
-                # Abweichungen pro Punkt
-                if method in ('ed', 'sidtw'):
-                    await _insert_pos_deviations(
-                        conn, method, traj_id,
-                        d, result.soll_aligned, result.ist_aligned,
-                        seg_ids,
-                    )
-                else:
-                    await _insert_ori_deviations(
-                        conn, method, traj_id,
-                        d, result.soll_aligned, result.ist_aligned,
-                        seg_ids,
-                    )
+                d = np.asarray(result.distances, dtype=float)
+                await _insert_info_rows(conn, method, traj_id, d, result.segment_ids)
+                await _insert_deviations(
+                    conn, method, traj_id,
+                    d, result.soll_aligned, result.ist_aligned,
+                    result.segment_ids,
+                )
 
         logger.info(f'✓ Evaluation hochgeladen für {traj_id}: '
                     f'ED avg={results["ed"].avg_distance:.3f} '
@@ -236,3 +267,130 @@ async def evaluate_and_upload(conn, traj_id: str, traj_data: dict):
 
     except Exception as e:
         logger.error(f'DB-Upload Evaluation fehlgeschlagen für {traj_id}: {e}')
+
+
+# ---------------------------------------------------------------------------
+# Haupt-Einstiegspunkt
+# ---------------------------------------------------------------------------
+
+async def evaluate_and_upload_batch(
+        connection: Callable,
+        trajs: Dict[str, dict],
+        on_done: Optional[Callable[[str], None]] = None,
+) -> Dict[str, float]:
+    """Berechnet alle Metriken für mehrere Bahnen und schreibt sie in die DB.
+
+    evaluate() läuft in EVAL_WORKERS Prozessen gleichzeitig, die Eingangs-
+    Arrays gehen per Shared Memory an die Worker. Ein Writer-Task schreibt
+    die Ergebnisse, sobald sie eintreffen.
+
+    Args:
+        connection: () → async Context-Manager, der eine Connection liefert
+        trajs:      traj_id → processed_data (aus dem CSVProcessor)
+        on_done:    Callback pro abgeschlossener Bahn (auch übersprungen/fehlgeschlagen)
+
+    Returns:
+        evaluate()-Laufzeit pro Methode in Sekunden, summiert über alle Bahnen
+    """
+    on_done = on_done or (lambda traj_id: None)
+    if not _EVAL_AVAILABLE:
+        logger.warning(f'Evaluation für {len(trajs)} Bahnen übersprungen (trajectory_evaluation nicht verfügbar)')
+        for traj_id in trajs:
+            on_done(traj_id)
+        return {}
+
+    loop = asyncio.get_running_loop()
+    executor = get_process_pool()
+    slots = asyncio.Semaphore(EVAL_WORKERS * 2)   # begrenzt gleichzeitig belegten Shared Memory
+    write_queue: asyncio.Queue = asyncio.Queue(maxsize=EVAL_WORKERS * 2)
+    method_seconds: Dict[str, float] = {}
+    failed: List[str] = []
+
+    def _done(traj_id: str):
+        try:
+            on_done(traj_id)
+        except Exception as e:
+            logger.error(f'on_done-Callback fehlgeschlagen für {traj_id}: {e}')
+
+    async def _evaluate(traj_id: str, traj_data: dict):
+        """evaluate() für eine Bahn → (results, use_ori), None ohne Positions-/Ist-Daten."""
+        extracted = _extract_arrays(traj_data)
+        if extracted is None:
+            logger.warning(f'Keine Positions-/Ist-Daten für {traj_id} — Evaluation übersprungen')
+            return None
+
+        soll_pos, ist_pos, soll_ori, ist_ori, seg_ids_pos, seg_ids_ori = extracted
+        use_ori = soll_ori is not None and len(soll_ori) > 0 and len(ist_ori) > 0
+        labels_pos, codes_pos = _encode_seg_ids(seg_ids_pos)
+        labels_ori, codes_ori = _encode_seg_ids(seg_ids_ori)
+
+        logger.info(f'Starte Evaluation für {traj_id}: soll={soll_pos.shape}, ist={ist_pos.shape}')
+
+        async with slots:
+            shared = _SharedArrays({
+                'soll_pos':      soll_pos,
+                'ist_pos':       ist_pos,
+                'soll_ori':      soll_ori if use_ori else np.zeros((1, 4)),
+                'ist_ori':       ist_ori if use_ori else np.zeros((1, 4)),
+                'seg_codes_pos': codes_pos,
+                'seg_codes_ori': codes_ori,
+            })
+            try:
+                results, timings = pickle.loads(await loop.run_in_executor(
+                    executor, _evaluate_worker, shared.spec, labels_pos, labels_ori, use_ori
+                ))
+            finally:
+                shared.release()
+
+        for method, seconds in timings.items():
+            method_seconds[method] = method_seconds.get(method, 0.0) + seconds
+        logger.info(f'Evaluation {traj_id}: ' + ', '.join(f'{m} {s:.2f}s' for m, s in timings.items()))
+        return results, use_ori
+
+    async def _compute(traj_id: str, traj_data: dict):
+        # Fehler pro Bahn (Vorbereitung, Shared Memory, Worker) → protokollieren, die übrigen laufen weiter
+        try:
+            evaluated = await _evaluate(traj_id, traj_data)
+        except Exception as e:
+            logger.error(f'Evaluation fehlgeschlagen für {traj_id}: {e}')
+            failed.append(traj_id)
+            _done(traj_id)
+            return
+        if evaluated is None:
+            _done(traj_id)
+            return
+        results, use_ori = evaluated
+        await write_queue.put((traj_id, results, use_ori))
+
+    async def _writer():
+        # Fehler pro Bahn: protokollieren und weiter leeren — sonst blockieren die Producer auf put()
+        while (item := await write_queue.get()) is not None:
+            traj_id, results, use_ori = item
+            try:
+                async with connection() as conn:
+                    await _upload_results(conn, traj_id, results, use_ori)
+            except Exception as e:
+                logger.error(f'Upload der Evaluation fehlgeschlagen für {traj_id}: {e}')
+                failed.append(traj_id)
+            _done(traj_id)
+
+    writer = asyncio.create_task(_writer())
+    producers = asyncio.gather(*(_compute(traj_id, traj_data) for traj_id, traj_data in trajs.items()))
+    # Endet der Writer vorzeitig (unerwarteter Fehler), warten die Producer nicht länger auf die Queue
+    writer.add_done_callback(lambda _: producers.cancel())
+    try:
+        await producers
+    except asyncio.CancelledError:
+        if not writer.done():
+            raise
+    finally:
+        if not writer.done():
+            await write_queue.put(None)
+        await writer
+
+    if failed:
+        logger.warning(f'Evaluation für {len(failed)} von {len(trajs)} Bahnen fehlgeschlagen: {", ".join(failed)}')
+    if method_seconds:
+        logger.info('Evaluation-Laufzeit pro Methode: ' +
+                    ', '.join(f'{m} {s:.2f}s' for m, s in method_seconds.items()))
+    return {method: round(seconds, 3) for method, seconds in method_seconds.items()}
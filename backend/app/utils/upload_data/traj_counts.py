@@ -0,0 +1,38 @@
+# backend/app/utils/upload_data/traj_counts.py
+"""
+Gecachte Zeilenzahlen für die Listen-Endpunkte.
+
+Statt bei jeder Seite SELECT COUNT(*) FROM motion.traj_info zu rechnen,
+führt der Upload einen Zähler in motion.traj_counts mit (in derselben
+Transaktion wie der traj_info-COPY).
+
+Tabelle und Startwert kommen aus scripts/migrate_schema.py (Schritt
+traj_counts). Der Zähler wird nur beim Upload erhöht — Zeilen, die außerhalb
+des Uploads gelöscht oder eingefügt werden, sieht er nicht. Erneutes
+Ausführen des Schritts (--only traj_counts) zählt exakt nach und setzt ihn
+zurück; exact_count=true an den Endpunkten zählt pro Anfrage exakt, schreibt
+den Zähler aber nicht.
+"""
+
+import logging
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+TRAJ_INFO_COUNT = 'traj_info'
+
+
+async def add_traj_count(conn: asyncpg.Connection, delta: int, name: str = TRAJ_INFO_COUNT) -> None:
+    """Zähler fortschreiben (im Upload in derselben Transaktion wie traj_info)."""
+    if not delta:
+        return
+    await conn.execute("""
+        INSERT INTO motion.traj_counts (name, n) VALUES ($1, $2)
+        ON CONFLICT (name) DO UPDATE
+            SET n = motion.traj_counts.n + EXCLUDED.n, updated_at = NOW()
+    """, name, delta)
+
+
+async def get_traj_count(conn: asyncpg.Connection, name: str = TRAJ_INFO_COUNT) -> int:
+    return await conn.fetchval("SELECT n FROM motion.traj_counts WHERE name = $1", name) or 0
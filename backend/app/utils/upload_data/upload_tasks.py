@@ -0,0 +1,241 @@
+# backend/app/utils/upload_data/upload_tasks.py
+"""
+CSV-Upload als Background-Job.
+
+Der Request speichert nur die Dateien und liefert eine task_id; Parsen,
+Insert, Metadaten und Evaluation laufen danach als Stufen im Hintergrund.
+Fortschritt pro Stufe und die file_results liegen im selben JobStore wie
+die Metadata-Tasks (für alle uvicorn-Worker sichtbar).
+
+Uploads sind nicht fortsetzbar: jeder Job merkt sich den Prozess, der ihn
+ausführt (owner). Beim Startup werden pending-/running-Uploads, deren
+Prozess nicht mehr lebt, als failed markiert — sonst pollt der Client ewig.
+"""
+
+import asyncio
+import copy
+import logging
+import os
+import socket
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from .batch_processor import BatchProcessor
+from ..metadata_embeddings.background_tasks import get_job_store, TaskStatus, WORKER_ID
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_TASK_TYPE = "csv_upload"
+UPLOAD_STAGES    = ["parse", "insert", "metadata", "evaluation"]
+
+
+def _initial_stages(n_files: int) -> Dict[str, Dict]:
+    stages = {stage: {"status": TaskStatus.PENDING, "processed": 0, "total": 0} for stage in UPLOAD_STAGES}
+    stages["parse"]["total"] = n_files
+    return stages
+
+
+async def create_upload_task(task_id: str, files_and_paths: List[Dict], details: Dict):
+    """Legt den Job an, bevor der Request antwortet → Status sofort abfragbar."""
+    await asyncio.to_thread(get_job_store().create, task_id, UPLOAD_TASK_TYPE, {
+        "status": TaskStatus.PENDING,
+        "owner": WORKER_ID,
+        "created_at": datetime.now().isoformat(),
+        "current_stage": None,
+        "stages": _initial_stages(len(files_and_paths)),
+        "file_results": [
+            {"filename": f['filename'], "segmentsFound": 0, "success": False, "error": None}
+            for f in files_and_paths
+        ],
+        "errors": [],
+        "details": details,
+    })
+
+
+class _ProgressWriter:
+    """
+    Fortschritt aus dem (synchronen) progress-Callback in den JobStore:
+    Updates werden gesammelt und von höchstens einem Task per to_thread
+    geschrieben — der Event-Loop wartet nie auf SQLite, die Reihenfolge bleibt.
+    """
+
+    def __init__(self, task_id: str):
+        self.task_id = task_id
+        self._pending: Dict = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def push(self, **fields):
+        details = fields.pop("details", None)
+        # Kopie: stages/file_results werden weiter verändert, während der Thread serialisiert
+        self._pending.update(copy.deepcopy(fields))
+        if details:
+            self._pending.setdefault("details", {}).update(copy.deepcopy(details))
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._flush())
+
+    async def _flush(self):
+        while self._pending:
+            fields, self._pending = self._pending, {}
+            try:
+                await asyncio.to_thread(get_job_store().update, self.task_id, **fields)
+            except Exception as e:
+                logger.error(f"Progress update for {self.task_id} failed: {e}")
+
+    async def drain(self):
+        """Ausstehende Updates schreiben (vor dem abschließenden Status)."""
+        if self._task is not None:
+            await self._task
+
+
+def _owner_alive(owner: Optional[str]) -> bool:
+    """owner = WORKER_ID (host:pid:suffix); nur Prozesse auf diesem Host lassen sich prüfen."""
+    try:
+        host, pid, _ = owner.split(":")
+        pid = int(pid)
+    except (AttributeError, ValueError):
+        return False
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+async def fail_interrupted_uploads() -> int:
+    """Beim Startup: Uploads ohne lebenden Prozess als failed markieren."""
+    store = get_job_store()
+    interrupted = [
+        task_id for task_id, state in (await asyncio.to_thread(store.unfinished, UPLOAD_TASK_TYPE)).items()
+        if not _owner_alive(state.get("owner"))
+    ]
+    for task_id in interrupted:
+        await asyncio.to_thread(
+            store.update, task_id,
+            status=TaskStatus.FAILED,
+            failed_at=datetime.now().isoformat(),
+            error="Upload interrupted by a server restart — please upload the files again",
+        )
+    if interrupted:
+        logger.warning(f"Marked {len(interrupted)} interrupted upload task(s) as failed")
+    return len(interrupted)
+
+
+def upload_progress_percent(task_data: Dict) -> float:
+    """Mittel über alle nicht übersprungenen Stufen (Stufe ohne Items = fertig)."""
+    stages = [s for s in task_data.get("stages", {}).values() if s["status"] != "skipped"]
+    if not stages:
+        return 0.0
+    fractions = [
+        1.0 if s["status"] == TaskStatus.COMPLETED else (s["processed"] / s["total"] if s["total"] else 0.0)
+        for s in stages
+    ]
+    return round(100 * sum(fractions) / len(fractions), 1)
+
+
+async def process_upload_background(
+        task_id: str,
+        files_and_paths: List[Dict],
+        db_pool,
+        robot_model: str,
+        path_planning: str,
+        source_data_act: str,
+        source_data_cmd: str,
+        upload_database: bool,
+        segmentation_method: str,
+        num_segments: int,
+        reference_position: Optional[tuple] = None,
+        tag: Optional[str] = None,
+):
+    """
+    Führt den Upload stufenweise aus und schreibt den Fortschritt in den
+    JobStore. Die temporären Dateien werden am Ende immer gelöscht.
+    """
+    start_time = datetime.now()
+    stages = _initial_stages(len(files_and_paths))
+    await asyncio.to_thread(
+        get_job_store().update, task_id,
+        status=TaskStatus.RUNNING, started_at=start_time.isoformat(), stages=stages, owner=WORKER_ID,
+    )
+    writer = _ProgressWriter(task_id)
+
+    def progress(stage: str, processed: int, total: int, file_results: Optional[List[Dict]] = None, **extra):
+        stages[stage].update(
+            processed=processed,
+            total=total,
+            status=TaskStatus.COMPLETED if processed >= total else TaskStatus.RUNNING,
+        )
+        # metadata und evaluation laufen gleichzeitig → erste nicht abgeschlossene Stufe
+        current = next((name for name in UPLOAD_STAGES if stages[name]["status"] == TaskStatus.RUNNING), stage)
+        fields = {"current_stage": current, "stages": stages}
+        if file_results is not None:
+            fields["file_results"] = file_results
+        if extra:
+            # z. B. copy_stats (rows / seconds / rows_per_second pro Tabelle),
+            # eval_method_seconds (evaluate()-Laufzeit pro Methode)
+            fields["details"] = extra
+        writer.push(**fields)
+
+    try:
+        file_results = await BatchProcessor().process_csv_batch(
+            files_and_paths,
+            robot_model,
+            path_planning,
+            source_data_act,
+            source_data_cmd,
+            upload_database,
+            segmentation_method,
+            num_segments,
+            None,
+            reference_position,
+            tag=tag,
+            db_pool=db_pool,
+            progress=progress,
+        )
+
+        # Nicht erreichte Stufen (kein DB-Upload, keine neuen Bahnen)
+        for stage in stages.values():
+            if stage["status"] == TaskStatus.PENDING:
+                stage["status"] = "skipped"
+            elif stage["status"] == TaskStatus.RUNNING:
+                stage["status"] = TaskStatus.COMPLETED
+
+        processing_time = (datetime.now() - start_time).total_seconds()
+        await writer.drain()
+        await asyncio.to_thread(
+            get_job_store().update, task_id,
+            status=TaskStatus.COMPLETED,
+            completed_at=datetime.now().isoformat(),
+            current_stage=None,
+            stages=stages,
+            file_results=file_results,
+            processing_time_seconds=processing_time,
+            summary={
+                "files": len(file_results),
+                "successful_files": sum(1 for r in file_results if r["success"]),
+                "trajectories": sum(r["segmentsFound"] for r in file_results),
+            }
+        )
+        logger.info(f"Upload task {task_id} completed in {processing_time:.2f} seconds")
+
+    except Exception as e:
+        logger.error(f"Upload task {task_id} failed: {e}")
+        await writer.drain()
+        await asyncio.to_thread(
+            get_job_store().update, task_id,
+            status=TaskStatus.FAILED,
+            failed_at=datetime.now().isoformat(),
+            stages=stages,
+            error=str(e)
+        )
+
+    finally:
+        for file_info in files_and_paths:
+            try:
+                if os.path.exists(file_info['path']):
+                    os.unlink(file_info['path'])
+            except Exception as cleanup_error:
+                logger.error(f"Error cleaning up temporary file {file_info['path']}: {str(cleanup_error)}")
@@ -0,0 +1,205 @@
+# backend/scripts/benchmark_arrow_ingest.py
+"""
+Benchmark: Ingest aus Parquet/Arrow gegen den CSV-Pfad.
+
+Jede CSV wird einmal nach Parquet bzw. Arrow IPC konvertiert (typisierte
+Spalten, Kommentarzeilen im Schema-Metadatum 'comments' — so, wie die
+Aufzeichnung sie direkt schreiben würde). Danach wird pro Datei gemessen:
+
+  - Einlesen (_read_columns) und komplette Verarbeitung (process_csv + pack)
+  - COPY-Vorbereitung ohne DB: Zeilen-Tupel (copy_records_to_table) gegen
+    CSV-Bytes aus den Arrow-Puffern (copy_arrow_to_table)
+
+Die verarbeiteten Bahnen beider Pfade müssen identisch sein; Exit-Code 1,
+wenn sich mindestens eine Datei unterscheidet.
+
+Verwendung:
+    python benchmark_arrow_ingest.py data/record_*.csv
+    python benchmark_arrow_ingest.py --format arrow --repeat 5 data/
+    python benchmark_arrow_ingest.py --segmentation reference_position --ref 1000 0 500 data/
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import os
+import statistics
+import sys
+import tempfile
+import time
+from itertools import chain
+from typing import Callable, Dict, List
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from utils.upload_data.csv_processor import (
+    ARROW_COMMENTS_KEY, CSVProcessor, PackedRows, pack_processed_data
+)
+from utils.upload_data.db_config import MAPPINGS
+
+TEXT_COLUMNS = ['timestamp', 'segment_id_ist', 'segment_id_soll']
+
+# Mapping → COPY-Spalten (wie TABLE_MAPPINGS in batch_processor, ohne dessen DB-Imports)
+COPY_COLUMNS = {
+    mapping_name: ['traj_id', 'seg_id', 'timestamp', *mapping.values()]
+    for mapping_name, mapping in MAPPINGS.items()
+}
+
+
+# ── Konvertierung CSV → Parquet / Arrow IPC ──────────────────────────────────
+
+def csv_to_arrow_table(path: str) -> pa.Table:
+    """CSV → Arrow-Tabelle; leere Zellen werden null, 'NaN' bleibt ein NaN-Wert."""
+    with open(path, 'rb') as f:
+        lines = f.read().splitlines(keepends=True)
+    comments = b''.join(line for line in lines if line.lstrip().startswith(b'#'))
+    data = b''.join(line for line in lines if not line.lstrip().startswith(b'#'))
+
+    table = pa_csv.read_csv(
+        io.BytesIO(data),
+        convert_options=pa_csv.ConvertOptions(
+            column_types={name: pa.string() for name in TEXT_COLUMNS},
+            null_values=[''],
+            strings_can_be_null=True,
+        ),
+    )
+    return table.replace_schema_metadata({ARROW_COMMENTS_KEY: comments})
+
+
+def write_converted(table: pa.Table, out_path: str, file_format: str):
+    if file_format == 'parquet':
+        pq.write_table(table, out_path)
+    else:
+        with pa.OSFile(out_path, 'wb') as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+# ── Messung ──────────────────────────────────────────────────────────────────
+
+def best_of(repeat: int, fn: Callable):
+    times, result = [], None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return min(times), statistics.median(times), result
+
+
+def process(path: str, args) -> List[Dict]:
+    with contextlib.redirect_stdout(io.StringIO()):
+        processed = CSVProcessor(path).process_csv(
+            'irb4400', 'unknown', 'vicon', 'abb_websocket', os.path.basename(path),
+            args.segmentation, args.num_segments, args.ref
+        )
+    return pack_processed_data(processed or [])
+
+
+def copy_records(processed: List[Dict]) -> int:
+    rows = 0
+    for mapping_name in COPY_COLUMNS:
+        for _ in chain.from_iterable(traj.get(mapping_name, []) for traj in processed):
+            rows += 1
+    return rows
+
+
+def copy_arrow(processed: List[Dict]) -> int:
+    n_bytes = 0
+    write_options = pa_csv.WriteOptions(include_header=False)
+    for mapping_name, columns in COPY_COLUMNS.items():
+        for traj in processed:
+            block = traj.get(mapping_name)
+            if isinstance(block, PackedRows) and len(block):
+                sink = pa.BufferOutputStream()
+                pa_csv.write_csv(block.to_arrow(columns), sink, write_options=write_options)
+                n_bytes += sink.getvalue().size
+            elif block:
+                n_bytes += sum(1 for _ in block)
+    return n_bytes
+
+
+def same_result(expected: List[Dict], actual: List[Dict]) -> bool:
+    if len(expected) != len(actual):
+        return False
+    for a, b in zip(expected, actual):
+        if a['traj_info_data'][:8] != b['traj_info_data'][:8] or a['traj_info_data'][9:] != b['traj_info_data'][9:]:
+            return False   # [8] = record_filename
+        for mapping_name in COPY_COLUMNS:
+            x, y = a.get(mapping_name, []), b.get(mapping_name, [])
+            if isinstance(x, PackedRows) and isinstance(y, PackedRows):
+                if (x.labels != y.labels or not np.array_equal(x.codes, y.codes)
+                        or not np.array_equal(x.timestamps, y.timestamps)
+                        or not np.array_equal(x.values, y.values, equal_nan=True)):
+                    return False
+            elif x != y:
+                return False
+    return True
+
+
+def collect_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith('.csv')
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='CSV-Dateien oder Verzeichnisse')
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    parser.add_argument('--repeat', type=int, default=3, help='Wiederholungen pro Messung (bestes/Median)')
+    parser.add_argument('--segmentation', default='fixed_segments',
+                        choices=['fixed_segments', 'reference_position'])
+    parser.add_argument('--num-segments', type=int, default=3)
+    parser.add_argument('--ref', nargs=3, type=float, metavar=('X', 'Y', 'Z'),
+                        help='Referenzposition in mm (für reference_position)')
+    args = parser.parse_args()
+
+    files = collect_files(args.paths)
+    mismatches = 0
+    totals = {'csv': 0.0, args.format: 0.0}
+
+    with tempfile.TemporaryDirectory() as out_dir:
+        for path in files:
+            converted = os.path.join(out_dir, os.path.basename(path) + '.' + args.format)
+            write_converted(csv_to_arrow_table(path), converted, args.format)
+
+            read_csv, _, _ = best_of(args.repeat, lambda: CSVProcessor(path)._read_columns())
+            read_arrow, _, _ = best_of(args.repeat, lambda: CSVProcessor(converted)._read_columns())
+            full_csv, median_csv, expected = best_of(args.repeat, lambda: process(path, args))
+            full_arrow, median_arrow, actual = best_of(args.repeat, lambda: process(converted, args))
+            records, _, n_rows = best_of(args.repeat, lambda: copy_records(expected))
+            arrow_bytes, _, _ = best_of(args.repeat, lambda: copy_arrow(expected))
+
+            ok = same_result(expected, actual)
+            mismatches += not ok
+            totals['csv'] += full_csv
+            totals[args.format] += full_arrow
+
+            size_csv, size_converted = os.path.getsize(path), os.path.getsize(converted)
+            print(f"{'OK  ' if ok else 'DIFF'} {os.path.basename(path)}: {len(expected)} Bahnen, {n_rows} Zeilen, "
+                  f"{size_csv / 1e6:.1f} MB CSV / {size_converted / 1e6:.1f} MB {args.format}")
+            print(f"     Einlesen:     CSV {read_csv:.3f}s | {args.format} {read_arrow:.3f}s "
+                  f"(x{read_csv / read_arrow if read_arrow else 0:.1f})")
+            print(f"     Verarbeitung: CSV {full_csv:.3f}s (Median {median_csv:.3f}s) | "
+                  f"{args.format} {full_arrow:.3f}s (Median {median_arrow:.3f}s)")
+            print(f"     COPY-Vorbereitung: Zeilen-Tupel {records:.3f}s | Arrow-CSV {arrow_bytes:.3f}s")
+
+    print(f"\n{len(files) - mismatches}/{len(files)} Dateien identisch; "
+          f"Verarbeitung gesamt CSV {totals['csv']:.2f}s, {args.format} {totals[args.format]:.2f}s")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
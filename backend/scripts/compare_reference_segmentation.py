@@ -0,0 +1,179 @@
+# backend/scripts/compare_reference_segmentation.py
+"""
+Regressionstest: vektorisierte Referenzpositions-Segmentierung
+(CSVProcessor.segment_by_reference_position) gegen die bisherige
+zeilenweise Implementierung auf aufgezeichneten CSV-Dateien.
+
+Verglichen werden die gültigen Segmente und das Segment → Bahn-Mapping.
+Exit-Code 1, wenn sich mindestens eine Datei unterscheidet.
+
+Verwendung:
+    python compare_reference_segmentation.py --ref 1000 0 500 data/record_*.csv
+    python compare_reference_segmentation.py --ref 1000 0 500 --threshold 0.3 data/
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import csv
+import io
+import os
+import sys
+import time
+from typing import Dict, List, Tuple
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'app'))
+
+from utils.upload_data.csv_processor import CSVProcessor
+
+
+# ── Bisherige Implementierung (zeilenweise über csv.DictReader) ───────────────
+
+def _distance(x1, y1, z1, x2, y2, z2) -> float:
+    return ((x1 - x2) ** 2 + (y1 - y2) ** 2 + (z1 - z2) ** 2) ** 0.5
+
+
+def legacy_reference_segments(path: str, reference_position, threshold: float = 0.3
+                              ) -> Tuple[List[str], Dict[str, str]]:
+    with open(path, 'r') as csvfile:
+        rows = list(csv.DictReader(csvfile))
+
+    rows_cmd = [
+        row for row in rows
+        if row.get('segment_id_soll') not in (None, '', 'NaN')
+    ]
+
+    ref_x, ref_y, ref_z = (float(v) for v in reference_position[:3])
+
+    segments_with_matches = {}
+    for row in rows_cmd:
+        ap_x, ap_y, ap_z = row.get('ap_x', ''), row.get('ap_y', ''), row.get('ap_z', '')
+        if ap_x and ap_y and ap_z and 'NaN' not in (ap_x, ap_y, ap_z):
+            try:
+                distance = _distance(float(ap_x), float(ap_y), float(ap_z), ref_x, ref_y, ref_z)
+            except ValueError:
+                continue
+            if distance <= threshold:
+                segments_with_matches.setdefault(row.get('segment_id_soll'), []).append(distance)
+
+    robot_starts_at_ref = False
+    start_segment = None
+    for row in rows_cmd[:200]:
+        ps_x, ps_y, ps_z = row.get('ps_x', ''), row.get('ps_y', ''), row.get('ps_z', '')
+        segment_id = row.get('segment_id_soll', '')
+        if ps_x and ps_y and ps_z and 'NaN' not in (ps_x, ps_y, ps_z):
+            try:
+                distance = _distance(float(ps_x), float(ps_y), float(ps_z), ref_x, ref_y, ref_z)
+            except ValueError:
+                continue
+            if distance <= threshold and segment_id and segment_id != 'NaN':
+                robot_starts_at_ref = True
+                start_segment = segment_id
+                break
+
+    all_segment_ids = []
+    for row in rows_cmd:
+        segment_id = row.get('segment_id_soll')
+        if segment_id and segment_id not in all_segment_ids:
+            all_segment_ids.append(segment_id)
+    all_segment_ids.sort(key=lambda x: int(x) if x.isdigit() else float('inf'))
+    if len(all_segment_ids) >= 2:
+        all_segment_ids = all_segment_ids[1:-1]
+
+    ref_segment_ids = sorted([s for s in segments_with_matches if s in all_segment_ids],
+                             key=lambda x: int(x) if x.isdigit() else float('inf'))
+
+    bahnen = []
+    if robot_starts_at_ref and start_segment == '0':
+        if '1' in all_segment_ids and ref_segment_ids:
+            start_idx = all_segment_ids.index('1')
+            end_idx = all_segment_ids.index(ref_segment_ids[0])
+            if start_idx < end_idx:
+                bahnen.append(all_segment_ids[start_idx:end_idx])
+
+    if robot_starts_at_ref and start_segment and start_segment in all_segment_ids:
+        start_idx = all_segment_ids.index(start_segment) + 2
+        if ref_segment_ids:
+            end_idx = all_segment_ids.index(ref_segment_ids[0])
+            if start_idx < end_idx:
+                bahnen.append(all_segment_ids[start_idx:end_idx])
+
+    for i in range(len(ref_segment_ids)):
+        start_idx = all_segment_ids.index(ref_segment_ids[i]) + 2
+        if i == len(ref_segment_ids) - 1:
+            end_idx = len(all_segment_ids)
+        else:
+            end_idx = all_segment_ids.index(ref_segment_ids[i + 1])
+        if start_idx < end_idx:
+            bahnen.append(all_segment_ids[start_idx:end_idx])
+
+    valid_bahnen = [traj_segs for traj_segs in bahnen if len(traj_segs) > 1]
+
+    segment_to_bahn = {segment_id: "?" for segment_id in all_segment_ids}
+    for traj_idx, traj_segs in enumerate(valid_bahnen):
+        for segment_id in traj_segs:
+            segment_to_bahn[segment_id] = str(traj_idx)
+
+    valid_segments = [segment_id for traj_segs in valid_bahnen for segment_id in traj_segs]
+    mapping = {
+        segment_id: segment_to_bahn[segment_id]
+        for segment_id in all_segment_ids
+        if segment_to_bahn.get(segment_id) not in ("?", None)
+    }
+    return valid_segments, mapping
+
+
+# ── Vergleich ─────────────────────────────────────────────────────────────────
+
+def collect_files(paths: List[str]) -> List[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(
+                os.path.join(path, name) for name in os.listdir(path) if name.endswith('.csv')
+            ))
+        else:
+            files.append(path)
+    return files
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('paths', nargs='+', help='CSV-Dateien oder Verzeichnisse')
+    parser.add_argument('--ref', nargs=3, type=float, required=True, metavar=('X', 'Y', 'Z'),
+                        help='Referenzposition in mm')
+    parser.add_argument('--threshold', type=float, default=0.3)
+    args = parser.parse_args()
+
+    files = collect_files(args.paths)
+    mismatches = 0
+
+    for path in files:
+        t0 = time.perf_counter()
+        expected = legacy_reference_segments(path, args.ref, args.threshold)
+        t1 = time.perf_counter()
+
+        processor = CSVProcessor(path)
+        _, cmd_table, _, _, _ = processor._read_columns()
+        t2 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            actual = processor.segment_by_reference_position(cmd_table, args.ref, args.threshold)
+        t3 = time.perf_counter()
+
+        ok = expected == actual
+        mismatches += not ok
+        n_trajs = len(set(expected[1].values()))
+        print(f"{'OK  ' if ok else 'DIFF'} {os.path.basename(path)}: {n_trajs} Bahnen, "
+              f"{len(expected[0])} Segmente | legacy {t1 - t0:.2f}s (inkl. Einlesen), "
+              f"Einlesen {t2 - t1:.2f}s + vektorisiert {t3 - t2:.3f}s")
+        if not ok:
+            print(f"     legacy:       {expected[1]}")
+            print(f"     vektorisiert: {actual[1]}")
+
+    print(f"\n{len(files) - mismatches}/{len(files)} Dateien identisch")
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
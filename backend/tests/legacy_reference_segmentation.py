@@ -0,0 +1,325 @@
+# backend/tests/legacy_reference_segmentation.py
+"""
+Bisherige Referenzpositions-Segmentierung, unverändert aus dem
+Baseline-Commit 63b4599 (backend/app/utils/upload_data/csv_processor.py):
+
+  CSVProcessor.process_csv   Zeilen 29-31 (Einlesen), 35-65 (IST/SOLL-Filter),
+                             69-327 (Zweig segmentation_method == "reference_position")
+  calculate_distance         Zeilen 1037-1040
+
+Angepasst ist nur die Einrückung; statt an process_data weiterzureichen,
+liefert die Methode (valid_segments, reference_segment_to_bahn) wie
+CSVProcessor.segment_by_reference_position. Der Schwellenwert ist wie im
+Original fest 0.3 mm.
+"""
+
+import csv
+
+
+class LegacyCSVProcessor:
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def segment_by_reference_position(self, reference_position):
+        with open(self.file_path, 'r') as csvfile:
+            reader = csv.DictReader(csvfile)
+            rows = list(reader)
+
+        act_spalten = ['timestamp', 'pv_x', 'pv_y', 'pv_z', 'ov_x', 'ov_y', 'ov_z', 'ov_w',
+                       'pt_x', 'pt_y', 'pt_z', 'ot_x', 'ot_y', 'ot_z', 'ot_w', 'tcp_speedv',
+                       'tcp_angularv', 'tcp_accelv', 'tcp_accel_pi',
+                       'tcp_angular_vel_pi', 'segment_id_ist']
+
+        cmd_spalten = ['ps_x', 'ps_y', 'ps_z', 'os_x', 'os_y', 'os_z', 'os_w', 'tcp_speedbs', 'tcp_accelbs',
+                        'joint_1', 'joint_2', 'joint_3', 'joint_4', 'joint_5', 'joint_6',
+                        'ap_x', 'ap_y', 'ap_z', 'aq_x', 'aq_y', 'aq_z', 'aq_w', 'DO_Signal',
+                        'Movement Type', 'Weight', 'Velocity Picking', 'Velocity Handling',
+                        'segment_id_soll']
+
+        # Filtere Zeilen für IST-Daten anhand der IST-Spalten
+        rows_act = []
+        for row in rows:
+            # Prüfe, ob die Zeile gültige IST-Daten enthält
+            if row.get('segment_id_ist') is not None and row.get('segment_id_ist') != '' and row.get(
+                    'segment_id_ist') != 'NaN':
+                # Prüfe, ob die erforderlichen IST-Spalten Werte enthalten
+                if any(row.get(spalte) not in [None, '', 'NaN'] for spalte in act_spalten if spalte in row):
+                    rows_act.append(row)
+
+        # Filtere Zeilen für SOLL-Daten anhand der SOLL-Spalten
+        rows_cmd = []
+        for row in rows:
+            # Prüfe, ob die Zeile gültige SOLL-Daten enthält
+            if row.get('segment_id_soll') is not None and row.get('segment_id_soll') != '' and row.get(
+                    'segment_id_soll') != 'NaN':
+                # Prüfe, ob die erforderlichen SOLL-Spalten Werte enthalten
+                if any(row.get(spalte) not in [None, '', 'NaN'] for spalte in cmd_spalten if
+                       spalte in row):
+                    rows_cmd.append(row)
+
+        ref_x = float(reference_position[0])
+        ref_y = float(reference_position[1])
+        ref_z = float(reference_position[2])
+        threshold = 0.3
+
+        # print(f"Suche nach AP-Positionen nahe der Referenzposition: x={ref_x}, y={ref_y}, z={ref_z} mit Schwellenwert {threshold}mm")
+
+        # Finde alle Zeilen mit AP-Positionen nahe der Referenzposition
+        matching_rows = []
+
+        for row in rows_cmd:
+            # Überprüfe, ob die AP-Werte vorhanden und gültig sind
+            ap_x = row.get('ap_x', '')
+            ap_y = row.get('ap_y', '')
+            ap_z = row.get('ap_z', '')
+
+            if ap_x and ap_y and ap_z and ap_x != 'NaN' and ap_y != 'NaN' and ap_z != 'NaN':
+                try:
+                    ap_x = float(ap_x)
+                    ap_y = float(ap_y)
+                    ap_z = float(ap_z)
+
+                    # Berechne den Abstand zur Referenzposition
+                    distance = self.calculate_distance(ap_x, ap_y, ap_z, ref_x, ref_y, ref_z)
+
+                    # Wenn der Abstand unter dem Schwellenwert liegt, speichere diese Zeile
+                    if distance <= threshold:
+                        matching_rows.append({
+                            'segment_id': row.get('segment_id_soll'),
+                            'timestamp': row.get('timestamp'),
+                            'distance': distance,
+                            'ap_x': ap_x,
+                            'ap_y': ap_y,
+                            'ap_z': ap_z
+                        })
+                except ValueError:
+                    # Ignoriere Zeilen mit ungültigen AP-Werten
+                    continue
+
+        # Gruppiere die Treffer nach Segment-ID
+        segments_with_matches = {}
+        for match in matching_rows:
+            segment_id = match['segment_id']
+            if segment_id not in segments_with_matches:
+                segments_with_matches[segment_id] = []
+            segments_with_matches[segment_id].append(match)
+
+        print(f"Gefunden: {len(matching_rows)} Zeilen mit AP-Positionen nahe der Referenzposition")
+        print(f"Verteilt auf {len(segments_with_matches)} Segmente:")
+
+        robot_starts_at_ref = False
+        start_segment = None
+
+        for i, row in enumerate(rows_cmd[:200]):
+            ps_x = row.get('ps_x', '')
+            ps_y = row.get('ps_y', '')
+            ps_z = row.get('ps_z', '')
+            segment_id = row.get('segment_id_soll', '')  # Hole segment_id hier
+
+            if ps_x and ps_y and ps_z and ps_x != 'NaN' and ps_y != 'NaN' and ps_z != 'NaN':
+                try:
+                    ps_x = float(ps_x)
+                    ps_y = float(ps_y)
+                    ps_z = float(ps_z)
+
+                    distance = self.calculate_distance(ps_x, ps_y, ps_z, ref_x, ref_y, ref_z)
+
+                    if distance <= threshold and segment_id and segment_id != 'NaN':  # Prüfe auch segment_id
+                        robot_starts_at_ref = True
+                        start_segment = segment_id  # Verwende die bereits geholte segment_id
+                        print(f"Roboter startet an Referenzposition in Segment {start_segment}")
+                        break
+                except ValueError:
+                    continue
+
+        #for segment_id, matches in segments_with_matches.items():
+        #    print(f"  Segment {segment_id}: {len(matches)} Referenzpunkte gefunden")
+        #    # Zeige den ersten und letzten gefundenen Punkt für dieses Segment
+        #    if matches:
+        #        first = matches[0]
+        #        last = matches[-1]
+        #        print(f"    Erster Punkt: AP=({first['ap_x']:.3f}, {first['ap_y']:.3f}, {first['ap_z']:.3f}), Abstand={first['distance']:.3f}mm")
+        #        print(f"    Letzter Punkt: AP=({last['ap_x']:.3f}, {last['ap_y']:.3f}, {last['ap_z']:.3f}), Abstand={last['distance']:.3f}mm")
+
+        # Sammle alle eindeutigen Segment-IDs (alle, nicht nur die mit Matches)
+        all_segment_ids = []
+        for row in rows_cmd:
+            segment_id = row.get('segment_id_soll')
+            if segment_id and segment_id not in all_segment_ids:
+                all_segment_ids.append(segment_id)
+
+        # Sortiere alle Segment-IDs numerisch
+        all_segment_ids.sort(key=lambda x: int(x) if x.isdigit() else float('inf'))
+
+        # Entferne das erste und letzte Segment, wie bei der ursprünglichen Methode
+        if len(all_segment_ids) >= 2:
+            all_segment_ids = all_segment_ids[1:-1]
+
+        # Sortiere die Segmente mit Matches (Referenzpunkte)
+        ref_segment_ids = sorted([s for s in segments_with_matches.keys() if s in all_segment_ids],
+                                 key=lambda x: int(x) if x.isdigit() else float('inf'))
+
+        # Definiere Bahnen als Bereiche zwischen Referenzpunkten
+        if robot_starts_at_ref and start_segment == '0':
+            # Segment 0 wurde entfernt, also beginnt die erste Bahn bei Segment 1
+            # Aber wir wollen Segment 1 auch überspringen (Bewegung zum nächsten Punkt)
+            # Also beginnen wir bei Segment 2
+
+            bahnen = []
+
+            # Erste Bahn: Von Segment 2 bis zum ersten AP-Referenzpunkt
+            if '1' in all_segment_ids and ref_segment_ids:
+                start_idx = all_segment_ids.index('1')  # Beginne bei Segment 2
+                first_ap_ref = ref_segment_ids[0]  # Das ist '5'
+                if first_ap_ref in all_segment_ids:
+                    end_idx = all_segment_ids.index(first_ap_ref)
+                    if start_idx < end_idx:
+                        bahnen.append(all_segment_ids[start_idx:end_idx])
+                        print(f"Erste Bahn (Start an Ref): Segmente {all_segment_ids[start_idx]} bis {all_segment_ids[end_idx-1]}")
+        else:
+            bahnen = []
+
+        if robot_starts_at_ref and start_segment and start_segment in all_segment_ids:
+            # Spezialbehandlung für Start an Referenzposition
+            start_idx = all_segment_ids.index(start_segment) + 2  # +2 um Start und Bewegung zu überspringen
+
+            # Finde das Ende dieser ersten Bahn
+            if ref_segment_ids:  # ref_segment_ids enthält NUR AP-Referenzpunkte
+                first_ap_ref = ref_segment_ids[0]
+                if first_ap_ref in all_segment_ids:
+                    end_idx = all_segment_ids.index(first_ap_ref)
+                    if start_idx < end_idx:
+                        bahnen.append(all_segment_ids[start_idx:end_idx])
+                        print(f"Erste Bahn (Start an Ref): Segmente {all_segment_ids[start_idx]} bis {all_segment_ids[end_idx-1]}")
+
+        # Für jedes Referenzsegment (außer dem letzten) finden wir alle Segmente bis zum nächsten Referenzsegment
+        for i in range(len(ref_segment_ids)):
+            home_segment_idx = all_segment_ids.index(ref_segment_ids[i])
+            start_idx = home_segment_idx + 2  # Starte nach dem Home-Segment (2 Segmente weiter)
+
+            # Für das letzte Referenzsegment nehmen wir alle verbleibenden Segmente
+            if i == len(ref_segment_ids) - 1:
+                end_idx = len(all_segment_ids)
+            else:
+                # Für alle anderen nehmen wir bis zum nächsten Home-Segment (exklusiv)
+                # aber schließen das Segment VOR dem nächsten Home-Punkt mit ein
+                next_home_idx = all_segment_ids.index(ref_segment_ids[i + 1])
+                end_idx = next_home_idx  # Stoppe VOR dem nächsten Home-Segment
+
+            # Sammle alle Segmente für diese Bahn (nur wenn start_idx < end_idx)
+            if start_idx < end_idx:
+                traj_segs = all_segment_ids[start_idx:end_idx]
+                bahnen.append(traj_segs)
+
+        # Filtere Bahnen, die zu wenige Segmente haben (≤ 2)
+        min_segments_per_bahn = 1
+        valid_bahnen = []
+        removed_bahnen = []
+
+        for i, traj_segs in enumerate(bahnen):
+            if len(traj_segs) > min_segments_per_bahn:
+                valid_bahnen.append(traj_segs)
+            else:
+                removed_bahnen.append((i, traj_segs))
+
+        # print(f"\nDefiniere {len(bahnen)} Bahnen basierend auf Referenzpunkten:")
+        # for i, traj_segs in enumerate(bahnen):
+        #     start_segment = traj_segs[0]
+        #     end_segment = traj_segs[-1]
+        #
+        #     print(f"  Bahn {i}: Segment {start_segment} bis {end_segment} ({len(traj_segs)} Segmente)")
+        #     if start_segment in segments_with_matches:
+        #         ref_matches = segments_with_matches[start_segment]
+        #         ref_count = len(ref_matches)
+        #         avg_distance = sum(match['distance'] for match in ref_matches) / ref_count if ref_count > 0 else 0
+        #         print(f"    Beginnt mit Referenzpunkt: {ref_count} Punkte, Ø Abstand: {avg_distance:.3f}mm")
+        #     print(f"    Enthaltene Segmente: {', '.join(traj_segs)}")
+
+        # print(f"\nNach Filterung: {len(valid_bahnen)} gültige Bahnen (mehr als {min_segments_per_bahn} Segmente):")
+
+        # Entfernte Bahnen ausgeben
+        # if removed_bahnen:
+        #     print(f"Entfernte Bahnen (≤ {min_segments_per_bahn} Segmente):")
+        #     for traj_idx, segments in removed_bahnen:
+        #         print(f"  Bahn {traj_idx}: {', '.join(segments)}")
+
+        # Neue Bahn-Indizes zuweisen
+        new_trajs = {}
+        for new_idx, traj_segs in enumerate(valid_bahnen):
+            original_idx = bahnen.index(traj_segs)
+            new_trajs[new_idx] = {"segments": traj_segs, "original_idx": original_idx}
+
+            # start_segment = traj_segs[0]
+            # end_segment = traj_segs[-1]
+            #
+            # print(f"  Bahn {new_idx} (ursprünglich Bahn {original_idx}): Segment {start_segment} bis {end_segment} ({len(traj_segs)} Segmente)")
+            # print(f"    Enthaltene Segmente: {', '.join(traj_segs)}")
+
+        # Segment zu Bahn Mapping mit neuen Indizes
+        segment_to_bahn = {}
+
+        # Initialisiere alle Segmente mit "?"
+        for segment_id in all_segment_ids:
+            segment_to_bahn[segment_id] = "?"
+
+        # Weise Bahn-IDs zu
+        for new_traj_idx, traj_info in new_trajs.items():
+            for segment_id in traj_info["segments"]:
+                segment_to_bahn[segment_id] = str(new_traj_idx)
+
+        #print("\nSegment zu Bahn Mapping (nach Filterung):")
+        #for segment_id in all_segment_ids:
+        #    traj_id = segment_to_bahn.get(segment_id, "?")
+        #    print(f"  Segment {segment_id} → Bahn {traj_id}")
+
+        # print("\nZusammenfassung der finalen Bahnen:")
+        # for traj_idx, traj_info in new_trajs.items():
+        #     segments = traj_info["segments"]
+        #     print(f"  Bahn {traj_idx}: {len(segments)} Segmente - {', '.join(segments)}")
+
+        # Sammle alle Segmente aus den validen Bahnen
+        valid_segments = []
+        for traj_info in new_trajs.values():
+            valid_segments.extend(traj_info["segments"])
+
+        #print(f"\nVerwende {len(valid_segments)} Segmente für die weitere Verarbeitung:")
+        #print(f"  {', '.join(valid_segments)}")
+
+        # Filtere Zeilen für IST-Daten basierend auf den gültigen Segmenten
+        rows_act_filtered = []
+        for row in rows_act:
+            segment_id = row.get('segment_id_ist')
+            if segment_id in valid_segments:
+                rows_act_filtered.append(row)
+
+        # Filtere Zeilen für SOLL-Daten basierend auf den gültigen Segmenten
+        rows_cmd_filtered = []
+        for row in rows_cmd:
+            segment_id = row.get('segment_id_soll')
+            if segment_id in valid_segments:
+                rows_cmd_filtered.append(row)
+
+        # print(f"IST: Originale Anzahl Zeilen: {len(rows_act)}, Nach Segment-Filterung: {len(rows_act_filtered)}")
+        # print(f"SOLL: Originale Anzahl Zeilen: {len(rows_cmd)}, Nach Segment-Filterung: {len(rows_cmd_filtered)}")
+
+        # Bereite ein Mapping von Segment zu Bahn vor, das an process_data übergeben wird
+        reference_segment_to_bahn = {}
+        for segment_id in all_segment_ids:
+            traj_id = segment_to_bahn.get(segment_id, None)
+            if traj_id != "?" and traj_id is not None:
+                reference_segment_to_bahn[segment_id] = traj_id
+
+        if robot_starts_at_ref:
+            print(f"DEBUG: Start-Segment: {start_segment}")
+            print(f"DEBUG: all_segment_ids: {all_segment_ids}")
+            print(f"DEBUG: ref_segment_ids VOR Änderung: {ref_segment_ids}")
+
+            print(f"DEBUG: ref_segment_ids NACH Änderung: {ref_segment_ids}")
+            print(f"DEBUG: Erste Bahn sollte beginnen bei Index: {all_segment_ids.index(start_segment) + 2 if start_segment in all_segment_ids else 'NICHT GEFUNDEN'}")
+
+        return valid_segments, reference_segment_to_bahn
+
+    @staticmethod
+    def calculate_distance(x1, y1, z1, x2, y2, z2):
+        """Berechnet den Abstand zwischen zwei 3D-Punkten."""
+        return ((x1 - x2) ** 2 + (y1 - y2) ** 2 + (z1 - z2) ** 2) ** 0.5
@@ -0,0 +1,117 @@
+# backend/tests/test_reference_segmentation.py
+"""
+Vektorisierte Referenzpositions-Segmentierung
+(CSVProcessor.segment_by_reference_position) gegen die bisherige
+zeilenweise Implementierung, unverändert aus dem Baseline-Commit
+übernommen (legacy_reference_segmentation.py).
+
+Verglichen wird auf den Dateien in tests/data (Aufzeichnungsformat mit allen
+IST-/SOLL-Spalten; weitere Aufzeichnungen dort ablegen und die
+Referenzposition in REFERENCE_POSITIONS eintragen) und auf kleinen
+synthetischen CSV-Dateien für Randfälle.
+"""
+
+import contextlib
+import csv
+import glob
+import io
+import os
+import sys
+
+import pytest
+
+TESTS = os.path.dirname(__file__)
+sys.path.append(os.path.join(TESTS, '..', 'app'))
+sys.path.append(TESTS)
+
+from legacy_reference_segmentation import LegacyCSVProcessor
+from utils.upload_data.csv_processor import CSVProcessor
+
+# Aufzeichnung in tests/data → Referenzposition (Home-Punkt) in mm
+REFERENCE_POSITIONS = {
+    'home_cycles.csv': (1340.0, 0.0, 1200.0),
+}
+RECORDINGS = sorted(glob.glob(os.path.join(TESTS, 'data', '*.csv')))
+
+REFERENCE = (1000.0, 0.0, 500.0)
+FAR = (1200.0, 300.0, 700.0)
+
+HEADER = ['timestamp', 'segment_id_ist', 'segment_id_soll', 'ap_x', 'ap_y', 'ap_z', 'ps_x', 'ps_y', 'ps_z']
+
+
+def _write_csv(path, n_segments, home_segments, start_at_ref, rows_per_segment=4, gaps=False):
+    """
+    SOLL-Zeilen für Segmente 0..n_segments-1; AP-Punkt an der Referenz für
+    home_segments, ps_* am Anfang an der Referenz, wenn start_at_ref.
+    gaps: zusätzlich IST-Zeilen (ohne segment_id_soll), leere und NaN-Werte.
+    """
+    timestamp = 1_700_000_000_000_000_000
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        for segment in range(n_segments):
+            ap = REFERENCE if segment in home_segments else FAR
+            for i in range(rows_per_segment):
+                timestamp += 1000
+                ps = REFERENCE if start_at_ref and segment == 0 else FAR
+                ap_row = list(ap)
+                if gaps and i == 1:
+                    ap_row = ['', '', ''] if segment % 2 else ['NaN', 'NaN', 'NaN']
+                writer.writerow([timestamp, '', segment, *ap_row, *ps])
+                if gaps and i == 2:
+                    timestamp += 1000
+                    writer.writerow([timestamp, segment, '', '', '', '', '', '', ''])
+
+
+SCENARIOS = {
+    'start_at_ref':     dict(n_segments=20, home_segments={6, 13}, start_at_ref=True),
+    'start_elsewhere':  dict(n_segments=20, home_segments={4, 11, 17}, start_at_ref=False),
+    'no_home':          dict(n_segments=10, home_segments=set(), start_at_ref=False),
+    'home_at_edges':    dict(n_segments=12, home_segments={0, 1, 11}, start_at_ref=False),
+    'adjacent_homes':   dict(n_segments=15, home_segments={5, 6, 8}, start_at_ref=True),
+    'gaps':             dict(n_segments=18, home_segments={3, 9, 14}, start_at_ref=True, gaps=True),
+    'single_row_segs':  dict(n_segments=25, home_segments={2, 10, 20}, start_at_ref=False, rows_per_segment=1),
+}
+
+
+def _compare(path, reference_position):
+    """(vektorisiert, bisherige Implementierung) für path; Schwellenwert 0.3 mm wie im Original."""
+    processor = CSVProcessor(path)
+    _, cmd_table, _, _, _ = processor._read_columns()
+    with contextlib.redirect_stdout(io.StringIO()):
+        actual = processor.segment_by_reference_position(cmd_table, reference_position, 0.3)
+        expected = LegacyCSVProcessor(path).segment_by_reference_position(reference_position)
+    return actual, expected
+
+
+@pytest.fixture(params=sorted(SCENARIOS))
+def synthetic_csv(request, tmp_path):
+    path = tmp_path / f'{request.param}.csv'
+    _write_csv(path, **SCENARIOS[request.param])
+    return str(path)
+
+
+@pytest.mark.parametrize('path', RECORDINGS, ids=os.path.basename)
+def test_recording_matches_legacy_implementation(path):
+    actual, expected = _compare(path, REFERENCE_POSITIONS[os.path.basename(path)])
+    assert expected[0], 'Aufzeichnung ohne erkannte Bahnen taugt nicht als Vergleich'
+    assert actual == expected
+
+
+def test_synthetic_matches_legacy_implementation(synthetic_csv):
+    actual, expected = _compare(synthetic_csv, REFERENCE)
+    assert actual == expected
+
+
+def test_finds_trajectories_between_home_segments(tmp_path):
+    path = str(tmp_path / 'record.csv')
+    _write_csv(path, n_segments=20, home_segments={6, 13}, start_at_ref=False)
+
+    processor = CSVProcessor(path)
+    _, cmd_table, _, _, _ = processor._read_columns()
+    with contextlib.redirect_stdout(io.StringIO()):
+        valid_segments, mapping = processor.segment_by_reference_position(cmd_table, REFERENCE)
+
+    # Home-Segment + 2 bis vor das nächste Home-Segment, letzte Bahn bis vor das letzte Segment
+    assert valid_segments == [str(s) for s in [*range(8, 13), *range(15, 19)]]
+    assert set(mapping.values()) == {'0', '1'}
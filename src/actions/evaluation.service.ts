@@ -14,7 +14,10 @@ import {
   transformSIDTWDeviationResult,
   transformSIDTWInfoResult,
 } from '@/src/lib/transformer.evaluation';
-import { transformTrajInfoResult } from '@/src/lib/transformer.motion';
+import {
+  transformPaginationResult,
+  transformTrajInfoResult,
+} from '@/src/lib/transformer.motion';
 import type {
   EDPosition,
   EDPositionRaw,
@@ -28,6 +31,7 @@ import type {
 import type {
   EvaluationIDsResponse,
   PaginationParams,
+  PaginationResultRaw,
 } from '@/types/pagination.types';
 
 const API_BASE_URL = process.env.API_BASE_URL || 'http://localhost:8000/api';
@@ -105,6 +109,7 @@ export const getEvaluationTrajIDs = async (
     if (params.page) queryParams.append('page', params.page.toString());
     if (params.pageSize)
       queryParams.append('page_size', params.pageSize.toString());
+    if (params.cursor) queryParams.append('cursor', params.cursor);
 
     // API-Endpunkt mit Parametern - entweder Search oder Regular basierend auf Parametern
     // Wir verwenden jetzt immer den Such-Endpunkt, da dieser die Filterung nach Evaluationsdaten enthält
@@ -114,14 +119,7 @@ export const getEvaluationTrajIDs = async (
 
     const result = await fetchFromAPI<{
       traj_info: any[];
-      pagination: {
-        total: number;
-        page: number;
-        page_size: number;
-        total_pages: number;
-        has_next: boolean;
-        has_previous: boolean;
-      };
+      pagination: PaginationResultRaw;
     }>(endpoint);
 
     // Paginierung in camelCase transformieren
@@ -129,14 +127,7 @@ export const getEvaluationTrajIDs = async (
       evaluationTrajIDs: {
         traj_info: transformTrajInfoResult(result.traj_info || []),
       },
-      pagination: {
-        total: result.pagination.total,
-        page: result.pagination.page,
-        pageSize: result.pagination.page_size,
-        totalPages: result.pagination.total_pages,
-        hasNext: result.pagination.has_next,
-        hasPrevious: result.pagination.has_previous,
-      },
+      pagination: transformPaginationResult(result.pagination),
     };
   } catch (error) {
     console.error('Error fetching Evaluation Traj IDs:', error);
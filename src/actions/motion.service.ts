@@ -5,6 +5,7 @@
 import {
   transformTrajAccelActResult,
   transformTrajAccelCmdResult,
+  transformTrajBundleResult,
   transformTrajInfobyIDResult,
   transformTrajInfoResponse,
   transformTrajJointStatesResult,
@@ -19,6 +20,7 @@ import {
 import type {
   TrajAccelAct,
   TrajAccelCmd,
+  TrajBundle,
   TrajInfo,
   TrajJointStates,
   TrajMetadataResult,
@@ -81,6 +83,7 @@ export const getTrajInfo = async (
     if (params.page) queryParams.append('page', params.page.toString());
     if (params.pageSize)
       queryParams.append('page_size', params.pageSize.toString());
+    if (params.cursor) queryParams.append('cursor', params.cursor);
 
     const result = await fetchFromAPI(
       `/traj/traj_info?${queryParams.toString()}`,
@@ -140,6 +143,7 @@ export const searchTrajInfo = async (
       queryParams.append('page', searchParams.page.toString());
     if (searchParams.pageSize)
       queryParams.append('page_size', searchParams.pageSize.toString());
+    if (searchParams.cursor) queryParams.append('cursor', searchParams.cursor);
 
     const apiUrl = `/traj/traj_search?${queryParams.toString()}`;
     console.log('API-Anfrage:', apiUrl);
@@ -324,6 +328,37 @@ export const getTrajMetadataById = async (
   }
 };
 
+// Alle Plot-Kanäle einer Bahn in einem Request (spaltenweise)
+export const getTrajBundleById = async (
+  id: string,
+  maxPoints?: number,
+): Promise<TrajBundle> => {
+  try {
+    const channels = [
+      'traj_pose_act',
+      'traj_vel_act',
+      'traj_accel_act',
+      'traj_accel_cmd',
+      'traj_position_cmd',
+      'traj_orientation_cmd',
+      'traj_vel_cmd',
+      'traj_joint_states',
+      'traj_setpoints',
+    ].join(',');
+    // Optional serverseitig reduziert (LTTB, Segmentgrenzen bleiben erhalten)
+    const downsample = maxPoints ? `&max_points=${maxPoints}` : '';
+    const result = await fetchFromAPI(
+      `/traj/bundle/${id}?channels=${channels}${downsample}`,
+      true,
+    );
+    return transformTrajBundleResult(result);
+  } catch (error) {
+    // eslint-disable-next-line no-console
+    console.error('Error fetching Traj bundle by ID:', error);
+    throw error;
+  }
+};
+
 export const checkTransformedDataExists = async (
   id: string,
 ): Promise<boolean> => {
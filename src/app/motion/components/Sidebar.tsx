@@ -91,7 +91,11 @@ export const Sidebar = () => {
       !isInitialLoading &&
       !isLoadingNextPageRef.current
     ) {
-      const nextPageParams = { ...searchParams, page: currentPage + 1 };
+      const nextPageParams = {
+        ...searchParams,
+        page: currentPage + 1,
+        cursor: pagination.nextCursor,
+      };
       setSearchParams(nextPageParams);
       loadTrajs(nextPageParams);
     }
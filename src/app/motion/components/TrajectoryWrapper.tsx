@@ -4,22 +4,15 @@ import { useParams } from 'next/navigation';
 import React, { useCallback, useEffect, useMemo, useState } from 'react';
 
 import {
-  getTrajAccelActById,
-  getTrajAccelCmdById,
+  getTrajBundleById,
   getTrajInfoById,
-  getTrajJointStatesById,
   getTrajMetadataById,
-  getTrajOrientationCmdById,
-  getTrajPoseActById,
-  getTrajPositionCmdById,
-  getTrajSetpointsById,
-  getTrajVelActById,
-  getTrajVelCmdById,
 } from '@/src/actions/motion.service';
 import { TrajectoryInfo } from '@/src/app/motion/components/TrajectoryInfo';
 import { TrajectoryPlot } from '@/src/app/motion/components/TrajectoryPlot';
 import { Typography } from '@/src/components/Typography';
 import { useTrajectory } from '@/src/providers/trajectory.provider';
+import type { TrajBundle } from '@/types/motion.types';
 
 const CACHE_DURATION = 1000 * 60 * 20;
 
@@ -115,13 +108,6 @@ export function TrajectoryWrapper() {
     setCurrentTrajSetpoints,
   } = useTrajectory();
 
-  const updateLoadingState = useCallback(
-    (key: keyof DataLoadingState, value: boolean) => {
-      setLoadingStates((prev) => ({ ...prev, [key]: value }));
-    },
-    [],
-  );
-
   const fetchInfoData = useCallback(async () => {
     if (!id) return;
 
@@ -152,88 +138,36 @@ export function TrajectoryWrapper() {
   const fetchPlotData = useCallback(async () => {
     if (!id) return;
 
-    const fetchDataWithCache = async <T,>(
-      fetchFunction: () => Promise<T[]>,
-      setter: (data: T[]) => void,
-      cacheKey: string,
-    ): Promise<void> => {
-      const fullKey = `${cacheKey}_${id}`;
-
-      // Versuch schnellen Cache-Zugriff
-      const cachedData = cache.get(fullKey);
-      if (cachedData) {
-        setter(cachedData);
-        return;
-      }
-
-      // Parallel: Daten holen und Cache setzen
-      const data = await fetchFunction();
-      setter(data);
-      cache.set(fullKey, data);
-    };
-
     try {
-      // Prioritätsgruppen für die Daten
-      const highPriorityFetches = [
-        // Pose Daten (höchste Priorität)
-        fetchDataWithCache(
-          () => getTrajPoseActById(id),
-          setCurrentTrajPoseAct,
-          'pose_act',
-        ).then(() => updateLoadingState('poseAct', true)),
-        // Events werden auch sofort benötigt
-        fetchDataWithCache(
-          () => getTrajSetpointsById(id),
-          setCurrentTrajSetpoints,
-          'setpoints',
-        ).then(() => updateLoadingState('setpoints', true)),
-        fetchDataWithCache(
-          () => getTrajPositionCmdById(id),
-          setCurrentTrajPositionCmd,
-          'position_cmd',
-        ).then(() => updateLoadingState('positionCmd', true)),
-        fetchDataWithCache(
-          () => getTrajOrientationCmdById(id),
-          setCurrentTrajOrientationCmd,
-          'orientation_cmd',
-        ).then(() => updateLoadingState('orientationCmd', true)),
-      ];
-
-      const mediumPriorityFetches = [
-        fetchDataWithCache(
-          () => getTrajJointStatesById(id),
-          setCurrentTrajJointStates,
-          'joint_states',
-        ).then(() => updateLoadingState('jointStates', true)),
-        fetchDataWithCache(
-          () => getTrajVelActById(id),
-          setCurrentTrajVelAct,
-          'vel_act',
-        ).then(() => updateLoadingState('velAct', true)),
-        fetchDataWithCache(
-          () => getTrajVelCmdById(id),
-          setCurrentTrajVelCmd,
-          'vel_cmd',
-        ).then(() => updateLoadingState('velCmd', true)),
-      ];
-
-      const lowPriorityFetches = [
-        fetchDataWithCache(
-          () => getTrajAccelActById(id),
-          setCurrentTrajAccelAct,
-          'accel_act',
-        ).then(() => updateLoadingState('accelAct', true)),
-        fetchDataWithCache(
-          () => getTrajAccelCmdById(id),
-          setCurrentTrajAccelCmd,
-          'accel_cmd',
-        ).then(() => updateLoadingState('accelCmd', true)),
-      ];
+      // Alle Kanäle in einem Request (spaltenweise, Zeitstempel geteilt)
+      const cacheKey = `bundle_${id}`;
+      let bundle: TrajBundle | null = cache.get(cacheKey);
+      if (!bundle) {
+        bundle = await getTrajBundleById(id);
+        cache.set(cacheKey, bundle);
+      }
 
-      // Ausführung in Prioritätsgruppen
-      await Promise.all(highPriorityFetches);
-      await Promise.all(mediumPriorityFetches);
-      await Promise.all(lowPriorityFetches);
+      setCurrentTrajPoseAct(bundle.poseAct);
+      setCurrentTrajSetpoints(bundle.setpoints);
+      setCurrentTrajPositionCmd(bundle.positionCmd);
+      setCurrentTrajOrientationCmd(bundle.orientationCmd);
+      setCurrentTrajJointStates(bundle.jointStates);
+      setCurrentTrajVelAct(bundle.velAct);
+      setCurrentTrajVelCmd(bundle.velCmd);
+      setCurrentTrajAccelAct(bundle.accelAct);
+      setCurrentTrajAccelCmd(bundle.accelCmd);
+
+      setLoadingStates({
+        poseAct: true,
+        velAct: true,
+        accelAct: true,
+        accelCmd: true,
+        positionCmd: true,
+        orientationCmd: true,
+        velCmd: true,
+        jointStates: true,
+        setpoints: true,
+      });
     } catch (err) {
       setError('Plotdaten konnten nicht abgerufen werden');
     }
@@ -248,7 +182,6 @@ export function TrajectoryWrapper() {
     setCurrentTrajVelCmd,
     setCurrentTrajAccelAct,
     setCurrentTrajAccelCmd,
-    updateLoadingState,
   ]);
 
   useEffect(() => {
@@ -12,6 +12,19 @@ type ProcessingResult = {
   error?: string;
 };
 
+type UploadStatus = {
+  status: string;
+  progress_percent: number;
+  file_results: ProcessingResult[];
+  processing_time_seconds: number;
+  error?: string;
+};
+
+// Status-Polling des Upload-Jobs: läuft, solange der Job pending/running ist
+const UPLOAD_POLL_INTERVAL_MS = 1000;
+const UPLOAD_POLL_TIMEOUT_MS = 60 * 60 * 1000;
+const ACTIVE_UPLOAD_STATUSES = ['pending', 'running'];
+
 const CSVUploadForm: React.FC = () => {
   const [files, setFiles] = useState<FileList | null>(null);
   const [robotModel, setRobotModel] = useState<string>('');
@@ -93,7 +106,33 @@ const CSVUploadForm: React.FC = () => {
           throw new Error(`HTTP error! status: ${response.status}`);
         }
 
-        const result = await response.json();
+        const { task_id: taskId } = await response.json();
+
+        // Upload läuft als Background-Job → Status pollen, bis er nicht mehr aktiv ist
+        const deadline = Date.now() + UPLOAD_POLL_TIMEOUT_MS;
+        let result: UploadStatus;
+        do {
+          if (Date.now() > deadline) {
+            throw new Error(
+              `Upload status not available after ${UPLOAD_POLL_TIMEOUT_MS / 60000} minutes (task ${taskId})`,
+            );
+          }
+          await new Promise((resolve) => {
+            setTimeout(resolve, UPLOAD_POLL_INTERVAL_MS);
+          });
+          const statusResponse = await fetch(`/api/upload/status/${taskId}`);
+          if (!statusResponse.ok) {
+            throw new Error(`HTTP error! status: ${statusResponse.status}`);
+          }
+          result = await statusResponse.json();
+          setProgress(result.progress_percent);
+        } while (ACTIVE_UPLOAD_STATUSES.includes(result.status));
+
+        // Jeder andere Endzustand (failed, cancelled, …) bricht ab
+        if (result.status !== 'completed') {
+          throw new Error(result.error || `Upload ${result.status}`);
+        }
+
         setProcessingResults(result.file_results);
 
         // Generate summary message
@@ -233,7 +272,7 @@ const CSVUploadForm: React.FC = () => {
                 className="w-full rounded py-1 font-light leading-tight text-primary focus:outline-none focus:ring-2"
                 id="file-input"
                 type="file"
-                accept=".csv"
+                accept=".csv,.parquet,.arrow,.feather"
                 multiple
                 onChange={(e: ChangeEvent<HTMLInputElement>) => {
                   if (e.target.files) setFiles(e.target.files);
@@ -3,6 +3,9 @@ import type {
   TrajAccelActRaw,
   TrajAccelCmd,
   TrajAccelCmdRaw,
+  TrajBundle,
+  TrajBundleChannel,
+  TrajBundleRaw,
   TrajInfo,
   TrajInfoRaw,
   TrajJointStates,
@@ -138,6 +141,8 @@ export const transformPaginationResult = (
     totalPages: paginationRaw.total_pages,
     hasNext: paginationRaw.has_next,
     hasPrevious: paginationRaw.has_previous,
+    nextCursor: paginationRaw.next_cursor ?? null,
+    totalIsEstimate: paginationRaw.total_is_estimate ?? false,
   };
 };
 // Transformiere die gesamte API-Antwort
@@ -307,3 +312,62 @@ export const transformTrajMetadataResult = (
     }),
   );
 };
+
+// Spaltenweiser Bundle-Kanal → Zeilen-Objekte im Format der Einzel-Endpunkte
+export const bundleChannelRows = <T>(
+  bundle: TrajBundleRaw,
+  channel: TrajBundleChannel,
+): T[] => {
+  const entry = bundle.channels[channel];
+  if (!entry) return [];
+
+  const columns: Record<string, unknown[]> = { ...entry.columns };
+  if (entry.timestamp) columns.timestamp = bundle.timestamps[entry.timestamp];
+  if (entry.segments) {
+    const { values, counts } = entry.segments;
+    columns.seg_id = values.flatMap((value, i) =>
+      Array<string>(counts[i]).fill(value),
+    );
+  }
+
+  const names = Object.keys(columns);
+  return Array.from({ length: entry.length }, (_, i) => {
+    const row: Record<string, unknown> = { traj_id: bundle.traj_id };
+    names.forEach((name) => {
+      row[name] = columns[name][i];
+    });
+    return row as T;
+  });
+};
+
+export const transformTrajBundleResult = (
+  bundle: TrajBundleRaw,
+): TrajBundle => ({
+  poseAct: transformTrajPoseActResult(
+    bundleChannelRows<TrajPoseActRaw>(bundle, 'traj_pose_act'),
+  ),
+  velAct: transformTrajVelActResult(
+    bundleChannelRows<TrajVelActRaw>(bundle, 'traj_vel_act'),
+  ),
+  accelAct: transformTrajAccelActResult(
+    bundleChannelRows<TrajAccelActRaw>(bundle, 'traj_accel_act'),
+  ),
+  accelCmd: transformTrajAccelCmdResult(
+    bundleChannelRows<TrajAccelCmdRaw>(bundle, 'traj_accel_cmd'),
+  ),
+  positionCmd: transformTrajPositionCmdResult(
+    bundleChannelRows<TrajPositionCmdRaw>(bundle, 'traj_position_cmd'),
+  ),
+  orientationCmd: transformTrajOrientationCmdResult(
+    bundleChannelRows<TrajOrientationCmdRaw>(bundle, 'traj_orientation_cmd'),
+  ),
+  velCmd: transformTrajVelCmdResult(
+    bundleChannelRows<TrajVelCmdRaw>(bundle, 'traj_vel_cmd'),
+  ),
+  jointStates: transformTrajJointStatesResult(
+    bundleChannelRows<TrajJointStatesRaw>(bundle, 'traj_joint_states'),
+  ),
+  setpoints: transformTrajSetpointsResult(
+    bundleChannelRows<TrajSetpointsRaw>(bundle, 'traj_setpoints'),
+  ),
+});
@@ -30,7 +30,7 @@ export interface TrajectoryState {
   trajInfo: TrajInfo[];
   pagination: PaginationResult | null;
   currentPage: number;
-  loadPage: (page: number) => Promise<void>;
+  loadPage: (page: number, cursor?: string | null) => Promise<void>;
   nextPage: () => Promise<void>;
   prevPage: () => Promise<void>;
   currentTrajInfo: TrajInfo | null;
@@ -119,16 +119,18 @@ export const TrajectoryProvider = ({
 
   // Funktion zum Laden einer bestimmten Seite - mit useCallback
   const loadPage = useCallback(
-    async (page: number) => {
+    async (page: number, cursor?: string | null) => {
       if (!pagination || page < 1 || page > pagination.totalPages) {
         return;
       }
 
       try {
+        // Mit Cursor per Keyset, sonst Sprung auf Seite n (OFFSET)
         const { trajInfo: newTrajInfo, pagination: newPagination } =
           await getTrajInfo({
             page,
             pageSize: pagination.pageSize,
+            cursor,
           });
 
         setTrajInfo(newTrajInfo);
@@ -145,7 +147,7 @@ export const TrajectoryProvider = ({
   // Navigations-Hilfsfunktionen - mit useCallback
   const nextPage = useCallback(async () => {
     if (pagination?.hasNext) {
-      await loadPage(currentPage + 1);
+      await loadPage(currentPage + 1, pagination.nextCursor);
     }
   }, [pagination, currentPage, loadPage]);
 
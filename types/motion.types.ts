@@ -308,3 +308,42 @@ export interface TrajMetadataResult {
   trajectory: TrajMetadata;
   segments: TrajMetadata[];
 }
+
+export type TrajBundleChannel =
+  | 'traj_pose_act'
+  | 'traj_vel_act'
+  | 'traj_accel_act'
+  | 'traj_accel_cmd'
+  | 'traj_position_cmd'
+  | 'traj_orientation_cmd'
+  | 'traj_vel_cmd'
+  | 'traj_joint_states'
+  | 'traj_setpoints'
+  | 'traj_metadata';
+
+export interface TrajBundleChannelRaw {
+  length: number;
+  // Schlüssel in TrajBundleRaw.timestamps (nur bei Zeitreihen)
+  timestamp?: string;
+  // seg_id lauflängenkodiert (nur bei Zeitreihen)
+  segments?: { values: string[]; counts: number[] };
+  columns: Record<string, unknown[]>;
+}
+
+export interface TrajBundleRaw {
+  traj_id: string;
+  timestamps: Record<string, string[]>;
+  channels: Partial<Record<TrajBundleChannel, TrajBundleChannelRaw>>;
+}
+
+export interface TrajBundle {
+  poseAct: TrajPoseAct[];
+  velAct: TrajVelAct[];
+  accelAct: TrajAccelAct[];
+  accelCmd: TrajAccelCmd[];
+  positionCmd: TrajPositionCmd[];
+  orientationCmd: TrajOrientationCmd[];
+  velCmd: TrajVelCmd[];
+  jointStates: TrajJointStates[];
+  setpoints: TrajSetpoints[];
+}
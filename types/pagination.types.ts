@@ -9,6 +9,8 @@ import type { TrajInfo, TrajInfoRaw } from '@/types/motion.types';
 export interface PaginationParams {
   page?: number;
   pageSize?: number;
+  // next_cursor der vorigen Seite → Keyset statt OFFSET
+  cursor?: string | null;
 }
 
 export interface PaginationResultRaw {
@@ -18,6 +20,8 @@ export interface PaginationResultRaw {
   total_pages: number;
   has_next: boolean;
   has_previous: boolean;
+  next_cursor: string | null;
+  total_is_estimate: boolean;
 }
 
 export interface TrajInfoResponseRaw {
@@ -37,6 +41,8 @@ export interface PaginationResult {
   totalPages: number;
   hasNext: boolean;
   hasPrevious: boolean;
+  nextCursor: string | null;
+  totalIsEstimate: boolean;
 }
 
 export interface EvaluationInfoResponse {
@@ -53,12 +59,5 @@ export interface EvaluationInfoResponse {
 
 export interface EvaluationIDsResponse {
   evaluationTrajIDs: EvaluationTrajIDs;
-  pagination: {
-    total: number;
-    page: number;
-    pageSize: number;
-    totalPages: number;
-    hasNext: boolean;
-    hasPrevious: boolean;
-  };
+  pagination: PaginationResult;
 }